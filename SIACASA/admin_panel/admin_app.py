@@ -19,6 +19,7 @@ from admin_panel.analytics.analytics_controller import analytics_blueprint
 
 # Importar conector de base de datos
 from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+from bot_siacasa.infrastructure.db.migrations import ensure_schema
 
 # Configurar logging
 logging.basicConfig(
@@ -75,6 +76,7 @@ class AdminPanel:
             user=os.getenv('NEONDB_USER'),
             password=os.getenv('NEONDB_PASSWORD')
         )
+        ensure_schema(self.db)
         
         # Configurar carpeta de carga de archivos
         self.app.config['UPLOAD_FOLDER'] = os.path.join(
@@ -125,7 +127,7 @@ class AdminPanel:
                 FROM chatbot_sessions 
                 WHERE bank_code = %s
                 """
-                total_conversations = self.db.fetch_one(query, (bank_code,))
+                total_conversations = self.db.fetch_one(query, (bank_code,), readonly=True)
                 conversation_count = total_conversations['count'] if total_conversations else 0
                 
                 # Obtener usuarios activos en las últimas 24 horas
@@ -144,12 +146,12 @@ class AdminPanel:
                     (end_time IS NOT NULL AND end_time > NOW() - INTERVAL '24 hours')
                 )
                 """
-                active_users = self.db.fetch_one(query, (bank_code,))
+                active_users = self.db.fetch_one(query, (bank_code,), readonly=True)
                 active_users_count = active_users['count'] if active_users else 0
                 
                 # Obtener archivos de entrenamiento
                 query = "SELECT COUNT(*) as count FROM training_files WHERE bank_code = %s"
-                training_files = self.db.fetch_one(query, (bank_code,))
+                training_files = self.db.fetch_one(query, (bank_code,), readonly=True)
                 training_files_count = training_files['count'] if training_files else 0
                 
                 # Obtener última fecha de entrenamiento
@@ -160,7 +162,7 @@ class AdminPanel:
                 ORDER BY end_time DESC
                 LIMIT 1
                 """
-                last_training = self.db.fetch_one(query, (bank_code,))
+                last_training = self.db.fetch_one(query, (bank_code,), readonly=True)
                 last_training_date = last_training['end_time'] if last_training else None
                 
                 # Crear diccionario de estadísticas
@@ -196,7 +198,7 @@ class AdminPanel:
             try:
                 # Obtener total de conversaciones
                 query = "SELECT COUNT(*) as count FROM chatbot_sessions WHERE bank_code = %s"
-                total_conversations = self.db.fetch_one(query, (bank_code,))
+                total_conversations = self.db.fetch_one(query, (bank_code,), readonly=True)
                 conversation_count = total_conversations['count'] if total_conversations else 0
                 
                 # Obtener usuarios activos en las últimas 24 horas
@@ -205,7 +207,7 @@ class AdminPanel:
                 FROM chatbot_sessions 
                 WHERE bank_code = %s AND start_time > NOW() - INTERVAL '24 hours'
                 """
-                active_users = self.db.fetch_one(query, (bank_code,))
+                active_users = self.db.fetch_one(query, (bank_code,), readonly=True)
                 active_users_count = active_users['count'] if active_users else 0
                 
                 return jsonify({
@@ -242,7 +244,7 @@ class AdminPanel:
                 ORDER BY 
                     date DESC
                 """
-                conversations_by_day = self.db.fetch_all(query, (bank_code,))
+                conversations_by_day = self.db.fetch_all(query, (bank_code,), readonly=True)
                 
                 # Duración promedio de conversaciones
                 query = """
@@ -254,7 +256,7 @@ class AdminPanel:
                     bank_code = %s
                     AND end_time IS NOT NULL
                 """
-                duration_result = self.db.fetch_one(query, (bank_code,))
+                duration_result = self.db.fetch_one(query, (bank_code,), readonly=True)
                 avg_duration = round(float(duration_result['avg_duration']), 0) if duration_result and duration_result['avg_duration'] else 0
                 
                 # Convertir a formato de minutos y segundos
@@ -279,7 +281,7 @@ class AdminPanel:
                 ORDER BY 
                     range
                 """
-                message_distribution = self.db.fetch_all(query, (bank_code,))
+                message_distribution = self.db.fetch_all(query, (bank_code,), readonly=True)
                 
                 return jsonify({
                     'conversations_by_day': conversations_by_day,
@@ -130,11 +130,13 @@ class SupportService:
                 agent_messages
             WHERE 
                 ticket_id = %s
+                -- Cota inferior para que solo se lean las particiones desde la creación del ticket
+                AND timestamp >= (SELECT creation_date FROM support_tickets WHERE id = %s)
             ORDER BY 
                 timestamp ASC
             """
             
-            agent_messages = self.repository.db.fetch_all(query, (ticket_id,))
+            agent_messages = self.repository.db.fetch_all(query, (ticket_id, ticket_id))
             
             # Convertir a formato común
             messages = []
@@ -691,7 +693,7 @@ class SupportService:
             FROM support_tickets
             WHERE 1=1 {bank_condition}
             """
-            total_result = self.repository.db.fetch_one(query)
+            total_result = self.repository.db.fetch_one(query, readonly=True)
             total_tickets = total_result['count'] if total_result else 0
             
             # Tickets por estado
@@ -701,7 +703,7 @@ class SupportService:
             WHERE 1=1 {bank_condition}
             GROUP BY status
             """
-            status_results = self.repository.db.fetch_all(query)
+            status_results = self.repository.db.fetch_all(query, readonly=True)
             
             status_counts = {}
             for row in status_results:
@@ -713,7 +715,7 @@ class SupportService:
             FROM support_tickets
             WHERE resolution_date IS NOT NULL {bank_condition}
             """
-            resolution_result = self.repository.db.fetch_one(query)
+            resolution_result = self.repository.db.fetch_one(query, readonly=True)
             avg_resolution_time = round(resolution_result['avg_resolution_time'], 2) if resolution_result and resolution_result['avg_resolution_time'] else 0
             
             # Tickets creados hoy
@@ -722,7 +724,7 @@ class SupportService:
             FROM support_tickets
             WHERE DATE(creation_date) = CURRENT_DATE {bank_condition}
             """
-            today_result = self.repository.db.fetch_one(query)
+            today_result = self.repository.db.fetch_one(query, readonly=True)
             tickets_today = today_result['count'] if today_result else 0
             
             # Tickets resueltos hoy
@@ -731,7 +733,7 @@ class SupportService:
             FROM support_tickets
             WHERE DATE(resolution_date) = CURRENT_DATE {bank_condition}
             """
-            resolved_today_result = self.repository.db.fetch_one(query)
+            resolved_today_result = self.repository.db.fetch_one(query, readonly=True)
             resolved_today = resolved_today_result['count'] if resolved_today_result else 0
             
             # Compilar estadísticas
@@ -850,7 +852,7 @@ class SupportService:
             ORDER BY 
                 date ASC
             """
-            tickets_by_day = self.repository.db.fetch_all(query)
+            tickets_by_day = self.repository.db.fetch_all(query, readonly=True)
             
             # Convertir a formato para gráfico
             dates = []
@@ -873,7 +875,7 @@ class SupportService:
             ORDER BY 
                 count DESC
             """
-            tickets_by_reason = self.repository.db.fetch_all(query)
+            tickets_by_reason = self.repository.db.fetch_all(query, readonly=True)
             
             # Convertir a formato para gráfico
             reasons = []
@@ -897,7 +899,7 @@ class SupportService:
             ORDER BY 
                 date ASC
             """
-            resolution_times = self.repository.db.fetch_all(query)
+            resolution_times = self.repository.db.fetch_all(query, readonly=True)
             
             # Convertir a formato para gráfico
             resolution_dates = []
@@ -3,7 +3,7 @@ import os
 import uuid
 import logging
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Iterator, Optional, Tuple
 from werkzeug.utils import secure_filename
 
 logger = logging.getLogger(__name__)
@@ -94,7 +94,7 @@ class TrainingService:
         LIMIT 10
         """
         
-        return self.db.fetch_all(query, (bank_code,))
+        return self.db.fetch_all(query, (bank_code,), readonly=True)
     
     def get_training_sessions_by_range(
         self,
@@ -128,9 +128,10 @@ class TrainingService:
         bank_code: str,
         start_date: datetime,
         end_date: datetime
-    ) -> List[Dict[str, Any]]:
+    ) -> Iterator[Dict[str, Any]]:
         """
         Obtiene el detalle de archivos por sesión dentro de un rango de fechas.
+        Las filas se entregan en streaming para que el reporte no cargue todo en memoria.
         """
         query = """
         SELECT 
@@ -150,7 +151,7 @@ class TrainingService:
           AND ts.start_time BETWEEN %s AND %s
         ORDER BY ts.start_time ASC, tsf.file_id
         """
-        return self.db.fetch_all(query, (bank_code, start_date, end_date))
+        return self.db.fetch_iter(query, (bank_code, start_date, end_date))
     
     def save_training_file(self, file, description: str, user_id: str, bank_code: str) -> Dict[str, Any]:
         """
@@ -1,10 +1,73 @@
 from abc import ABC, abstractmethod
-from typing import Optional, List, TYPE_CHECKING
+from datetime import datetime
+from typing import Dict, Optional, List, Tuple, TYPE_CHECKING
 
 # Evitar importaciones circulares
 if TYPE_CHECKING:
     from bot_siacasa.domain.entities.usuario import Usuario
     from bot_siacasa.domain.entities.conversacion import Conversacion
+    from bot_siacasa.domain.entities.mensaje import Mensaje
+
+
+class UnitOfWork:
+    """
+    Acumula los cambios de un turno de chat (usuario, conversación y mensajes)
+    para persistirlos juntos al confirmar.
+    
+    Los objetos se registran por referencia: los cambios hechos después de
+    registrarlos (p. ej. los tiempos de procesamiento) también se guardan.
+    Un mensaje registrado varias veces se guarda una sola vez.
+    """
+    
+    def __init__(self, repository: "IRepository"):
+        """
+        Args:
+            repository: Repositorio que aplicará los cambios
+        """
+        self.repository = repository
+        self.usuarios: Dict[str, "Usuario"] = {}
+        self.conversaciones: Dict[str, "Conversacion"] = {}
+        self.mensajes: Dict[str, Tuple[str, "Mensaje"]] = {}
+        # False al copiar datos ya existentes (rebalanceo de shards): no se derivan
+        # de nuevo las sesiones del panel ni de métricas
+        self.derivar_sesiones = True
+        self.committed = False
+    
+    def registrar_usuario(self, usuario: "Usuario") -> None:
+        self.usuarios[usuario.id] = usuario
+    
+    def registrar_conversacion(self, conversacion: "Conversacion") -> None:
+        self.conversaciones[conversacion.id] = conversacion
+    
+    def registrar_mensaje(self, conversacion_id: str, mensaje: "Mensaje") -> None:
+        # El mensaje de sistema no se persiste: la conversación guarda la
+        # referencia a su plantilla (ver domain/system_prompts.py)
+        if mensaje.role == "system":
+            return
+        self.mensajes[mensaje.id] = (conversacion_id, mensaje)
+    
+    def vacia(self) -> bool:
+        return not (self.usuarios or self.conversaciones or self.mensajes)
+    
+    def commit(self) -> None:
+        """
+        Persiste todos los cambios registrados y vacía la unidad de trabajo.
+        """
+        if not self.vacia():
+            self.repository.aplicar_unidad_de_trabajo(self)
+        self.usuarios.clear()
+        self.conversaciones.clear()
+        self.mensajes.clear()
+        self.committed = True
+    
+    def __enter__(self) -> "UnitOfWork":
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        # Solo se confirma si el bloque terminó sin errores
+        if exc_type is None:
+            self.commit()
+
 
 class IRepository(ABC):
     """
@@ -72,14 +135,142 @@ class IRepository(ABC):
         pass
     
     @abstractmethod
-    def obtener_conversaciones_usuario(self, usuario_id: str) -> List["Conversacion"]:
+    def obtener_conversaciones_usuario(
+        self,
+        usuario_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> List["Conversacion"]:
         """
         Obtiene todas las conversaciones de un usuario.
         
         Args:
             usuario_id: ID del usuario
+            max_mensajes: Mensajes más recientes a cargar por conversación (None = todos)
             
         Returns:
             Lista de conversaciones
         """
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def finalizar_conversacion(self, conversacion_id: str) -> None:
+        """
+        Finaliza una conversación: deja de ser la activa del usuario y no se
+        reabre aunque después se guarde una copia sin fecha de fin.
+
+        Args:
+            conversacion_id: ID de la conversación
+        """
+        pass
+
+    def obtener_conversaciones(
+        self,
+        conversacion_ids: List[str],
+        max_mensajes: Optional[int] = None
+    ) -> List["Conversacion"]:
+        """
+        Obtiene varias conversaciones a la vez. La implementación por defecto las
+        carga una a una; los repositorios con base de datos la sobrescriben para
+        hacerlo con consultas por lotes.
+        
+        Args:
+            conversacion_ids: IDs de las conversaciones
+            max_mensajes: Mensajes más recientes por conversación (None = todos; la
+                implementación por defecto lo ignora)
+            
+        Returns:
+            Conversaciones encontradas
+        """
+        conversaciones = []
+        for conversacion_id in conversacion_ids:
+            conversacion = self.obtener_conversacion(conversacion_id)
+            if conversacion:
+                conversaciones.append(conversacion)
+        return conversaciones
+    
+    def obtener_mensajes_anteriores(
+        self,
+        conversacion_id: str,
+        antes_de: Optional[datetime] = None,
+        limite: int = 20
+    ) -> List["Mensaje"]:
+        """
+        Obtiene una página de mensajes de una conversación anteriores a una fecha
+        (paginación por timestamp). Los repositorios que no guardan mensajes fuera
+        de la conversación retornan una lista vacía.
+        
+        Args:
+            conversacion_id: ID de la conversación
+            antes_de: Cursor; solo mensajes anteriores a esta fecha (None = los más recientes)
+            limite: Número máximo de mensajes
+            
+        Returns:
+            Mensajes en orden cronológico
+        """
+        return []
+    
+    def unit_of_work(self) -> UnitOfWork:
+        """
+        Crea una unidad de trabajo para persistir un turno completo de una vez.
+        
+        Returns:
+            Unidad de trabajo asociada a este repositorio
+        """
+        return UnitOfWork(self)
+    
+    def aplicar_unidad_de_trabajo(self, unidad: UnitOfWork) -> None:
+        """
+        Persiste los cambios de una unidad de trabajo. La implementación por defecto
+        los aplica uno a uno con los métodos del repositorio; los repositorios con
+        transacciones pueden sobrescribirla para hacerlo en un solo viaje.
+        
+        Args:
+            unidad: Unidad de trabajo con los cambios registrados
+        """
+        for usuario in unidad.usuarios.values():
+            self.guardar_usuario(usuario)
+        for conversacion in unidad.conversaciones.values():
+            self.guardar_conversacion(conversacion)
+        if hasattr(self, '_guardar_mensaje'):
+            for conversacion_id, mensaje in unidad.mensajes.values():
+                self._guardar_mensaje(conversacion_id, mensaje)
+
+    @abstractmethod
+    def exportar_conversaciones_usuario(self, usuario_id: str) -> List["Conversacion"]:
+        """
+        Obtiene todas las conversaciones de un usuario con todos sus mensajes. A
+        diferencia de obtener_conversaciones_usuario, propaga los errores en lugar
+        de retornar una lista vacía: lo usa el rebalanceo de shards antes de borrar
+        los datos del shard de origen.
+
+        Args:
+            usuario_id: ID del usuario
+
+        Returns:
+            Lista de conversaciones completas
+        """
+        pass
+
+    @abstractmethod
+    def listar_ids_usuarios(self) -> List[str]:
+        """
+        IDs de los usuarios con datos en el repositorio. Lo usa el rebalanceo de
+        shards para encontrar los usuarios que deben cambiar de shard.
+
+        Returns:
+            Lista de IDs de usuario
+        """
+        pass
+
+    @abstractmethod
+    def eliminar_conversaciones_usuario(self, usuario_id: str, conversacion_ids: List[str]) -> None:
+        """
+        Elimina conversaciones de un usuario con sus mensajes, y el usuario si ya no
+        le quedan conversaciones. Lo usa el rebalanceo de shards tras copiarlas al
+        shard nuevo.
+
+        Args:
+            usuario_id: ID del usuario
+            conversacion_ids: Conversaciones a eliminar (las que ya se copiaron)
+        """
+        pass
@@ -35,7 +35,9 @@ class OptimizedConfig:
         "max_messages_in_history": 15,    # Máximo 15 mensajes en historial
         "max_messages_to_ai": 10,         # Máximo 10 mensajes a la IA
         "context_window_size": 8,         # Ventana de contexto de 8 mensajes
-        "enable_conversation_compression": True
+        "enable_conversation_compression": True,
+        "cache_max_memory_mb": 64,        # Memoria estimada máxima de la caché de conversaciones
+        "cache_idle_ttl_seconds": 1800    # Conversaciones sin uso durante 30 min salen de la caché
     }
     
     # === TIMEOUTS AGRESIVOS ===
@@ -77,7 +79,55 @@ class OptimizedConfig:
         "pool_timeout": 2.0,
         "pool_recycle": 3600,
         "enable_query_caching": True,
-        "query_cache_size": 1000
+        "query_cache_size": 1000,
+        "request_query_warning": 15  # Consultas por request a partir de las que se advierte en logs
+    }
+    
+    # === REPOSITORIO EN MEMORIA (respaldo sin NeonDB) ===
+    MEMORY_REPOSITORY_CONFIG = {
+        "max_conversations": 5000,     # Conversaciones residentes antes de desalojar (LRU)
+        "max_memory_mb": 256,          # Memoria estimada máxima de conversaciones y mensajes
+        "spill_path": os.getenv("MEMORY_REPOSITORY_SPILL_PATH") or None  # Archivo shelve opcional
+    }
+    
+    # === PARTICIONADO MENSUAL DE MENSAJES (mensajes, agent_messages, chat_messages) ===
+    PARTITION_CONFIG = {
+        "months_ahead": 3,             # Particiones futuras creadas por adelantado
+        "retention_months": 12,        # Meses adjuntos; las anteriores se separan (DETACH)
+        "maintain_on_startup": True    # Verificar particiones futuras al iniciar
+    }
+    
+    # === CONFIGURACIÓN DE SQLITE (despliegues de un solo nodo) ===
+    SQLITE_CONFIG = {
+        "journal_mode": "WAL",         # Lectores concurrentes con un escritor
+        "synchronous": "NORMAL",       # Seguro con WAL; fsync solo en checkpoints
+        "busy_timeout_ms": 5000,
+        "cache_size_kb": 20000,        # Caché de páginas por conexión
+        "mmap_size": 268435456,        # 256 MB de lectura mapeada en memoria
+        "cached_statements": 256,      # Sentencias preparadas por conexión
+        "max_readers": 4               # Conexiones de solo lectura en el pool
+    }
+    
+    # === REPARTO DE USUARIOS ENTRE VARIAS BASES (REPOSITORY_BACKEND=sharded) ===
+    SHARDING_CONFIG = {
+        "virtual_nodes": 128,          # Posiciones por shard en el anillo de hash consistente
+        "fan_out_workers": 8,          # Hilos para consultas de administración a todos los shards
+        "directory_size": 50000        # Conversaciones recordadas (conversación -> shard)
+    }
+    
+    # === ESTADO COMPARTIDO ENTRE WORKERS (REDIS_URL) ===
+    SHARED_STATE_CONFIG = {
+        "key_prefix": "siacasa:",      # Prefijo de claves (separa despliegues en el mismo servidor)
+        "socket_timeout": 0.5,         # Segundos por operación; un fallo equivale a fallo de caché
+        "retry_after_seconds": 5.0     # Tras un error, no reintentar durante este tiempo
+    }
+    
+    # === AFINIDAD USUARIO -> WORKER (WORKER_NODES) ===
+    WORKER_AFFINITY_CONFIG = {
+        "virtual_nodes": 128,          # Posiciones por worker en el anillo de hash consistente
+        "connect_timeout": 2.0,        # Segundos máximos para conectar con el worker dueño
+        "forward_timeout": 60.0,       # Espera de la respuesta: mayor que el peor turno (IA con reintentos)
+        "retry_after_seconds": 10.0    # Tiempo fuera del anillo de un worker que no respondió
     }
     
     # === CONFIGURACIÓN DE ANÁLISIS DE SENTIMIENTO ===
@@ -204,7 +254,7 @@ class EnvironmentConfig:
     ENVIRONMENT = os.getenv("ENVIRONMENT", "development")
     DEBUG = os.getenv("DEBUG", "False").lower() == "true"
     
-    # Configuración de cache
+    # Configuración de cache y estado compartido entre workers (redis://host:puerto/db)
     REDIS_URL = os.getenv("REDIS_URL", None)
     ENABLE_REDIS_CACHE = REDIS_URL is not None
     
@@ -221,6 +271,18 @@ class EnvironmentConfig:
     NEONDB_CONNECT_TIMEOUT = int(os.getenv("NEONDB_CONNECT_TIMEOUT", "5"))
     USE_MEMORY_REPOSITORY = os.getenv("USE_MEMORY_REPOSITORY", "False").lower() == "true"
     DISABLE_NEONDB = os.getenv("DISABLE_NEONDB", "False").lower() == "true"
+    REPOSITORY_BACKEND = os.getenv("REPOSITORY_BACKEND", "postgresql").lower()  # postgresql | sqlite | sharded | memory
+    SQLITE_DB_PATH = os.getenv("SQLITE_DB_PATH", "./chatbot_data.db")
+    # Shards con REPOSITORY_BACKEND=sharded: "nombre=destino" separados por comas
+    # (destino = host de PostgreSQL o ruta de un archivo .db de SQLite)
+    SHARD_TARGETS = os.getenv("SHARD_TARGETS", "")
+    # Nombres de los shards antes de agregar uno nuevo ("shard0,shard1"), hasta que
+    # scripts/rebalance_shards.py mueva los datos; después se deja vacío
+    SHARD_PREVIOUS = os.getenv("SHARD_PREVIOUS", "")
+    
+    # Afinidad de usuarios entre workers: "worker0=http://127.0.0.1:3200,worker1=http://127.0.0.1:3201"
+    WORKER_NODES = os.getenv("WORKER_NODES", "")
+    WORKER_NAME = os.getenv("WORKER_NAME") or f"worker{os.getenv('NODE_APP_INSTANCE', '0')}"
     
     # Configuración de OpenAI
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
@@ -1,7 +1,7 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 import logging
-from typing import List, Dict, Optional
+from typing import Callable, List, Dict, Optional
 
 from bot_siacasa.domain.entities.mensaje import Mensaje
 from bot_siacasa.domain.entities.usuario import Usuario
@@ -18,10 +18,19 @@ class Conversacion:
     fecha_fin: Optional[datetime] = None  # Fecha de fin de la conversación (si ha terminado)
     fecha_ultima_actividad: datetime = field(default_factory=datetime.now)  # Fecha de última actividad
     metadata: Dict = field(default_factory=dict)  # Metadatos adicionales
+    total_mensajes: int = 0  # Mensajes totales, incluidos los que no están en la ventana en memoria
+    # Referencia al prompt de sistema (el texto no se persiste con la conversación)
+    prompt_template: Optional[str] = None
+    prompt_version: Optional[int] = None
+    # Carga páginas de mensajes anteriores: (antes_de, limite) -> mensajes en orden cronológico
+    cargador_mensajes: Optional[Callable[[Optional[datetime], int], List[Mensaje]]] = field(
+        default=None, repr=False, compare=False
+    )
     
     def __post_init__(self):
         if self.metadata is None:
             self.metadata = {}
+        self.total_mensajes = max(self.total_mensajes or 0, len(self.mensajes))
     
     def agregar_mensaje(self, mensaje: Mensaje) -> None:
         """
@@ -32,6 +41,7 @@ class Conversacion:
         """
         # Agregar mensaje a la lista
         self.mensajes.append(mensaje)
+        self.total_mensajes += 1
         # Actualizar fecha de última actividad
         self.fecha_ultima_actividad = datetime.now()
         logger.debug(f"Mensaje agregado a conversación {self.id}: {mensaje.role} - {mensaje.content[:50]}...")
@@ -87,7 +97,7 @@ class Conversacion:
         if len(self.mensajes) <= max_mensajes:
             return
         
-        logger.info(f"Limitando historial de conversación {self.id} de {len(self.mensajes)} a {max_mensajes} mensajes")
+        logger.debug(f"Limitando historial de conversación {self.id} de {len(self.mensajes)} a {max_mensajes} mensajes")
         
         # Encontrar mensaje de sistema
         sistema_idx = None
@@ -106,6 +116,43 @@ class Conversacion:
             self.mensajes = self.mensajes[-max_mensajes:]
             logger.debug(f"Historial limitado sin mensaje de sistema")
     
+    def tiene_mensajes_anteriores(self) -> bool:
+        """
+        Indica si hay mensajes persistidos fuera de la ventana en memoria.
+        """
+        return self.total_mensajes > len(self.mensajes)
+    
+    def obtener_mensajes_anteriores(
+        self,
+        antes_de: Optional[datetime] = None,
+        limite: int = 20
+    ) -> List[Mensaje]:
+        """
+        Obtiene una página de mensajes anteriores a la ventana en memoria, sin
+        agregarlos a ella (para vistas de agentes o resúmenes).
+        
+        Args:
+            antes_de: Solo mensajes anteriores a esta fecha (por defecto, el mensaje
+                más antiguo de la ventana); se usa como cursor para paginar
+            limite: Número máximo de mensajes a retornar
+            
+        Returns:
+            Mensajes en orden cronológico
+        """
+        if antes_de is None:
+            fechas = [mensaje.timestamp for mensaje in self.mensajes if mensaje.role != "system" and mensaje.timestamp]
+            antes_de = min(fechas) if fechas else None
+        
+        if self.cargador_mensajes is not None:
+            return self.cargador_mensajes(antes_de, limite)
+        
+        # Sin cargador solo existen los mensajes de la ventana
+        anteriores = [
+            mensaje for mensaje in self.mensajes
+            if mensaje.role != "system" and antes_de is not None and mensaje.timestamp < antes_de
+        ]
+        return anteriores[-limite:] if limite else []
+    
     def esta_activa(self) -> bool:
         """
         Verifica si la conversación está activa.
@@ -2,7 +2,8 @@
 from dataclasses import dataclass, field
 from datetime import datetime
 from typing import Optional, Dict, List
-import uuid
+
+from bot_siacasa.domain.identifiers import new_id
 
 @dataclass
 class Mensaje:
@@ -13,7 +14,7 @@ class Mensaje:
     metadata: Optional[Dict] = None
     
     # Campos adicionales que coinciden con tu DB
-    id: Optional[str] = field(default_factory=lambda: str(uuid.uuid4()))
+    id: Optional[str] = field(default_factory=new_id)  # UUIDv7: ordenado por tiempo
     conversacion_id: Optional[str] = None
     sentiment_score: Optional[float] = None
     processing_time_ms: Optional[float] = None
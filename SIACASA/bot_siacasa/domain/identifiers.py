@@ -0,0 +1,83 @@
+# bot_siacasa/domain/identifiers.py
+"""
+Identificadores ordenados por tiempo (UUID versión 7, RFC 9562).
+
+Los 48 bits iniciales son la marca de tiempo Unix en milisegundos, de modo que
+los IDs generados consecutivamente son crecientes y las inserciones se agregan
+al final del índice B-tree en lugar de caer en páginas aleatorias. Siguen siendo
+UUID válidos: conviven con los UUID4 existentes en columnas de tipo UUID.
+"""
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+# 12 bits de contador (rand_a); se siembra con 11 bits aleatorios para dejar margen
+_COUNTER_BITS = 12
+_COUNTER_MAX = (1 << _COUNTER_BITS) - 1
+
+
+def uuid7() -> uuid.UUID:
+    """
+    Genera un UUIDv7 monótono dentro del proceso: dentro del mismo milisegundo
+    se incrementa un contador, y si se agota se avanza al milisegundo siguiente.
+
+    Returns:
+        UUID versión 7
+    """
+    global _last_ms, _counter
+
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = int.from_bytes(os.urandom(2), "big") >> (16 - _COUNTER_BITS + 1)
+        else:
+            _counter += 1
+            if _counter > _COUNTER_MAX:
+                _last_ms += 1
+                _counter = 0
+        timestamp_ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (timestamp_ms & ((1 << 48) - 1)) << 80
+    value |= 0x7 << 76
+    value |= counter << 64
+    value |= 0b10 << 62
+    value |= rand_b
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    """
+    Genera un identificador ordenado por tiempo en formato texto.
+
+    Returns:
+        UUIDv7 como cadena canónica
+    """
+    return str(uuid7())
+
+
+def uuid7_datetime(value: Union[str, uuid.UUID]) -> Optional[datetime]:
+    """
+    Extrae la fecha de creación de un UUIDv7.
+
+    Args:
+        value: Identificador (texto o UUID)
+
+    Returns:
+        Fecha UTC de generación, o None si no es un UUIDv7 (p. ej. un UUID4 antiguo)
+    """
+    try:
+        parsed = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+    except (ValueError, AttributeError):
+        return None
+    if parsed.version != 7:
+        return None
+    return datetime.fromtimestamp((parsed.int >> 80) / 1000, tz=timezone.utc)
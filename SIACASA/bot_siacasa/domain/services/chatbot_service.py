@@ -1,5 +1,4 @@
 # bot_siacasa/domain/services/chatbot_service.py
-import uuid
 import logging
 import time
 import re
@@ -13,7 +12,10 @@ from bot_siacasa.domain.entities.conversacion import Conversacion
 from bot_siacasa.domain.entities.analisis_sentimiento import AnalisisSentimiento
 from bot_siacasa.domain.entities.ticket import Ticket, TicketStatus, EscalationReason
 from bot_siacasa.application.interfaces.repository_interface import IRepository
+from bot_siacasa.domain.services.conversation_cache import ConversationCache
 from bot_siacasa.domain.services.escalation_service import EscalationService
+from bot_siacasa.domain.identifiers import new_id
+from bot_siacasa.domain.system_prompts import PromptReference, SystemPromptCatalog
 
 # Evitar importación circular
 if TYPE_CHECKING:
@@ -100,7 +102,8 @@ class ChatbotService:
         ai_provider=None,
         bank_config=None,
         support_repository=None,
-        knowledge_service=None
+        knowledge_service=None,
+        conversation_cache: Optional[ConversationCache] = None
     ):
         """
         Inicializa el servicio del chatbot.
@@ -113,9 +116,10 @@ class ChatbotService:
 
         # Cache para optimizar rendimiento
         self._sentiment_cache = {}
-        self._conversation_cache = {}
+        self._conversation_cache = conversation_cache if conversation_cache is not None else ConversationCache()
         self._response_cache = {}
         self._max_cache_size = 100
+        self._max_mensajes_historial = self._cargar_ventana_historial()
 
         default_config = {
             "bank_name": "Banco SIACASA",
@@ -142,21 +146,11 @@ class ChatbotService:
         )
         self.bank_config.setdefault("greeting", "Hola, soy tu asistente virtual bancario. ¿En qué puedo ayudarte hoy?")
 
-        # Mensaje de sistema optimizado
-        identidad = self.bank_config.get("identity_statement", "")
-        estilo = self.bank_config.get("style", "profesional")
-        self.mensaje_sistema = Mensaje(
-            role="system",
-            content=(
-                f"Eres el asistente virtual oficial del {self.bank_config['bank_name']}. {identidad}\n\n"
-                "Instrucciones de estilo:\n"
-                f"- Mantén un tono {estilo} y empático.\n"
-                "- Responde de forma clara, concisa y contextualizada al banco.\n"
-                "- Utiliza la base de conocimiento y evita inventar datos. Si falta información, acláralo y ofrece canales oficiales.\n"
-                "- Nunca digas que eres un modelo genérico de OpenAI ni que careces de afiliación bancaria.\n"
-                "- Si la consulta requiere intervención humana, ofrece derivar a un agente.\n"
-                "- No repitas saludos en cada mensaje y evita tecnicismos innecesarios."
-            )
+        # Prompt de sistema versionado: las conversaciones guardan solo la referencia
+        self.prompt_catalog = SystemPromptCatalog()
+        self.prompt_catalog.registrar_banco(self.bank_config["bank_code"], self.bank_config)
+        self.mensaje_sistema = self.prompt_catalog.mensaje(
+            self.prompt_catalog.referencia_actual(self.bank_config["bank_code"])
         )
 
     def obtener_respuesta_rapida(self, texto: str) -> Optional[str]:
@@ -184,8 +178,15 @@ class ChatbotService:
 
         try:
             # Verificar cache primero
-            if usuario_id in self._conversation_cache:
-                cached_conv = self._conversation_cache[usuario_id]
+            cached_conv = self._conversation_cache.get(usuario_id)
+            if cached_conv is not None:
+                # Las instantáneas de otro worker llegan sin mensaje de sistema ni cargador
+                self._ensure_system_message(cached_conv)
+                if cached_conv.cargador_mensajes is None:
+                    cached_conv.cargador_mensajes = (
+                        lambda antes_de, limite, conversacion_id=cached_conv.id:
+                            self.repository.obtener_mensajes_anteriores(conversacion_id, antes_de, limite)
+                    )
                 logger.debug(
                     f"Conversación obtenida del cache para {usuario_id}")
                 return cached_conv
@@ -203,12 +204,15 @@ class ChatbotService:
                     self.repository.guardar_usuario(usuario)
 
                 # Crear nueva conversación
-                conversacion_id = str(uuid.uuid4())
+                conversacion_id = new_id()
                 conversacion = Conversacion(
                     id=conversacion_id, usuario=usuario)
 
-                # Agregar mensaje del sistema
-                conversacion.agregar_mensaje(self.mensaje_sistema)
+                # Referencia al prompt de sistema vigente (el mensaje no se persiste)
+                referencia = self.prompt_catalog.referencia_actual(self.bank_config["bank_code"])
+                conversacion.prompt_template = referencia.template
+                conversacion.prompt_version = referencia.version
+                self._ensure_system_message(conversacion)
 
                 # Inicializar metadatos con bank_code predeterminado
                 self._ensure_conversation_bank_code(conversacion)
@@ -216,10 +220,11 @@ class ChatbotService:
                 # Guardar la conversación
                 self.repository.guardar_conversacion(conversacion)
             else:
+                self._ensure_system_message(conversacion)
                 self._ensure_conversation_bank_code(conversacion)
 
-            # Agregar al cache (limitar tamaño)
-            self._add_to_conversation_cache(usuario_id, conversacion)
+            # Agregar al cache (acotado por memoria, con LRU y TTL de inactividad)
+            self._conversation_cache.put(usuario_id, conversacion)
 
             execution_time = (time.perf_counter() - start_time) * 1000
             logger.debug(
@@ -233,14 +238,29 @@ class ChatbotService:
                 f"Error obteniendo conversación en {execution_time:.2f}ms: {e}")
             raise
 
-    def _add_to_conversation_cache(self, usuario_id: str, conversacion: Conversacion):
-        """Agrega conversación al cache con límite de tamaño"""
-        if len(self._conversation_cache) >= self._max_cache_size:
-            # Remover el más antiguo (FIFO simple)
-            oldest_key = next(iter(self._conversation_cache))
-            del self._conversation_cache[oldest_key]
-
-        self._conversation_cache[usuario_id] = conversacion
+    @staticmethod
+    def _cargar_ventana_historial() -> int:
+        """Mensajes recientes que cada conversación mantiene en memoria."""
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            return int(OptimizedConfig.CONVERSATION_CONFIG.get("max_messages_in_history", 15))
+        except Exception:
+            return 15
+
+    def _ensure_system_message(self, conversacion: Conversacion) -> None:
+        """
+        El mensaje de sistema no se persiste: se reconstruye al inicio de la ventana
+        (solo en memoria) a partir de la plantilla y versión de la conversación.
+        Las conversaciones sin referencia toman la versión vigente.
+        """
+        if any(mensaje.role == "system" for mensaje in conversacion.mensajes):
+            return
+        if not conversacion.prompt_template or conversacion.prompt_version is None:
+            referencia = self.prompt_catalog.referencia_actual(self.bank_config["bank_code"])
+            conversacion.prompt_template = referencia.template
+            conversacion.prompt_version = referencia.version
+        referencia = PromptReference(conversacion.prompt_template, conversacion.prompt_version)
+        conversacion.mensajes.insert(0, self.prompt_catalog.mensaje(referencia))
 
     def _ensure_conversation_bank_code(self, conversacion: Conversacion) -> None:
         """Garantiza que la conversación tenga un bank_code en su metadata."""
@@ -348,12 +368,27 @@ class ChatbotService:
         texto_lower = texto.lower()
         return any(frase in texto_lower for frase in self.CLARIFICATION_PHRASES)
 
+    def _persistir_turno(self, conversacion: Conversacion, *mensajes: Mensaje) -> None:
+        """
+        Persiste los mensajes de un turno y la conversación con una sola unidad de trabajo
+        (una transacción en los repositorios que la soportan).
+        """
+        with self.repository.unit_of_work() as unidad:
+            for mensaje in mensajes:
+                unidad.registrar_mensaje(conversacion.id, mensaje)
+            unidad.registrar_conversacion(conversacion)
+
+        # Ya persistidos: la conversación en memoria conserva solo la ventana reciente
+        conversacion.limitar_historial(self._max_mensajes_historial)
+        # Write-through: la caché se actualiza solo después de guardar
+        self._conversation_cache.put(conversacion.usuario.id, conversacion)
+
     def _handle_gibberish_input(self, conversacion: Conversacion, usuario_id: str, texto: str) -> str:
         """Responde con mensaje de no comprensión y sugiere reformulación."""
         full_response = "Lo siento, no entendí tu consulta."
 
         mensaje_usuario = Mensaje(role="user", content=texto)
-        mensaje_usuario.id = str(uuid.uuid4())
+        mensaje_usuario.id = new_id()
         mensaje_usuario.timestamp = datetime.now()
         mensaje_usuario.metadata = {"interaction": "gibberish_input"}
 
@@ -361,22 +396,17 @@ class ChatbotService:
             conversacion.metadata = {}
 
         conversacion.agregar_mensaje(mensaje_usuario)
-        if hasattr(self.repository, '_guardar_mensaje'):
-            self.repository._guardar_mensaje(conversacion.id, mensaje_usuario)
 
         mensaje_bot = Mensaje(role="assistant", content=full_response)
-        mensaje_bot.id = str(uuid.uuid4())
+        mensaje_bot.id = new_id()
         mensaje_bot.timestamp = datetime.now()
         mensaje_bot.metadata = {"interaction": "gibberish_response"}
 
         conversacion.agregar_mensaje(mensaje_bot)
-        if hasattr(self.repository, '_guardar_mensaje'):
-            self.repository._guardar_mensaje(conversacion.id, mensaje_bot)
 
         conversacion.metadata["last_interaction_type"] = "gibberish"
 
-        self.repository.guardar_conversacion(conversacion)
-        self._conversation_cache[usuario_id] = conversacion
+        self._persistir_turno(conversacion, mensaje_usuario, mensaje_bot)
 
         return full_response
 
@@ -388,7 +418,7 @@ class ChatbotService:
         )
 
         mensaje_usuario = Mensaje(role="user", content=texto)
-        mensaje_usuario.id = str(uuid.uuid4())
+        mensaje_usuario.id = new_id()
         mensaje_usuario.timestamp = datetime.now()
         mensaje_usuario.metadata = {"interaction": "clarification_request"}
 
@@ -396,22 +426,17 @@ class ChatbotService:
             conversacion.metadata = {}
 
         conversacion.agregar_mensaje(mensaje_usuario)
-        if hasattr(self.repository, '_guardar_mensaje'):
-            self.repository._guardar_mensaje(conversacion.id, mensaje_usuario)
 
         mensaje_bot = Mensaje(role="assistant", content=respuesta)
-        mensaje_bot.id = str(uuid.uuid4())
+        mensaje_bot.id = new_id()
         mensaje_bot.timestamp = datetime.now()
         mensaje_bot.metadata = {"interaction": "clarification_response"}
 
         conversacion.agregar_mensaje(mensaje_bot)
-        if hasattr(self.repository, '_guardar_mensaje'):
-            self.repository._guardar_mensaje(conversacion.id, mensaje_bot)
 
         conversacion.metadata["last_interaction_type"] = "clarification_provided"
 
-        self.repository.guardar_conversacion(conversacion)
-        self._conversation_cache[usuario_id] = conversacion
+        self._persistir_turno(conversacion, mensaje_usuario, mensaje_bot)
 
         return respuesta
 
@@ -430,23 +455,15 @@ class ChatbotService:
 
             # Crear mensaje con ID único
             mensaje = Mensaje(role="user", content=texto.strip())
-            mensaje.id = str(uuid.uuid4())
+            mensaje.id = new_id()
             mensaje.timestamp = datetime.now()
 
             # Agregar a la conversación en memoria
             conversacion.agregar_mensaje(mensaje)
 
-            # ✅ IMPORTANTE: Guardar mensaje individual PRIMERO
-            # Esto asegura que el mensaje se guarde incluso si falla el guardado de la conversación
-            if hasattr(self.repository, '_guardar_mensaje'):
-                self.repository._guardar_mensaje(conversacion.id, mensaje)
-                logger.info(f"✅ Mensaje individual guardado: {mensaje.id}")
-            
-            # Luego actualizar la conversación completa
-            self.repository.guardar_conversacion(conversacion)
-
-            # Actualizar cache
-            self._conversation_cache[usuario_id] = conversacion
+            # ✅ Guardar mensaje y conversación juntos (una sola transacción)
+            self._persistir_turno(conversacion, mensaje)
+            logger.info(f"✅ Mensaje individual guardado: {mensaje.id}")
 
             execution_time = (time.perf_counter() - start_time) * 1000
             logger.info(f"✅ Mensaje usuario procesado en {execution_time:.2f}ms")
@@ -469,21 +486,14 @@ class ChatbotService:
 
             # Crear mensaje con ID único
             mensaje = Mensaje(role="assistant", content=texto)
-            mensaje.id = str(uuid.uuid4())  # ✅ Asignar ID inmediatamente
+            mensaje.id = new_id()  # ✅ Asignar ID inmediatamente
             mensaje.timestamp = datetime.now()
 
             # Agregar a la conversación
             conversacion.agregar_mensaje(mensaje)
 
-            # ✅ Guardar mensaje individual primero (más seguro)
-            if hasattr(self.repository, '_guardar_mensaje_individual'):
-                self.repository._guardar_mensaje_individual(conversacion.id, mensaje)
-            
-            # Luego guardar la conversación completa
-            self.repository.guardar_conversacion(conversacion)
-
-            # Actualizar cache
-            self._conversation_cache[usuario_id] = conversacion
+            # ✅ Guardar mensaje y conversación juntos (una sola transacción)
+            self._persistir_turno(conversacion, mensaje)
 
             execution_time = (time.perf_counter() - start_time) * 1000
             logger.info(f"✅ Mensaje asistente agregado en {execution_time:.2f}ms - ID: {mensaje.id}")
@@ -607,7 +617,7 @@ class ChatbotService:
             
             # 3. ✅ NUEVO: Crear mensaje del usuario con TODOS los campos de análisis
             mensaje_usuario = Mensaje(role="user", content=texto_mensaje)
-            mensaje_usuario.id = str(uuid.uuid4())
+            mensaje_usuario.id = new_id()
             mensaje_usuario.timestamp = datetime.now()
             
             # Asignar TODOS los campos del análisis de sentimiento
@@ -624,14 +634,9 @@ class ChatbotService:
                 "emociones": emociones
             }
             
-            # 4. Agregar mensaje a la conversación
+            # 4. Agregar mensaje a la conversación (se persiste al final del turno)
             conversacion.agregar_mensaje(mensaje_usuario)
             
-            # 5. ✅ IMPORTANTE: Guardar mensaje del usuario inmediatamente
-            if hasattr(self.repository, '_guardar_mensaje'):
-                self.repository._guardar_mensaje(conversacion.id, mensaje_usuario)
-                logger.debug(f"Mensaje usuario guardado con análisis completo")
-            
             # 6. Generar respuesta de la IA
             historial_mensajes = conversacion.obtener_historial()
 
@@ -664,7 +669,7 @@ class ChatbotService:
 
             # 8. ✅ Crear y guardar mensaje del bot
             mensaje_bot = Mensaje(role="assistant", content=respuesta_ia)
-            mensaje_bot.id = str(uuid.uuid4())
+            mensaje_bot.id = new_id()
             mensaje_bot.timestamp = datetime.now()
             mensaje_bot.token_count = self._estimar_tokens(respuesta_ia)
             mensaje_bot.response_tone = response_tone
@@ -677,12 +682,7 @@ class ChatbotService:
             # 9. Agregar mensaje del bot a la conversación
             conversacion.agregar_mensaje(mensaje_bot)
             
-            # 10. ✅ Guardar mensaje del bot individualmente
-            if hasattr(self.repository, '_guardar_mensaje'):
-                self.repository._guardar_mensaje(conversacion.id, mensaje_bot)
-                logger.debug(f"Mensaje bot guardado individualmente: {mensaje_bot.id}")
-            
-            # 11. ✅ Actualizar métricas finales del mensaje usuario
+            # 10. ✅ Actualizar métricas finales del mensaje usuario
             mensaje_usuario.processing_time_ms = round(processing_time_ms)
             mensaje_usuario.ai_processing_time_ms = round(ai_processing_time_ms)
             mensaje_usuario.token_count = token_count
@@ -693,16 +693,8 @@ class ChatbotService:
                 "ai_processing_time_ms": round(ai_processing_time_ms)
             })
             
-            # 12. ✅ Actualizar el mensaje del usuario en la BD con tiempos finales
-            if hasattr(self.repository, '_guardar_mensaje'):
-                self.repository._guardar_mensaje(conversacion.id, mensaje_usuario)
-                logger.debug(f"Mensaje usuario actualizado con tiempos finales")
-            
-            # 13. Guardar la conversación completa
-            self.repository.guardar_conversacion(conversacion)
-            
-            # 14. Actualizar cache
-            self._conversation_cache[usuario_id] = conversacion
+            # 11. ✅ Persistir el turno completo (mensajes con tiempos finales y conversación)
+            self._persistir_turno(conversacion, mensaje_usuario, mensaje_bot)
             
             logger.info(
                 f"✅ Mensaje procesado para {usuario_id} en {processing_time_ms:.2f}ms "
@@ -775,7 +767,7 @@ class ChatbotService:
             conversacion = self.obtener_o_crear_conversacion(usuario_id)
 
             # Si hay pocos mensajes, no es necesario resumir
-            if len(conversacion.mensajes) < 15:
+            if conversacion.total_mensajes < 15:
                 return ""
 
             # Solicitar un resumen a la IA
@@ -0,0 +1,378 @@
+# bot_siacasa/domain/services/conversation_cache.py
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.domain.identifiers import new_id
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONVERSATION_CACHE_CONFIG = {
+    "cache_max_memory_mb": 64,
+    "cache_idle_ttl_seconds": 1800
+}
+
+# Estimación del costo en memoria de cada objeto además de su texto
+MENSAJE_OVERHEAD_BYTES = 600
+CONVERSACION_OVERHEAD_BYTES = 1500
+
+
+def estimar_bytes_conversacion(conversacion: Conversacion) -> int:
+    """
+    Memoria aproximada de una conversación en caché. El mensaje de sistema se
+    comparte entre conversaciones, así que no se cuenta.
+    """
+    return CONVERSACION_OVERHEAD_BYTES + sum(
+        MENSAJE_OVERHEAD_BYTES + len((mensaje.content or "").encode("utf-8"))
+        for mensaje in conversacion.mensajes
+        if mensaje.role != "system"
+    )
+
+
+_CAMPOS_MENSAJE = {campo.name for campo in fields(Mensaje)}
+
+
+def conversacion_a_snapshot(conversacion: Conversacion) -> Dict[str, Any]:
+    """
+    Instantánea serializable (JSON) de una conversación para compartirla entre
+    procesos. No incluye el mensaje de sistema ni el cargador de mensajes: ambos
+    se reconstruyen en el proceso que la recibe.
+    """
+    return {
+        "id": conversacion.id,
+        "usuario": asdict(conversacion.usuario),
+        "mensajes": [
+            {**asdict(mensaje), "timestamp": _fecha_a_texto(mensaje.timestamp)}
+            for mensaje in conversacion.mensajes
+            if mensaje.role != "system"
+        ],
+        "fecha_inicio": _fecha_a_texto(conversacion.fecha_inicio),
+        "fecha_fin": _fecha_a_texto(conversacion.fecha_fin),
+        "fecha_ultima_actividad": _fecha_a_texto(conversacion.fecha_ultima_actividad),
+        "metadata": conversacion.metadata,
+        "total_mensajes": conversacion.total_mensajes,
+        "prompt_template": conversacion.prompt_template,
+        "prompt_version": conversacion.prompt_version
+    }
+
+
+def conversacion_desde_snapshot(datos: Dict[str, Any]) -> Conversacion:
+    """
+    Reconstruye una conversación a partir de `conversacion_a_snapshot`.
+    """
+    mensajes = [
+        Mensaje(**{
+            **{clave: valor for clave, valor in mensaje.items() if clave in _CAMPOS_MENSAJE},
+            "timestamp": _texto_a_fecha(mensaje.get("timestamp")) or datetime.now()
+        })
+        for mensaje in datos.get("mensajes", [])
+    ]
+    return Conversacion(
+        id=datos["id"],
+        usuario=Usuario(**datos["usuario"]),
+        mensajes=mensajes,
+        fecha_inicio=_texto_a_fecha(datos.get("fecha_inicio")) or datetime.now(),
+        fecha_fin=_texto_a_fecha(datos.get("fecha_fin")),
+        fecha_ultima_actividad=_texto_a_fecha(datos.get("fecha_ultima_actividad")) or datetime.now(),
+        metadata=datos.get("metadata") or {},
+        total_mensajes=datos.get("total_mensajes") or 0,
+        prompt_template=datos.get("prompt_template"),
+        prompt_version=datos.get("prompt_version")
+    )
+
+
+def _fecha_a_texto(fecha: Optional[datetime]) -> Optional[str]:
+    return fecha.isoformat() if fecha else None
+
+
+def _texto_a_fecha(texto: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(texto) if texto else None
+
+
+@dataclass
+class _Entrada:
+    conversacion: Conversacion
+    bytes: int
+    ultimo_acceso: float
+    version: Optional[str] = None  # Versión de la instantánea compartida que refleja
+
+
+# Cachés vivas del proceso, para las invalidaciones explícitas
+_caches: "weakref.WeakSet[ConversationCache]" = weakref.WeakSet()
+
+
+class ConversationCache:
+    """
+    Caché de conversaciones activas por usuario.
+
+    LRU O(1) sobre un OrderedDict, acotada por memoria estimada (no por número
+    de entradas) y con TTL de inactividad: una entrada que no se usa durante
+    `idle_ttl_seconds` se descarta. Se escribe a través (write-through) después de
+    cada guardado en el repositorio, y se invalida explícitamente cuando otro
+    componente cambia la conversación (ticket creado, sesión finalizada).
+
+    Con varios workers, `shared_store` publica en cada `put` una instantánea de la
+    conversación con una versión nueva. Antes de usar su copia local, cada worker
+    compara la versión (una lectura pequeña): si otro worker atendió el último
+    turno, carga su instantánea; si la clave no existe (invalidada o expirada),
+    recarga desde el repositorio. Así cualquier worker puede atender a cualquier
+    usuario.
+    """
+
+    def __init__(
+        self,
+        max_memory_mb: Optional[float] = None,
+        idle_ttl_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic,
+        shared_store=None
+    ):
+        """
+        Args:
+            max_memory_mb: Memoria estimada máxima de las conversaciones en caché
+            idle_ttl_seconds: Segundos sin uso tras los que una entrada expira
+            clock: Reloj monotónico (inyectable en pruebas)
+            shared_store: Almacén compartido entre workers (SharedStateStore), opcional
+
+        Los valores no indicados se toman de OptimizedConfig.CONVERSATION_CONFIG.
+        """
+        config = {**DEFAULT_CONVERSATION_CACHE_CONFIG, **self._load_config()}
+        self.max_bytes = int((max_memory_mb or config["cache_max_memory_mb"]) * 1024 * 1024)
+        self.idle_ttl_seconds = idle_ttl_seconds or config["cache_idle_ttl_seconds"]
+        self._clock = clock
+        self.shared_store = shared_store
+
+        self._lock = threading.RLock()
+        self._entradas: "OrderedDict[str, _Entrada]" = OrderedDict()  # usuario_id -> entrada (LRU al final)
+        self._usuario_por_conversacion: Dict[str, str] = {}
+        self._total_bytes = 0
+
+        # Métricas
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.shared_hits = 0
+        self.shared_errors = 0
+
+        _caches.add(self)
+
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            config = OptimizedConfig.CONVERSATION_CONFIG
+            return {key: config[key] for key in DEFAULT_CONVERSATION_CACHE_CONFIG if key in config}
+        except Exception:
+            return {}
+
+    def __contains__(self, usuario_id: str) -> bool:
+        with self._lock:
+            return usuario_id in self._entradas
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entradas)
+
+    def get(self, usuario_id: str) -> Optional[Conversacion]:
+        """
+        Conversación en caché del usuario, o None si no está o expiró.
+        """
+        with self._lock:
+            entrada = self._entradas.get(usuario_id)
+            ahora = self._clock()
+            if entrada is not None and ahora - entrada.ultimo_acceso > self.idle_ttl_seconds:
+                self._quitar(usuario_id)
+                self.expirations += 1
+                entrada = None
+            if entrada is None and self.shared_store is None:
+                self.misses += 1
+                return None
+            if entrada is not None:
+                entrada.ultimo_acceso = ahora
+                self._entradas.move_to_end(usuario_id)
+                if self.shared_store is None:
+                    self.hits += 1
+                    return entrada.conversacion
+
+        # La red se consulta fuera del lock para no serializar a los demás usuarios
+        return self._get_compartida(usuario_id, entrada)
+
+    def _get_compartida(self, usuario_id: str, entrada: Optional[_Entrada]) -> Optional[Conversacion]:
+        from bot_siacasa.infrastructure.shared_state import SharedStateError
+
+        snapshot_key, version_key = self._claves(usuario_id)
+        try:
+            version = self.shared_store.get(version_key)
+            if version is not None and (entrada is None or entrada.version != version):
+                snapshot = self.shared_store.get_json(snapshot_key)
+            else:
+                snapshot = None
+        except SharedStateError as e:
+            # Sin almacén compartido solo queda la copia local
+            logger.warning(f"Estado compartido no disponible para {usuario_id}: {e}")
+            with self._lock:
+                self.shared_errors += 1
+                if entrada is not None:
+                    self.hits += 1
+                    return entrada.conversacion
+                self.misses += 1
+                return None
+
+        with self._lock:
+            if entrada is not None and version == entrada.version:
+                self.hits += 1
+                return entrada.conversacion
+            if entrada is not None and self._entradas.get(usuario_id) is entrada:
+                # Otro worker la cambió o la invalidó: la copia local ya no sirve
+                self._quitar(usuario_id)
+            if snapshot is None or snapshot.get("version") != version:
+                self.misses += 1
+                return None
+            conversacion = conversacion_desde_snapshot(snapshot["conversacion"])
+            self._guardar_local(usuario_id, conversacion, version)
+            self.shared_hits += 1
+            return conversacion
+
+    def put(self, usuario_id: str, conversacion: Conversacion) -> None:
+        """
+        Guarda (o actualiza) la conversación de un usuario. Se llama después de
+        persistirla, por lo que la caché nunca adelanta al repositorio.
+        """
+        version = new_id() if self.shared_store is not None else None
+        with self._lock:
+            self._guardar_local(usuario_id, conversacion, version)
+        if self.shared_store is not None:
+            snapshot_key, version_key = self._claves(usuario_id)
+            publicada = self.shared_store.set_many_json(
+                {snapshot_key: {"version": version, "conversacion": conversacion_a_snapshot(conversacion)}},
+                self.idle_ttl_seconds
+            )
+            # La versión se escribe después: quien la lea encuentra ya la instantánea
+            if not (publicada and self._set_version(version_key, version)):
+                with self._lock:
+                    self.shared_errors += 1
+
+    def _set_version(self, version_key: str, version: str) -> bool:
+        from bot_siacasa.infrastructure.shared_state import SharedStateError
+        try:
+            self.shared_store.set(version_key, version, self.idle_ttl_seconds)
+            return True
+        except SharedStateError as e:
+            logger.warning(f"No se pudo publicar la versión {version_key}: {e}")
+            return False
+
+    def _guardar_local(self, usuario_id: str, conversacion: Conversacion, version: Optional[str]) -> None:
+        if usuario_id in self._entradas:
+            self._quitar(usuario_id)
+        entrada = _Entrada(conversacion, estimar_bytes_conversacion(conversacion), self._clock(), version)
+        self._entradas[usuario_id] = entrada
+        self._usuario_por_conversacion[conversacion.id] = usuario_id
+        self._total_bytes += entrada.bytes
+        self._purgar(protegido=usuario_id)
+
+    @staticmethod
+    def _claves(usuario_id: str):
+        return f"conversacion:{usuario_id}", f"conversacion:{usuario_id}:version"
+
+    def invalidate(self, usuario_id: str, motivo: str = "") -> bool:
+        """
+        Descarta la conversación en caché de un usuario.
+
+        Args:
+            usuario_id: ID del usuario
+            motivo: Motivo (para logs)
+
+        Returns:
+            True si había una entrada local
+        """
+        if self.shared_store is not None:
+            # Los demás workers dejan de usar su copia al no encontrar la versión
+            self.shared_store.discard(*self._claves(usuario_id))
+        with self._lock:
+            if usuario_id not in self._entradas:
+                return False
+            self._quitar(usuario_id)
+            self.invalidations += 1
+        logger.debug(f"Conversación en caché invalidada para {usuario_id} ({motivo or 'sin motivo'})")
+        return True
+
+    def invalidate_conversation(self, conversacion_id: str, motivo: str = "") -> bool:
+        """
+        Descarta una conversación en caché por su ID.
+        """
+        with self._lock:
+            usuario_id = self._usuario_por_conversacion.get(conversacion_id)
+        return self.invalidate(usuario_id, motivo) if usuario_id else False
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entradas.clear()
+            self._usuario_por_conversacion.clear()
+            self._total_bytes = 0
+
+    def _quitar(self, usuario_id: str) -> None:
+        entrada = self._entradas.pop(usuario_id)
+        self._total_bytes -= entrada.bytes
+        if self._usuario_por_conversacion.get(entrada.conversacion.id) == usuario_id:
+            del self._usuario_por_conversacion[entrada.conversacion.id]
+
+    def _purgar(self, protegido: Optional[str] = None) -> None:
+        """
+        Quita desde el extremo LRU las entradas expiradas y, mientras se supere
+        el límite de memoria, las menos usadas. La entrada `protegido` se conserva.
+        """
+        ahora = self._clock()
+        while self._entradas:
+            usuario_id, entrada = next(iter(self._entradas.items()))
+            if usuario_id == protegido:
+                break
+            if ahora - entrada.ultimo_acceso > self.idle_ttl_seconds:
+                self.expirations += 1
+            elif self._total_bytes > self.max_bytes:
+                self.evictions += 1
+            else:
+                break
+            self._quitar(usuario_id)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Métricas de uso de la caché.
+        """
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                "entradas": len(self._entradas),
+                "memoria_estimada_mb": round(self._total_bytes / (1024 * 1024), 3),
+                "max_memoria_mb": round(self.max_bytes / (1024 * 1024), 3),
+                "idle_ttl_seconds": self.idle_ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / consultas, 4) if consultas else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "shared": self.shared_store is not None,
+                "shared_hits": self.shared_hits,
+                "shared_errors": self.shared_errors
+            }
+
+
+def invalidar_conversacion_usuario(usuario_id: str, motivo: str = "") -> int:
+    """
+    Invalida la conversación de un usuario en todas las cachés del proceso. Lo usan
+    los componentes que cambian una conversación fuera del ChatbotService (tickets,
+    agentes, fin de sesión).
+
+    Returns:
+        Número de cachés que tenían la conversación
+    """
+    return sum(1 for cache in list(_caches) if cache.invalidate(usuario_id, motivo))
@@ -1,6 +1,5 @@
 # bot_siacasa/domain/services/escalation_service.py
 import logging
-import uuid
 from datetime import datetime
 from typing import Optional, Dict, List, Tuple
 
@@ -8,6 +7,8 @@ from bot_siacasa.domain.entities.ticket import Ticket, TicketStatus, EscalationR
 from bot_siacasa.domain.entities.mensaje import Mensaje
 from bot_siacasa.domain.entities.usuario import Usuario
 from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.identifiers import new_id
+from bot_siacasa.domain.services.conversation_cache import invalidar_conversacion_usuario
 
 logger = logging.getLogger(__name__)
 
@@ -151,7 +152,7 @@ class EscalationService:
         Returns:
             Ticket creado
         """
-        ticket_id = str(uuid.uuid4())
+        ticket_id = new_id()
         
         # Determinar la prioridad del ticket
         prioridad = self._determine_priority(conversacion, razon)
@@ -183,7 +184,7 @@ class EscalationService:
                     bank_code = conversacion.metadata.get('bank_code', "default")
                 
                 # Count messages
-                message_count = len(conversacion.mensajes) if hasattr(conversacion, 'mensajes') else 0
+                message_count = getattr(conversacion, 'total_mensajes', 0)
                 
                 # Create metadata JSON
                 import json
@@ -232,6 +233,10 @@ class EscalationService:
         # Agregar mensaje de sistema a la conversación indicando la escalación
         self._add_escalation_message(conversacion, razon)
         
+        # Desde aquí la conversación la atiende soporte: la copia en caché del
+        # chatbot deja de ser válida
+        invalidar_conversacion_usuario(conversacion.usuario.id, "ticket creado")
+        
         logger.info(f"Nuevo ticket creado: {ticket_id}, Razón: {razon.value}, Prioridad: {prioridad}")
         return ticket
     
@@ -271,7 +276,7 @@ class EscalationService:
                 bank_code = conversacion.metadata.get('bank_code', "default")
             
             # Count messages
-            message_count = len(conversacion.mensajes) if hasattr(conversacion, 'mensajes') else 0
+            message_count = getattr(conversacion, 'total_mensajes', 0)
             
             # Create metadata JSON
             import json
@@ -323,7 +328,7 @@ class EscalationService:
             priority = 2  # Prioridad por defecto
         
         # Ajustar según duración de la conversación y número de mensajes
-        message_count = len(conversacion.mensajes)
+        message_count = conversacion.total_mensajes
         if message_count > 10:
             priority += 1  # Aumentar prioridad para conversaciones largas
         
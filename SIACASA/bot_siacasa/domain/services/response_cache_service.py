@@ -14,16 +14,19 @@ class ResponseCacheService:
     Implementa cache con TTL, LRU y categorización de respuestas.
     """
 
-    def __init__(self, max_size: int = 500, default_ttl: int = 3600):
+    def __init__(self, max_size: int = 500, default_ttl: int = 3600, shared_store=None):
         """
         Inicializa el servicio de cache.
         
         Args:
             max_size: Tamaño máximo del cache
             default_ttl: TTL por defecto en segundos (1 hora)
+            shared_store: Almacén compartido entre workers (SharedStateStore), opcional.
+                El cache local se usa primero; en un fallo se consulta el compartido.
         """
         self.max_size = max_size
         self.default_ttl = default_ttl
+        self.shared_store = shared_store
         
         # Estructuras de cache
         self._cache = {}  # {key: {"response": str, "timestamp": datetime, "ttl": int, "hits": int}}
@@ -33,6 +36,7 @@ class ResponseCacheService:
         self._hits = 0
         self._misses = 0
         self._total_requests = 0
+        self._shared_hits = 0
         
         # Configuración de TTL por categoría
         self.ttl_config = {
@@ -59,7 +63,7 @@ class ResponseCacheService:
         """
         self._total_requests += 1
         
-        if cache_key not in self._cache:
+        if cache_key not in self._cache and not self._load_shared(cache_key):
             self._misses += 1
             return None
         
@@ -113,8 +117,44 @@ class ResponseCacheService:
         self._cache[cache_key] = entry
         self._update_access_order(cache_key)
         
+        if self.shared_store is not None and ttl > 0:
+            self.shared_store.set_json(
+                f"respuesta:{cache_key}",
+                {"response": response, "category": category, "expires_at": time.time() + ttl},
+                ttl
+            )
+        
         logger.debug(f"Cache SET para key: {cache_key[:20]}... (category: {category}, ttl: {ttl}s)")
 
+    def _load_shared(self, cache_key: str) -> bool:
+        """
+        Trae al cache local una respuesta guardada por otro worker. El almacén
+        compartido aplica el TTL, así que la copia local vive lo que le queda.
+        """
+        if self.shared_store is None:
+            return False
+        
+        shared = self.shared_store.get_json(f"respuesta:{cache_key}")
+        if not shared:
+            return False
+        
+        category = shared.get("category", "general")
+        remaining = int(shared.get("expires_at", 0) - time.time())
+        if remaining <= 0:
+            return False
+        if len(self._cache) >= self.max_size:
+            self._evict_lru()
+        self._cache[cache_key] = {
+            "response": shared["response"],
+            "timestamp": datetime.now(),
+            "ttl": remaining,
+            "hits": 0,
+            "category": category
+        }
+        self._update_access_order(cache_key)
+        self._shared_hits += 1
+        return True
+
     def generate_key(self, user_id: str, message: str, context_size: int = 3) -> str:
         """
         Genera una clave de cache basada en el mensaje y contexto.
@@ -209,6 +249,7 @@ class ResponseCacheService:
             "hits": self._hits,
             "misses": self._misses,
             "hit_rate_percent": round(hit_rate, 2),
+            "shared_hits": self._shared_hits,
             "categories": self._get_category_stats()
         }
 
@@ -271,5 +312,7 @@ def get_cache_service() -> ResponseCacheService:
     """
     global _cache_instance
     if _cache_instance is None:
-        _cache_instance = ResponseCacheService()
+        from bot_siacasa.infrastructure.shared_state import get_shared_state
+        shared_state = get_shared_state()
+        _cache_instance = ResponseCacheService(shared_store=shared_state if shared_state.shared else None)
     return _cache_instance
\ No newline at end of file
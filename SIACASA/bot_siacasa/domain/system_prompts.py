@@ -0,0 +1,147 @@
+# bot_siacasa/domain/system_prompts.py
+"""
+Prompts de sistema versionados por banco.
+
+Las conversaciones no guardan el texto del prompt de sistema como mensaje: solo
+guardan una referencia (plantilla = código de banco) y la versión con la que
+empezaron. El texto se reconstruye al cargar la conversación y se comparte entre
+todas las conversaciones con la misma referencia.
+"""
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from bot_siacasa.domain.banks_config import BANK_CONFIGS
+from bot_siacasa.domain.entities.mensaje import Mensaje
+
+logger = logging.getLogger(__name__)
+
+PROMPT_TEMPLATE_V1 = (
+    "Eres el asistente virtual oficial del {bank_name}. {identity_statement}\n\n"
+    "Instrucciones de estilo:\n"
+    "- Mantén un tono {style} y empático.\n"
+    "- Responde de forma clara, concisa y contextualizada al banco.\n"
+    "- Utiliza la base de conocimiento y evita inventar datos. Si falta información, acláralo y ofrece canales oficiales.\n"
+    "- Nunca digas que eres un modelo genérico de OpenAI ni que careces de afiliación bancaria.\n"
+    "- Si la consulta requiere intervención humana, ofrece derivar a un agente.\n"
+    "- No repitas saludos en cada mensaje y evita tecnicismos innecesarios."
+)
+
+# plantilla (código de banco) -> versión -> texto. "default" aplica a los bancos
+# sin plantilla propia. Las versiones publicadas no se modifican: un cambio de
+# prompt es una versión nueva, y las conversaciones en curso conservan la suya.
+PROMPT_TEMPLATES: Dict[str, Dict[int, str]] = {
+    "default": {1: PROMPT_TEMPLATE_V1},
+}
+
+
+@dataclass(frozen=True)
+class PromptReference:
+    """
+    Referencia al prompt de sistema de una conversación.
+
+    Attributes:
+        template: Plantilla (código de banco)
+        version: Versión de la plantilla
+    """
+    template: str
+    version: int
+
+
+class SystemPromptCatalog:
+    """
+    Construye y cachea los mensajes de sistema a partir de las plantillas
+    versionadas y de la configuración de cada banco.
+    """
+
+    def __init__(
+        self,
+        templates: Optional[Dict[str, Dict[int, str]]] = None,
+        bank_configs: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        """
+        Args:
+            templates: Plantillas por banco y versión (por defecto PROMPT_TEMPLATES)
+            bank_configs: Configuración de los bancos (por defecto BANK_CONFIGS)
+        """
+        self.templates = templates if templates is not None else PROMPT_TEMPLATES
+        self.bank_configs: Dict[str, Dict[str, Any]] = {
+            code: dict(config) for code, config in (bank_configs if bank_configs is not None else BANK_CONFIGS).items()
+        }
+        self._mensajes: Dict[PromptReference, Mensaje] = {}
+        self._lock = threading.Lock()
+
+    def registrar_banco(self, bank_code: str, config: Dict[str, Any]) -> None:
+        """
+        Registra (o completa) la configuración de un banco e invalida sus prompts cacheados.
+
+        Args:
+            bank_code: Código del banco
+            config: Nombre, estilo, declaración de identidad, etc.
+        """
+        with self._lock:
+            self.bank_configs[bank_code] = {**self.bank_configs.get(bank_code, {}), **config}
+            for reference in [ref for ref in self._mensajes if ref.template == bank_code]:
+                del self._mensajes[reference]
+
+    def _versiones(self, bank_code: str) -> Dict[int, str]:
+        return self.templates.get(bank_code) or self.templates["default"]
+
+    def referencia_actual(self, bank_code: Optional[str]) -> PromptReference:
+        """
+        Referencia a la última versión del prompt de un banco.
+        """
+        bank_code = bank_code or "default"
+        return PromptReference(bank_code, max(self._versiones(bank_code)))
+
+    def renderizar(self, reference: PromptReference) -> str:
+        """
+        Texto del prompt de sistema para una referencia. Una versión desconocida
+        (p. ej. retirada) usa la versión vigente del banco.
+
+        Args:
+            reference: Plantilla y versión
+
+        Returns:
+            Texto del prompt
+        """
+        versiones = self._versiones(reference.template)
+        plantilla = versiones.get(reference.version)
+        if plantilla is None:
+            logger.warning(
+                f"Versión {reference.version} del prompt de {reference.template} no disponible; se usa la vigente"
+            )
+            plantilla = versiones[max(versiones)]
+
+        config = self.bank_configs.get(reference.template) or self.bank_configs.get("default", {})
+        bank_name = config.get("bank_name", "Banco SIACASA")
+        return plantilla.format(
+            bank_name=bank_name,
+            identity_statement=config.get(
+                "identity_statement", f"Representas al banco {bank_name} para resolver consultas oficiales."
+            ),
+            style=config.get("style", "profesional")
+        )
+
+    def mensaje(self, reference: PromptReference) -> Mensaje:
+        """
+        Mensaje de sistema (compartido y de solo lectura) para una referencia.
+
+        Args:
+            reference: Plantilla y versión
+
+        Returns:
+            Mensaje con rol "system"
+        """
+        with self._lock:
+            mensaje = self._mensajes.get(reference)
+            if mensaje is None:
+                mensaje = Mensaje(
+                    role="system",
+                    content=self.renderizar(reference),
+                    metadata={"prompt_template": reference.template, "prompt_version": reference.version}
+                )
+                self._mensajes[reference] = mensaje
+            return mensaje
+
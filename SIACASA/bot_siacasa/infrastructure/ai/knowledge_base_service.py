@@ -70,7 +70,8 @@ class KnowledgeBaseService:
                 ORDER BY embedding <=> %s::vector
                 LIMIT %s
                 """,
-                (embedding_str, code, embedding_str, limit)
+                (embedding_str, code, embedding_str, limit),
+                prepared=True
             )
         except Exception as e:
             logger.error(f"Error consultando text_embeddings: {e}", exc_info=True)
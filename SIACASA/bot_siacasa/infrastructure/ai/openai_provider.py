@@ -10,6 +10,7 @@ import asyncio
 import aiohttp
 
 from bot_siacasa.application.interfaces.ia_provider_interface import IAProviderInterface
+from bot_siacasa.infrastructure.cooperative import run_blocking
 
 logger = logging.getLogger(__name__)
 
@@ -19,13 +20,15 @@ class OpenAIProvider(IAProviderInterface):
     Incluye cache, timeouts y configuración optimizada para velocidad.
     """
     
-    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo"):
+    def __init__(self, api_key: str, model: str = "gpt-3.5-turbo", shared_store=None):
         """
         Inicializa el proveedor de OpenAI optimizado.
         
         Args:
             api_key: API key de OpenAI
             model: Modelo de OpenAI a utilizar (por defecto gpt-3.5-turbo para velocidad)
+            shared_store: Almacén compartido entre workers (SharedStateStore) para los
+                caches de respuestas y sentimiento, opcional
         """
         self.model = model
         self.api_key = api_key
@@ -35,6 +38,8 @@ class OpenAIProvider(IAProviderInterface):
         self._response_cache = {}
         self._sentiment_cache = {}
         self._max_cache_size = 200
+        self.shared_store = shared_store
+        self._shared_ttl = self._load_cache_ttls()
         
         # Configuración optimizada para velocidad
         self.config_optimized = {
@@ -65,7 +70,31 @@ class OpenAIProvider(IAProviderInterface):
         cache_string = content + extra
         return hashlib.md5(cache_string.encode()).hexdigest()
     
-    def _add_to_cache(self, cache_dict: dict, key: str, value):
+    @staticmethod
+    def _load_cache_ttls() -> Dict[str, int]:
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            config = OptimizedConfig.CACHE_CONFIG
+            return {"respuesta": config["response_ttl"], "sentimiento": config["sentiment_ttl"]}
+        except Exception:
+            return {"respuesta": 3600, "sentimiento": 7200}
+    
+    def _cache_namespace(self, cache_dict: dict) -> str:
+        return "sentimiento" if cache_dict is self._sentiment_cache else "respuesta"
+    
+    def _get_from_cache(self, cache_dict: dict, key: str):
+        """Busca en el cache local y, si no está, en el compartido entre workers"""
+        if key in cache_dict:
+            return cache_dict[key]
+        if self.shared_store is None:
+            return None
+        
+        value = self.shared_store.get_json(f"openai:{self._cache_namespace(cache_dict)}:{key}")
+        if value is not None:
+            self._add_to_cache(cache_dict, key, value, compartir=False)
+        return value
+    
+    def _add_to_cache(self, cache_dict: dict, key: str, value, compartir: bool = True):
         """Agrega elemento al cache con límite de tamaño"""
         if len(cache_dict) >= self._max_cache_size:
             # Remover el más antiguo (FIFO)
@@ -73,6 +102,10 @@ class OpenAIProvider(IAProviderInterface):
             del cache_dict[oldest_key]
         
         cache_dict[key] = value
+        
+        if compartir and self.shared_store is not None:
+            namespace = self._cache_namespace(cache_dict)
+            self.shared_store.set_json(f"openai:{namespace}:{key}", value, self._shared_ttl[namespace])
 
     def generar_embedding(self, texto: str, modelo: str = "text-embedding-3-small") -> Optional[List[float]]:
         """
@@ -82,7 +115,8 @@ class OpenAIProvider(IAProviderInterface):
             return None
 
         try:
-            response = openai.embeddings.create(
+            response = run_blocking(
+                openai.embeddings.create,
                 model=modelo,
                 input=texto
             )
@@ -101,10 +135,11 @@ class OpenAIProvider(IAProviderInterface):
         try:
             # Verificar cache primero
             cache_key = hashlib.md5(texto.strip().lower().encode()).hexdigest()
-            if cache_key in self._sentiment_cache:
+            cached = self._get_from_cache(self._sentiment_cache, cache_key)
+            if cached is not None:
                 execution_time = (time.perf_counter() - start_time) * 1000
                 logger.debug(f"Sentimiento obtenido del cache en {execution_time:.2f}ms")
-                return self._sentiment_cache[cache_key]
+                return cached
             
             # Prompt mejorado para análisis completo
             system_prompt = """Analiza el siguiente texto y responde SOLO con JSON válido con esta estructura exacta:
@@ -136,7 +171,8 @@ class OpenAIProvider(IAProviderInterface):
     Los tonos sugeridos: profesional, empático, amigable, formal, tranquilizador."""
 
             # Hacer la llamada a OpenAI
-            response = openai.chat.completions.create(
+            response = run_blocking(
+                openai.chat.completions.create,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": system_prompt},
@@ -190,10 +226,11 @@ class OpenAIProvider(IAProviderInterface):
         try:
             # 1. Verificar cache primero
             cache_key = self._generate_cache_key(mensajes, instrucciones_adicionales or "")
-            if cache_key in self._response_cache:
+            cached = self._get_from_cache(self._response_cache, cache_key)
+            if cached is not None:
                 execution_time = (time.perf_counter() - start_time) * 1000
                 logger.debug(f"Respuesta obtenida del cache en {execution_time:.2f}ms")
-                return self._response_cache[cache_key]
+                return cached
             
             # 2. Validar y preparar mensajes
             mensajes_validados = self._validar_mensajes(mensajes)
@@ -218,7 +255,8 @@ class OpenAIProvider(IAProviderInterface):
             api_params.pop('max_retries', None)
             api_params.pop('api_key', None)
 
-            response = openai.chat.completions.create(
+            response = run_blocking(
+                openai.chat.completions.create,
                 model=self.model,
                 messages=mensajes_validados,
                 **api_params  # Usar configuración optimizada y limpia
@@ -311,8 +349,9 @@ class OpenAIProvider(IAProviderInterface):
         try:
             # Verificar cache
             cache_key = self._generate_cache_key(mensajes, instrucciones_adicionales or "")
-            if cache_key in self._response_cache:
-                return self._response_cache[cache_key]
+            cached = self._get_from_cache(self._response_cache, cache_key)
+            if cached is not None:
+                return cached
             
             # Preparar mensajes
             mensajes_validados = self._validar_mensajes(mensajes)
@@ -421,7 +460,8 @@ class OpenAIProvider(IAProviderInterface):
     def test_connection(self) -> bool:
         """Prueba la conexión con OpenAI"""
         try:
-            response = openai.chat.completions.create(
+            response = run_blocking(
+                openai.chat.completions.create,
                 model=self.model,
                 messages=[{"role": "user", "content": "test"}],
                 max_tokens=5,
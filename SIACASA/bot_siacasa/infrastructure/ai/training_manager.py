@@ -199,20 +199,23 @@ class TrainingManager:
         try:
             # Dividir el texto en chunks para procesar (máximo 8000 tokens por chunk)
             chunks = self._split_into_chunks(text)
+            embeddings = []
             
             for i, chunk in enumerate(chunks):
                 # Crear embedding usando OpenAI
                 embedding = self._get_embedding(chunk)
                 
                 if embedding:
-                    # Guardar embedding en la base de datos
-                    self._save_embedding(embedding, chunk, file_info, i)
+                    embeddings.append((i, chunk, embedding))
                     
                     # Pequeña pausa para no exceder límites de API
                     time.sleep(0.5)
                 else:
                     logger.warning(f"No se pudo crear embedding para el chunk {i}")
             
+            # Guardar todos los embeddings del archivo en una sola carga
+            self._save_embeddings(embeddings, file_info)
+            
             return True
             
         except Exception as e:
@@ -267,55 +270,41 @@ class TrainingManager:
             logger.error(f"Error al obtener embedding: {e}", exc_info=True)
             return None
     
-    def _save_embedding(self, embedding: List[float], text: str, file_info: Dict[str, Any], chunk_index: int) -> None:
+    def _save_embeddings(self, embeddings: List[Tuple[int, str, List[float]]], file_info: Dict[str, Any]) -> None:
         """
-        Guarda un embedding en la base de datos.
+        Guarda los embeddings de un archivo en la base de datos con una sola carga COPY.
+        La tabla text_embeddings se crea con las migraciones de esquema (migrations.py).
         
         Args:
-            embedding: Vector de embedding
-            text: Texto original
+            embeddings: Lista de tuplas (índice del chunk, texto original, vector de embedding)
             file_info: Información del archivo
-            chunk_index: Índice del chunk
         """
+        if not embeddings:
+            return
+        
         try:
-            # Crear tabla de embeddings si no existe
-            self.db.execute("""
-            CREATE TABLE IF NOT EXISTS text_embeddings (
-                id UUID PRIMARY KEY,
-                file_id UUID REFERENCES training_files(id),
-                bank_code VARCHAR(10) REFERENCES banks(code),
-                chunk_index INTEGER,
-                text TEXT,
-                embedding VECTOR(1536),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            
-            # Insertar embedding en la base de datos
-            query = """
-            INSERT INTO text_embeddings (id, file_id, bank_code, chunk_index, text, embedding)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            
-            embedding_id = str(uuid.uuid4())
-            
-            # Convertir la lista de embeddings a formato de vector PostgreSQL
-            embedding_str = f"[{','.join(map(str, embedding))}]"
-            
-            self.db.execute(
-                query,
+            rows = [
                 (
-                    embedding_id,
+                    str(uuid.uuid4()),
                     file_info['id'],
                     file_info['bank_code'],
                     chunk_index,
                     text,
-                    embedding_str
+                    # Formato de vector PostgreSQL
+                    f"[{','.join(map(str, embedding))}]"
                 )
+                for chunk_index, text, embedding in embeddings
+            ]
+            
+            self.db.copy_rows(
+                "text_embeddings",
+                ["id", "file_id", "bank_code", "chunk_index", "text", "embedding"],
+                rows
             )
+            logger.info(f"{len(rows)} embeddings guardados para el archivo {file_info['id']}")
             
         except Exception as e:
-            logger.error(f"Error al guardar embedding: {e}", exc_info=True)
+            logger.error(f"Error al guardar embeddings: {e}", exc_info=True)
             raise
     
     def start_training_session(self, bank_code: str, user_id: str, file_ids: List[str]) -> str:
@@ -346,15 +335,11 @@ class TrainingManager:
                 (session_id, bank_code, user_id, len(file_ids), datetime.now())
             )
             
-            # Asociar archivos con la sesión
-            for file_id in file_ids:
-                self.db.execute(
-                    """
-                    INSERT INTO training_session_files (session_id, file_id, status)
-                    VALUES (%s, %s, 'pending')
-                    """,
-                    (session_id, file_id)
-                )
+            # Asociar archivos con la sesión en una sola sentencia
+            self.db.execute_values(
+                "INSERT INTO training_session_files (session_id, file_id, status) VALUES %s",
+                [(session_id, file_id, 'pending') for file_id in file_ids]
+            )
             
             # Procesar archivos (en un proceso separado en una aplicación real)
             for file_id in file_ids:
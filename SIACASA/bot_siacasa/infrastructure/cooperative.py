@@ -0,0 +1,129 @@
+# bot_siacasa/infrastructure/cooperative.py
+import logging
+import os
+import threading
+from typing import Any, Callable, TypeVar
+
+import psycopg2
+from psycopg2 import extensions
+
+from bot_siacasa.infrastructure.db import connection_pool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Intervalo de sondeo (s) de un green thread que espera una conexión libre del pool
+GREEN_POOL_POLL_INTERVAL = 0.01
+
+_lock = threading.Lock()
+_enabled = False
+
+
+def eventlet_wait_callback(conn, timeout=None):
+    """
+    Callback de espera de psycopg2 que cede el control al hub de eventlet mientras
+    la conexión espera al servidor, en lugar de bloquear todo el proceso.
+    """
+    from eventlet.hubs import trampoline
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            trampoline(conn.fileno(), read=True)
+        elif state == extensions.POLL_WRITE:
+            trampoline(conn.fileno(), write=True)
+        else:
+            raise psycopg2.OperationalError(f"Resultado inesperado de poll: {state!r}")
+
+
+def _green_pool_wait(condition, timeout: float):
+    """
+    Espera de conexión libre compatible con eventlet: libera el lock del pool y cede
+    el hub para que los green threads que tienen conexiones puedan devolverlas.
+    """
+    import eventlet
+
+    condition.release()
+    try:
+        eventlet.sleep(min(timeout, GREEN_POOL_POLL_INTERVAL))
+    finally:
+        condition.acquire()
+
+
+def enable_cooperative_mode() -> bool:
+    """
+    Activa la E/S cooperativa para el servidor Socket.IO con eventlet:
+    psycopg2 cede el hub mientras espera a la base de datos, los pools esperan
+    conexiones sin bloquear el hub y `run_blocking` delega las llamadas HTTP
+    bloqueantes (OpenAI) a hilos reales de `eventlet.tpool`.
+
+    Se puede desactivar con SIACASA_COOPERATIVE_IO=false.
+
+    Returns:
+        True si el modo cooperativo quedó activo
+    """
+    global _enabled
+
+    if os.getenv("SIACASA_COOPERATIVE_IO", "true").lower() != "true":
+        logger.info("Modo cooperativo desactivado por SIACASA_COOPERATIVE_IO")
+        return False
+
+    with _lock:
+        if _enabled:
+            return True
+        try:
+            import eventlet  # noqa: F401
+            from eventlet import tpool  # noqa: F401
+        except ImportError:
+            logger.warning("eventlet no está instalado; la E/S de base de datos y OpenAI seguirá siendo bloqueante")
+            return False
+
+        extensions.set_wait_callback(eventlet_wait_callback)
+        connection_pool.set_wait_strategy(_green_pool_wait)
+        _enabled = True
+
+    logger.info("Modo cooperativo activado: psycopg2 con callback de eventlet y llamadas bloqueantes en tpool")
+    return True
+
+
+def disable_cooperative_mode():
+    """
+    Restaura el comportamiento bloqueante (útil en pruebas y scripts).
+    """
+    global _enabled
+
+    with _lock:
+        extensions.set_wait_callback(None)
+        connection_pool.set_wait_strategy(None)
+        _enabled = False
+
+
+def is_cooperative() -> bool:
+    """
+    Indica si el modo cooperativo está activo.
+    """
+    return _enabled
+
+
+def run_blocking(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecuta una función bloqueante (p. ej. una llamada HTTP síncrona) sin detener
+    el hub de eventlet: en modo cooperativo se ejecuta en un hilo de `eventlet.tpool`
+    y el green thread que llama queda suspendido hasta que termine.
+
+    Args:
+        func: Función a ejecutar
+        *args: Argumentos posicionales
+        **kwargs: Argumentos con nombre
+
+    Returns:
+        Resultado de la función (las excepciones se propagan al llamador)
+    """
+    if not _enabled:
+        return func(*args, **kwargs)
+
+    from eventlet import tpool
+    return tpool.execute(func, *args, **kwargs)
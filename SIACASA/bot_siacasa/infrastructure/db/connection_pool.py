@@ -0,0 +1,363 @@
+# bot_siacasa/infrastructure/db/connection_pool.py
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Estado de transacción "idle" de psycopg2 (psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+_TRANSACTION_STATUS_IDLE = 0
+
+# Estrategia para esperar una conexión libre: (condition, segundos) -> None.
+# None usa la espera bloqueante de threading; el modo cooperativo la sustituye.
+_wait_strategy: Optional[Callable[[threading.Condition, float], None]] = None
+
+
+def set_wait_strategy(strategy: Optional[Callable[[threading.Condition, float], None]]):
+    """
+    Define cómo esperan los pools una conexión libre cuando están agotados.
+
+    Args:
+        strategy: Función (condition, timeout) llamada con el lock del pool tomado,
+            o None para la espera bloqueante por defecto
+    """
+    global _wait_strategy
+    _wait_strategy = strategy
+
+
+class PoolTimeoutError(RuntimeError):
+    """
+    Se lanza cuando no se obtiene una conexión del pool dentro del timeout configurado.
+    """
+
+
+class PooledConnection:
+    """
+    Envoltorio de una conexión física administrada por el pool.
+    Guarda la edad de la conexión y datos asociados a ella (p. ej. sentencias preparadas).
+    """
+
+    def __init__(self, connection: Any):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used_at = self.created_at
+        self.state: Dict[str, Any] = {}
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+    @property
+    def closed(self) -> bool:
+        return bool(getattr(self.connection, "closed", False))
+
+    def close(self):
+        try:
+            self.connection.close()
+        except Exception as e:
+            logger.debug(f"Error al cerrar conexión del pool: {e}")
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones acotado y seguro entre hilos/greenlets.
+
+    Mantiene hasta `pool_size` conexiones ociosas y permite hasta `max_overflow`
+    conexiones adicionales bajo carga. Cada conexión se valida antes de entregarse
+    (pre-ping) y se recicla cuando supera `recycle` segundos de antigüedad.
+    """
+
+    def __init__(
+        self,
+        creator: Callable[[], Any],
+        pool_size: int = 10,
+        max_overflow: int = 20,
+        timeout: float = 2.0,
+        recycle: int = 3600,
+        pre_ping: bool = True,
+        name: str = "neondb"
+    ):
+        """
+        Args:
+            creator: Función que abre una nueva conexión física
+            pool_size: Conexiones que se mantienen abiertas en reposo
+            max_overflow: Conexiones adicionales permitidas bajo carga
+            timeout: Segundos máximos de espera para obtener una conexión
+            recycle: Antigüedad máxima (segundos) de una conexión antes de reabrirla
+            pre_ping: Si se valida la conexión con `SELECT 1` antes de entregarla
+            name: Nombre del pool (para logs y estadísticas)
+        """
+        self._creator = creator
+        self.pool_size = max(1, int(pool_size))
+        self.max_overflow = max(0, int(max_overflow))
+        self.timeout = float(timeout)
+        self.recycle = recycle
+        self.pre_ping = pre_ping
+        self.name = name
+
+        self._idle: deque = deque()
+        self._condition = threading.Condition(threading.Lock())
+        self._total = 0
+        self._in_use = 0
+
+        # Estadísticas
+        self._stats = {
+            "connections_created": 0,
+            "connections_recycled": 0,
+            "ping_failures": 0,
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "total_wait_time_ms": 0.0,
+            "max_wait_time_ms": 0.0
+        }
+
+    @property
+    def max_connections(self) -> int:
+        return self.pool_size + self.max_overflow
+
+    def acquire(self) -> PooledConnection:
+        """
+        Obtiene una conexión del pool, esperando hasta `timeout` si está agotado.
+
+        Returns:
+            Conexión envuelta lista para usar
+
+        Raises:
+            PoolTimeoutError: Si no hay conexiones disponibles a tiempo
+        """
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+
+        while True:
+            pooled = None
+            create = False
+
+            with self._condition:
+                while not self._idle and self._total >= self.max_connections:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeoutError(
+                            f"Pool '{self.name}' agotado: {self._in_use} conexiones en uso "
+                            f"(máximo {self.max_connections}), espera de {self.timeout}s superada"
+                        )
+                    waited = True
+                    if _wait_strategy is None:
+                        self._condition.wait(remaining)
+                    else:
+                        _wait_strategy(self._condition, remaining)
+
+                if self._idle:
+                    pooled = self._idle.pop()
+                else:
+                    create = True
+                    self._total += 1
+                self._in_use += 1
+
+            if create:
+                try:
+                    pooled = self._create()
+                except Exception:
+                    self._forget()
+                    raise
+            elif not self._validate(pooled):
+                pooled.close()
+                self._forget()
+                continue
+
+            self._record_checkout(time.monotonic() - start, waited)
+            pooled.last_used_at = time.monotonic()
+            return pooled
+
+    def release(self, pooled: PooledConnection, discard: bool = False):
+        """
+        Devuelve una conexión al pool.
+
+        Args:
+            pooled: Conexión obtenida con `acquire`
+            discard: Si es True la conexión se cierra en lugar de reutilizarse
+        """
+        if not discard and not pooled.closed:
+            discard = not self._reset(pooled)
+
+        with self._condition:
+            self._in_use -= 1
+            if discard or pooled.closed or len(self._idle) >= self.pool_size:
+                self._total -= 1
+                close = True
+            else:
+                self._idle.append(pooled)
+                close = False
+            self._condition.notify()
+
+        if close:
+            pooled.close()
+
+    @contextmanager
+    def connection(self):
+        """
+        Context manager que entrega una conexión física y la devuelve al pool al terminar.
+        Si ocurre un error de conexión, la conexión se descarta.
+        """
+        pooled = self.acquire()
+        discard = False
+        try:
+            yield pooled
+        except Exception:
+            discard = pooled.closed
+            raise
+        finally:
+            self.release(pooled, discard=discard)
+
+    def dispose(self):
+        """
+        Cierra todas las conexiones ociosas del pool.
+        """
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._total -= len(idle)
+            self._condition.notify_all()
+
+        for pooled in idle:
+            pooled.close()
+        logger.info(f"Pool '{self.name}' liberado ({len(idle)} conexiones cerradas)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna estadísticas del pool.
+
+        Returns:
+            Diccionario con conexiones en uso, ociosas y tiempos de espera
+        """
+        with self._condition:
+            checkouts = self._stats["checkouts"]
+            return {
+                "name": self.name,
+                "pool_size": self.pool_size,
+                "max_overflow": self.max_overflow,
+                "max_connections": self.max_connections,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "total": self._total,
+                **self._stats,
+                "avg_wait_time_ms": (
+                    self._stats["total_wait_time_ms"] / checkouts if checkouts else 0.0
+                )
+            }
+
+    def _create(self) -> PooledConnection:
+        connection = self._creator()
+        with self._condition:
+            self._stats["connections_created"] += 1
+        return PooledConnection(connection)
+
+    def _validate(self, pooled: PooledConnection) -> bool:
+        """
+        Verifica que una conexión ociosa siga siendo utilizable.
+        """
+        if pooled.closed:
+            return False
+
+        if self.recycle is not None and self.recycle >= 0 and pooled.age > self.recycle:
+            logger.debug(f"Reciclando conexión del pool '{self.name}' ({pooled.age:.0f}s)")
+            with self._condition:
+                self._stats["connections_recycled"] += 1
+            return False
+
+        if self.pre_ping:
+            try:
+                cursor = pooled.connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+                cursor.close()
+                pooled.connection.rollback()
+            except Exception as e:
+                logger.warning(f"Conexión inválida descartada del pool '{self.name}': {e}")
+                with self._condition:
+                    self._stats["ping_failures"] += 1
+                return False
+
+        return True
+
+    def _reset(self, pooled: PooledConnection) -> bool:
+        """
+        Deja la conexión sin transacción abierta antes de devolverla al pool.
+        """
+        try:
+            status = pooled.connection.get_transaction_status()
+            if status != _TRANSACTION_STATUS_IDLE:
+                pooled.connection.rollback()
+            return True
+        except Exception as e:
+            logger.warning(f"No se pudo reiniciar la conexión del pool '{self.name}': {e}")
+            return False
+
+    def _forget(self):
+        with self._condition:
+            self._total -= 1
+            self._in_use -= 1
+            self._condition.notify()
+
+    def _record_checkout(self, wait_seconds: float, waited: bool):
+        wait_ms = wait_seconds * 1000
+        with self._condition:
+            self._stats["checkouts"] += 1
+            if waited:
+                self._stats["waits"] += 1
+            self._stats["total_wait_time_ms"] += wait_ms
+            self._stats["max_wait_time_ms"] = max(self._stats["max_wait_time_ms"], wait_ms)
+
+
+# Registro global de pools por destino, compartido por todas las instancias del conector
+_pools: Dict[tuple, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(key: tuple, creator: Callable[[], Any], **settings) -> ConnectionPool:
+    """
+    Obtiene (o crea) el pool compartido para un destino de conexión.
+
+    Args:
+        key: Identificador del destino (host, base de datos, usuario...)
+        creator: Función que abre una conexión física
+        **settings: Parámetros para `ConnectionPool`
+
+    Returns:
+        Pool compartido
+    """
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = ConnectionPool(creator, **settings)
+            _pools[key] = pool
+            logger.info(
+                f"Pool de conexiones '{pool.name}' creado "
+                f"(size={pool.pool_size}, overflow={pool.max_overflow}, timeout={pool.timeout}s)"
+            )
+        return pool
+
+
+def get_all_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Retorna las estadísticas de todos los pools registrados.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+    return {pool.name: pool.get_stats() for pool in pools}
+
+
+def dispose_all_pools():
+    """
+    Cierra y olvida todos los pools registrados.
+    """
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.dispose()
@@ -0,0 +1,51 @@
+# bot_siacasa/infrastructure/db/counters.py
+import logging
+from datetime import datetime, timedelta
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+# Corrige conversaciones cuyo contador incremental no coincide con sus mensajes
+RECONCILE_MESSAGE_COUNTS_SQL = """
+UPDATE conversaciones c
+SET cantidad_mensajes = reales.total
+FROM (
+    SELECT c2.id, COUNT(m.id) AS total
+    FROM conversaciones c2
+    LEFT JOIN mensajes m ON m.conversacion_id = c2.id
+    WHERE %(desde)s::timestamp IS NULL
+        OR c2.fecha_inicio >= %(desde)s::timestamp
+        OR c2.fecha_fin IS NULL
+    GROUP BY c2.id
+) reales
+WHERE c.id = reales.id
+    AND c.cantidad_mensajes IS DISTINCT FROM reales.total
+"""
+
+
+def reconcile_message_counts(db, days: Optional[int] = 7) -> int:
+    """
+    Repara la deriva de `conversaciones.cantidad_mensajes` (mantenido de forma
+    incremental en cada inserción) recontando los mensajes reales.
+
+    Args:
+        db: Conector a la base de datos
+        days: Solo revisa conversaciones iniciadas en los últimos `days` días y las
+            activas (None revisa todas)
+
+    Returns:
+        Número de conversaciones corregidas
+    """
+    desde = datetime.now() - timedelta(days=days) if days is not None else None
+
+    try:
+        repaired = db.execute(RECONCILE_MESSAGE_COUNTS_SQL, {"desde": desde})
+    except Exception as e:
+        logger.error(f"Error al reconciliar contadores de mensajes: {e}", exc_info=True)
+        raise
+
+    if repaired:
+        logger.warning(f"Contadores de mensajes corregidos en {repaired} conversaciones")
+    else:
+        logger.info("Contadores de mensajes consistentes")
+    return repaired
@@ -0,0 +1,180 @@
+# bot_siacasa/infrastructure/db/indexes.py
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ManagedIndex:
+    """
+    Índice gestionado por las migraciones para las consultas más frecuentes.
+
+    Attributes:
+        name: Nombre del índice
+        table: Tabla indexada
+        columns: Definición de columnas, p. ej. "usuario_id, fecha_inicio DESC"
+        where: Predicado opcional para índices parciales
+        purpose: Consulta a la que da servicio (para reportes)
+    """
+    name: str
+    table: str
+    columns: str
+    where: Optional[str] = None
+    purpose: str = ""
+
+    def create_sql(self, concurrently: bool = True) -> str:
+        # Los índices de una tabla particionada no admiten CONCURRENTLY
+        mode = "CONCURRENTLY " if concurrently else ""
+        statement = f"CREATE INDEX {mode}IF NOT EXISTS {self.name} ON {self.table} ({self.columns})"
+        if self.where:
+            statement += f" WHERE {self.where}"
+        return statement
+
+
+MANAGED_INDEXES: List[ManagedIndex] = [
+    ManagedIndex(
+        "idx_conversaciones_usuario_activa", "conversaciones", "usuario_id, fecha_fin, fecha_inicio DESC",
+        purpose="Conversación activa de un usuario"
+    ),
+    ManagedIndex(
+        "idx_mensajes_conversacion_timestamp", "mensajes", "conversacion_id, timestamp",
+        purpose="Hidratación de conversaciones y último mensaje en MetricsCollector"
+    ),
+    ManagedIndex(
+        "idx_chatbot_sessions_user_bank_end", "chatbot_sessions", "user_id, bank_code, end_time",
+        purpose="Sesión activa del chatbot por usuario y banco"
+    ),
+    ManagedIndex(
+        "idx_tickets_status_bank_priority", "support_tickets", "status, bank_code, priority DESC, creation_date",
+        purpose="Cola de tickets por estado y banco"
+    ),
+    ManagedIndex(
+        "idx_tickets_agent_status", "support_tickets", "agent_id, status",
+        purpose="Tickets asignados a un agente"
+    ),
+    ManagedIndex(
+        "idx_agent_messages_ticket_timestamp", "agent_messages", "ticket_id, timestamp",
+        purpose="Historial de mensajes de un ticket"
+    ),
+    ManagedIndex(
+        "idx_chat_sessions_user_end", "chat_sessions", "user_id, end_time",
+        purpose="Sesión de métricas activa por usuario"
+    ),
+]
+
+
+def table_kind(cursor, table: str) -> Optional[str]:
+    """
+    Retorna None si la tabla no existe, "partitioned" si está particionada o "table".
+    """
+    cursor.execute(
+        """
+        SELECT to_regclass(%s) IS NOT NULL AS present,
+            EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)) AS partitioned
+        """,
+        (table, table)
+    )
+    row = cursor.fetchone()
+    if not row or not row["present"]:
+        return None
+    return "partitioned" if row.get("partitioned") else "table"
+
+
+def create_managed_index(cursor, index: ManagedIndex) -> bool:
+    """
+    Crea un índice con CREATE INDEX CONCURRENTLY (requiere autocommit); en tablas
+    particionadas se crea de forma normal sobre la tabla padre. Un índice inválido
+    que dejó una construcción interrumpida se elimina y se vuelve a crear; las
+    tablas que aún no existen se omiten.
+
+    Args:
+        cursor: Cursor en modo autocommit
+        index: Índice a crear
+
+    Returns:
+        True si el índice existe y es válido al terminar
+    """
+    kind = table_kind(cursor, index.table)
+    if kind is None:
+        logger.info(f"Tabla {index.table} inexistente; se omite el índice {index.name}")
+        return False
+
+    cursor.execute(
+        """
+        SELECT i.indisvalid AS valid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+        """,
+        (index.name,)
+    )
+    row = cursor.fetchone()
+    if row and not row["valid"]:
+        logger.warning(f"Índice {index.name} inválido (construcción interrumpida); se recreará")
+        if kind == "partitioned":
+            cursor.execute(f"DROP INDEX IF EXISTS {index.name}")
+        else:
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index.name}")
+
+    cursor.execute(index.create_sql(concurrently=kind != "partitioned"))
+    return True
+
+
+def managed_index_steps(indexes: Sequence[ManagedIndex] = MANAGED_INDEXES) -> List[Callable[[Any], None]]:
+    """
+    Construye los pasos de migración que crean los índices gestionados.
+    """
+    return [lambda cursor, index=index: create_managed_index(cursor, index) for index in indexes]
+
+
+def check_indexes(db, indexes: Sequence[ManagedIndex] = MANAGED_INDEXES) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Reporta los índices gestionados que faltan o son inválidos y los índices que
+    no se han usado desde el último reinicio de estadísticas (pg_stat_user_indexes).
+
+    Args:
+        db: Conector a la base de datos
+        indexes: Índices esperados
+
+    Returns:
+        Diccionario con las listas "missing", "invalid" y "unused"
+    """
+    rows = db.fetch_all(
+        """
+        SELECT c.relname AS name, i.indisvalid AS valid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = ANY(%s)
+        """,
+        ([index.name for index in indexes],)
+    )
+    existing = {row["name"]: row["valid"] for row in rows}
+
+    missing = [
+        {"name": index.name, "table": index.table, "columns": index.columns, "purpose": index.purpose}
+        for index in indexes if index.name not in existing
+    ]
+    invalid = [
+        {"name": index.name, "table": index.table}
+        for index in indexes if existing.get(index.name) is False
+    ]
+
+    unused = db.fetch_all(
+        """
+        SELECT
+            s.relname AS table,
+            s.indexrelname AS name,
+            s.idx_scan AS scans,
+            pg_relation_size(s.indexrelid) AS size_bytes
+        FROM pg_stat_user_indexes s
+        JOIN pg_index i ON i.indexrelid = s.indexrelid
+        WHERE s.idx_scan = 0
+            AND NOT i.indisunique
+            AND NOT i.indisprimary
+        ORDER BY pg_relation_size(s.indexrelid) DESC
+        """
+    )
+
+    return {"missing": missing, "invalid": invalid, "unused": unused}
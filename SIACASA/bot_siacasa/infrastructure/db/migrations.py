@@ -0,0 +1,486 @@
+# bot_siacasa/infrastructure/db/migrations.py
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, List, Optional, Sequence, Union
+
+from bot_siacasa.infrastructure.db.indexes import managed_index_steps
+from bot_siacasa.infrastructure.db.partitions import PARTITIONED_TABLES, partitioning_steps
+
+logger = logging.getLogger(__name__)
+
+# Clave del advisory lock que serializa las migraciones entre procesos/workers
+MIGRATION_LOCK_KEY = 7_410_221
+
+# Una sentencia de migración puede ser SQL o una función que recibe el cursor
+MigrationStep = Union[str, Callable[[Any], None]]
+
+
+@dataclass(frozen=True)
+class Migration:
+    """
+    Migración de esquema versionada.
+
+    Attributes:
+        version: Número de versión (se aplican en orden ascendente)
+        description: Descripción breve
+        statements: Sentencias SQL o funciones que reciben el cursor
+        transactional: Si es False se ejecuta en autocommit (p. ej. CREATE INDEX CONCURRENTLY)
+    """
+    version: int
+    description: str
+    statements: Sequence[MigrationStep]
+    transactional: bool = True
+
+
+def _uuid_using(column: str) -> str:
+    """
+    Expresión USING que convierte un identificador de texto a UUID. Los UUID
+    existentes (uuid4) se conservan; cualquier otro valor se convierte de forma
+    determinista con md5, así que las referencias entre tablas siguen coincidiendo.
+    """
+    return (
+        f"(CASE WHEN {column} ~* '^[0-9a-f]{{8}}-[0-9a-f]{{4}}-[0-9a-f]{{4}}-[0-9a-f]{{4}}-[0-9a-f]{{12}}$' "
+        f"THEN {column}::uuid ELSE md5({column})::uuid END)"
+    )
+
+
+SCHEMA_VERSION_DDL = """
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    description TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+)
+"""
+
+MIGRATIONS: List[Migration] = [
+    Migration(
+        version=1,
+        description="Esquema base: bancos, administradores, entrenamiento y sesiones del chatbot",
+        statements=[
+            """
+            CREATE TABLE IF NOT EXISTS banks (
+                code VARCHAR(10) PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                description TEXT,
+                active BOOLEAN DEFAULT TRUE,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS admin_users (
+                id UUID PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                email VARCHAR(100) UNIQUE NOT NULL,
+                username VARCHAR(50) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                role VARCHAR(20) NOT NULL DEFAULT 'user',
+                bank_code VARCHAR(10) REFERENCES banks(code),
+                is_active BOOLEAN DEFAULT TRUE,
+                last_login TIMESTAMP,
+                reset_token TEXT,
+                reset_token_expiry TIMESTAMP,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS training_files (
+                id UUID PRIMARY KEY,
+                filename VARCHAR(255) NOT NULL,
+                original_filename VARCHAR(255) NOT NULL,
+                file_path VARCHAR(255) NOT NULL,
+                file_type VARCHAR(50),
+                file_size INTEGER,
+                bank_code VARCHAR(10) REFERENCES banks(code),
+                uploaded_by UUID REFERENCES admin_users(id),
+                status VARCHAR(20) DEFAULT 'pending',
+                description TEXT,
+                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                processed_at TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS training_sessions (
+                id UUID PRIMARY KEY,
+                bank_code VARCHAR(10) REFERENCES banks(code),
+                initiated_by UUID REFERENCES admin_users(id),
+                status VARCHAR(20) DEFAULT 'pending',
+                files_count INTEGER DEFAULT 0,
+                success_count INTEGER DEFAULT 0,
+                error_count INTEGER DEFAULT 0,
+                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                end_time TIMESTAMP,
+                log_file VARCHAR(255),
+                results TEXT
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS training_session_files (
+                session_id UUID REFERENCES training_sessions(id),
+                file_id UUID REFERENCES training_files(id),
+                status VARCHAR(20) DEFAULT 'pending',
+                error_message TEXT,
+                processed_at TIMESTAMP,
+                PRIMARY KEY (session_id, file_id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS chatbot_sessions (
+                id UUID PRIMARY KEY,
+                user_id VARCHAR(100) NOT NULL,
+                bank_code VARCHAR(10) REFERENCES banks(code),
+                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                end_time TIMESTAMP,
+                message_count INTEGER DEFAULT 0,
+                user_satisfied BOOLEAN,
+                metadata JSONB
+            )
+            """,
+            "ALTER TABLE chatbot_sessions ADD COLUMN IF NOT EXISTS last_activity_time TIMESTAMP",
+            # Banco por defecto
+            """
+            INSERT INTO banks (code, name, description)
+            VALUES ('default', 'Banco Predeterminado', 'Configuración predeterminada del sistema')
+            ON CONFLICT (code) DO NOTHING
+            """,
+            # Usuario administrador por defecto (contraseña "admin123", hash de werkzeug.security)
+            """
+            INSERT INTO admin_users (id, name, email, username, password_hash, role, bank_code)
+            SELECT
+                '00000000-0000-0000-0000-000000000000',
+                'Administrador',
+                'admin@siacasa.com',
+                'admin',
+                'pbkdf2:sha256:600000$LmQ0xnZDHkFGPxBn$5c9507f254be938ed982fb40ec78b19e68c3a3be7d88e9e91e5ed67a2384a571',
+                'admin',
+                'default'
+            WHERE NOT EXISTS (SELECT 1 FROM admin_users WHERE username = 'admin')
+            """
+        ]
+    ),
+    Migration(
+        version=2,
+        description="Conversaciones, usuarios y mensajes del chatbot",
+        statements=[
+            """
+            CREATE TABLE IF NOT EXISTS usuarios (
+                id VARCHAR(100) PRIMARY KEY,
+                datos TEXT,
+                fecha_creacion TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                fecha_actualizacion TIMESTAMP
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS conversaciones (
+                id VARCHAR(100) PRIMARY KEY,
+                usuario_id VARCHAR(100) NOT NULL,
+                fecha_inicio TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                fecha_fin TIMESTAMP,
+                cantidad_mensajes INTEGER NOT NULL DEFAULT 0,
+                metadata JSONB
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS mensajes (
+                id VARCHAR(100) PRIMARY KEY,
+                conversacion_id VARCHAR(100) NOT NULL,
+                role VARCHAR(20) NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                sentiment_score FLOAT,
+                processing_time_ms FLOAT,
+                ai_processing_time_ms FLOAT,
+                sentiment VARCHAR(20),
+                sentiment_confidence FLOAT,
+                intent VARCHAR(100),
+                intent_confidence FLOAT,
+                token_count INTEGER,
+                response_tone VARCHAR(20),
+                metadata JSONB
+            )
+            """
+        ]
+    ),
+    Migration(
+        version=3,
+        description="Tickets de soporte, mensajes de agentes y relación ticket-usuario",
+        statements=[
+            """
+            CREATE TABLE IF NOT EXISTS support_tickets (
+                id UUID PRIMARY KEY,
+                conversation_id UUID NOT NULL,
+                user_id VARCHAR(100) NOT NULL,
+                status VARCHAR(20) NOT NULL,
+                escalation_reason VARCHAR(50) NOT NULL,
+                creation_date TIMESTAMP NOT NULL,
+                assignment_date TIMESTAMP,
+                resolution_date TIMESTAMP,
+                agent_id UUID,
+                agent_name VARCHAR(100),
+                notes TEXT,
+                priority INTEGER NOT NULL,
+                metadata JSONB,
+                bank_code VARCHAR(10) REFERENCES banks(code),
+                FOREIGN KEY (conversation_id) REFERENCES chatbot_sessions(id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_tickets_status ON support_tickets(status)",
+            "CREATE INDEX IF NOT EXISTS idx_tickets_user_id ON support_tickets(user_id)",
+            "CREATE INDEX IF NOT EXISTS idx_tickets_agent_id ON support_tickets(agent_id)",
+            "CREATE INDEX IF NOT EXISTS idx_tickets_bank_code ON support_tickets(bank_code)",
+            # Mensajes de agentes (no forman parte de la conversación principal)
+            """
+            CREATE TABLE IF NOT EXISTS agent_messages (
+                id UUID PRIMARY KEY,
+                ticket_id UUID NOT NULL,
+                agent_id UUID NOT NULL,
+                agent_name VARCHAR(100) NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TIMESTAMP NOT NULL,
+                is_internal BOOLEAN NOT NULL DEFAULT FALSE,
+                FOREIGN KEY (ticket_id) REFERENCES support_tickets(id)
+            )
+            """,
+            """
+            CREATE TABLE IF NOT EXISTS ticket_user_mapping (
+                ticket_id UUID PRIMARY KEY,
+                user_id VARCHAR(100) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_ticket_user_user_id ON ticket_user_mapping(user_id)"
+        ]
+    ),
+    Migration(
+        version=4,
+        description="Embeddings de entrenamiento (pgvector)",
+        statements=[
+            "CREATE EXTENSION IF NOT EXISTS vector",
+            """
+            CREATE TABLE IF NOT EXISTS text_embeddings (
+                id UUID PRIMARY KEY,
+                file_id UUID REFERENCES training_files(id),
+                bank_code VARCHAR(10) REFERENCES banks(code),
+                chunk_index INTEGER,
+                text TEXT,
+                embedding VECTOR(1536),
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """
+        ]
+    ),
+    Migration(
+        version=5,
+        description="Índices para las consultas frecuentes (CREATE INDEX CONCURRENTLY)",
+        statements=managed_index_steps(),
+        transactional=False
+    ),
+    Migration(
+        version=6,
+        description="Particionado mensual por timestamp de mensajes, agent_messages y chat_messages",
+        statements=partitioning_steps()
+    ),
+    Migration(
+        version=7,
+        description="Identificadores de conversaciones y mensajes como UUID nativo",
+        statements=[
+            f"ALTER TABLE conversaciones ALTER COLUMN id TYPE UUID USING {_uuid_using('id')}",
+            f"ALTER TABLE mensajes ALTER COLUMN id TYPE UUID USING {_uuid_using('id')}",
+            f"ALTER TABLE mensajes ALTER COLUMN conversacion_id TYPE UUID USING {_uuid_using('conversacion_id')}"
+        ]
+    ),
+    Migration(
+        version=8,
+        description="Sesiones y mensajes de métricas (chat_sessions, chat_messages) en el esquema",
+        statements=[
+            # Mismas columnas que los modelos de metrics/database.py; el turno las
+            # actualiza en el mismo lote que los mensajes, así que deben existir siempre
+            """
+            CREATE TABLE IF NOT EXISTS chat_sessions (
+                id UUID PRIMARY KEY,
+                user_id VARCHAR(255) NOT NULL,
+                cliente_type VARCHAR(50),
+                start_time TIMESTAMP NOT NULL,
+                end_time TIMESTAMP,
+                initial_sentiment VARCHAR(20) NOT NULL,
+                final_sentiment VARCHAR(20),
+                resolution_status VARCHAR(20),
+                total_messages INTEGER DEFAULT 0,
+                escalation_required BOOLEAN DEFAULT FALSE,
+                satisfaction_score INTEGER,
+                sentiment_journey JSON,
+                emotion_improvement BOOLEAN DEFAULT FALSE,
+                queries_resolved INTEGER DEFAULT 0,
+                banking_services_used JSON,
+                avg_response_time_ms FLOAT DEFAULT 0,
+                session_duration_seconds FLOAT DEFAULT 0
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_id ON chat_sessions (user_id)",
+            """
+            CREATE TABLE IF NOT EXISTS chat_messages (
+                id UUID NOT NULL,
+                session_id UUID NOT NULL REFERENCES chat_sessions(id),
+                user_message TEXT NOT NULL,
+                bot_response TEXT NOT NULL,
+                timestamp TIMESTAMP NOT NULL,
+                sentiment VARCHAR(20) NOT NULL,
+                sentiment_confidence FLOAT DEFAULT 0,
+                intent VARCHAR(100),
+                intent_confidence FLOAT DEFAULT 0,
+                processing_time_ms FLOAT DEFAULT 0,
+                token_count INTEGER DEFAULT 0,
+                detected_entities JSON,
+                is_escalation_request BOOLEAN DEFAULT FALSE,
+                response_tone VARCHAR(20),
+                banking_service_category VARCHAR(50),
+                PRIMARY KEY (id)
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS ix_chat_messages_session_id ON chat_messages (session_id, timestamp)",
+            # Si la tabla se acaba de crear, se particiona por mes como las demás
+            partitioning_steps([table for table in PARTITIONED_TABLES if table.name == "chat_messages"])[0]
+        ]
+    ),
+    Migration(
+        version=9,
+        description="Prompt de sistema por referencia (plantilla y versión) en lugar de una copia por conversación",
+        statements=[
+            "ALTER TABLE conversaciones ADD COLUMN IF NOT EXISTS prompt_template VARCHAR(50)",
+            "ALTER TABLE conversaciones ADD COLUMN IF NOT EXISTS prompt_version INTEGER",
+            # Las copias ya guardadas se eliminan; las conversaciones sin referencia
+            # toman la versión vigente del prompt al volver a cargarse
+            """
+            WITH borrados AS (
+                DELETE FROM mensajes WHERE role = 'system'
+                RETURNING conversacion_id
+            ), por_conversacion AS (
+                SELECT conversacion_id, COUNT(*) AS cantidad
+                FROM borrados
+                GROUP BY conversacion_id
+            )
+            UPDATE conversaciones c
+            SET cantidad_mensajes = GREATEST(c.cantidad_mensajes - p.cantidad, 0)
+            FROM por_conversacion p
+            WHERE c.id = p.conversacion_id
+            """
+        ]
+    ),
+    Migration(
+        version=10,
+        description="Índices gestionados de las tablas creadas después de la migración 5 (chat_sessions)",
+        # La migración 5 omite las tablas que aún no existen (chat_sessions se crea
+        # en la 8); los índices ya creados se omiten con IF NOT EXISTS
+        statements=managed_index_steps(),
+        transactional=False
+    )
+]
+
+
+def get_current_version(db) -> int:
+    """
+    Obtiene la versión de esquema aplicada más reciente.
+
+    Args:
+        db: Conector a la base de datos
+
+    Returns:
+        Versión actual (0 si no hay migraciones aplicadas)
+    """
+    with db.transaction() as cursor:
+        cursor.execute(SCHEMA_VERSION_DDL)
+        cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version")
+        row = cursor.fetchone()
+    return row["version"] if row else 0
+
+
+def run_migrations(db, migrations: Optional[Sequence[Migration]] = None, target: Optional[int] = None) -> List[int]:
+    """
+    Aplica en orden las migraciones pendientes. Un advisory lock evita que varios
+    workers apliquen la misma migración a la vez.
+
+    Args:
+        db: Conector a la base de datos
+        migrations: Migraciones a considerar (por defecto MIGRATIONS)
+        target: Versión máxima a aplicar (por defecto todas)
+
+    Returns:
+        Lista de versiones aplicadas en esta ejecución
+    """
+    migrations = sorted(migrations if migrations is not None else MIGRATIONS, key=lambda m: m.version)
+
+    with db.transaction() as cursor:
+        cursor.execute(SCHEMA_VERSION_DDL)
+        cursor.execute("SELECT version FROM schema_version")
+        applied = {row["version"] for row in cursor.fetchall()}
+
+    applied_now = []
+    for migration in migrations:
+        if migration.version in applied or (target is not None and migration.version > target):
+            continue
+
+        if migration.transactional:
+            with db.transaction() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_KEY,))
+                if _apply(cursor, migration):
+                    applied_now.append(migration.version)
+        else:
+            with db.autocommit() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_KEY,))
+                try:
+                    if _apply(cursor, migration):
+                        applied_now.append(migration.version)
+                finally:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_KEY,))
+
+    if applied_now:
+        logger.info(f"Migraciones aplicadas: {applied_now}")
+    else:
+        logger.debug("Esquema de base de datos al día")
+    return applied_now
+
+
+def _apply(cursor, migration: Migration) -> bool:
+    """
+    Aplica una migración si otro proceso no la aplicó mientras se esperaba el lock.
+    """
+    cursor.execute("SELECT 1 FROM schema_version WHERE version = %s", (migration.version,))
+    if cursor.fetchone():
+        return False
+
+    logger.info(f"Aplicando migración {migration.version}: {migration.description}")
+    for step in migration.statements:
+        if callable(step):
+            step(cursor)
+        else:
+            cursor.execute(step)
+
+    cursor.execute(
+        "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+        (migration.version, migration.description)
+    )
+    return True
+
+
+# Destinos cuyo esquema ya se verificó en este proceso
+_verified_targets = set()
+_verified_lock = threading.Lock()
+
+
+def ensure_schema(db) -> None:
+    """
+    Aplica las migraciones pendientes una sola vez por proceso y destino.
+    Las llamadas posteriores no ejecutan consultas.
+
+    Args:
+        db: Conector a la base de datos
+    """
+    target = (getattr(db, "host", None), getattr(db, "database", None))
+
+    with _verified_lock:
+        if target in _verified_targets:
+            return
+        run_migrations(db)
+        _verified_targets.add(target)
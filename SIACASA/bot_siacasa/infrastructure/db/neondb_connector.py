@@ -1,13 +1,112 @@
 # bot_siacasa/infrastructure/db/neondb_connector.py
+import io
+import json
 import logging
 import os
+import time
+import uuid
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Dict, Any, Optional, Tuple
-from datetime import datetime
+from contextlib import contextmanager
+from psycopg2 import extensions, sql
+from psycopg2.extras import RealDictCursor, execute_batch, execute_values
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Sequence, Tuple
+from datetime import date, datetime
+
+from bot_siacasa.infrastructure.db.connection_pool import ConnectionPool, PooledConnection, get_pool
+from bot_siacasa.infrastructure.db.prepared_statements import (
+    PreparedStatementCache,
+    prepared_statement_stats
+)
+from bot_siacasa.infrastructure.db.query_budget import record_query
+from bot_siacasa.infrastructure.db.query_stats import query_stats
+from bot_siacasa.infrastructure.db.replica import REPLICA_LAG_QUERY, ReplicaRouter, get_replica_router
 
 logger = logging.getLogger(__name__)
 
+
+def _load_pool_settings() -> Dict[str, Any]:
+    """
+    Lee la configuración del pool desde DATABASE_CONFIG (ajustada según entorno).
+    """
+    try:
+        from bot_siacasa.config.config import EnvironmentConfig
+        config = EnvironmentConfig.get_database_config()
+    except Exception as e:
+        logger.warning(f"No se pudo cargar DATABASE_CONFIG, usando valores por defecto: {e}")
+        config = {}
+
+    return {
+        "pool_size": config.get("connection_pool_size", 10),
+        "max_overflow": config.get("max_overflow", 20),
+        "timeout": config.get("pool_timeout", 2.0),
+        "recycle": config.get("pool_recycle", 3600)
+    }
+
+
+def _load_query_cache_settings(host: str) -> Tuple[bool, int]:
+    """
+    Lee la configuración de la caché de sentencias preparadas desde DATABASE_CONFIG.
+    Se desactiva al usar el endpoint "-pooler" de Neon (PgBouncer en modo transacción),
+    donde las sentencias PREPARE no sobreviven entre transacciones.
+    """
+    try:
+        from bot_siacasa.config.config import OptimizedConfig
+        config = OptimizedConfig.DATABASE_CONFIG
+    except Exception:
+        config = {}
+
+    enabled = config.get("enable_query_caching", True) and "-pooler" not in (host or "")
+    return enabled, config.get("query_cache_size", 100)
+
+
+def _format_copy_value(value: Any) -> str:
+    """
+    Convierte un valor Python en un campo CSV para COPY (NULL se representa sin comillas).
+    """
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, (datetime, date)):
+        value = value.isoformat()
+    else:
+        value = str(value)
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _rows_to_copy_buffer(rows: Iterable[Sequence[Any]]) -> io.StringIO:
+    """
+    Serializa filas en un buffer CSV apto para `COPY ... FROM STDIN`.
+    """
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(",".join(_format_copy_value(value) for value in row))
+        buffer.write("\n")
+    buffer.seek(0)
+    return buffer
+
+
+class _TrackedCursor:
+    """
+    Envoltorio de cursor que registra cada sentencia en las estadísticas del conector.
+    """
+    
+    def __init__(self, cursor, connector: "NeonDBConnector"):
+        self._cursor = cursor
+        self._connector = connector
+    
+    def execute(self, query: Any, params: Any = None):
+        with self._connector._timed(query) as measurement:
+            self._cursor.execute(query, params)
+            measurement["rows"] = max(self._cursor.rowcount, 0)
+    
+    def __iter__(self):
+        return iter(self._cursor)
+    
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+
 class NeonDBConnector:
     """
     Conector para la base de datos PostgreSQL en NeonDB.
@@ -20,7 +119,11 @@ class NeonDBConnector:
         user=None,
         password=None,
         connect_timeout: Optional[int] = None,
-        sslmode: Optional[str] = None
+        sslmode: Optional[str] = None,
+        pool: Optional[ConnectionPool] = None,
+        replica_host: Optional[str] = None,
+        replica_pool: Optional[ConnectionPool] = None,
+        replica_router: Optional[ReplicaRouter] = None
     ):
         """
         Inicializa el conector con las credenciales de conexión.
@@ -33,6 +136,10 @@ class NeonDBConnector:
             password: Contraseña
             connect_timeout: Timeout (en segundos) para la conexión
             sslmode: Modo SSL a utilizar (por defecto 'require' para Neon)
+            pool: Pool de conexiones a utilizar (por defecto el pool compartido del destino)
+            replica_host: Host de una réplica de lectura (por defecto NEONDB_REPLICA_HOST)
+            replica_pool: Pool de conexiones de la réplica (por defecto el pool compartido)
+            replica_router: Estado de salud/retraso de la réplica (por defecto el compartido)
         """
         self.host = host or os.getenv("NEONDB_HOST")
         self.database = database or os.getenv("NEONDB_DATABASE")
@@ -46,26 +153,54 @@ class NeonDBConnector:
             logger.error("Faltan credenciales para conectar a NeonDB")
             raise ValueError("Faltan credenciales para conectar a NeonDB")
         
-        # Inicializar la base de datos si es necesario
-        self._initialize_database()
+        # Las instancias que apuntan al mismo destino comparten un único pool
+        self.pool = pool or get_pool(
+            (self.host, self.database, self.user, self.sslmode),
+            self._get_connection,
+            name=f"{self.database}@{self.host}",
+            **_load_pool_settings()
+        )
+        self.prepared_statements_enabled, self.prepared_cache_size = _load_query_cache_settings(self.host)
+        
+        # Réplica de lectura opcional para consultas analíticas (readonly=True)
+        self.replica_host = replica_host or os.getenv("NEONDB_REPLICA_HOST")
+        self.replica_pool = replica_pool
+        self.replica_router = replica_router
+        if self.replica_host and self.replica_pool is None:
+            self.replica_pool = get_pool(
+                (self.replica_host, self.database, self.user, self.sslmode),
+                lambda: self._get_connection(host=self.replica_host),
+                name=f"{self.database}@{self.replica_host}",
+                **_load_pool_settings()
+            )
+        if self.replica_pool is not None and self.replica_router is None:
+            self.replica_router = get_replica_router(self.replica_host or "replica")
+        
+        # El esquema se crea con migraciones versionadas (ver migrations.ensure_schema),
+        # por lo que construir un conector no ejecuta ninguna consulta
     
-    def _get_connection(self):
+    def _get_connection(self, host: Optional[str] = None):
         """
-        Establece una conexión a la base de datos.
+        Establece una nueva conexión física a la base de datos.
+        Se usa como fábrica del pool; el resto del conector obtiene conexiones con `_connection()`.
+        
+        Args:
+            host: Host al que conectar (por defecto el primario)
         
         Returns:
             Conexión a la base de datos
         """
+        host = host or self.host
         try:
             logger.debug(
                 "Conectando a NeonDB %s (db=%s) con timeout %ss y sslmode=%s",
-                self.host,
+                host,
                 self.database,
                 self.connect_timeout,
                 self.sslmode
             )
             connection = psycopg2.connect(
-                host=self.host,
+                host=host,
                 database=self.database,
                 user=self.user,
                 password=self.password,
@@ -77,218 +212,502 @@ class NeonDBConnector:
             logger.error(f"Error al conectar a NeonDB: {e}", exc_info=True)
             raise
     
-    def _initialize_database(self):
+    @contextmanager
+    def _connection(self):
         """
-        Inicializa la base de datos creando las tablas necesarias si no existen.
+        Obtiene una conexión del pool y la devuelve al terminar.
+        
+        Yields:
+            Conexión a la base de datos
         """
-        try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            
-            # Crear tablas necesarias
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS banks (
-                code VARCHAR(10) PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                description TEXT,
-                active BOOLEAN DEFAULT TRUE,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS admin_users (
-                id UUID PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                role VARCHAR(20) NOT NULL DEFAULT 'user',
-                bank_code VARCHAR(10) REFERENCES banks(code),
-                is_active BOOLEAN DEFAULT TRUE,
-                last_login TIMESTAMP,
-                reset_token TEXT,
-                reset_token_expiry TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS training_files (
-                id UUID PRIMARY KEY,
-                filename VARCHAR(255) NOT NULL,
-                original_filename VARCHAR(255) NOT NULL,
-                file_path VARCHAR(255) NOT NULL,
-                file_type VARCHAR(50),
-                file_size INTEGER,
-                bank_code VARCHAR(10) REFERENCES banks(code),
-                uploaded_by UUID REFERENCES admin_users(id),
-                status VARCHAR(20) DEFAULT 'pending',
-                description TEXT,
-                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                processed_at TIMESTAMP
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS training_sessions (
-                id UUID PRIMARY KEY,
-                bank_code VARCHAR(10) REFERENCES banks(code),
-                initiated_by UUID REFERENCES admin_users(id),
-                status VARCHAR(20) DEFAULT 'pending',
-                files_count INTEGER DEFAULT 0,
-                success_count INTEGER DEFAULT 0,
-                error_count INTEGER DEFAULT 0,
-                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                end_time TIMESTAMP,
-                log_file VARCHAR(255),
-                results TEXT
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS training_session_files (
-                session_id UUID REFERENCES training_sessions(id),
-                file_id UUID REFERENCES training_files(id),
-                status VARCHAR(20) DEFAULT 'pending',
-                error_message TEXT,
-                processed_at TIMESTAMP,
-                PRIMARY KEY (session_id, file_id)
-            )
-            """)
-            
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chatbot_sessions (
-                id UUID PRIMARY KEY,
-                user_id VARCHAR(100) NOT NULL,
-                bank_code VARCHAR(10) REFERENCES banks(code),
-                start_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                end_time TIMESTAMP,
-                message_count INTEGER DEFAULT 0,
-                user_satisfied BOOLEAN,
-                metadata JSONB
-            )
-            """)
-            
-            # Insertar banco por defecto si no existe
-            cursor.execute("""
-            INSERT INTO banks (code, name, description)
-            VALUES ('default', 'Banco Predeterminado', 'Configuración predeterminada del sistema')
-            ON CONFLICT (code) DO NOTHING
-            """)
-            
-            # Insertar usuario administrador por defecto si no existe
-            cursor.execute("""
-            SELECT COUNT(*) FROM admin_users WHERE username = 'admin'
-            """)
-            admin_exists = cursor.fetchone()[0] > 0
-            
-            if not admin_exists:
-                # La contraseña predeterminada es "admin123" (hash generado con werkzeug.security)
-                cursor.execute("""
-                INSERT INTO admin_users (
-                    id, name, email, username, password_hash, role, bank_code
-                )
-                VALUES (
-                    '00000000-0000-0000-0000-000000000000',
-                    'Administrador',
-                    'admin@siacasa.com',
-                    'admin',
-                    'pbkdf2:sha256:600000$LmQ0xnZDHkFGPxBn$5c9507f254be938ed982fb40ec78b19e68c3a3be7d88e9e91e5ed67a2384a571',
-                    'admin',
-                    'default'
-                )
-                """)
-            
-            conn.commit()
-            logger.info("Base de datos inicializada correctamente")
+        with self.pool.connection() as pooled:
+            yield pooled.connection
+    
+    def _run(self, pooled: PooledConnection, cursor, query: str, params: tuple, prepared: bool = False):
+        """
+        Ejecuta una consulta en el cursor, como sentencia preparada si se solicita.
+        
+        Args:
+            pooled: Conexión del pool dueña del cursor
+            cursor: Cursor donde ejecutar
+            query: Consulta SQL
+            params: Parámetros para la consulta
+            prepared: Si se reutiliza una sentencia preparada en la conexión
+        """
+        if prepared and self.prepared_statements_enabled:
+            cache = pooled.state.get("prepared_statements")
+            if cache is None:
+                cache = PreparedStatementCache(self.prepared_cache_size)
+                pooled.state["prepared_statements"] = cache
+            try:
+                if cache.execute(cursor, query, params):
+                    return
+            except Exception:
+                pooled.connection.rollback()
+                cache.reset(pooled.connection)
+                raise
+        
+        cursor.execute(query, params or ())
+    
+    @contextmanager
+    def _timed(self, query: Any):
+        """
+        Mide la duración de una sentencia y la registra en las estadísticas por huella.
+        
+        Args:
+            query: Consulta medida
             
-        except Exception as e:
-            logger.error(f"Error al inicializar la base de datos: {e}", exc_info=True)
+        Yields:
+            Diccionario donde el llamador anota las filas devueltas o afectadas
+        """
+        measurement = {"rows": 0}
+        error = False
+        start = time.perf_counter()
+        try:
+            yield measurement
+        except Exception:
+            error = True
             raise
         finally:
-            if 'conn' in locals() and conn:
-                conn.close()
+            query_stats.record(
+                query,
+                (time.perf_counter() - start) * 1000,
+                rows=measurement["rows"],
+                error=error
+            )
+            record_query(query, measurement["rows"])
     
-    def execute(self, query: str, params: tuple = None) -> int:
+    def get_query_stats(self, top: Optional[int] = 20, order_by: str = "total_ms") -> Dict[str, Any]:
+        """
+        Obtiene las estadísticas de latencia por huella de consulta (para dashboards).
+        
+        Args:
+            top: Número máximo de huellas a devolver
+            order_by: Campo de orden (total_ms, calls, max_ms, avg_ms, slow_calls)
+            
+        Returns:
+            Diccionario con el umbral de consulta lenta, totales y huellas
+        """
+        return query_stats.get_stats(top=top, order_by=order_by)
+    
+    def get_prepared_statement_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene los contadores de la caché de sentencias preparadas.
+        
+        Returns:
+            Diccionario con aciertos, fallos, desalojos y tasa de aciertos
+        """
+        return {
+            "enabled": self.prepared_statements_enabled,
+            "max_per_connection": self.prepared_cache_size,
+            **prepared_statement_stats.as_dict()
+        }
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """
+        Obtiene las estadísticas del pool de conexiones.
+        
+        Returns:
+            Diccionario con conexiones en uso, ociosas y tiempos de espera
+        """
+        return self.pool.get_stats()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        Abre una transacción sobre una única conexión del pool. Todas las sentencias
+        ejecutadas con el cursor entregado se confirman juntas al salir del bloque,
+        o se revierten si ocurre un error.
+        
+        Yields:
+            Cursor (filas como diccionario) cuyas sentencias se miden en las estadísticas
+        """
+        with self.pool.connection() as pooled:
+            conn = pooled.connection
+            try:
+                yield _TrackedCursor(conn.cursor(cursor_factory=RealDictCursor), self)
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Error en transacción, cambios revertidos: {e}", exc_info=True)
+                raise
+    
+    @contextmanager
+    def autocommit(self):
+        """
+        Entrega un cursor sobre una conexión en modo autocommit, para sentencias que no
+        pueden ejecutarse dentro de una transacción (p. ej. CREATE INDEX CONCURRENTLY).
+        
+        Yields:
+            Cursor (filas como diccionario) cuyas sentencias se miden en las estadísticas
+        """
+        with self.pool.connection() as pooled:
+            conn = pooled.connection
+            conn.autocommit = True
+            try:
+                yield _TrackedCursor(conn.cursor(cursor_factory=RealDictCursor), self)
+            finally:
+                conn.autocommit = False
+    
+    def execute(self, query: str, params: tuple = None, prepared: bool = False) -> int:
         """
         Ejecuta una consulta SQL que no devuelve resultados.
         
         Args:
             query: Consulta SQL
             params: Parámetros para la consulta
+            prepared: Si se ejecuta como sentencia preparada (para consultas frecuentes)
             
         Returns:
             Número de filas afectadas
         """
-        conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute(query, params or ())
-            affected_rows = cursor.rowcount
-            conn.commit()
-            return affected_rows
+            with self.pool.connection() as pooled:
+                conn = pooled.connection
+                try:
+                    with self._timed(query) as measurement:
+                        cursor = conn.cursor()
+                        self._run(pooled, cursor, query, params, prepared)
+                        affected_rows = cursor.rowcount
+                        conn.commit()
+                        measurement["rows"] = affected_rows
+                    return affected_rows
+                except Exception:
+                    conn.rollback()
+                    raise
         except Exception as e:
-            if conn:
-                conn.rollback()
             logger.error(f"Error al ejecutar consulta: {e}", exc_info=True)
             raise
-        finally:
-            if conn:
-                conn.close()
     
-    def fetch_one(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
+    def fetch_one(
+        self,
+        query: str,
+        params: tuple = None,
+        prepared: bool = False,
+        readonly: bool = False
+    ) -> Optional[Dict[str, Any]]:
         """
         Ejecuta una consulta SQL y devuelve una fila como diccionario.
         
         Args:
             query: Consulta SQL
             params: Parámetros para la consulta
+            prepared: Si se ejecuta como sentencia preparada (para consultas frecuentes)
+            readonly: Si puede leerse de la réplica (consultas analíticas que toleran retraso)
             
         Returns:
             Diccionario con los resultados o None si no hay resultados
         """
-        conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(query, params or ())
-            result = cursor.fetchone()
-            return dict(result) if result else None
+            rows = self._read(query, params, prepared, readonly, single=True)
+            return rows[0] if rows else None
         except Exception as e:
             logger.error(f"Error al ejecutar consulta fetch_one: {e}", exc_info=True)
             raise
-        finally:
-            if conn:
-                conn.close()
     
-    def fetch_all(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
+    def fetch_all(
+        self,
+        query: str,
+        params: tuple = None,
+        prepared: bool = False,
+        readonly: bool = False
+    ) -> List[Dict[str, Any]]:
         """
         Ejecuta una consulta SQL y devuelve todas las filas como lista de diccionarios.
         
         Args:
             query: Consulta SQL
             params: Parámetros para la consulta
+            prepared: Si se ejecuta como sentencia preparada (para consultas frecuentes)
+            readonly: Si puede leerse de la réplica (consultas analíticas que toleran retraso)
             
         Returns:
             Lista de diccionarios con los resultados
         """
-        conn = None
         try:
-            conn = self._get_connection()
-            cursor = conn.cursor(cursor_factory=RealDictCursor)
-            cursor.execute(query, params or ())
-            results = cursor.fetchall()
-            return [dict(row) for row in results]
+            return self._read(query, params, prepared, readonly, single=False)
         except Exception as e:
             logger.error(f"Error al ejecutar consulta fetch_all: {e}", exc_info=True)
             raise
-        finally:
-            if conn:
-                conn.close()
+    
+    def fetch_one_replica(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
+        """
+        Atajo de `fetch_one(..., readonly=True)` para consultas analíticas.
+        """
+        return self.fetch_one(query, params, readonly=True)
+    
+    def fetch_all_replica(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
+        """
+        Atajo de `fetch_all(..., readonly=True)` para consultas analíticas.
+        """
+        return self.fetch_all(query, params, readonly=True)
+    
+    def _read(self, query: str, params: tuple, prepared: bool, readonly: bool, single: bool) -> List[Dict[str, Any]]:
+        """
+        Ejecuta una lectura en la réplica (si se permite y está sana) o en el primario.
+        Si la réplica falla, la lectura se repite en el primario.
+        """
+        if readonly and self._replica_usable():
+            try:
+                return self._read_from(self.replica_pool, query, params, prepared, single)
+            except Exception as e:
+                self.replica_router.record_failure(e)
+        
+        return self._read_from(self.pool, query, params, prepared, single)
+    
+    def _read_from(
+        self,
+        pool: ConnectionPool,
+        query: str,
+        params: tuple,
+        prepared: bool,
+        single: bool
+    ) -> List[Dict[str, Any]]:
+        with pool.connection() as pooled, self._timed(query) as measurement:
+            cursor = pooled.connection.cursor(cursor_factory=RealDictCursor)
+            self._run(pooled, cursor, query, params, prepared)
+            if single:
+                result = cursor.fetchone()
+                rows = [dict(result)] if result else []
+            else:
+                rows = [dict(row) for row in cursor.fetchall()]
+            measurement["rows"] = len(rows)
+            return rows
+    
+    def _replica_usable(self) -> bool:
+        """
+        Indica si hay réplica configurada, disponible y con retraso tolerable.
+        """
+        if self.replica_pool is None:
+            return False
+        return self.replica_router.should_use_replica(self._measure_replica_lag)
+    
+    def _measure_replica_lag(self) -> float:
+        with self.replica_pool.connection() as pooled:
+            cursor = pooled.connection.cursor()
+            cursor.execute(REPLICA_LAG_QUERY)
+            row = cursor.fetchone()
+            return float(row[0] or 0) if row else 0.0
+    
+    def get_replica_stats(self) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene las estadísticas de enrutamiento a la réplica (None si no hay réplica).
+        """
+        return self.replica_router.get_stats() if self.replica_router else None
+    
+    def fetch_iter(
+        self,
+        query: str,
+        params: tuple = None,
+        batch_size: int = 1000,
+        readonly: bool = False
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Ejecuta una consulta con un cursor de servidor (con nombre) y entrega las filas
+        de a una, trayéndolas en lotes de `batch_size`. La memoria usada no depende del
+        tamaño del resultado. La conexión queda reservada hasta agotar o cerrar el iterador.
+        
+        Args:
+            query: Consulta SQL
+            params: Parámetros para la consulta
+            batch_size: Filas solicitadas al servidor por cada viaje
+            readonly: Si puede leerse de la réplica (exportaciones y análisis); si
+                la réplica falla antes de entregar filas, se lee del primario
+            
+        Yields:
+            Diccionario por cada fila del resultado
+        """
+        if readonly and self._replica_usable():
+            entregadas = 0
+            try:
+                for row in self._iter_from(self.replica_pool, query, params, batch_size):
+                    entregadas += 1
+                    yield row
+                return
+            except Exception as e:
+                self.replica_router.record_failure(e)
+                # Con filas ya entregadas, repetir la consulta en el primario las duplicaría
+                if entregadas:
+                    raise
+                logger.warning(f"Réplica no disponible en fetch_iter, se lee del primario: {e}")
+        
+        yield from self._iter_from(self.pool, query, params, batch_size)
+    
+    def _iter_from(
+        self,
+        pool: ConnectionPool,
+        query: str,
+        params: tuple,
+        batch_size: int
+    ) -> Iterator[Dict[str, Any]]:
+        cursor_name = f"siacasa_iter_{uuid.uuid4().hex[:12]}"
+        # Solo se mide el tiempo en la base de datos, no el del consumidor del iterador
+        elapsed = 0.0
+        total_rows = 0
+        round_trips = 0
+        error = False
+        
+        with pool.connection() as pooled:
+            conn = pooled.connection
+            cursor = conn.cursor(name=cursor_name, cursor_factory=RealDictCursor)
+            cursor.itersize = batch_size
+            try:
+                start = time.perf_counter()
+                cursor.execute(query, params or ())
+                round_trips += 1
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    round_trips += 1
+                    elapsed += time.perf_counter() - start
+                    if not rows:
+                        break
+                    total_rows += len(rows)
+                    for row in rows:
+                        yield dict(row)
+                    start = time.perf_counter()
+            except Exception as e:
+                error = True
+                logger.error(f"Error al ejecutar consulta fetch_iter: {e}", exc_info=True)
+                raise
+            finally:
+                query_stats.record(query, elapsed * 1000, rows=total_rows, error=error)
+                record_query(query, total_rows, round_trips)
+                try:
+                    cursor.close()
+                except Exception:
+                    pass
+                # Cierra la transacción de lectura que mantiene vivo el cursor
+                conn.rollback()
+    
+    def execute_many(self, query: str, params_list: Sequence[tuple], page_size: int = 1000) -> int:
+        """
+        Ejecuta la misma sentencia para muchos conjuntos de parámetros en una sola transacción.
+        Las sentencias se envían agrupadas en lotes de `page_size` por viaje a la base de datos.
+        
+        Args:
+            query: Consulta SQL con marcadores %s
+            params_list: Lista de tuplas de parámetros
+            page_size: Sentencias por lote enviado al servidor
+            
+        Returns:
+            Número de conjuntos de parámetros ejecutados
+        """
+        if not params_list:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                try:
+                    with self._timed(query) as measurement:
+                        cursor = conn.cursor()
+                        execute_batch(cursor, query, params_list, page_size=page_size)
+                        conn.commit()
+                        measurement["rows"] = len(params_list)
+                    return len(params_list)
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            logger.error(f"Error al ejecutar consulta execute_many: {e}", exc_info=True)
+            raise
+    
+    def execute_values(
+        self,
+        query: str,
+        rows: Sequence[tuple],
+        template: Optional[str] = None,
+        page_size: int = 1000
+    ) -> int:
+        """
+        Inserta/actualiza muchas filas con un único `VALUES (...), (...), ...` por lote.
+        
+        Args:
+            query: Consulta SQL con un único marcador `VALUES %s`
+            rows: Filas a enviar
+            template: Plantilla opcional para cada fila, p. ej. "(%s, %s::jsonb)"
+            page_size: Filas por sentencia enviada al servidor
+            
+        Returns:
+            Número de filas afectadas
+        """
+        if not rows:
+            return 0
+        
+        try:
+            with self._connection() as conn:
+                try:
+                    with self._timed(query) as measurement:
+                        cursor = conn.cursor()
+                        affected_rows = 0
+                        for start in range(0, len(rows), page_size):
+                            page = rows[start:start + page_size]
+                            execute_values(cursor, query, page, template=template, page_size=len(page))
+                            affected_rows += max(cursor.rowcount, 0)
+                        conn.commit()
+                        measurement["rows"] = affected_rows
+                    return affected_rows
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            logger.error(f"Error al ejecutar consulta execute_values: {e}", exc_info=True)
+            raise
+    
+    def copy_rows(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        """
+        Carga filas masivamente con `COPY ... FROM STDIN` en un solo viaje y un único commit.
+        
+        Args:
+            table: Nombre de la tabla destino
+            columns: Columnas en el orden de cada fila
+            rows: Filas a cargar (None se guarda como NULL, dict/list como JSON)
+            
+        Returns:
+            Número de filas copiadas
+        """
+        if extensions.get_wait_callback() is not None:
+            # psycopg2 no admite COPY con callbacks de espera (modo cooperativo de eventlet)
+            return self._insert_rows(table, columns, rows)
+        
+        buffer = _rows_to_copy_buffer(rows)
+        statement = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            sql.Identifier(*table.split(".")),
+            sql.SQL(", ").join(sql.Identifier(column) for column in columns)
+        )
+        
+        try:
+            with self._connection() as conn:
+                try:
+                    with self._timed(f"COPY {table} ({', '.join(columns)}) FROM STDIN") as measurement:
+                        cursor = conn.cursor()
+                        cursor.copy_expert(statement, buffer)
+                        copied_rows = cursor.rowcount
+                        conn.commit()
+                        measurement["rows"] = copied_rows
+                    return copied_rows
+                except Exception:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            logger.error(f"Error al ejecutar COPY en {table}: {e}", exc_info=True)
+            raise
+    
+    def _insert_rows(self, table: str, columns: Sequence[str], rows: Iterable[Sequence[Any]]) -> int:
+        """
+        Alternativa a `copy_rows` con `INSERT ... VALUES` por lotes.
+        """
+        values = [
+            tuple(json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value for value in row)
+            for row in rows
+        ]
+        def quote(identifier: str) -> str:
+            return '"' + identifier.replace('"', '""') + '"'
+        
+        query = "INSERT INTO {} ({}) VALUES %s".format(
+            ".".join(quote(part) for part in table.split(".")),
+            ", ".join(quote(column) for column in columns)
+        )
+        return self.execute_values(query, values)
     
     # Métodos específicos para el panel de administración
     
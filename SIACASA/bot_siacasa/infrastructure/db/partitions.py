@@ -0,0 +1,303 @@
+# bot_siacasa/infrastructure/db/partitions.py
+import logging
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from bot_siacasa.infrastructure.db.indexes import table_kind
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PartitionedTable:
+    """
+    Tabla de solo inserción particionada por rango mensual de una columna de fecha.
+
+    Attributes:
+        name: Nombre de la tabla
+        column: Columna de partición (forma parte de la clave primaria)
+        primary_key: Columnas de la clave primaria (debe incluir `column`)
+        indexes: Índices (nombre, columnas) que se crean en la tabla padre
+        foreign_keys: Definiciones FOREIGN KEY que se vuelven a crear
+    """
+    name: str
+    column: str
+    primary_key: Tuple[str, ...]
+    indexes: Tuple[Tuple[str, str], ...] = ()
+    foreign_keys: Tuple[str, ...] = field(default=())
+
+
+PARTITIONED_TABLES: List[PartitionedTable] = [
+    PartitionedTable(
+        "mensajes", "timestamp", ("id", "timestamp"),
+        indexes=(("idx_mensajes_conversacion_timestamp", "conversacion_id, timestamp"),)
+    ),
+    PartitionedTable(
+        "agent_messages", "timestamp", ("id", "timestamp"),
+        indexes=(("idx_agent_messages_ticket_timestamp", "ticket_id, timestamp"),),
+        foreign_keys=("FOREIGN KEY (ticket_id) REFERENCES support_tickets(id)",)
+    ),
+    PartitionedTable(
+        "chat_messages", "timestamp", ("id", "timestamp"),
+        indexes=(("ix_chat_messages_session_id", "session_id, timestamp"),),
+        foreign_keys=("FOREIGN KEY (session_id) REFERENCES chat_sessions(id)",)
+    ),
+]
+
+
+def _partition_config() -> Dict[str, Any]:
+    try:
+        from bot_siacasa.config.config import OptimizedConfig
+        return dict(OptimizedConfig.PARTITION_CONFIG)
+    except Exception:
+        return {}
+
+
+def month_start(value: date) -> date:
+    return date(value.year, value.month, 1)
+
+
+def add_months(value: date, months: int) -> date:
+    index = value.year * 12 + value.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def _partition_sql(table: PartitionedTable, month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table.name, month)} PARTITION OF {table.name} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+
+def _month_bounds(table: PartitionedTable, month: date) -> str:
+    return f"{table.column} >= '{month.isoformat()}' AND {table.column} < '{add_months(month, 1).isoformat()}'"
+
+
+def create_month_partition(cursor, table: PartitionedTable, month: date) -> int:
+    """
+    Crea la partición de un mes. Si la partición DEFAULT ya tiene filas de ese
+    mes (p. ej. el mantenimiento no corrió a tiempo), CREATE ... PARTITION OF
+    fallaría; en ese caso, dentro de la transacción del cursor, se separa la
+    partición DEFAULT, se crea la del mes, se mueven a ella las filas del rango
+    y se vuelve a adjuntar la DEFAULT.
+
+    Args:
+        cursor: Cursor dentro de una transacción
+        table: Tabla particionada
+        month: Primer día del mes
+
+    Returns:
+        Filas movidas desde la partición DEFAULT
+    """
+    partition = partition_name(table.name, month)
+    default = f"{table.name}_default"
+    cursor.execute(
+        "SELECT to_regclass(%s) IS NOT NULL AS present, to_regclass(%s) IS NOT NULL AS has_default",
+        (partition, default)
+    )
+    row = cursor.fetchone()
+    if row and row["present"]:
+        return 0
+
+    pending = False
+    if row and row["has_default"]:
+        cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {_month_bounds(table, month)}) AS pending")
+        pending_row = cursor.fetchone()
+        pending = bool(pending_row and pending_row["pending"])
+
+    if not pending:
+        cursor.execute(_partition_sql(table, month))
+        return 0
+
+    cursor.execute(f"ALTER TABLE {table.name} DETACH PARTITION {default}")
+    cursor.execute(_partition_sql(table, month))
+    cursor.execute(f"INSERT INTO {table.name} SELECT * FROM {default} WHERE {_month_bounds(table, month)}")
+    moved = max(cursor.rowcount or 0, 0)
+    cursor.execute(f"DELETE FROM {default} WHERE {_month_bounds(table, month)}")
+    cursor.execute(f"ALTER TABLE {table.name} ATTACH PARTITION {default} DEFAULT")
+    logger.warning(f"Partición {partition} creada moviendo {moved} filas desde {default}")
+    return moved
+
+
+def convert_to_partitioned(cursor, table: PartitionedTable, months_ahead: int = 3, today: Optional[date] = None) -> bool:
+    """
+    Convierte una tabla existente en una tabla particionada por mes: la renombra,
+    crea la tabla padre con las mismas columnas, crea las particiones que cubren
+    los datos existentes y los meses siguientes (más una partición DEFAULT de
+    seguridad), copia las filas y elimina la tabla original.
+
+    Debe ejecutarse dentro de una transacción: la copia bloquea la tabla mientras dura.
+
+    Args:
+        cursor: Cursor dentro de una transacción
+        table: Tabla a convertir
+        months_ahead: Meses futuros a crear por adelantado
+        today: Fecha de referencia (por defecto, hoy)
+
+    Returns:
+        True si la tabla se convirtió en esta llamada
+    """
+    kind = table_kind(cursor, table.name)
+    if kind is None:
+        logger.info(f"Tabla {table.name} inexistente; se omite el particionado")
+        return False
+    if kind == "partitioned":
+        return False
+
+    legacy = f"{table.name}_sin_particionar"
+    logger.info(f"Particionando {table.name} por mes de {table.column}")
+
+    cursor.execute(f"ALTER TABLE {table.name} RENAME TO {legacy}")
+    cursor.execute(
+        f"CREATE TABLE {table.name} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        f"PARTITION BY RANGE ({table.column})"
+    )
+
+    cursor.execute(f"SELECT MIN({table.column}) AS oldest FROM {legacy}")
+    row = cursor.fetchone()
+    current = month_start(today or date.today())
+    oldest = row["oldest"] if row and row["oldest"] else None
+    first = month_start(oldest.date() if isinstance(oldest, datetime) else oldest) if oldest else current
+
+    month = min(first, current)
+    while month <= add_months(current, months_ahead):
+        cursor.execute(_partition_sql(table, month))
+        month = add_months(month, 1)
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table.name}_default PARTITION OF {table.name} DEFAULT")
+
+    cursor.execute(f"INSERT INTO {table.name} SELECT * FROM {legacy}")
+    cursor.execute(f"DROP TABLE {legacy}")
+
+    # Claves e índices después de copiar (más rápido y sin conflicto de nombres)
+    cursor.execute(f"ALTER TABLE {table.name} ADD PRIMARY KEY ({', '.join(table.primary_key)})")
+    for foreign_key in table.foreign_keys:
+        cursor.execute(f"ALTER TABLE {table.name} ADD {foreign_key}")
+    for name, columns in table.indexes:
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table.name} ({columns})")
+    return True
+
+
+def partitioning_steps(tables: Sequence[PartitionedTable] = PARTITIONED_TABLES):
+    """
+    Construye los pasos de migración que particionan las tablas de mensajes.
+    """
+    months_ahead = _partition_config().get("months_ahead", 3)
+    return [
+        lambda cursor, table=table: convert_to_partitioned(cursor, table, months_ahead)
+        for table in tables
+    ]
+
+
+class PartitionManager:
+    """
+    Mantiene las particiones mensuales: crea las de los próximos meses y separa
+    (DETACH) las que superan la retención, de modo que los índices y el vacuum de
+    la tabla activa no crecen con el historial.
+    """
+
+    def __init__(
+        self,
+        db,
+        tables: Sequence[PartitionedTable] = PARTITIONED_TABLES,
+        months_ahead: Optional[int] = None,
+        retention_months: Optional[int] = None
+    ):
+        """
+        Args:
+            db: Conector a la base de datos
+            tables: Tablas particionadas gestionadas
+            months_ahead: Meses futuros con partición creada (por defecto PARTITION_CONFIG)
+            retention_months: Meses que permanecen adjuntos; None o 0 desactiva la separación
+        """
+        config = _partition_config()
+        self.db = db
+        self.tables = list(tables)
+        self.months_ahead = months_ahead if months_ahead is not None else config.get("months_ahead", 3)
+        self.retention_months = (
+            retention_months if retention_months is not None else config.get("retention_months")
+        )
+
+    def list_partitions(self, table: str) -> List[Dict[str, Any]]:
+        """
+        Lista las particiones adjuntas de una tabla con su rango y tamaño.
+        """
+        return self.db.fetch_all(
+            """
+            SELECT
+                child.relname AS name,
+                pg_get_expr(child.relpartbound, child.oid) AS bounds,
+                pg_total_relation_size(child.oid) AS size_bytes
+            FROM pg_inherits i
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            (table,)
+        )
+
+    def ensure_future_partitions(self, today: Optional[date] = None) -> List[str]:
+        """
+        Crea las particiones del mes actual y de los `months_ahead` siguientes. Las
+        filas de esos meses que hayan caído en la partición DEFAULT se mueven a su
+        partición en la misma transacción (ver create_month_partition).
+
+        Returns:
+            Particiones verificadas
+        """
+        current = month_start(today or date.today())
+        created = []
+        with self.db.transaction() as cursor:
+            for table in self.tables:
+                if table_kind(cursor, table.name) != "partitioned":
+                    continue
+                for offset in range(self.months_ahead + 1):
+                    month = add_months(current, offset)
+                    create_month_partition(cursor, table, month)
+                    created.append(partition_name(table.name, month))
+        return created
+
+    def detach_old_partitions(self, today: Optional[date] = None) -> List[str]:
+        """
+        Separa las particiones mensuales anteriores a la retención. Las tablas
+        separadas se conservan (archivo) y pueden eliminarse o exportarse aparte.
+
+        Returns:
+            Particiones separadas
+        """
+        if not self.retention_months:
+            return []
+
+        cutoff = f"{add_months(month_start(today or date.today()), -self.retention_months):%Y%m}"
+        detached = []
+        for table in self.tables:
+            prefix = f"{table.name}_p"
+            for partition in self.list_partitions(table.name):
+                suffix = partition["name"][len(prefix):]
+                if not partition["name"].startswith(prefix) or not suffix.isdigit():
+                    continue
+                if suffix < cutoff:
+                    self.db.execute(f"ALTER TABLE {table.name} DETACH PARTITION {partition['name']}")
+                    detached.append(partition["name"])
+                    logger.info(f"Partición {partition['name']} separada de {table.name}")
+        return detached
+
+    def run_maintenance(self, today: Optional[date] = None) -> Dict[str, List[str]]:
+        """
+        Crea las particiones futuras y separa las antiguas.
+
+        Returns:
+            Diccionario con las listas "ensured" y "detached"
+        """
+        try:
+            ensured = self.ensure_future_partitions(today)
+            detached = self.detach_old_partitions(today)
+        except Exception as e:
+            logger.error(f"Error en el mantenimiento de particiones: {e}", exc_info=True)
+            raise
+        logger.info(f"Particiones verificadas: {len(ensured)}, separadas: {len(detached)}")
+        return {"ensured": ensured, "detached": detached}
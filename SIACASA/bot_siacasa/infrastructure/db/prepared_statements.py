@@ -0,0 +1,164 @@
+# bot_siacasa/infrastructure/db/prepared_statements.py
+import hashlib
+import logging
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marcadores posicionales de psycopg2 (%s), ignorando el escape literal %%
+_PLACEHOLDER_PATTERN = re.compile(r"%%|%s")
+_NAMED_PLACEHOLDER_PATTERN = re.compile(r"%\([^)]+\)s")
+
+
+class PreparedStatementStats:
+    """
+    Contadores globales de aciertos y fallos de la caché de sentencias preparadas.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def record(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+prepared_statement_stats = PreparedStatementStats()
+
+
+def to_server_placeholders(query: str) -> Optional[Tuple[str, int]]:
+    """
+    Traduce los marcadores %s de psycopg2 a parámetros $1..$n de PostgreSQL.
+
+    Args:
+        query: Consulta SQL con marcadores posicionales
+
+    Returns:
+        Tupla (consulta traducida, número de parámetros) o None si la consulta
+        usa marcadores con nombre y no puede prepararse
+    """
+    if _NAMED_PLACEHOLDER_PATTERN.search(query):
+        return None
+
+    count = 0
+
+    def replace(match):
+        nonlocal count
+        if match.group(0) == "%%":
+            return "%"
+        count += 1
+        return f"${count}"
+
+    return _PLACEHOLDER_PATTERN.sub(replace, query), count
+
+
+class PreparedStatementCache:
+    """
+    Caché LRU de sentencias preparadas (PREPARE/EXECUTE) de una conexión.
+
+    Las sentencias preparadas viven en la sesión del servidor, por lo que cada
+    conexión física del pool tiene su propia caché.
+    """
+
+    def __init__(self, max_size: int = 100, stats: PreparedStatementStats = prepared_statement_stats):
+        """
+        Args:
+            max_size: Número máximo de sentencias preparadas por conexión
+            stats: Contadores donde registrar aciertos, fallos y desalojos
+        """
+        self.max_size = max(1, int(max_size))
+        self.stats = stats
+        self._statements: "OrderedDict[str, Tuple[str, int]]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._statements)
+
+    def __contains__(self, query: str) -> bool:
+        return query in self._statements
+
+    def execute(self, cursor, query: str, params: Optional[tuple]) -> bool:
+        """
+        Ejecuta la consulta como sentencia preparada, preparándola la primera vez.
+
+        Args:
+            cursor: Cursor de la conexión dueña de esta caché
+            query: Consulta SQL con marcadores %s
+            params: Parámetros de la consulta
+
+        Returns:
+            True si se ejecutó como sentencia preparada, False si la consulta
+            no es apta y el llamador debe ejecutarla de forma normal
+        """
+        entry = self._statements.get(query)
+
+        if entry is None:
+            translated = to_server_placeholders(query)
+            if translated is None:
+                return False
+
+            server_query, param_count = translated
+            name = "siacasa_" + hashlib.md5(query.encode("utf-8")).hexdigest()[:16]
+            self._evict_if_needed(cursor)
+            cursor.execute(f"PREPARE {name} AS {server_query}")
+            entry = (name, param_count)
+            self._statements[query] = entry
+            self.stats.record("misses")
+        else:
+            self._statements.move_to_end(query)
+            self.stats.record("hits")
+
+        name, param_count = entry
+        params = tuple(params or ())
+        if len(params) != param_count:
+            raise ValueError(
+                f"La sentencia preparada {name} espera {param_count} parámetros y recibió {len(params)}"
+            )
+
+        if param_count:
+            cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * param_count)})", params)
+        else:
+            cursor.execute(f"EXECUTE {name}")
+        return True
+
+    def reset(self, connection):
+        """
+        Descarta todas las sentencias preparadas de la conexión (p. ej. tras un error
+        que pudo dejarlas en un estado desconocido).
+
+        Args:
+            connection: Conexión dueña de esta caché
+        """
+        if self._statements:
+            self.stats.record("invalidations", len(self._statements))
+        self._statements.clear()
+        try:
+            cursor = connection.cursor()
+            cursor.execute("DEALLOCATE ALL")
+            cursor.close()
+        except Exception as e:
+            logger.warning(f"No se pudieron liberar las sentencias preparadas: {e}")
+
+    def _evict_if_needed(self, cursor):
+        while len(self._statements) >= self.max_size:
+            _, (name, _) = self._statements.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {name}")
+            self.stats.record("evictions")
+            logger.debug(f"Sentencia preparada {name} desalojada de la caché")
@@ -0,0 +1,157 @@
+# bot_siacasa/infrastructure/db/query_budget.py
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from bot_siacasa.infrastructure.db.query_stats import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Contadores activos en el contexto actual (request, green thread o bloque de prueba).
+# Es una tupla para que los bloques anidados sumen también en los externos.
+_active_counters: ContextVar[Tuple["QueryCounter", ...]] = ContextVar("siacasa_query_counters", default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Se lanza cuando un bloque de código supera su presupuesto de consultas.
+    """
+
+
+class QueryCounter:
+    """
+    Cuenta los viajes a la base de datos y las filas obtenidas dentro de un bloque.
+    """
+
+    def __init__(self, name: Optional[str] = None):
+        """
+        Args:
+            name: Nombre del flujo medido (p. ej. "POST /api/mensaje")
+        """
+        self.name = name
+        self.queries = 0
+        self.rows = 0
+        self.by_fingerprint: Counter = Counter()
+
+    def record(self, query: Any, rows: int = 0, round_trips: int = 1):
+        self.queries += round_trips
+        self.rows += max(rows or 0, 0)
+        self.by_fingerprint[fingerprint(query)] += round_trips
+
+    def repeated(self, min_count: int = 2) -> Dict[str, int]:
+        """
+        Retorna las huellas ejecutadas al menos `min_count` veces (candidatas a N+1).
+        """
+        return {key: count for key, count in self.by_fingerprint.most_common() if count >= min_count}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "queries": self.queries,
+            "rows": self.rows,
+            "repeated": self.repeated()
+        }
+
+
+def record_query(query: Any, rows: int = 0, round_trips: int = 1):
+    """
+    Registra una consulta en todos los contadores activos del contexto actual.
+
+    Args:
+        query: Consulta ejecutada
+        rows: Filas devueltas o afectadas
+        round_trips: Viajes al servidor que supuso la consulta
+    """
+    for counter in _active_counters.get():
+        counter.record(query, rows, round_trips)
+
+
+def current_counter() -> Optional[QueryCounter]:
+    """
+    Retorna el contador más interno activo o None si no hay ninguno.
+    """
+    counters = _active_counters.get()
+    return counters[-1] if counters else None
+
+
+def start_tracking(name: Optional[str] = None) -> Tuple[QueryCounter, Any]:
+    """
+    Activa un contador en el contexto actual. Pensado para hooks de inicio/fin
+    de request; en el resto de casos es preferible `track_queries`.
+
+    Returns:
+        Tupla (contador, token para `stop_tracking`)
+    """
+    counter = QueryCounter(name)
+    token = _active_counters.set(_active_counters.get() + (counter,))
+    return counter, token
+
+
+def stop_tracking(token: Any):
+    """
+    Desactiva el contador activado con `start_tracking`.
+    """
+    _active_counters.reset(token)
+
+
+@contextmanager
+def track_queries(name: Optional[str] = None) -> Iterator[QueryCounter]:
+    """
+    Cuenta las consultas ejecutadas dentro del bloque.
+
+    Args:
+        name: Nombre del flujo medido
+
+    Yields:
+        Contador del bloque
+    """
+    counter, token = start_tracking(name)
+    try:
+        yield counter
+    finally:
+        stop_tracking(token)
+
+
+@contextmanager
+def assert_query_budget(
+    name: str,
+    max_queries: int,
+    max_rows: Optional[int] = None,
+    max_repeats: Optional[int] = None
+) -> Iterator[QueryCounter]:
+    """
+    Falla si el bloque supera el presupuesto de consultas declarado. Se usa en
+    pruebas para detectar regresiones N+1 en flujos concretos.
+
+    Args:
+        name: Nombre del flujo (p. ej. "SupportRepository.obtener_tickets_por_estado")
+        max_queries: Máximo de viajes a la base de datos
+        max_rows: Máximo de filas obtenidas (opcional)
+        max_repeats: Máximo de ejecuciones de una misma huella (opcional)
+
+    Yields:
+        Contador del bloque
+
+    Raises:
+        QueryBudgetExceeded: Si se supera algún límite
+    """
+    with track_queries(name) as counter:
+        yield counter
+
+    problems = []
+    if counter.queries > max_queries:
+        problems.append(f"{counter.queries} consultas (máximo {max_queries})")
+    if max_rows is not None and counter.rows > max_rows:
+        problems.append(f"{counter.rows} filas (máximo {max_rows})")
+    if max_repeats is not None:
+        for key, count in counter.repeated(max_repeats + 1).items():
+            problems.append(f"{count} ejecuciones de '{key}' (máximo {max_repeats})")
+
+    if problems:
+        repeated = "\n".join(f"  {count}x {key}" for key, count in counter.repeated().items())
+        raise QueryBudgetExceeded(
+            f"{name} superó su presupuesto: {'; '.join(problems)}"
+            + (f"\nConsultas repetidas:\n{repeated}" if repeated else "")
+        )
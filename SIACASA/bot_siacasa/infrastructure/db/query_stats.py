@@ -0,0 +1,196 @@
+# bot_siacasa/infrastructure/db/query_stats.py
+import json
+import logging
+import re
+import threading
+from bisect import bisect_left
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger("bot_siacasa.db.slow_queries")
+
+# Límites superiores (ms) de los buckets del histograma de latencia
+LATENCY_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+# Máximo de huellas distintas que se conservan para no crecer sin límite
+MAX_FINGERPRINTS = 500
+
+_COMMENT_PATTERN = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_PATTERN = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_PATTERN = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_PATTERN = re.compile(r"%\([^)]+\)s|%s|\$\d+")
+_LIST_PATTERN = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_VALUES_PATTERN = re.compile(r"(\(\?\))(?:\s*,\s*\(\?\))+")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+def _load_slow_query_threshold_ms() -> float:
+    """
+    Lee el umbral de consulta lenta desde TIMEOUT_CONFIG['db_query_timeout'] (segundos).
+    """
+    try:
+        from bot_siacasa.config.config import OptimizedConfig
+        return float(OptimizedConfig.TIMEOUT_CONFIG.get("db_query_timeout", 2.0)) * 1000
+    except Exception:
+        return 2000.0
+
+
+def fingerprint(query: Any) -> str:
+    """
+    Normaliza una consulta SQL para agrupar ejecuciones equivalentes: elimina
+    comentarios y literales, unifica marcadores y colapsa listas y espacios.
+
+    Args:
+        query: Consulta SQL (str, bytes o sentencia compuesta de psycopg2)
+
+    Returns:
+        Huella normalizada de la consulta
+    """
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", errors="replace")
+    elif not isinstance(query, str):
+        query = str(query)
+
+    normalized = _COMMENT_PATTERN.sub(" ", query)
+    normalized = _STRING_PATTERN.sub("?", normalized)
+    normalized = _PLACEHOLDER_PATTERN.sub("?", normalized)
+    normalized = _NUMBER_PATTERN.sub("?", normalized)
+    normalized = _WHITESPACE_PATTERN.sub(" ", normalized).strip()
+    normalized = _LIST_PATTERN.sub("(?)", normalized)
+    normalized = _VALUES_PATTERN.sub(r"\1", normalized)
+    return normalized
+
+
+class QueryStatsRegistry:
+    """
+    Registro de latencias por huella de consulta, con histograma, contadores
+    y log estructurado de consultas lentas.
+    """
+
+    def __init__(self, slow_query_threshold_ms: Optional[float] = None, max_fingerprints: int = MAX_FINGERPRINTS):
+        """
+        Args:
+            slow_query_threshold_ms: Umbral para registrar una consulta como lenta
+            max_fingerprints: Máximo de huellas distintas a conservar
+        """
+        self.slow_query_threshold_ms = (
+            slow_query_threshold_ms if slow_query_threshold_ms is not None else _load_slow_query_threshold_ms()
+        )
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.dropped = 0
+
+    def record(self, query: Any, duration_ms: float, rows: int = 0, error: bool = False) -> str:
+        """
+        Registra la ejecución de una consulta.
+
+        Args:
+            query: Consulta ejecutada
+            duration_ms: Duración en milisegundos
+            rows: Filas devueltas o afectadas
+            error: Si la consulta terminó con error
+
+        Returns:
+            Huella de la consulta
+        """
+        key = fingerprint(query)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_fingerprints:
+                    self.dropped += 1
+                else:
+                    entry = self._entries[key] = {
+                        "calls": 0,
+                        "errors": 0,
+                        "rows": 0,
+                        "slow_calls": 0,
+                        "total_ms": 0.0,
+                        "min_ms": None,
+                        "max_ms": 0.0,
+                        "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1)
+                    }
+
+            if entry is not None:
+                entry["calls"] += 1
+                entry["rows"] += max(rows or 0, 0)
+                entry["total_ms"] += duration_ms
+                entry["max_ms"] = max(entry["max_ms"], duration_ms)
+                entry["min_ms"] = duration_ms if entry["min_ms"] is None else min(entry["min_ms"], duration_ms)
+                entry["histogram"][bisect_left(LATENCY_BUCKETS_MS, duration_ms)] += 1
+                if error:
+                    entry["errors"] += 1
+                if duration_ms >= self.slow_query_threshold_ms:
+                    entry["slow_calls"] += 1
+
+        if duration_ms >= self.slow_query_threshold_ms:
+            slow_query_logger.warning("Consulta lenta: %s", json.dumps({
+                "fingerprint": key,
+                "duration_ms": round(duration_ms, 2),
+                "threshold_ms": self.slow_query_threshold_ms,
+                "rows": rows,
+                "error": error
+            }, ensure_ascii=False))
+
+        return key
+
+    def get_stats(self, top: Optional[int] = 20, order_by: str = "total_ms") -> Dict[str, Any]:
+        """
+        Retorna las estadísticas por huella ordenadas por el campo indicado.
+
+        Args:
+            top: Número máximo de huellas a devolver (None para todas)
+            order_by: Campo de orden (total_ms, calls, max_ms, avg_ms, slow_calls)
+
+        Returns:
+            Diccionario con el umbral, totales y la lista de huellas
+        """
+        with self._lock:
+            entries = [
+                {
+                    "fingerprint": key,
+                    **{name: value for name, value in entry.items() if name != "histogram"},
+                    "avg_ms": entry["total_ms"] / entry["calls"] if entry["calls"] else 0.0,
+                    "histogram": {
+                        bucket: count
+                        for bucket, count in zip(
+                            [f"<={limit}ms" for limit in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"],
+                            entry["histogram"]
+                        )
+                        if count
+                    }
+                }
+                for key, entry in self._entries.items()
+            ]
+            dropped = self.dropped
+
+        entries.sort(key=lambda item: item.get(order_by) or 0, reverse=True)
+        return {
+            "slow_query_threshold_ms": self.slow_query_threshold_ms,
+            "fingerprints": len(entries),
+            "dropped_fingerprints": dropped,
+            "total_calls": sum(item["calls"] for item in entries),
+            "total_ms": round(sum(item["total_ms"] for item in entries), 2),
+            "queries": entries[:top] if top else entries
+        }
+
+    def reset(self):
+        """
+        Limpia todas las estadísticas acumuladas.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.dropped = 0
+
+
+# Registro global compartido por todos los conectores del proceso
+query_stats = QueryStatsRegistry()
+
+
+def get_query_stats(top: Optional[int] = 20, order_by: str = "total_ms") -> Dict[str, Any]:
+    """
+    Retorna las estadísticas globales de consultas del proceso.
+    """
+    return query_stats.get_stats(top=top, order_by=order_by)
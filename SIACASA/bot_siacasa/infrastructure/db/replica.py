@@ -0,0 +1,165 @@
+# bot_siacasa/infrastructure/db/replica.py
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Retraso de la réplica en segundos (0 si ya aplicó todo lo recibido del primario)
+REPLICA_LAG_QUERY = """
+SELECT CASE
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM (now() - pg_last_xact_replay_timestamp())), 0)
+END AS lag_seconds
+"""
+
+
+class ReplicaRouter:
+    """
+    Decide si una lectura de solo lectura puede ir a la réplica.
+
+    La réplica se descarta temporalmente cuando falla (durante `failure_cooldown`
+    segundos) o cuando su retraso supera `max_lag_seconds`. El retraso se consulta
+    como máximo una vez cada `lag_check_interval` segundos.
+    """
+
+    def __init__(
+        self,
+        max_lag_seconds: Optional[float] = None,
+        lag_check_interval: Optional[float] = None,
+        failure_cooldown: Optional[float] = None,
+        name: str = "replica"
+    ):
+        """
+        Args:
+            max_lag_seconds: Retraso máximo tolerado (por defecto NEONDB_REPLICA_MAX_LAG o 30s)
+            lag_check_interval: Segundos entre verificaciones de retraso
+            failure_cooldown: Segundos sin usar la réplica tras un error
+            name: Nombre para logs y estadísticas
+        """
+        self.max_lag_seconds = (
+            max_lag_seconds if max_lag_seconds is not None
+            else float(os.getenv("NEONDB_REPLICA_MAX_LAG", "30"))
+        )
+        self.lag_check_interval = (
+            lag_check_interval if lag_check_interval is not None
+            else float(os.getenv("NEONDB_REPLICA_LAG_CHECK_INTERVAL", "5"))
+        )
+        self.failure_cooldown = (
+            failure_cooldown if failure_cooldown is not None
+            else float(os.getenv("NEONDB_REPLICA_FAILURE_COOLDOWN", "30"))
+        )
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._unavailable_until = 0.0
+        self._last_lag_check = 0.0
+        self._last_lag: Optional[float] = None
+        self._stats = {
+            "replica_reads": 0,
+            "primary_fallbacks": 0,
+            "replica_errors": 0,
+            "stale_skips": 0
+        }
+
+    def should_use_replica(self, measure_lag: Callable[[], float]) -> bool:
+        """
+        Indica si la próxima lectura puede ir a la réplica.
+
+        Args:
+            measure_lag: Función que consulta el retraso actual de la réplica (segundos)
+
+        Returns:
+            True si la réplica está disponible y dentro del retraso tolerado
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            if now < self._unavailable_until:
+                self._stats["primary_fallbacks"] += 1
+                return False
+            check_lag = now - self._last_lag_check >= self.lag_check_interval
+            if check_lag:
+                # Evita que varios hilos consulten el retraso a la vez
+                self._last_lag_check = now
+
+        if check_lag:
+            try:
+                lag = float(measure_lag())
+            except Exception as e:
+                self.record_failure(e)
+                return False
+            with self._lock:
+                self._last_lag = lag
+            if lag > self.max_lag_seconds:
+                logger.warning(
+                    f"Réplica '{self.name}' con retraso de {lag:.1f}s "
+                    f"(máximo {self.max_lag_seconds}s); se lee del primario"
+                )
+
+        with self._lock:
+            if self._last_lag is not None and self._last_lag > self.max_lag_seconds:
+                self._stats["stale_skips"] += 1
+                self._stats["primary_fallbacks"] += 1
+                return False
+            self._stats["replica_reads"] += 1
+            return True
+
+    def record_failure(self, error: Exception):
+        """
+        Registra un error de la réplica y la deja fuera de uso durante el cooldown.
+        """
+        with self._lock:
+            self._unavailable_until = time.monotonic() + self.failure_cooldown
+            self._stats["replica_errors"] += 1
+            self._stats["primary_fallbacks"] += 1
+        logger.warning(
+            f"Réplica '{self.name}' no disponible, se usará el primario durante "
+            f"{self.failure_cooldown}s: {error}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Retorna estadísticas del enrutamiento a la réplica.
+        """
+        with self._lock:
+            return {
+                "name": self.name,
+                "max_lag_seconds": self.max_lag_seconds,
+                "last_lag_seconds": self._last_lag,
+                "available": time.monotonic() >= self._unavailable_until,
+                **self._stats
+            }
+
+
+# Estado compartido por destino de réplica entre todas las instancias del conector
+_routers: Dict[str, ReplicaRouter] = {}
+_routers_lock = threading.Lock()
+
+
+def get_replica_router(name: str) -> ReplicaRouter:
+    """
+    Obtiene (o crea) el enrutador compartido de una réplica.
+
+    Args:
+        name: Identificador de la réplica (p. ej. su host)
+
+    Returns:
+        Enrutador de la réplica
+    """
+    with _routers_lock:
+        router = _routers.get(name)
+        if router is None:
+            router = _routers[name] = ReplicaRouter(name=name)
+        return router
+
+
+def get_all_replica_stats() -> Dict[str, Dict[str, Any]]:
+    """
+    Retorna las estadísticas de todas las réplicas registradas.
+    """
+    with _routers_lock:
+        routers = list(_routers.items())
+    return {name: router.get_stats() for name, router in routers}
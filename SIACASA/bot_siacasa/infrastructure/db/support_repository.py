@@ -3,12 +3,12 @@ import logging
 import json
 from typing import Dict, List, Optional
 from datetime import datetime
-import uuid
 
 from bot_siacasa.domain.entities.ticket import Ticket, TicketStatus, EscalationReason
 from bot_siacasa.domain.entities.usuario import Usuario
 from bot_siacasa.domain.entities.conversacion import Conversacion
 from bot_siacasa.domain.entities.mensaje import Mensaje  # Añadir esta importación
+from bot_siacasa.domain.identifiers import new_id
 
 logger = logging.getLogger(__name__)
 
@@ -20,87 +20,12 @@ class SupportRepository:
     def __init__(self, db_connector):
         """
         Inicializa el repositorio con el conector de base de datos.
+        Las tablas de soporte se crean con las migraciones de esquema (migrations.py).
         
         Args:
             db_connector: Conector a la base de datos
         """
         self.db = db_connector
-        self._initialize_tables()
-    
-    def _initialize_tables(self) -> None:
-        """
-        Inicializa las tablas necesarias para el repositorio de soporte.
-        """
-        try:
-            # Tabla de tickets
-            self.db.execute("""
-            CREATE TABLE IF NOT EXISTS support_tickets (
-                id UUID PRIMARY KEY,
-                conversation_id UUID NOT NULL,
-                user_id VARCHAR(100) NOT NULL,
-                status VARCHAR(20) NOT NULL,
-                escalation_reason VARCHAR(50) NOT NULL,
-                creation_date TIMESTAMP NOT NULL,
-                assignment_date TIMESTAMP,
-                resolution_date TIMESTAMP,
-                agent_id UUID,
-                agent_name VARCHAR(100),
-                notes TEXT,
-                priority INTEGER NOT NULL,
-                metadata JSONB,
-                bank_code VARCHAR(10) REFERENCES banks(code),
-                FOREIGN KEY (conversation_id) REFERENCES chatbot_sessions(id)
-            )
-            """)
-            
-            # Índices para búsqueda eficiente
-            self.db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tickets_status ON support_tickets(status);
-            """)
-            
-            self.db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tickets_user_id ON support_tickets(user_id);
-            """)
-            
-            self.db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tickets_agent_id ON support_tickets(agent_id);
-            """)
-            
-            self.db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_tickets_bank_code ON support_tickets(bank_code);
-            """)
-            
-            # Tabla para mensajes de agentes (mensajes que no forman parte de la conversación principal)
-            self.db.execute("""
-            CREATE TABLE IF NOT EXISTS agent_messages (
-                id UUID PRIMARY KEY,
-                ticket_id UUID NOT NULL,
-                agent_id UUID NOT NULL,
-                agent_name VARCHAR(100) NOT NULL,
-                content TEXT NOT NULL,
-                timestamp TIMESTAMP NOT NULL,
-                is_internal BOOLEAN NOT NULL DEFAULT FALSE,
-                FOREIGN KEY (ticket_id) REFERENCES support_tickets(id)
-            )
-            """)
-            
-            self.db.execute("""
-            CREATE TABLE IF NOT EXISTS ticket_user_mapping (
-                ticket_id UUID PRIMARY KEY,
-                user_id VARCHAR(100) NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """)
-            
-            # Índice para búsquedas rápidas por usuario
-            self.db.execute("""
-            CREATE INDEX IF NOT EXISTS idx_ticket_user_user_id ON ticket_user_mapping(user_id);
-            """)
-            
-            logger.info("Tablas de soporte inicializadas correctamente")
-        except Exception as e:
-            logger.error(f"Error al inicializar tablas de soporte: {e}", exc_info=True)
-            raise
     
     def guardar_ticket(self, ticket: Ticket) -> None:
         """
@@ -335,6 +260,7 @@ class SupportRepository:
                 )
                 conversacion.mensajes.append(mensaje_sistema)
             
+            conversacion.total_mensajes = len(conversacion.mensajes)
             return conversacion
             
         except Exception as e:
@@ -622,7 +548,7 @@ class SupportRepository:
         try:
             # Logging para depuración
             logger.info(f"Agregando mensaje de agente: ticket_id={ticket_id}, agente={agente_nombre}, es_interno={es_interno}")
-            mensaje_id = str(uuid.uuid4())
+            mensaje_id = new_id()
             
             query = """
             INSERT INTO agent_messages (
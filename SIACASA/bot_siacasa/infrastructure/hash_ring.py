@@ -0,0 +1,128 @@
+# bot_siacasa/infrastructure/hash_ring.py
+"""
+Anillo de hash consistente con nodos virtuales.
+
+Asigna claves (p. ej. usuario_id) a nodos (shards, workers) de forma estable entre
+procesos: al agregar o quitar un nodo solo cambian de nodo ~1/N de las claves.
+"""
+import bisect
+import hashlib
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VIRTUAL_NODES = 128
+
+
+def stable_hash(value: str) -> int:
+    """
+    Hash de 64 bits estable entre procesos (a diferencia de hash(), que usa una
+    semilla aleatoria por proceso).
+    """
+    return int.from_bytes(hashlib.md5(value.encode("utf-8")).digest()[:8], "big")
+
+
+def parse_node_targets(valor: str, prefijo: str = "nodo") -> Dict[str, str]:
+    """
+    Interpreta una lista de nodos "nombre=destino,nombre=destino". Las entradas sin
+    nombre reciben "<prefijo><posición>".
+
+    Args:
+        valor: Lista separada por comas
+        prefijo: Prefijo de los nombres generados
+
+    Returns:
+        Destino por nombre de nodo, en el orden indicado
+    """
+    targets: Dict[str, str] = {}
+    for posicion, entrada in enumerate(e.strip() for e in (valor or "").split(",")):
+        if not entrada:
+            continue
+        nombre, separador, destino = entrada.partition("=")
+        if not separador:
+            nombre, destino = f"{prefijo}{posicion}", entrada
+        nombre, destino = nombre.strip(), destino.strip()
+        if nombre in targets:
+            raise ValueError(f"Nodo duplicado: {nombre}")
+        targets[nombre] = destino
+    return targets
+
+
+class ConsistentHashRing:
+    """
+    Anillo de hash consistente. Cada nodo ocupa `virtual_nodes` posiciones para
+    repartir las claves de forma uniforme.
+    """
+
+    def __init__(self, nodes: Iterable[str] = (), virtual_nodes: int = DEFAULT_VIRTUAL_NODES):
+        """
+        Args:
+            nodes: Nombres de los nodos iniciales
+            virtual_nodes: Posiciones en el anillo por nodo
+        """
+        if virtual_nodes < 1:
+            raise ValueError("virtual_nodes debe ser al menos 1")
+        self.virtual_nodes = virtual_nodes
+        self._posiciones: List[int] = []
+        self._nodo_por_posicion: Dict[int, str] = {}
+        self._nodos: List[str] = []
+        self._lock = threading.Lock()
+        for node in nodes:
+            self.add_node(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self._nodos)
+
+    def __len__(self) -> int:
+        return len(self._nodos)
+
+    def __contains__(self, node: str) -> bool:
+        return node in self._nodos
+
+    def add_node(self, node: str) -> None:
+        """
+        Agrega un nodo al anillo (sin efecto si ya existe).
+        """
+        with self._lock:
+            if node in self._nodos:
+                return
+            for replica in range(self.virtual_nodes):
+                posicion = stable_hash(f"{node}#{replica}")
+                # Colisión (muy improbable): la posición conserva su dueño anterior
+                if posicion in self._nodo_por_posicion:
+                    continue
+                self._nodo_por_posicion[posicion] = node
+                bisect.insort(self._posiciones, posicion)
+            self._nodos.append(node)
+        logger.debug(f"Nodo agregado al anillo: {node} ({len(self._nodos)} nodos)")
+
+    def remove_node(self, node: str) -> None:
+        """
+        Quita un nodo del anillo; sus claves pasan a los nodos siguientes.
+        """
+        with self._lock:
+            if node not in self._nodos:
+                return
+            self._nodos.remove(node)
+            self._posiciones = [p for p in self._posiciones if self._nodo_por_posicion[p] != node]
+            self._nodo_por_posicion = {p: self._nodo_por_posicion[p] for p in self._posiciones}
+        logger.debug(f"Nodo quitado del anillo: {node} ({len(self._nodos)} nodos)")
+
+    def get_node(self, key: str) -> Optional[str]:
+        """
+        Nodo responsable de una clave: el primero en el anillo a partir de su hash.
+
+        Args:
+            key: Clave a ubicar
+
+        Returns:
+            Nombre del nodo, o None si el anillo está vacío
+        """
+        with self._lock:
+            if not self._posiciones:
+                return None
+            indice = bisect.bisect(self._posiciones, stable_hash(str(key))) % len(self._posiciones)
+            return self._nodo_por_posicion[self._posiciones[indice]]
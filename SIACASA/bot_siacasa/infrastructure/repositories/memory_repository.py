@@ -1,7 +1,10 @@
 import logging
-from typing import Dict, Optional, List
+import shelve
+import threading
+from collections import OrderedDict
+from dataclasses import replace
+from typing import Any, Dict, Optional, List, Set
 from datetime import datetime
-import json
 
 from bot_siacasa.application.interfaces.repository_interface import IRepository
 from bot_siacasa.domain.entities.usuario import Usuario
@@ -10,233 +13,519 @@ from bot_siacasa.domain.entities.mensaje import Mensaje
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MEMORY_REPOSITORY_CONFIG = {
+    "max_conversations": 5000,
+    "max_memory_mb": 256,
+    "spill_path": None
+}
+
+# Estimación del costo en memoria de cada objeto además de su texto
+MENSAJE_OVERHEAD_BYTES = 600
+CONVERSACION_OVERHEAD_BYTES = 1500
+
+
+def _estimar_bytes_mensaje(mensaje: Mensaje) -> int:
+    return MENSAJE_OVERHEAD_BYTES + len((mensaje.content or "").encode("utf-8"))
+
+
 class MemoryRepository(IRepository):
     """
     Implementación mejorada del repositorio en memoria.
-    Incluye mejor manejo de errores y logging detallado.
+
+    Acotada por número de conversaciones y por memoria estimada: al superar el
+    límite se desalojan las conversaciones menos usadas (primero las finalizadas).
+    Con `spill_path` las desalojadas se guardan en un archivo `shelve` local y se
+    recuperan al volver a pedirlas. Los índices por usuario y por conversación
+    activa hacen que las búsquedas sean O(1).
     """
-    
-    def __init__(self):
+
+    def __init__(
+        self,
+        max_conversations: Optional[int] = None,
+        max_memory_mb: Optional[float] = None,
+        spill_path: Optional[str] = None
+    ):
         """
         Inicializa el repositorio en memoria.
+
+        Args:
+            max_conversations: Máximo de conversaciones residentes en memoria
+            max_memory_mb: Memoria estimada máxima de conversaciones y mensajes
+            spill_path: Archivo donde guardar las conversaciones desalojadas (opcional)
+
+        Los valores no indicados se toman de OptimizedConfig.MEMORY_REPOSITORY_CONFIG.
         """
+        config = {**DEFAULT_MEMORY_REPOSITORY_CONFIG, **self._load_config()}
+        self.max_conversations = max_conversations or config["max_conversations"]
+        self.max_bytes = int((max_memory_mb or config["max_memory_mb"]) * 1024 * 1024)
+        self.spill_path = spill_path or config["spill_path"]
+
+        self._lock = threading.RLock()
         self.usuarios: Dict[str, Usuario] = {}
-        self.conversaciones: Dict[str, Conversacion] = {}
+        # Conversaciones residentes en orden LRU (la más reciente al final)
+        self.conversaciones: "OrderedDict[str, Conversacion]" = OrderedDict()
         self.conversaciones_activas: Dict[str, str] = {}  # usuario_id -> conversacion_id
-        logger.info("Repositorio en memoria inicializado")
-    
+        self.conversaciones_por_usuario: Dict[str, Set[str]] = {}  # usuario_id -> {conversacion_id}
+        # Todos los mensajes por conversación (la conversación solo guarda su ventana reciente)
+        self.mensajes: Dict[str, Dict[str, Mensaje]] = {}  # conversacion_id -> {mensaje_id: mensaje}
+        self._bytes: Dict[str, int] = {}  # conversacion_id -> memoria estimada
+        self._total_bytes = 0
+        self._spilled: Set[str] = set()
+        self.evictions = 0
+        self.restores = 0
+
+        self._spill = shelve.open(self.spill_path) if self.spill_path else None
+        logger.info(
+            f"Repositorio en memoria inicializado (máx. {self.max_conversations} conversaciones, "
+            f"{self.max_bytes // (1024 * 1024)} MB, spill={self.spill_path or 'no'})"
+        )
+
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            return dict(OptimizedConfig.MEMORY_REPOSITORY_CONFIG)
+        except Exception:
+            return {}
+
     def guardar_usuario(self, usuario: Usuario) -> None:
         """
         Guarda un usuario en el repositorio.
-        
+
         Args:
             usuario: Usuario a guardar
         """
         try:
-            self.usuarios[usuario.id] = usuario
-            logger.info(f"Usuario guardado: {usuario.id}")
+            with self._lock:
+                self.usuarios[usuario.id] = usuario
+            logger.debug(f"Usuario guardado: {usuario.id}")
         except Exception as e:
             logger.error(f"Error al guardar usuario {usuario.id}: {e}", exc_info=True)
             raise
-    
+
     def obtener_usuario(self, usuario_id: str) -> Optional[Usuario]:
         """
         Obtiene un usuario por su ID.
-        
+
         Args:
             usuario_id: ID del usuario
-            
+
         Returns:
             Usuario o None si no existe
         """
         try:
-            usuario = self.usuarios.get(usuario_id)
-            if usuario:
-                logger.info(f"Usuario encontrado: {usuario_id}")
-            else:
-                logger.info(f"Usuario no encontrado: {usuario_id}")
+            with self._lock:
+                usuario = self.usuarios.get(usuario_id)
+                if usuario is None and self._spill is not None:
+                    usuario = self._spill.get(f"u:{usuario_id}")
+                    if usuario is not None:
+                        self.usuarios[usuario_id] = usuario
+            logger.debug(f"Usuario {'encontrado' if usuario else 'no encontrado'}: {usuario_id}")
             return usuario
         except Exception as e:
             logger.error(f"Error al obtener usuario {usuario_id}: {e}", exc_info=True)
             return None
-    
+
     def guardar_conversacion(self, conversacion: Conversacion) -> None:
         """
         Guarda una conversación en el repositorio.
-        
+
         Args:
             conversacion: Conversación a guardar
         """
         try:
-            # Hacer una copia profunda para evitar problemas de referencia
-            self.conversaciones[conversacion.id] = conversacion
-            
-            # Marcar como conversación activa para el usuario
-            self.conversaciones_activas[conversacion.usuario.id] = conversacion.id
-            
-            # Log detallado
-            num_mensajes = len(conversacion.mensajes) if hasattr(conversacion, 'mensajes') else 0
-            logger.info(f"Conversación guardada: {conversacion.id} para usuario {conversacion.usuario.id} con {num_mensajes} mensajes")
-            
-            # Log de verificación de los mensajes
-            if hasattr(conversacion, 'mensajes') and conversacion.mensajes:
-                for i, msg in enumerate(conversacion.mensajes[-3:]):  # Solo los últimos 3
-                    logger.debug(f"Mensaje #{i}: {msg.role} - {msg.content[:30]}...")
+            with self._lock:
+                self._admitir(conversacion)
+                for mensaje in conversacion.mensajes:
+                    # El mensaje de sistema se reconstruye desde su plantilla
+                    if mensaje.role != "system":
+                        self._guardar_mensaje(conversacion.id, mensaje)
+                if conversacion.cargador_mensajes is None:
+                    conversacion.cargador_mensajes = (
+                        lambda antes_de, limite, conversacion_id=conversacion.id:
+                            self.obtener_mensajes_anteriores(conversacion_id, antes_de, limite)
+                    )
+                self._desalojar_si_necesario(conversacion.id)
+
+            logger.debug(
+                f"Conversación guardada: {conversacion.id} para usuario {conversacion.usuario.id} "
+                f"con {len(conversacion.mensajes)} mensajes"
+            )
         except Exception as e:
             logger.error(f"Error al guardar conversación {conversacion.id}: {e}", exc_info=True)
             raise
-    
+
+    def _admitir(self, conversacion: Conversacion) -> None:
+        """
+        Registra la conversación como residente y actualiza los índices.
+        """
+        usuario_id = conversacion.usuario.id
+        self.conversaciones[conversacion.id] = conversacion
+        self.conversaciones.move_to_end(conversacion.id)
+        self.conversaciones_por_usuario.setdefault(usuario_id, set()).add(conversacion.id)
+        if conversacion.fecha_fin is None:
+            self.conversaciones_activas[usuario_id] = conversacion.id
+        elif self.conversaciones_activas.get(usuario_id) == conversacion.id:
+            del self.conversaciones_activas[usuario_id]
+        if conversacion.id not in self._bytes:
+            self._bytes[conversacion.id] = CONVERSACION_OVERHEAD_BYTES
+            self._total_bytes += CONVERSACION_OVERHEAD_BYTES
+
+    def _guardar_mensaje(self, conversacion_id: str, mensaje: Mensaje) -> None:
+        """
+        Registra un mensaje en el historial completo de la conversación.
+        """
+        with self._lock:
+            self._residente(conversacion_id)
+            mensajes = self.mensajes.setdefault(conversacion_id, {})
+            anterior = mensajes.get(mensaje.id)
+            delta = _estimar_bytes_mensaje(mensaje) - (_estimar_bytes_mensaje(anterior) if anterior else 0)
+            mensajes[mensaje.id] = mensaje
+            self._bytes[conversacion_id] = self._bytes.get(conversacion_id, 0) + delta
+            self._total_bytes += delta
+            if conversacion_id in self.conversaciones:
+                self.conversaciones.move_to_end(conversacion_id)
+                self._desalojar_si_necesario(conversacion_id)
+
+    def _desalojar_si_necesario(self, protegida: Optional[str] = None) -> None:
+        """
+        Desaloja conversaciones en orden LRU mientras se supere algún límite:
+        primero las finalizadas y, si no basta, las activas sin uso reciente.
+        La conversación `protegida` (la que se está escribiendo) nunca se desaloja.
+        """
+        if not self._excede_limites():
+            return
+
+        for solo_finalizadas in (True, False):
+            for conversacion_id in list(self.conversaciones):
+                if not self._excede_limites():
+                    return
+                if conversacion_id == protegida:
+                    continue
+                if solo_finalizadas and self.conversaciones[conversacion_id].fecha_fin is None:
+                    continue
+                self._desalojar(conversacion_id)
+
+    def _excede_limites(self) -> bool:
+        return len(self.conversaciones) > self.max_conversations or self._total_bytes > self.max_bytes
+
+    def _desalojar(self, conversacion_id: str) -> None:
+        conversacion = self.conversaciones.pop(conversacion_id)
+        mensajes = self.mensajes.pop(conversacion_id, {})
+        self._total_bytes -= self._bytes.pop(conversacion_id, 0)
+        self.evictions += 1
+        usuario_id = conversacion.usuario.id
+
+        if self._spill is not None:
+            # El cargador de mensajes es una función local y no se puede serializar
+            self._spill[f"c:{conversacion_id}"] = {
+                "conversacion": replace(conversacion, cargador_mensajes=None),
+                "mensajes": list(mensajes.values())
+            }
+            self._spill[f"u:{usuario_id}"] = conversacion.usuario
+            self._spilled.add(conversacion_id)
+            # Sin conversaciones residentes, el usuario se recupera del respaldo al pedirlo
+            if not any(otra in self.conversaciones for otra in self.conversaciones_por_usuario.get(usuario_id, ())):
+                self.usuarios.pop(usuario_id, None)
+            logger.debug(f"Conversación {conversacion_id} desalojada a {self.spill_path}")
+            return
+
+        # Sin archivo de respaldo la conversación se descarta
+        ids = self.conversaciones_por_usuario.get(usuario_id, set())
+        ids.discard(conversacion_id)
+        if not ids:
+            self.conversaciones_por_usuario.pop(usuario_id, None)
+            self.usuarios.pop(usuario_id, None)
+        if self.conversaciones_activas.get(usuario_id) == conversacion_id:
+            del self.conversaciones_activas[usuario_id]
+        logger.debug(f"Conversación {conversacion_id} descartada por límite de memoria")
+
+    def _residente(self, conversacion_id: str) -> Optional[Conversacion]:
+        """
+        Retorna la conversación marcándola como usada; la recupera del archivo de
+        respaldo si fue desalojada.
+        """
+        conversacion = self.conversaciones.get(conversacion_id)
+        if conversacion is not None:
+            self.conversaciones.move_to_end(conversacion_id)
+            return conversacion
+
+        if conversacion_id not in self._spilled:
+            return None
+
+        datos = self._spill.pop(f"c:{conversacion_id}")
+        self._spilled.discard(conversacion_id)
+        self.restores += 1
+        conversacion = datos["conversacion"]
+        self._admitir(conversacion)
+        for mensaje in datos["mensajes"]:
+            self._guardar_mensaje(conversacion_id, mensaje)
+        conversacion.cargador_mensajes = (
+            lambda antes_de, limite, conversacion_id=conversacion_id:
+                self.obtener_mensajes_anteriores(conversacion_id, antes_de, limite)
+        )
+        self._desalojar_si_necesario(conversacion_id)
+        logger.debug(f"Conversación {conversacion_id} recuperada de {self.spill_path}")
+        return conversacion
+
+    def obtener_mensajes_anteriores(
+        self,
+        conversacion_id: str,
+        antes_de: Optional[datetime] = None,
+        limite: int = 20
+    ) -> List[Mensaje]:
+        """
+        Obtiene una página de mensajes anteriores a una fecha.
+
+        Args:
+            conversacion_id: ID de la conversación
+            antes_de: Cursor; solo mensajes anteriores a esta fecha (None = los más recientes)
+            limite: Número máximo de mensajes
+
+        Returns:
+            Mensajes en orden cronológico
+        """
+        with self._lock:
+            self._residente(conversacion_id)
+            mensajes = sorted(self.mensajes.get(conversacion_id, {}).values(), key=lambda mensaje: mensaje.timestamp)
+        if antes_de is not None:
+            mensajes = [mensaje for mensaje in mensajes if mensaje.timestamp < antes_de]
+        return mensajes[-limite:] if limite else []
+
     def obtener_conversacion(self, conversacion_id: str) -> Optional[Conversacion]:
         """
         Obtiene una conversación por su ID.
-        
+
         Args:
             conversacion_id: ID de la conversación
-            
+
         Returns:
             Conversación o None si no existe
         """
         try:
-            conversacion = self.conversaciones.get(conversacion_id)
-            if conversacion:
-                num_mensajes = len(conversacion.mensajes) if hasattr(conversacion, 'mensajes') else 0
-                logger.info(f"Conversación encontrada: {conversacion_id} con {num_mensajes} mensajes")
-            else:
-                logger.info(f"Conversación no encontrada: {conversacion_id}")
+            with self._lock:
+                conversacion = self._residente(conversacion_id)
+            logger.debug(f"Conversación {'encontrada' if conversacion else 'no encontrada'}: {conversacion_id}")
             return conversacion
         except Exception as e:
             logger.error(f"Error al obtener conversación {conversacion_id}: {e}", exc_info=True)
             return None
-    
+
     def obtener_conversacion_activa(self, usuario_id: str) -> Optional[Conversacion]:
         """
         Obtiene la conversación activa de un usuario.
-        
+
         Args:
             usuario_id: ID del usuario
-            
+
         Returns:
             Conversación activa o None si no existe
         """
         try:
-            # Obtener ID de la conversación activa
-            conversacion_id = self.conversaciones_activas.get(usuario_id)
-            
-            if not conversacion_id:
-                logger.info(f"Usuario {usuario_id} no tiene conversación activa")
-                return None
-            
-            # Obtener la conversación
-            conversacion = self.conversaciones.get(conversacion_id)
-            
+            with self._lock:
+                conversacion_id = self.conversaciones_activas.get(usuario_id)
+                if not conversacion_id:
+                    logger.debug(f"Usuario {usuario_id} no tiene conversación activa")
+                    return None
+
+                conversacion = self._residente(conversacion_id)
+                if conversacion is None:
+                    logger.warning(f"ID de conversación activa {conversacion_id} para usuario {usuario_id} no encontrado")
+                    # Limpiar la referencia inválida
+                    del self.conversaciones_activas[usuario_id]
+
             if conversacion:
-                num_mensajes = len(conversacion.mensajes) if hasattr(conversacion, 'mensajes') else 0
-                logger.info(f"Conversación activa encontrada para usuario {usuario_id}: {conversacion_id} con {num_mensajes} mensajes")
-                
-                # Verificar mensajes
-                if hasattr(conversacion, 'mensajes') and conversacion.mensajes:
-                    roles = [msg.role for msg in conversacion.mensajes]
-                    logger.debug(f"Roles de mensajes en la conversación: {roles}")
-            else:
-                logger.warning(f"ID de conversación activa {conversacion_id} para usuario {usuario_id} no encontrado")
-                
-                # Limpiar la referencia inválida
-                del self.conversaciones_activas[usuario_id]
-            
+                logger.debug(
+                    f"Conversación activa encontrada para usuario {usuario_id}: {conversacion_id} "
+                    f"con {len(conversacion.mensajes)} mensajes"
+                )
             return conversacion
         except Exception as e:
             logger.error(f"Error al obtener conversación activa para usuario {usuario_id}: {e}", exc_info=True)
             return None
-    
-    def obtener_conversaciones_usuario(self, usuario_id: str) -> List[Conversacion]:
+
+    def obtener_conversaciones_usuario(
+        self,
+        usuario_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> List[Conversacion]:
         """
         Obtiene todas las conversaciones de un usuario.
-        
+
         Args:
             usuario_id: ID del usuario
-            
+            max_mensajes: Se ignora: cada conversación residente ya guarda solo su
+                ventana reciente y el resto se pagina con obtener_mensajes_anteriores
+
         Returns:
             Lista de conversaciones
         """
         try:
-            conversaciones = [
-                conversacion for conversacion in self.conversaciones.values()
-                if conversacion.usuario.id == usuario_id
-            ]
-            
-            logger.info(f"Obtenidas {len(conversaciones)} conversaciones para usuario {usuario_id}")
+            with self._lock:
+                conversaciones = [
+                    conversacion
+                    for conversacion in map(self._residente, list(self.conversaciones_por_usuario.get(usuario_id, ())))
+                    if conversacion is not None
+                ]
+
+            logger.debug(f"Obtenidas {len(conversaciones)} conversaciones para usuario {usuario_id}")
             return conversaciones
         except Exception as e:
             logger.error(f"Error al obtener conversaciones para usuario {usuario_id}: {e}", exc_info=True)
             return []
-    
+
+    def exportar_conversaciones_usuario(self, usuario_id: str) -> List[Conversacion]:
+        """
+        Obtiene todas las conversaciones de un usuario, incluidas las desalojadas
+        a disco, propagando los errores (rebalanceo de shards). Cada una se retorna
+        como copia con su historial completo, no solo la ventana reciente.
+
+        Args:
+            usuario_id: ID del usuario
+
+        Returns:
+            Lista de conversaciones completas
+        """
+        with self._lock:
+            conversaciones = []
+            for conversacion_id in list(self.conversaciones_por_usuario.get(usuario_id, ())):
+                conversacion = self._residente(conversacion_id)
+                if conversacion is None:
+                    raise LookupError(f"La conversación {conversacion_id} de {usuario_id} no está disponible")
+                historial = sorted(self.mensajes.get(conversacion_id, {}).values(), key=lambda m: m.timestamp)
+                sistema = [mensaje for mensaje in conversacion.mensajes if mensaje.role == "system"]
+                conversaciones.append(replace(conversacion, mensajes=sistema + historial))
+            return conversaciones
+
+    def listar_ids_usuarios(self) -> List[str]:
+        """
+        IDs de los usuarios con datos en el repositorio, incluidos los que solo
+        tienen conversaciones desalojadas a disco (rebalanceo de shards).
+
+        Returns:
+            Lista de IDs de usuario
+        """
+        with self._lock:
+            return list(set(self.usuarios) | set(self.conversaciones_por_usuario))
+
+    def eliminar_conversaciones_usuario(self, usuario_id: str, conversacion_ids: List[str]) -> None:
+        """
+        Elimina las conversaciones indicadas con sus mensajes (en memoria y en el
+        archivo de respaldo), y el usuario si ya no le quedan conversaciones.
+
+        Args:
+            usuario_id: ID del usuario
+            conversacion_ids: Conversaciones a eliminar
+        """
+        with self._lock:
+            ids = self.conversaciones_por_usuario.get(usuario_id, set())
+            for conversacion_id in conversacion_ids:
+                if conversacion_id not in ids:
+                    continue
+                ids.discard(conversacion_id)
+                self.conversaciones.pop(conversacion_id, None)
+                self.mensajes.pop(conversacion_id, None)
+                self._total_bytes -= self._bytes.pop(conversacion_id, 0)
+                if conversacion_id in self._spilled:
+                    self._spilled.discard(conversacion_id)
+                    del self._spill[f"c:{conversacion_id}"]
+                if self.conversaciones_activas.get(usuario_id) == conversacion_id:
+                    del self.conversaciones_activas[usuario_id]
+
+            if not ids:
+                self.conversaciones_por_usuario.pop(usuario_id, None)
+                self.usuarios.pop(usuario_id, None)
+                if self._spill is not None:
+                    self._spill.pop(f"u:{usuario_id}", None)
+        logger.info(f"Eliminadas {len(conversacion_ids)} conversaciones de {usuario_id}")
+
     def finalizar_conversacion(self, conversacion_id: str) -> None:
         """
         Finaliza una conversación.
-        
+
         Args:
             conversacion_id: ID de la conversación
         """
         try:
-            # Obtener la conversación
-            conversacion = self.conversaciones.get(conversacion_id)
-            
-            if not conversacion:
-                logger.warning(f"Intento de finalizar conversación inexistente: {conversacion_id}")
-                return
-            
-            # Marcar como finalizada
-            conversacion.fecha_fin = datetime.now()
-            
-            # Actualizar en el repositorio
-            self.conversaciones[conversacion_id] = conversacion
-            
-            # Eliminar como conversación activa
-            usuario_id = conversacion.usuario.id
-            if usuario_id in self.conversaciones_activas and self.conversaciones_activas[usuario_id] == conversacion_id:
-                del self.conversaciones_activas[usuario_id]
-            
-            logger.info(f"Conversación {conversacion_id} finalizada para usuario {usuario_id}")
+            with self._lock:
+                # Obtener la conversación
+                conversacion = self._residente(conversacion_id)
+
+                if not conversacion:
+                    logger.warning(f"Intento de finalizar conversación inexistente: {conversacion_id}")
+                    return
+
+                # Marcar como finalizada y quitarla del índice de activas
+                conversacion.fecha_fin = datetime.now()
+                self._admitir(conversacion)
+
+            logger.info(f"Conversación {conversacion_id} finalizada para usuario {conversacion.usuario.id}")
         except Exception as e:
             logger.error(f"Error al finalizar conversación {conversacion_id}: {e}", exc_info=True)
-    
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas de ocupación y desalojo del repositorio.
+        """
+        with self._lock:
+            return {
+                "conversaciones_residentes": len(self.conversaciones),
+                "conversaciones_en_disco": len(self._spilled),
+                "memoria_estimada_mb": round(self._total_bytes / (1024 * 1024), 3),
+                "max_memoria_mb": round(self.max_bytes / (1024 * 1024), 3),
+                "max_conversaciones": self.max_conversations,
+                "desalojos": self.evictions,
+                "recuperaciones": self.restores
+            }
+
+    def cerrar(self) -> None:
+        """
+        Cierra el archivo de respaldo, si existe.
+        """
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
     # Método adicional para depuración
     def debug_status(self) -> Dict:
         """
         Devuelve información de depuración sobre el estado del repositorio.
-        
+
         Returns:
             Diccionario con información de estado
         """
         try:
-            status = {
-                "usuarios": len(self.usuarios),
-                "conversaciones": len(self.conversaciones),
-                "conversaciones_activas": len(self.conversaciones_activas),
-                "detalle_usuarios": [],
-                "detalle_conversaciones": []
-            }
-            
-            # Información de usuarios
-            for usuario_id, usuario in self.usuarios.items():
-                status["detalle_usuarios"].append({
-                    "id": usuario_id,
-                    "datos": usuario.datos
-                })
-            
-            # Información de conversaciones
-            for conv_id, conv in self.conversaciones.items():
-                num_mensajes = len(conv.mensajes) if hasattr(conv, 'mensajes') else 0
-                status["detalle_conversaciones"].append({
-                    "id": conv_id,
-                    "usuario_id": conv.usuario.id,
-                    "num_mensajes": num_mensajes,
-                    "fecha_inicio": str(conv.fecha_inicio),
-                    "fecha_fin": str(conv.fecha_fin) if conv.fecha_fin else None,
-                    "activa": conv_id in self.conversaciones_activas.values()
-                })
-            
+            with self._lock:
+                status = {
+                    "usuarios": len(self.usuarios),
+                    "conversaciones": len(self.conversaciones),
+                    "conversaciones_activas": len(self.conversaciones_activas),
+                    "memoria": self.get_stats(),
+                    "detalle_usuarios": [],
+                    "detalle_conversaciones": []
+                }
+
+                # Información de usuarios
+                for usuario_id, usuario in self.usuarios.items():
+                    status["detalle_usuarios"].append({
+                        "id": usuario_id,
+                        "datos": usuario.datos
+                    })
+
+                # Información de conversaciones
+                activas = set(self.conversaciones_activas.values())
+                for conv_id, conv in self.conversaciones.items():
+                    status["detalle_conversaciones"].append({
+                        "id": conv_id,
+                        "usuario_id": conv.usuario.id,
+                        "num_mensajes": conv.total_mensajes,
+                        "fecha_inicio": str(conv.fecha_inicio),
+                        "fecha_fin": str(conv.fecha_fin) if conv.fecha_fin else None,
+                        "activa": conv_id in activas
+                    })
+
             return status
         except Exception as e:
             logger.error(f"Error al generar reporte de estado: {e}", exc_info=True)
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
@@ -1,17 +1,376 @@
 import logging
-import uuid
 import json
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Any, Dict, Optional, List, Tuple
 
-from bot_siacasa.application.interfaces.repository_interface import IRepository
+from bot_siacasa.application.interfaces.repository_interface import IRepository, UnitOfWork
 from bot_siacasa.domain.entities.usuario import Usuario
 from bot_siacasa.domain.entities.conversacion import Conversacion
 from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.identifiers import new_id
 from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+from bot_siacasa.infrastructure.repositories.row_mapping import (
+    cargar_fecha,
+    cargar_json,
+    max_mensajes_historial,
+    mensaje_desde_fila,
+)
 
 logger = logging.getLogger(__name__)
 
+UPSERT_USUARIO_SQL = """
+    INSERT INTO usuarios (id, datos, fecha_creacion)
+    VALUES (%s, %s, CURRENT_TIMESTAMP)
+    ON CONFLICT (id) DO UPDATE SET
+        datos = EXCLUDED.datos,
+        fecha_actualizacion = CURRENT_TIMESTAMP
+"""
+
+# cantidad_mensajes no se sobrescribe: lo mantiene el upsert de mensajes. Una
+# conversación finalizada no se reabre aunque llegue un turno con una copia vieja.
+UPSERT_CONVERSACION_SQL = """
+    INSERT INTO conversaciones (
+        id, usuario_id, fecha_inicio, fecha_fin, 
+        cantidad_mensajes, metadata, prompt_template, prompt_version
+    ) VALUES (%s, %s, %s, %s, 0, %s, %s, %s)
+    ON CONFLICT (id) DO UPDATE SET
+        fecha_fin = COALESCE(conversaciones.fecha_fin, EXCLUDED.fecha_fin),
+        metadata = EXCLUDED.metadata,
+        prompt_template = COALESCE(EXCLUDED.prompt_template, conversaciones.prompt_template),
+        prompt_version = COALESCE(EXCLUDED.prompt_version, conversaciones.prompt_version)
+"""
+
+# Sesiones derivadas de cada conversación (mismo id) que se actualizan en el mismo
+# lote que el turno: chatbot_sessions alimenta el panel de administración y los
+# tickets; chat_sessions/chat_messages, las métricas.
+UPSERT_CHATBOT_SESSION_SQL = """
+    INSERT INTO chatbot_sessions (
+        id, user_id, bank_code, start_time, end_time,
+        message_count, last_activity_time, metadata
+    ) VALUES (
+        %s, %s, (SELECT code FROM banks WHERE code = %s), %s, %s,
+        (SELECT cantidad_mensajes FROM conversaciones WHERE id = %s), %s, %s
+    )
+    ON CONFLICT (id) DO UPDATE SET
+        bank_code = COALESCE(EXCLUDED.bank_code, chatbot_sessions.bank_code),
+        end_time = COALESCE(chatbot_sessions.end_time, EXCLUDED.end_time),
+        message_count = EXCLUDED.message_count,
+        last_activity_time = EXCLUDED.last_activity_time
+"""
+
+# total_messages y avg_response_time_ms no se tocan aquí: los actualiza la inserción
+# de chat_messages solo con los turnos realmente insertados
+UPSERT_CHAT_SESSION_SQL = """
+    INSERT INTO chat_sessions (
+        id, user_id, start_time, end_time, initial_sentiment, final_sentiment,
+        total_messages, escalation_required, avg_response_time_ms
+    ) VALUES (%s, %s, %s, %s, %s, %s, 0, %s, 0)
+    ON CONFLICT (id) DO UPDATE SET
+        end_time = COALESCE(chat_sessions.end_time, EXCLUDED.end_time),
+        final_sentiment = COALESCE(EXCLUDED.final_sentiment, chat_sessions.final_sentiment),
+        escalation_required = chat_sessions.escalation_required OR EXCLUDED.escalation_required
+"""
+
+CHAT_MESSAGE_COLUMNS = (
+    "id, session_id, user_message, bot_response, timestamp, sentiment, sentiment_confidence, "
+    "intent, intent_confidence, processing_time_ms, token_count, is_escalation_request, response_tone"
+)
+
+CHAT_MESSAGE_PLACEHOLDERS = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+
+
+def insert_chat_messages_sql(filas: int = 1) -> str:
+    """
+    Inserta los turnos en chat_messages; el id es el de la respuesta, así que
+    repetir el mismo turno no lo duplica. Con ON CONFLICT DO NOTHING, RETURNING
+    solo devuelve las filas insertadas: total_messages (turnos) y el promedio de
+    respuesta de chat_sessions se incrementan solo con ellas.
+    
+    Args:
+        filas: Número de filas en el VALUES
+    """
+    return f"""
+    WITH insertados AS (
+        INSERT INTO chat_messages ({CHAT_MESSAGE_COLUMNS})
+        VALUES {", ".join([CHAT_MESSAGE_PLACEHOLDERS] * filas)}
+        ON CONFLICT DO NOTHING
+        RETURNING session_id, processing_time_ms
+    ), nuevos AS (
+        SELECT session_id, COUNT(*) AS cantidad, SUM(COALESCE(processing_time_ms, 0)) AS tiempo_total
+        FROM insertados
+        GROUP BY session_id
+    )
+    UPDATE chat_sessions s
+    SET avg_response_time_ms = (
+            COALESCE(s.avg_response_time_ms, 0) * COALESCE(s.total_messages, 0) + nuevos.tiempo_total
+        ) / (COALESCE(s.total_messages, 0) + nuevos.cantidad),
+        total_messages = COALESCE(s.total_messages, 0) + nuevos.cantidad
+    FROM nuevos
+    WHERE s.id = nuevos.session_id
+    """
+
+
+MENSAJE_COLUMNS = (
+    "id, conversacion_id, role, content, timestamp, sentiment_score, processing_time_ms, "
+    "ai_processing_time_ms, sentiment, sentiment_confidence, intent, intent_confidence, "
+    "token_count, response_tone, metadata"
+)
+
+MENSAJE_PLACEHOLDERS = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"
+
+# mensajes está particionada por mes de timestamp: la clave única es (id, timestamp)
+# y el timestamp de un mensaje no cambia una vez insertado
+MENSAJE_CONFLICT_SQL = """
+    ON CONFLICT (id, timestamp) DO UPDATE SET
+        content = EXCLUDED.content,
+        sentiment_score = EXCLUDED.sentiment_score,
+        processing_time_ms = EXCLUDED.processing_time_ms,
+        ai_processing_time_ms = EXCLUDED.ai_processing_time_ms,
+        sentiment = EXCLUDED.sentiment,
+        sentiment_confidence = EXCLUDED.sentiment_confidence,
+        intent = EXCLUDED.intent,
+        intent_confidence = EXCLUDED.intent_confidence,
+        token_count = EXCLUDED.token_count,
+        response_tone = EXCLUDED.response_tone,
+        metadata = EXCLUDED.metadata
+"""
+
+
+
+def upsert_mensajes_sql(filas: int = 1) -> str:
+    """
+    Upsert de mensajes que incrementa cantidad_mensajes solo por las filas
+    realmente insertadas (xmax = 0), sin recontar la conversación.
+    
+    Args:
+        filas: Número de filas en el VALUES
+    """
+    return f"""
+    WITH upsert AS (
+        INSERT INTO mensajes ({MENSAJE_COLUMNS})
+        VALUES {", ".join([MENSAJE_PLACEHOLDERS] * filas)}
+        {MENSAJE_CONFLICT_SQL}
+        RETURNING conversacion_id, (xmax = 0) AS insertado
+    ), nuevos AS (
+        SELECT conversacion_id, COUNT(*) AS cantidad
+        FROM upsert
+        WHERE insertado
+        GROUP BY conversacion_id
+    )
+    UPDATE conversaciones c
+    SET cantidad_mensajes = c.cantidad_mensajes + nuevos.cantidad
+    FROM nuevos
+    WHERE c.id = nuevos.conversacion_id
+    """
+
+
+MENSAJE_SELECT_COLUMNS = """
+    id, role, content, timestamp, metadata,
+    sentiment, sentiment_score, sentiment_confidence,
+    intent, intent_confidence, token_count,
+    processing_time_ms, ai_processing_time_ms,
+    response_tone
+"""
+
+# Conversación + usuario + sus N mensajes más recientes en una sola sentencia.
+# LIMIT NULL equivale a sin límite (historial completo). La cota timestamp >=
+# fecha_inicio permite descartar en ejecución las particiones anteriores a la
+# conversación. El mensaje de sistema no se guarda en mensajes: el servicio lo
+# reconstruye a partir de prompt_template/prompt_version.
+HIDRATAR_CONVERSACION_SQL = """
+    SELECT
+        c.id, c.usuario_id, c.fecha_inicio, c.fecha_fin, c.cantidad_mensajes, c.metadata,
+        c.prompt_template, c.prompt_version,
+        u.datos AS usuario_datos,
+        COALESCE(m.mensajes, '[]'::json) AS mensajes
+    FROM conversaciones c
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(ultimos ORDER BY ultimos.timestamp ASC) AS mensajes
+        FROM (
+            SELECT """ + MENSAJE_SELECT_COLUMNS + """
+            FROM mensajes
+            WHERE conversacion_id = c.id
+                AND timestamp >= c.fecha_inicio
+            ORDER BY timestamp DESC
+            LIMIT %s
+        ) ultimos
+    ) m ON TRUE
+    WHERE {where}
+    ORDER BY c.fecha_inicio DESC
+    LIMIT 1
+"""
+
+# Carga por lotes: cabeceras de varias conversaciones y, en una segunda consulta,
+# los N mensajes más recientes de cada una (NULL = todos)
+CONVERSACIONES_LOTE_SQL = """
+    SELECT
+        c.id, c.usuario_id, c.fecha_inicio, c.fecha_fin, c.cantidad_mensajes, c.metadata,
+        c.prompt_template, c.prompt_version,
+        u.datos AS usuario_datos
+    FROM conversaciones c
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+    WHERE {where}
+    ORDER BY c.fecha_inicio DESC
+"""
+
+MENSAJES_LOTE_SQL = """
+    SELECT conversacion_id, """ + MENSAJE_SELECT_COLUMNS + """
+    FROM (
+        SELECT
+            conversacion_id, """ + MENSAJE_SELECT_COLUMNS + """,
+            row_number() OVER (PARTITION BY conversacion_id ORDER BY timestamp DESC) AS posicion
+        FROM mensajes
+        WHERE conversacion_id = ANY(%s::uuid[])
+            AND timestamp >= (SELECT MIN(fecha_inicio) FROM conversaciones WHERE id = ANY(%s::uuid[]))
+    ) recientes
+    WHERE %s::int IS NULL OR posicion <= %s::int
+    ORDER BY conversacion_id, timestamp ASC
+"""
+
+# Cierra la conversación y sus sesiones derivadas (mismo id) en un solo viaje
+FINALIZAR_CONVERSACION_SQL = """
+    UPDATE conversaciones SET fecha_fin = %s WHERE id = %s AND fecha_fin IS NULL;
+    UPDATE chatbot_sessions SET end_time = COALESCE(end_time, %s) WHERE id = %s;
+    UPDATE chat_sessions SET end_time = COALESCE(end_time, %s) WHERE id = %s
+"""
+
+# Rebalanceo de shards: usuarios con datos y borrado de lo ya copiado a otro shard
+LISTAR_IDS_USUARIOS_SQL = "SELECT id FROM usuarios UNION SELECT usuario_id FROM conversaciones"
+
+ELIMINAR_CONVERSACIONES_USUARIO_SQL = """
+    DELETE FROM mensajes WHERE conversacion_id = ANY(%s::uuid[]);
+    DELETE FROM conversaciones WHERE usuario_id = %s AND id = ANY(%s::uuid[]);
+    DELETE FROM usuarios u WHERE u.id = %s
+        AND NOT EXISTS (SELECT 1 FROM conversaciones c WHERE c.usuario_id = u.id)
+"""
+
+# Página de mensajes anteriores a un cursor (timestamp), de más reciente a más antiguo
+MENSAJES_ANTERIORES_SQL = """
+    SELECT """ + MENSAJE_SELECT_COLUMNS + """
+    FROM mensajes
+    WHERE conversacion_id = %s
+        AND timestamp >= (SELECT fecha_inicio FROM conversaciones WHERE id = %s)
+        AND (%s::timestamp IS NULL OR timestamp < %s::timestamp)
+    ORDER BY timestamp DESC
+    LIMIT %s
+"""
+
+
+def _conversacion_desde_fila(fila: Dict[str, Any]) -> Conversacion:
+    usuario = Usuario(id=fila['usuario_id'], datos=cargar_json(fila.get('usuario_datos'), {}))
+    conversacion = Conversacion(
+        id=fila['id'],
+        usuario=usuario,
+        fecha_inicio=cargar_fecha(fila['fecha_inicio']),
+        fecha_fin=cargar_fecha(fila['fecha_fin']),
+        metadata=cargar_json(fila.get('metadata'), {}),
+        prompt_template=fila.get('prompt_template'),
+        prompt_version=fila.get('prompt_version')
+    )
+    conversacion.mensajes = [mensaje_desde_fila(mensaje) for mensaje in cargar_json(fila.get('mensajes'), [])]
+    # cantidad_mensajes se mantiene de forma incremental en cada inserción
+    conversacion.total_mensajes = max(fila.get('cantidad_mensajes') or 0, len(conversacion.mensajes))
+    return conversacion
+
+
+def _usuario_params(usuario: Usuario) -> Tuple[Any, ...]:
+    return (usuario.id, json.dumps(usuario.datos))
+
+
+def _conversacion_params(conversacion: Conversacion) -> Tuple[Any, ...]:
+    return (
+        conversacion.id,
+        conversacion.usuario.id,
+        conversacion.fecha_inicio,
+        conversacion.fecha_fin,
+        json.dumps({"activa": conversacion.fecha_fin is None}),
+        conversacion.prompt_template,
+        conversacion.prompt_version
+    )
+
+
+def _mensaje_params(conversacion_id: str, mensaje: Mensaje) -> Tuple[Any, ...]:
+    metadata = getattr(mensaje, 'metadata', None) or {}
+    return (
+        mensaje.id,
+        conversacion_id,
+        mensaje.role,
+        mensaje.content,
+        getattr(mensaje, 'timestamp', None) or datetime.now(),
+        getattr(mensaje, 'sentiment_score', None),
+        getattr(mensaje, 'processing_time_ms', None),
+        getattr(mensaje, 'ai_processing_time_ms', None) or metadata.get('ai_processing_time_ms'),
+        getattr(mensaje, 'sentiment', None),
+        getattr(mensaje, 'sentiment_confidence', None),
+        getattr(mensaje, 'intent', None),
+        getattr(mensaje, 'intent_confidence', None),
+        getattr(mensaje, 'token_count', None),
+        getattr(mensaje, 'response_tone', None) or metadata.get('response_tone'),
+        json.dumps(metadata) if metadata else None
+    )
+
+
+def _turnos_por_conversacion(unidad: UnitOfWork) -> Dict[str, List[Tuple[Mensaje, Mensaje]]]:
+    """
+    Agrupa los mensajes de la unidad de trabajo en turnos (pregunta, respuesta)
+    por conversación, en el orden en que se registraron.
+    """
+    turnos: Dict[str, List[Tuple[Mensaje, Mensaje]]] = {}
+    preguntas: Dict[str, Mensaje] = {}
+    for conversacion_id, mensaje in unidad.mensajes.values():
+        if mensaje.role == "user":
+            preguntas[conversacion_id] = mensaje
+        elif mensaje.role == "assistant" and conversacion_id in preguntas:
+            turnos.setdefault(conversacion_id, []).append((preguntas.pop(conversacion_id), mensaje))
+    return turnos
+
+
+def _chatbot_session_params(conversacion: Conversacion, ultima_actividad: datetime) -> Tuple[Any, ...]:
+    metadata = getattr(conversacion, 'metadata', None) or {}
+    return (
+        conversacion.id,
+        conversacion.usuario.id,
+        metadata.get('bank_code') or 'default',
+        conversacion.fecha_inicio,
+        conversacion.fecha_fin,
+        conversacion.id,
+        ultima_actividad,
+        json.dumps({"source": metadata.get('source', 'web')})
+    )
+
+
+def _chat_session_params(conversacion: Conversacion, turnos: List[Tuple[Mensaje, Mensaje]]) -> Tuple[Any, ...]:
+    sentimientos = [pregunta.sentiment or 'neutral' for pregunta, _ in turnos]
+    return (
+        conversacion.id,
+        conversacion.usuario.id,
+        conversacion.fecha_inicio,
+        conversacion.fecha_fin,
+        sentimientos[0] if sentimientos else 'neutral',
+        sentimientos[-1] if sentimientos else None,
+        any(pregunta.is_escalation_request for pregunta, _ in turnos)
+    )
+
+
+def _chat_message_params(conversacion_id: str, pregunta: Mensaje, respuesta: Mensaje) -> Tuple[Any, ...]:
+    return (
+        respuesta.id,
+        conversacion_id,
+        pregunta.content,
+        respuesta.content,
+        respuesta.timestamp,
+        pregunta.sentiment or 'neutral',
+        pregunta.sentiment_confidence or 0.0,
+        pregunta.intent,
+        pregunta.intent_confidence or 0.0,
+        respuesta.processing_time_ms or pregunta.processing_time_ms or 0.0,
+        respuesta.token_count or 0,
+        pregunta.is_escalation_request,
+        respuesta.response_tone
+    )
+
+
 class PostgreSQLRepository(IRepository):
     """
     ✅ IMPLEMENTACIÓN REAL para PostgreSQL/NeonDB.
@@ -36,31 +395,10 @@ class PostgreSQLRepository(IRepository):
             usuario: Usuario a guardar
         """
         try:
-            # Verificar si el usuario ya existe
-            existing = self.db.fetch_one("""
-                SELECT id FROM usuarios WHERE id = %s
-            """, (usuario.id,))
+            # Un solo upsert: crea el usuario o actualiza sus datos
+            self.db.execute(UPSERT_USUARIO_SQL, _usuario_params(usuario))
+            logger.debug(f"Usuario guardado en PostgreSQL: {usuario.id}")
             
-            if existing:
-                # Actualizar usuario existente
-                self.db.execute("""
-                    UPDATE usuarios SET 
-                        datos = %s,
-                        fecha_actualizacion = CURRENT_TIMESTAMP
-                    WHERE id = %s
-                """, (json.dumps(usuario.datos), usuario.id))
-                logger.debug(f"Usuario actualizado: {usuario.id}")
-            else:
-                # Crear nuevo usuario
-                self.db.execute("""
-                    INSERT INTO usuarios (id, datos, fecha_creacion)
-                    VALUES (%s, %s, CURRENT_TIMESTAMP)
-                    ON CONFLICT (id) DO UPDATE SET
-                        datos = EXCLUDED.datos,
-                        fecha_actualizacion = CURRENT_TIMESTAMP
-                """, (usuario.id, json.dumps(usuario.datos)))
-                logger.info(f"✅ Usuario guardado en PostgreSQL: {usuario.id}")
-                
         except Exception as e:
             logger.error(f"❌ Error guardando usuario {usuario.id}: {e}", exc_info=True)
             raise
@@ -103,31 +441,18 @@ class PostgreSQLRepository(IRepository):
         """
         try:
             # 1. Guardar/actualizar la conversación
-            self.db.execute("""
-                INSERT INTO conversaciones (
-                    id, usuario_id, fecha_inicio, fecha_fin, 
-                    cantidad_mensajes, metadata
-                ) VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE SET
-                    fecha_fin = EXCLUDED.fecha_fin,
-                    cantidad_mensajes = EXCLUDED.cantidad_mensajes,
-                    metadata = EXCLUDED.metadata
-            """, (
-                conversacion.id,
-                conversacion.usuario.id,
-                conversacion.fecha_inicio,
-                conversacion.fecha_fin,
-                len(conversacion.mensajes),
-                json.dumps({"activa": conversacion.fecha_fin is None})
-            ))
+            self.db.execute(UPSERT_CONVERSACION_SQL, _conversacion_params(conversacion))
             
             # 2. ✅ NO borramos mensajes existentes
-            # Solo guardamos mensajes que no tengan ID (nuevos)
+            # Solo guardamos mensajes que no tengan ID (nuevos); el de sistema se
+            # referencia por plantilla y versión, no se copia
             if hasattr(conversacion, 'mensajes') and conversacion.mensajes:
                 for mensaje in conversacion.mensajes:
                     # Solo guardar mensajes sin ID (nuevos)
+                    if mensaje.role == "system":
+                        continue
                     if not hasattr(mensaje, 'id') or not mensaje.id:
-                        mensaje.id = str(uuid.uuid4())
+                        mensaje.id = new_id()
                         self._guardar_mensaje(conversacion.id, mensaje)
             
             logger.info(f"✅ Conversación actualizada en PostgreSQL: {conversacion.id}")
@@ -154,69 +479,11 @@ class PostgreSQLRepository(IRepository):
         try:
             # Asegurar que el mensaje tenga ID
             if not hasattr(mensaje, 'id') or not mensaje.id:
-                mensaje.id = str(uuid.uuid4())
+                mensaje.id = new_id()
             
-            # Extraer metadata si existe
-            metadata = getattr(mensaje, 'metadata', {})
-            
-            # UPSERT con TODOS los campos de análisis
-            self.db.execute("""
-                INSERT INTO mensajes (
-                    id, 
-                    conversacion_id, 
-                    role, 
-                    content, 
-                    timestamp, 
-                    sentiment_score, 
-                    processing_time_ms,
-                    ai_processing_time_ms,
-                    sentiment,
-                    sentiment_confidence,
-                    intent,
-                    intent_confidence,
-                    token_count,
-                    response_tone,
-                    metadata
-                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                ON CONFLICT (id) DO UPDATE SET
-                    content = EXCLUDED.content,
-                    timestamp = EXCLUDED.timestamp,
-                    sentiment_score = EXCLUDED.sentiment_score,
-                    processing_time_ms = EXCLUDED.processing_time_ms,
-                    ai_processing_time_ms = EXCLUDED.ai_processing_time_ms,
-                    sentiment = EXCLUDED.sentiment,
-                    sentiment_confidence = EXCLUDED.sentiment_confidence,
-                    intent = EXCLUDED.intent,
-                    intent_confidence = EXCLUDED.intent_confidence,
-                    token_count = EXCLUDED.token_count,
-                    response_tone = EXCLUDED.response_tone,
-                    metadata = EXCLUDED.metadata
-            """, (
-                mensaje.id,
-                conversacion_id,
-                mensaje.role,
-                mensaje.content,
-                getattr(mensaje, 'timestamp', datetime.now()),
-                getattr(mensaje, 'sentiment_score', None),
-                getattr(mensaje, 'processing_time_ms', None),
-                getattr(mensaje, 'ai_processing_time_ms', metadata.get('ai_processing_time_ms')),
-                getattr(mensaje, 'sentiment', None),
-                getattr(mensaje, 'sentiment_confidence', None),
-                getattr(mensaje, 'intent', None),
-                getattr(mensaje, 'intent_confidence', None),
-                getattr(mensaje, 'token_count', None),
-                getattr(mensaje, 'response_tone', metadata.get('response_tone')),
-                json.dumps(metadata) if metadata else None
-            ))
-            
-            # Actualizar contador de mensajes si es un nuevo mensaje
-            self.db.execute("""
-                UPDATE conversaciones 
-                SET cantidad_mensajes = (
-                    SELECT COUNT(*) FROM mensajes WHERE conversacion_id = %s
-                )
-                WHERE id = %s
-            """, (conversacion_id, conversacion_id))
+            # UPSERT con TODOS los campos de análisis; el contador de la conversación
+            # se incrementa en la misma sentencia solo si el mensaje es nuevo
+            self.db.execute(upsert_mensajes_sql(), _mensaje_params(conversacion_id, mensaje), prepared=True)
             
             logger.debug(f"✅ Mensaje guardado con análisis completo: {mensaje.id}")
             
@@ -237,152 +504,328 @@ class PostgreSQLRepository(IRepository):
             logger.error(f"❌ Error guardando mensaje individual: {e}", exc_info=True)
             raise
     
-    def obtener_conversacion(self, conversacion_id: str) -> Optional[Conversacion]:
+    def aplicar_unidad_de_trabajo(self, unidad: UnitOfWork) -> None:
+        """
+        Persiste un turno completo en una sola transacción y un solo viaje: todas las
+        sentencias se envían juntas en autocommit, por lo que PostgreSQL las ejecuta
+        como una transacción implícita (o se aplican todas o ninguna). Es la única
+        vía de escritura por turno: también actualiza chatbot_sessions, chat_sessions
+        y chat_messages a partir de la conversación y sus mensajes.
+        
+        Args:
+            unidad: Unidad de trabajo con usuarios, conversaciones y mensajes
+        """
+        statements: List[Tuple[str, Tuple[Any, ...]]] = []
+        
+        for usuario in unidad.usuarios.values():
+            statements.append((UPSERT_USUARIO_SQL, _usuario_params(usuario)))
+        
+        for conversacion in unidad.conversaciones.values():
+            statements.append((UPSERT_CONVERSACION_SQL, _conversacion_params(conversacion)))
+        
+        if unidad.mensajes:
+            filas = [_mensaje_params(conversacion_id, mensaje) for conversacion_id, mensaje in unidad.mensajes.values()]
+            statements.append((upsert_mensajes_sql(len(filas)), tuple(value for fila in filas for value in fila)))
+        
+        # Sesiones del panel y de métricas: se derivan del mismo turno y viajan en el
+        # mismo lote (después de los mensajes, para leer el contador ya actualizado).
+        # Una copia de datos existentes (rebalanceo de shards) no las deriva.
+        if unidad.derivar_sesiones:
+            turnos = _turnos_por_conversacion(unidad)
+            ahora = datetime.now()
+            for conversacion in unidad.conversaciones.values():
+                turnos_conversacion = turnos.get(conversacion.id, [])
+                statements.append((UPSERT_CHATBOT_SESSION_SQL, _chatbot_session_params(conversacion, ahora)))
+                statements.append((UPSERT_CHAT_SESSION_SQL, _chat_session_params(conversacion, turnos_conversacion)))
+                if turnos_conversacion:
+                    filas = [
+                        _chat_message_params(conversacion.id, pregunta, respuesta)
+                        for pregunta, respuesta in turnos_conversacion
+                    ]
+                    statements.append((
+                        insert_chat_messages_sql(len(filas)),
+                        tuple(value for fila in filas for value in fila)
+                    ))
+        
+        try:
+            with self.db.autocommit() as cursor:
+                batch = b";\n".join(cursor.mogrify(query, params) for query, params in statements)
+                cursor.execute(batch)
+            
+            logger.debug(
+                f"Turno persistido: {len(unidad.usuarios)} usuarios, {len(unidad.conversaciones)} "
+                f"conversaciones, {len(unidad.mensajes)} mensajes"
+            )
+        except Exception as e:
+            logger.error(f"❌ Error persistiendo unidad de trabajo: {e}", exc_info=True)
+            raise
+    
+    def _hidratar_conversacion(self, where: str, valor: str, max_mensajes: Optional[int]) -> Optional[Conversacion]:
+        """
+        Carga la conversación con su ventana de mensajes recientes y le asigna el
+        cargador que pagina los mensajes anteriores bajo demanda.
         """
-        Obtiene una conversación de PostgreSQL con TODOS los campos de los mensajes.
+        fila = self.db.fetch_one(
+            HIDRATAR_CONVERSACION_SQL.format(where=where),
+            (max_mensajes or max_mensajes_historial(), valor),
+            prepared=True
+        )
+        if not fila:
+            return None
+        
+        conversacion = _conversacion_desde_fila(fila)
+        conversacion.cargador_mensajes = (
+            lambda antes_de, limite, conversacion_id=conversacion.id:
+                self.obtener_mensajes_anteriores(conversacion_id, antes_de, limite)
+        )
+        return conversacion
+    
+    def obtener_conversacion(
+        self,
+        conversacion_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> Optional[Conversacion]:
+        """
+        Obtiene una conversación de PostgreSQL con su ventana de mensajes recientes
+        en una sola consulta (conversación, usuario y mensajes). Los mensajes
+        anteriores se cargan con `Conversacion.obtener_mensajes_anteriores`.
         
         Args:
             conversacion_id: ID de la conversación
+            max_mensajes: Mensajes recientes a cargar (por defecto
+                CONVERSATION_CONFIG['max_messages_in_history'])
             
         Returns:
             Conversación o None si no existe
         """
         try:
-            # Obtener conversación
-            conv_data = self.db.fetch_one("""
-                SELECT 
-                    id, usuario_id, fecha_inicio, fecha_fin, 
-                    cantidad_mensajes, metadata
-                FROM conversaciones 
-                WHERE id = %s
-            """, (conversacion_id,))
-            
-            if not conv_data:
-                return None
-            
-            # Obtener usuario
-            usuario = self.obtener_usuario(conv_data['usuario_id'])
-            if not usuario:
-                # Crear usuario básico si no existe
-                usuario = Usuario(id=conv_data['usuario_id'])
-            
-            # Crear conversación
-            conversacion = Conversacion(
-                id=conv_data['id'],
-                usuario=usuario,
-                fecha_inicio=conv_data['fecha_inicio'],
-                fecha_fin=conv_data['fecha_fin']
-            )
-            
-            # ✅ Cargar mensajes con TODOS los campos
-            mensajes_data = self.db.fetch_all("""
-                SELECT 
-                    id, role, content, timestamp, metadata,
-                    sentiment, sentiment_score, sentiment_confidence,
-                    intent, intent_confidence, token_count,
-                    processing_time_ms, ai_processing_time_ms,
-                    response_tone
-                FROM mensajes 
-                WHERE conversacion_id = %s 
-                ORDER BY timestamp ASC
-            """, (conversacion_id,))
-            
-            for msg_data in mensajes_data:
-                mensaje = Mensaje(
-                    role=msg_data['role'],
-                    content=msg_data['content'],
-                    timestamp=msg_data['timestamp']
+            conversacion = self._hidratar_conversacion("c.id = %s", conversacion_id, max_mensajes)
+            if conversacion:
+                logger.debug(
+                    f"Conversación cargada: {conversacion_id} con {len(conversacion.mensajes)} "
+                    f"de {conversacion.total_mensajes} mensajes"
                 )
-                mensaje.id = msg_data['id']
-                
-                # Cargar todos los campos adicionales
-                mensaje.sentiment = msg_data.get('sentiment')
-                mensaje.sentiment_score = msg_data.get('sentiment_score')
-                mensaje.sentiment_confidence = msg_data.get('sentiment_confidence')
-                mensaje.intent = msg_data.get('intent')
-                mensaje.intent_confidence = msg_data.get('intent_confidence')
-                mensaje.token_count = msg_data.get('token_count')
-                mensaje.processing_time_ms = msg_data.get('processing_time_ms')
-                mensaje.ai_processing_time_ms = msg_data.get('ai_processing_time_ms')
-                mensaje.response_tone = msg_data.get('response_tone')
-                
-                # Cargar metadata
-                if msg_data.get('metadata'):
-                    try:
-                        mensaje.metadata = json.loads(msg_data['metadata'])
-                    except:
-                        mensaje.metadata = {}
-                
-                conversacion.mensajes.append(mensaje)
-            
-            logger.debug(f"Conversación cargada: {conversacion_id} con {len(conversacion.mensajes)} mensajes")
             return conversacion
             
         except Exception as e:
             logger.error(f"Error obteniendo conversación {conversacion_id}: {e}")
             return None
     
-    def obtener_conversacion_activa(self, usuario_id: str) -> Optional[Conversacion]:
+    def obtener_conversacion_activa(
+        self,
+        usuario_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> Optional[Conversacion]:
         """
-        ✅ CRÍTICO: Obtiene conversación activa de PostgreSQL.
+        ✅ CRÍTICO: Obtiene conversación activa de PostgreSQL con sus mensajes más
+        recientes en un solo viaje a la base de datos.
         
         Args:
             usuario_id: ID del usuario
+            max_mensajes: Mensajes recientes a cargar (por defecto
+                CONVERSATION_CONFIG['max_messages_in_history'])
             
         Returns:
             Conversación activa o None si no existe
         """
         try:
-            # Buscar conversación activa (sin fecha_fin)
-            conv_data = self.db.fetch_one("""
-                SELECT id
-                FROM conversaciones 
-                WHERE usuario_id = %s 
-                    AND fecha_fin IS NULL 
-                ORDER BY fecha_inicio DESC 
-                LIMIT 1
-            """, (usuario_id,))
-            
-            if conv_data:
-                return self.obtener_conversacion(conv_data['id'])
-            else:
+            conversacion = self._hidratar_conversacion(
+                "c.usuario_id = %s AND c.fecha_fin IS NULL", usuario_id, max_mensajes
+            )
+            if not conversacion:
                 logger.debug(f"No hay conversación activa para usuario: {usuario_id}")
-                return None
+            return conversacion
                 
         except Exception as e:
             logger.error(f"Error obteniendo conversación activa para {usuario_id}: {e}")
             return None
     
-    def obtener_conversaciones_usuario(self, usuario_id: str) -> List[Conversacion]:
+    def obtener_mensajes_anteriores(
+        self,
+        conversacion_id: str,
+        antes_de: Optional[datetime] = None,
+        limite: int = 20
+    ) -> List[Mensaje]:
         """
-        Obtiene todas las conversaciones de un usuario.
+        Obtiene una página de mensajes anteriores a `antes_de` usando el índice
+        (conversacion_id, timestamp).
         
         Args:
-            usuario_id: ID del usuario
+            conversacion_id: ID de la conversación
+            antes_de: Cursor; solo mensajes anteriores a esta fecha (None = los más recientes)
+            limite: Número máximo de mensajes
             
         Returns:
-            Lista de conversaciones
+            Mensajes en orden cronológico
         """
         try:
-            conv_ids = self.db.fetch_all("""
-                SELECT id
-                FROM conversaciones 
-                WHERE usuario_id = %s 
-                ORDER BY fecha_inicio DESC
-            """, (usuario_id,))
+            filas = self.db.fetch_all(
+                MENSAJES_ANTERIORES_SQL,
+                (conversacion_id, conversacion_id, antes_de, antes_de, limite),
+                prepared=True
+            )
+            return [mensaje_desde_fila(fila) for fila in reversed(filas)]
+            
+        except Exception as e:
+            logger.error(f"Error obteniendo mensajes anteriores de {conversacion_id}: {e}")
+            return []
+    
+    def _cargar_conversaciones(
+        self,
+        where: str,
+        valor: Any,
+        max_mensajes: Optional[int],
+        preparada: bool = True
+    ) -> List[Conversacion]:
+        """
+        Carga varias conversaciones con dos consultas: las cabeceras y, después,
+        los mensajes de todas ellas.
+        
+        Las consultas con listas de IDs (ANY(%s::uuid[])) no se preparan: PREPARE
+        tipa el parámetro como uuid[] y psycopg2 envía la lista de str como text[],
+        que EXECUTE no puede convertir. Sin preparar, el cast se aplica al literal.
+        """
+        filas = self.db.fetch_all(CONVERSACIONES_LOTE_SQL.format(where=where), (valor,), prepared=preparada)
+        if not filas:
+            return []
+        
+        conversaciones = []
+        por_id = {}
+        for fila in filas:
+            conversacion = _conversacion_desde_fila(fila)
+            conversacion.cargador_mensajes = (
+                lambda antes_de, limite, conversacion_id=conversacion.id:
+                    self.obtener_mensajes_anteriores(conversacion_id, antes_de, limite)
+            )
+            conversaciones.append(conversacion)
+            por_id[conversacion.id] = conversacion
+        
+        mensajes_data = self.db.fetch_all(
+            MENSAJES_LOTE_SQL,
+            (list(por_id), list(por_id), max_mensajes, max_mensajes),
+            prepared=False
+        )
+        for mensaje_data in mensajes_data:
+            por_id[mensaje_data['conversacion_id']].mensajes.append(mensaje_desde_fila(mensaje_data))
+        
+        for conversacion in conversaciones:
+            conversacion.total_mensajes = max(conversacion.total_mensajes, len(conversacion.mensajes))
+        return conversaciones
+    
+    def obtener_conversaciones(
+        self,
+        conversacion_ids: List[str],
+        max_mensajes: Optional[int] = None
+    ) -> List[Conversacion]:
+        """
+        Obtiene varias conversaciones en dos consultas (cabeceras y mensajes),
+        independientemente de cuántas sean. Pensado para vistas de historial y analítica.
+        
+        Args:
+            conversacion_ids: IDs de las conversaciones
+            max_mensajes: Mensajes más recientes a cargar por conversación (None = todos)
             
-            conversaciones = []
-            for conv_data in conv_ids:
-                conv = self.obtener_conversacion(conv_data['id'])
-                if conv:
-                    conversaciones.append(conv)
+        Returns:
+            Conversaciones encontradas, de la más reciente a la más antigua
+        """
+        if not conversacion_ids:
+            return []
+        
+        try:
+            conversaciones = self._cargar_conversaciones(
+                "c.id = ANY(%s::uuid[])", list(conversacion_ids), max_mensajes, preparada=False
+            )
+            logger.debug(f"Obtenidas {len(conversaciones)} de {len(conversacion_ids)} conversaciones por lote")
+            return conversaciones
             
+        except Exception as e:
+            logger.error(f"Error obteniendo conversaciones por lote: {e}")
+            return []
+    
+    def obtener_conversaciones_usuario(
+        self,
+        usuario_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> List[Conversacion]:
+        """
+        Obtiene todas las conversaciones de un usuario en dos consultas.
+        
+        Args:
+            usuario_id: ID del usuario
+            max_mensajes: Mensajes más recientes a cargar por conversación (None = todos)
+            
+        Returns:
+            Lista de conversaciones
+        """
+        try:
+            conversaciones = self._cargar_conversaciones("c.usuario_id = %s", usuario_id, max_mensajes)
             logger.debug(f"Obtenidas {len(conversaciones)} conversaciones para {usuario_id}")
             return conversaciones
             
         except Exception as e:
             logger.error(f"Error obteniendo conversaciones para {usuario_id}: {e}")
             return []
+
+    def exportar_conversaciones_usuario(self, usuario_id: str) -> List[Conversacion]:
+        """
+        Obtiene todas las conversaciones de un usuario con todos sus mensajes,
+        propagando los errores (rebalanceo de shards).
+
+        Args:
+            usuario_id: ID del usuario
+
+        Returns:
+            Lista de conversaciones completas
+        """
+        return self._cargar_conversaciones("c.usuario_id = %s", usuario_id, None)
+
+    def finalizar_conversacion(self, conversacion_id: str) -> None:
+        """
+        Finaliza una conversación (fecha_fin) y cierra sus sesiones de
+        chatbot_sessions y chat_sessions en un solo viaje a la base de datos.
+
+        Args:
+            conversacion_id: ID de la conversación
+        """
+        ahora = datetime.now()
+        try:
+            self.db.execute(
+                FINALIZAR_CONVERSACION_SQL,
+                (ahora, conversacion_id, ahora, conversacion_id, ahora, conversacion_id)
+            )
+            logger.info(f"✅ Conversación finalizada en PostgreSQL: {conversacion_id}")
+        except Exception as e:
+            logger.error(f"❌ Error finalizando conversación {conversacion_id}: {e}", exc_info=True)
+            raise
+
+    def listar_ids_usuarios(self) -> List[str]:
+        """
+        IDs de los usuarios con datos en esta base (rebalanceo de shards).
+        
+        Returns:
+            Lista de IDs de usuario
+        """
+        return [fila['id'] for fila in self.db.fetch_all(LISTAR_IDS_USUARIOS_SQL)]
+    
+    def eliminar_conversaciones_usuario(self, usuario_id: str, conversacion_ids: List[str]) -> None:
+        """
+        Elimina en un solo viaje las conversaciones indicadas con sus mensajes, y el
+        usuario si ya no le quedan conversaciones. Las sesiones del panel y de
+        métricas (y sus tickets) se conservan como histórico.
+        
+        Args:
+            usuario_id: ID del usuario
+            conversacion_ids: Conversaciones a eliminar
+        """
+        try:
+            self.db.execute(
+                ELIMINAR_CONVERSACIONES_USUARIO_SQL,
+                (list(conversacion_ids), usuario_id, list(conversacion_ids), usuario_id)
+            )
+            logger.info(f"Eliminadas {len(conversacion_ids)} conversaciones de {usuario_id}")
+        except Exception as e:
+            logger.error(f"❌ Error eliminando conversaciones de {usuario_id}: {e}", exc_info=True)
+            raise
     
     def obtener_historial_limitado(self, usuario_id: str, limit: int = 20) -> List[Dict[str, str]]:
         """
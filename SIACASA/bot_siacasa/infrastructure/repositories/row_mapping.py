@@ -0,0 +1,61 @@
+# bot_siacasa/infrastructure/repositories/row_mapping.py
+"""
+Conversión de filas de la base de datos a entidades del dominio, compartida por
+los repositorios de PostgreSQL y SQLite (mismo modelo de tablas).
+"""
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from bot_siacasa.domain.entities.mensaje import Mensaje
+
+
+def max_mensajes_historial() -> int:
+    """Mensajes recientes a cargar por defecto (CONVERSATION_CONFIG)."""
+    try:
+        from bot_siacasa.config.config import OptimizedConfig
+        return int(OptimizedConfig.CONVERSATION_CONFIG.get("max_messages_in_history", 15))
+    except Exception:
+        return 15
+
+
+def cargar_json(valor: Any, default: Any) -> Any:
+    """Acepta JSON ya decodificado (JSONB) o texto JSON."""
+    if valor is None or valor == "":
+        return default
+    if isinstance(valor, (dict, list)):
+        return valor
+    try:
+        return json.loads(valor)
+    except (TypeError, ValueError):
+        return default
+
+
+def cargar_fecha(valor: Any) -> Optional[datetime]:
+    """Acepta datetime o texto ISO (fechas dentro de json_agg)."""
+    if valor is None or isinstance(valor, datetime):
+        return valor
+    return datetime.fromisoformat(valor)
+
+
+def mensaje_desde_fila(fila: Dict[str, Any]) -> Mensaje:
+    """Construye un Mensaje con todos sus campos a partir de una fila de mensajes."""
+    mensaje = Mensaje(
+        role=fila['role'],
+        content=fila['content'],
+        timestamp=cargar_fecha(fila.get('timestamp'))
+    )
+    mensaje.id = fila['id']
+    
+    # Cargar todos los campos adicionales
+    mensaje.sentiment = fila.get('sentiment')
+    mensaje.sentiment_score = fila.get('sentiment_score')
+    mensaje.sentiment_confidence = fila.get('sentiment_confidence')
+    mensaje.intent = fila.get('intent')
+    mensaje.intent_confidence = fila.get('intent_confidence')
+    mensaje.token_count = fila.get('token_count')
+    mensaje.processing_time_ms = fila.get('processing_time_ms')
+    mensaje.ai_processing_time_ms = fila.get('ai_processing_time_ms')
+    mensaje.response_tone = fila.get('response_tone')
+    mensaje.metadata = cargar_json(fila.get('metadata'), {})
+    return mensaje
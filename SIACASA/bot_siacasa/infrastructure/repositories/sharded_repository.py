@@ -0,0 +1,511 @@
+# bot_siacasa/infrastructure/repositories/sharded_repository.py
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, TypeVar
+
+from bot_siacasa.application.interfaces.repository_interface import IRepository, UnitOfWork
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.infrastructure.hash_ring import ConsistentHashRing, parse_node_targets
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_SHARDING_CONFIG = {
+    "virtual_nodes": 128,
+    "fan_out_workers": 8,
+    "directory_size": 50000
+}
+
+
+def parse_shard_targets(valor: str) -> Dict[str, str]:
+    """
+    Interpreta la lista de shards "nombre=destino,nombre=destino". Las entradas sin
+    nombre reciben "shard<posición>".
+
+    Args:
+        valor: Lista separada por comas (p. ej. SHARD_TARGETS)
+
+    Returns:
+        Destino por nombre de shard, en el orden indicado
+    """
+    return parse_node_targets(valor, prefijo="shard")
+
+
+def _mensajes_persistidos(conversacion: Conversacion) -> int:
+    # El mensaje de sistema no se persiste (ver UnitOfWork.registrar_mensaje)
+    return sum(1 for mensaje in conversacion.mensajes if mensaje.role != "system")
+
+
+class ShardedRepository(IRepository):
+    """
+    Repositorio particionado horizontalmente por usuario: los datos de cada usuario
+    (usuario, conversaciones y mensajes) viven en uno de N repositorios, elegido por
+    hash consistente de `usuario_id`.
+
+    Las operaciones por usuario van a un único shard. Las que solo reciben un
+    `conversacion_id` usan un directorio en memoria (conversación -> shard) que se
+    llena al guardar y cargar; si no lo conocen, consultan todos los shards. La
+    consulta a todos los shards (`fan_out`) se reserva para analítica y
+    administración.
+
+    Agregar un shard solo cambia el reparto: los datos de los usuarios que pasan
+    al shard nuevo siguen en su shard anterior hasta ejecutar `rebalancear()`
+    (scripts/rebalance_shards.py), que los copia y luego los borra del anterior.
+    Mientras tanto, con `shards_anteriores` (SHARD_PREVIOUS) las lecturas por
+    usuario que no encuentran nada en el shard nuevo consultan el dueño según el
+    anillo anterior. Procedimiento: desplegar SHARD_TARGETS con el shard nuevo y
+    SHARD_PREVIOUS con la lista anterior en todos los workers, ejecutar el
+    rebalanceo y quitar SHARD_PREVIOUS. Las sesiones del panel y de métricas
+    (chatbot_sessions, chat_sessions y sus tickets) no se mueven: quedan como
+    histórico en el shard anterior y el panel las ve por fan-out.
+    """
+
+    def __init__(
+        self,
+        shards: Dict[str, IRepository],
+        virtual_nodes: Optional[int] = None,
+        fan_out_workers: Optional[int] = None,
+        directory_size: Optional[int] = None,
+        shards_anteriores: Optional[Sequence[str]] = None
+    ):
+        """
+        Args:
+            shards: Repositorios por nombre de shard. El nombre (no el orden)
+                determina el reparto: debe mantenerse estable entre despliegues.
+            virtual_nodes: Posiciones en el anillo por shard
+            fan_out_workers: Hilos para consultar varios shards en paralelo
+            directory_size: Máximo de conversaciones en el directorio conversación -> shard
+            shards_anteriores: Shards del reparto anterior mientras no termina el
+                rebalanceo (las lecturas por usuario también los consultan)
+
+        Los valores no indicados se toman de OptimizedConfig.SHARDING_CONFIG.
+        """
+        if not shards:
+            raise ValueError("Se requiere al menos un shard")
+
+        config = {**DEFAULT_SHARDING_CONFIG, **self._load_config()}
+        self.shards: Dict[str, IRepository] = dict(shards)
+        self.virtual_nodes = virtual_nodes or config["virtual_nodes"]
+        self.ring = ConsistentHashRing(self.shards, self.virtual_nodes)
+        # Reparto previo a agregar shards, hasta que rebalancear() mueve los datos
+        self.ring_anterior: Optional[ConsistentHashRing] = None
+        if shards_anteriores and set(shards_anteriores) != set(self.shards):
+            desconocidos = set(shards_anteriores) - set(self.shards)
+            if desconocidos:
+                raise ValueError(f"Shards anteriores sin repositorio: {', '.join(sorted(desconocidos))}")
+            self.ring_anterior = ConsistentHashRing(list(shards_anteriores), self.virtual_nodes)
+        self.directory_size = directory_size or config["directory_size"]
+
+        self._directorio: "OrderedDict[str, str]" = OrderedDict()  # conversacion_id -> shard
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=min(len(self.shards), fan_out_workers or config["fan_out_workers"]),
+            thread_name_prefix="shard-fan-out"
+        )
+        self.fan_outs = 0
+        self.directory_misses = 0
+        self.lecturas_anillo_anterior = 0
+
+        logger.info(f"Repositorio particionado inicializado con {len(self.shards)} shards: {', '.join(self.shards)}")
+
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            return dict(getattr(OptimizedConfig, "SHARDING_CONFIG", {}))
+        except Exception:
+            return {}
+
+    # --- Enrutamiento ---
+
+    def shard_para_usuario(self, usuario_id: str) -> str:
+        """
+        Nombre del shard que guarda los datos de un usuario.
+        """
+        return self.ring.get_node(usuario_id)
+
+    def _repositorio_usuario(self, usuario_id: str) -> IRepository:
+        return self.shards[self.shard_para_usuario(usuario_id)]
+
+    def _shard_anterior(self, usuario_id: str) -> Optional[str]:
+        """
+        Shard que tenía al usuario antes del último cambio de reparto, si es otro
+        y el rebalanceo no ha terminado.
+        """
+        ring_anterior = self.ring_anterior
+        if ring_anterior is None:
+            return None
+        shard = ring_anterior.get_node(usuario_id)
+        if shard == self.shard_para_usuario(usuario_id):
+            return None
+        with self._lock:
+            self.lecturas_anillo_anterior += 1
+        return shard
+
+    def _recordar(self, conversacion: Optional[Conversacion], shard: str) -> Optional[Conversacion]:
+        if conversacion is not None:
+            with self._lock:
+                self._directorio[conversacion.id] = shard
+                self._directorio.move_to_end(conversacion.id)
+                while len(self._directorio) > self.directory_size:
+                    self._directorio.popitem(last=False)
+        return conversacion
+
+    def _shard_conocido(self, conversacion_id: str) -> Optional[str]:
+        with self._lock:
+            shard = self._directorio.get(conversacion_id)
+            if shard is None:
+                self.directory_misses += 1
+            return shard
+
+    def fan_out(self, operacion: Callable[[IRepository], T]) -> Dict[str, T]:
+        """
+        Ejecuta una operación en todos los shards en paralelo (analítica y
+        administración; las rutas de chat no deben usarlo).
+
+        Args:
+            operacion: Función que recibe el repositorio de un shard
+
+        Returns:
+            Resultado por nombre de shard
+        """
+        self.fan_outs += 1
+        futuros = {nombre: self._executor.submit(operacion, repo) for nombre, repo in self.shards.items()}
+        return {nombre: futuro.result() for nombre, futuro in futuros.items()}
+
+    # --- Operaciones por usuario ---
+
+    def guardar_usuario(self, usuario: Usuario) -> None:
+        self._repositorio_usuario(usuario.id).guardar_usuario(usuario)
+
+    def obtener_usuario(self, usuario_id: str) -> Optional[Usuario]:
+        usuario = self._repositorio_usuario(usuario_id).obtener_usuario(usuario_id)
+        if usuario is None:
+            anterior = self._shard_anterior(usuario_id)
+            if anterior is not None:
+                return self.shards[anterior].obtener_usuario(usuario_id)
+        return usuario
+
+    def guardar_conversacion(self, conversacion: Conversacion) -> None:
+        shard = self.shard_para_usuario(conversacion.usuario.id)
+        self.shards[shard].guardar_conversacion(conversacion)
+        self._recordar(conversacion, shard)
+
+    def obtener_conversacion_activa(self, usuario_id: str) -> Optional[Conversacion]:
+        shard = self.shard_para_usuario(usuario_id)
+        conversacion = self.shards[shard].obtener_conversacion_activa(usuario_id)
+        if conversacion is None:
+            anterior = self._shard_anterior(usuario_id)
+            if anterior is not None:
+                # Los turnos siguientes se guardan ya en el shard nuevo
+                return self._recordar(self.shards[anterior].obtener_conversacion_activa(usuario_id), anterior)
+        return self._recordar(conversacion, shard)
+
+    def obtener_conversaciones_usuario(
+        self,
+        usuario_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> List[Conversacion]:
+        shard = self.shard_para_usuario(usuario_id)
+        conversaciones = self.shards[shard].obtener_conversaciones_usuario(usuario_id, max_mensajes)
+        for conversacion in conversaciones:
+            self._recordar(conversacion, shard)
+
+        anterior = self._shard_anterior(usuario_id)
+        if anterior is not None:
+            ids = {conversacion.id for conversacion in conversaciones}
+            for conversacion in self.shards[anterior].obtener_conversaciones_usuario(usuario_id, max_mensajes):
+                if conversacion.id not in ids:
+                    conversaciones.append(self._recordar(conversacion, anterior))
+            conversaciones.sort(key=lambda c: c.fecha_inicio, reverse=True)
+        return conversaciones
+
+    def exportar_conversaciones_usuario(self, usuario_id: str) -> List[Conversacion]:
+        shard = self.shard_para_usuario(usuario_id)
+        conversaciones = self.shards[shard].exportar_conversaciones_usuario(usuario_id)
+        anterior = self._shard_anterior(usuario_id)
+        if anterior is not None:
+            ids = {conversacion.id for conversacion in conversaciones}
+            conversaciones.extend(
+                conversacion
+                for conversacion in self.shards[anterior].exportar_conversaciones_usuario(usuario_id)
+                if conversacion.id not in ids
+            )
+        return conversaciones
+
+    def aplicar_unidad_de_trabajo(self, unidad: UnitOfWork) -> None:
+        """
+        Reparte la unidad de trabajo por shard y la confirma en cada uno. Un turno
+        de chat pertenece a un solo usuario, así que normalmente toca un único
+        shard (y conserva su transacción); con varios shards no hay atomicidad
+        entre ellos.
+
+        Args:
+            unidad: Unidad de trabajo con los cambios registrados
+        """
+        por_shard: Dict[str, UnitOfWork] = {}
+
+        def unidad_de(shard: str) -> UnitOfWork:
+            if shard not in por_shard:
+                por_shard[shard] = self.shards[shard].unit_of_work()
+            return por_shard[shard]
+
+        for usuario in unidad.usuarios.values():
+            unidad_de(self.shard_para_usuario(usuario.id)).registrar_usuario(usuario)
+        for conversacion in unidad.conversaciones.values():
+            shard = self.shard_para_usuario(conversacion.usuario.id)
+            unidad_de(shard).registrar_conversacion(conversacion)
+            self._recordar(conversacion, shard)
+        for conversacion_id, mensaje in unidad.mensajes.values():
+            conversacion = unidad.conversaciones.get(conversacion_id)
+            if conversacion is not None:
+                shard = self.shard_para_usuario(conversacion.usuario.id)
+            else:
+                shard = self._shard_conocido(conversacion_id) or self._localizar(conversacion_id)
+            if shard is None:
+                raise ValueError(f"No se pudo determinar el shard de la conversación {conversacion_id}")
+            unidad_de(shard).registrar_mensaje(conversacion_id, mensaje)
+
+        for shard, sub_unidad in por_shard.items():
+            try:
+                sub_unidad.commit()
+            except Exception as e:
+                logger.error(f"Error persistiendo unidad de trabajo en el shard {shard}: {e}", exc_info=True)
+                raise
+
+    # --- Operaciones por conversación ---
+
+    def _localizar(self, conversacion_id: str) -> Optional[str]:
+        """
+        Busca en todos los shards el que guarda una conversación y lo recuerda.
+        """
+        encontradas = self.fan_out(lambda repo: repo.obtener_conversacion(conversacion_id))
+        for shard, conversacion in encontradas.items():
+            if conversacion is not None:
+                self._recordar(conversacion, shard)
+                return shard
+        return None
+
+    def obtener_conversacion(self, conversacion_id: str) -> Optional[Conversacion]:
+        shard = self._shard_conocido(conversacion_id)
+        if shard is not None:
+            conversacion = self.shards[shard].obtener_conversacion(conversacion_id)
+            if conversacion is not None:
+                return conversacion
+
+        encontradas = self.fan_out(lambda repo: repo.obtener_conversacion(conversacion_id))
+        for shard, conversacion in encontradas.items():
+            if conversacion is not None:
+                return self._recordar(conversacion, shard)
+        return None
+
+    def obtener_mensajes_anteriores(
+        self,
+        conversacion_id: str,
+        antes_de: Optional[datetime] = None,
+        limite: int = 20
+    ) -> List[Mensaje]:
+        shard = self._shard_conocido(conversacion_id) or self._localizar(conversacion_id)
+        if shard is None:
+            return []
+        return self.shards[shard].obtener_mensajes_anteriores(conversacion_id, antes_de, limite)
+
+    def finalizar_conversacion(self, conversacion_id: str) -> None:
+        shard = self._shard_conocido(conversacion_id) or self._localizar(conversacion_id)
+        if shard is None:
+            logger.warning(f"No se encontró la conversación {conversacion_id} en ningún shard")
+            return
+        self.shards[shard].finalizar_conversacion(conversacion_id)
+
+    # --- Cambios de reparto ---
+
+    def agregar_shard(self, nombre: str, repositorio: IRepository) -> None:
+        """
+        Agrega un shard: recibe ~1/N de los usuarios. Hasta ejecutar
+        `rebalancear()`, las lecturas de esos usuarios también consultan su shard
+        anterior.
+
+        Args:
+            nombre: Nombre del shard (estable entre despliegues)
+            repositorio: Repositorio del shard
+        """
+        if nombre in self.shards:
+            raise ValueError(f"El shard {nombre} ya existe")
+        with self._lock:
+            if self.ring_anterior is None:
+                self.ring_anterior = ConsistentHashRing(list(self.shards), self.virtual_nodes)
+            self.shards[nombre] = repositorio
+        self.ring.add_node(nombre)
+        logger.info(f"Shard {nombre} agregado; pendiente de rebalanceo")
+
+    def rebalancear(self) -> int:
+        """
+        Mueve a su shard actual los usuarios cuyos datos siguen en otro shard:
+        copia usuario, conversaciones y mensajes (upserts por id) y después los
+        borra del shard de origen. Es idempotente, así que puede repetirse si se
+        interrumpe. Solo si todos los usuarios se movieron, las lecturas dejan de
+        consultar el anillo anterior; si alguno falla, sus datos siguen en el
+        origen y basta con volver a ejecutarlo.
+
+        Returns:
+            Número de usuarios movidos
+        """
+        movidos = 0
+        fallidos = 0
+        for origen, repositorio in list(self.shards.items()):
+            for usuario_id in repositorio.listar_ids_usuarios():
+                destino = self.shard_para_usuario(usuario_id)
+                if destino == origen:
+                    continue
+                try:
+                    self._mover_usuario(usuario_id, origen, destino)
+                    movidos += 1
+                except Exception as e:
+                    fallidos += 1
+                    logger.error(f"Error moviendo al usuario {usuario_id} de {origen} a {destino}: {e}")
+
+        if fallidos:
+            logger.warning(
+                f"Rebalanceo de shards incompleto: {movidos} usuarios movidos, {fallidos} con error; "
+                f"se mantiene el anillo anterior"
+            )
+            return movidos
+
+        with self._lock:
+            self.ring_anterior = None
+        logger.info(f"Rebalanceo de shards terminado: {movidos} usuarios movidos")
+        return movidos
+
+    def listar_ids_usuarios(self) -> List[str]:
+        ids = set()
+        for ids_shard in self.fan_out(lambda repo: repo.listar_ids_usuarios()).values():
+            ids.update(ids_shard)
+        return list(ids)
+
+    def eliminar_conversaciones_usuario(self, usuario_id: str, conversacion_ids: List[str]) -> None:
+        # Durante un rebalanceo los datos pueden estar en el shard actual o en el anterior
+        self._repositorio_usuario(usuario_id).eliminar_conversaciones_usuario(usuario_id, conversacion_ids)
+        anterior = self._shard_anterior(usuario_id)
+        if anterior is not None:
+            self.shards[anterior].eliminar_conversaciones_usuario(usuario_id, conversacion_ids)
+        with self._lock:
+            for conversacion_id in conversacion_ids:
+                self._directorio.pop(conversacion_id, None)
+
+    def _mover_usuario(self, usuario_id: str, origen: str, destino: str) -> None:
+        """
+        Copia los datos de un usuario al shard destino y los borra del origen.
+        Solo se borran las conversaciones que se copiaron y que el destino devuelve
+        con al menos los mismos mensajes; ante cualquier error no se borra nada.
+        """
+        repo_origen = self.shards[origen]
+        repo_destino = self.shards[destino]
+        usuario = repo_origen.obtener_usuario(usuario_id)
+        conversaciones = repo_origen.exportar_conversaciones_usuario(usuario_id)
+
+        unidad = repo_destino.unit_of_work()
+        unidad.derivar_sesiones = False
+        with unidad:
+            if usuario is not None:
+                unidad.registrar_usuario(usuario)
+            elif conversaciones:
+                unidad.registrar_usuario(conversaciones[0].usuario)
+            for conversacion in conversaciones:
+                unidad.registrar_conversacion(conversacion)
+                for mensaje in conversacion.mensajes:
+                    unidad.registrar_mensaje(conversacion.id, mensaje)
+
+        copiadas = {c.id: _mensajes_persistidos(c) for c in repo_destino.exportar_conversaciones_usuario(usuario_id)}
+        for conversacion in conversaciones:
+            if copiadas.get(conversacion.id, -1) < _mensajes_persistidos(conversacion):
+                raise RuntimeError(
+                    f"La copia de la conversación {conversacion.id} en {destino} está incompleta "
+                    f"({copiadas.get(conversacion.id, 0)} de {_mensajes_persistidos(conversacion)} mensajes)"
+                )
+
+        repo_origen.eliminar_conversaciones_usuario(usuario_id, [c.id for c in conversaciones])
+        for conversacion in conversaciones:
+            self._recordar(conversacion, destino)
+        logger.debug(f"Usuario {usuario_id} movido de {origen} a {destino} ({len(conversaciones)} conversaciones)")
+
+    # --- Administración (fan-out) ---
+
+    def obtener_conversaciones(
+        self,
+        conversacion_ids: List[str],
+        max_mensajes: Optional[int] = None
+    ) -> List[Conversacion]:
+        """
+        Obtiene varias conversaciones: las de shard conocido con una consulta por
+        lotes en su shard y el resto consultando todos los shards.
+
+        Args:
+            conversacion_ids: IDs de las conversaciones
+            max_mensajes: Mensajes más recientes por conversación (None = todos)
+
+        Returns:
+            Conversaciones encontradas, de la más reciente a la más antigua
+        """
+        if not conversacion_ids:
+            return []
+
+        por_shard: Dict[str, List[str]] = {}
+        desconocidas: List[str] = []
+        for conversacion_id in conversacion_ids:
+            shard = self._shard_conocido(conversacion_id)
+            if shard is None:
+                desconocidas.append(conversacion_id)
+            else:
+                por_shard.setdefault(shard, []).append(conversacion_id)
+
+        if desconocidas:
+            for shard in self.shards:
+                por_shard.setdefault(shard, []).extend(desconocidas)
+
+        def cargar(shard: str) -> List[Conversacion]:
+            return self.shards[shard].obtener_conversaciones(por_shard[shard], max_mensajes)
+
+        self.fan_outs += 1
+        futuros = {shard: self._executor.submit(cargar, shard) for shard in por_shard}
+        conversaciones: Dict[str, Conversacion] = {}
+        for shard, futuro in futuros.items():
+            for conversacion in futuro.result():
+                conversaciones[conversacion.id] = self._recordar(conversacion, shard)
+
+        return sorted(conversaciones.values(), key=lambda c: c.fecha_inicio, reverse=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas de enrutamiento y de cada shard.
+        """
+        with self._lock:
+            estadisticas = {
+                "shards": list(self.shards),
+                "conversaciones_en_directorio": len(self._directorio),
+                "fallos_de_directorio": self.directory_misses,
+                "consultas_fan_out": self.fan_outs,
+                "rebalanceo_pendiente": self.ring_anterior is not None,
+                "lecturas_anillo_anterior": self.lecturas_anillo_anterior
+            }
+        estadisticas["por_shard"] = self.fan_out(
+            lambda repo: repo.get_stats() if hasattr(repo, "get_stats") else {}
+        )
+        return estadisticas
+
+    def cerrar(self) -> None:
+        """
+        Cierra los repositorios de los shards y el pool de fan-out.
+        """
+        for nombre, repo in self.shards.items():
+            if hasattr(repo, "cerrar"):
+                try:
+                    repo.cerrar()
+                except Exception as e:
+                    logger.warning(f"Error cerrando el shard {nombre}: {e}")
+        self._executor.shutdown(wait=False)
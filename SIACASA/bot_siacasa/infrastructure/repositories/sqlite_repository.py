@@ -1,61 +1,721 @@
-# Nuevo archivo: bot_siacasa/infrastructure/repositories/sqlite_repository.py
-import sqlite3
+# bot_siacasa/infrastructure/repositories/sqlite_repository.py
 import json
-import pickle
+import logging
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Optional, List
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
 
-from bot_siacasa.application.interfaces.repository_interface import IRepository
+from bot_siacasa.application.interfaces.repository_interface import IRepository, UnitOfWork
 from bot_siacasa.domain.entities.usuario import Usuario
 from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.identifiers import new_id
+from bot_siacasa.infrastructure.repositories.row_mapping import (
+    cargar_fecha,
+    cargar_json,
+    max_mensajes_historial,
+    mensaje_desde_fila,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_CONFIG = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout_ms": 5000,
+    "cache_size_kb": 20000,
+    "mmap_size": 268435456,
+    "cached_statements": 256,
+    "max_readers": 4
+}
+
+# Mismo modelo que en PostgreSQL; las fechas se guardan como texto ISO 8601
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS usuarios (
+    id TEXT PRIMARY KEY,
+    datos TEXT,
+    fecha_creacion TEXT,
+    fecha_actualizacion TEXT
+);
+
+CREATE TABLE IF NOT EXISTS conversaciones (
+    id TEXT PRIMARY KEY,
+    usuario_id TEXT NOT NULL,
+    fecha_inicio TEXT NOT NULL,
+    fecha_fin TEXT,
+    cantidad_mensajes INTEGER NOT NULL DEFAULT 0,
+    metadata TEXT,
+    prompt_template TEXT,
+    prompt_version INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS mensajes (
+    id TEXT PRIMARY KEY,
+    conversacion_id TEXT NOT NULL,
+    role TEXT NOT NULL,
+    content TEXT,
+    timestamp TEXT NOT NULL,
+    sentiment_score REAL,
+    processing_time_ms REAL,
+    ai_processing_time_ms REAL,
+    sentiment TEXT,
+    sentiment_confidence REAL,
+    intent TEXT,
+    intent_confidence REAL,
+    token_count INTEGER,
+    response_tone TEXT,
+    metadata TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_conversaciones_usuario_activa
+    ON conversaciones (usuario_id, fecha_fin, fecha_inicio DESC);
+CREATE INDEX IF NOT EXISTS idx_mensajes_conversacion_timestamp
+    ON mensajes (conversacion_id, timestamp);
+
+-- El contador solo sube con inserciones reales: un upsert que termina en
+-- actualización dispara triggers de UPDATE, no de INSERT
+CREATE TRIGGER IF NOT EXISTS trg_mensajes_contador
+AFTER INSERT ON mensajes
+BEGIN
+    UPDATE conversaciones SET cantidad_mensajes = cantidad_mensajes + 1
+    WHERE id = NEW.conversacion_id;
+END;
+"""
+
+UPSERT_USUARIO_SQL = """
+    INSERT INTO usuarios (id, datos, fecha_creacion)
+    VALUES (?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        datos = excluded.datos,
+        fecha_actualizacion = excluded.fecha_creacion
+"""
+
+UPSERT_CONVERSACION_SQL = """
+    INSERT INTO conversaciones (id, usuario_id, fecha_inicio, fecha_fin, metadata, prompt_template, prompt_version)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        fecha_fin = COALESCE(conversaciones.fecha_fin, excluded.fecha_fin),
+        metadata = excluded.metadata,
+        prompt_template = COALESCE(excluded.prompt_template, conversaciones.prompt_template),
+        prompt_version = COALESCE(excluded.prompt_version, conversaciones.prompt_version)
+"""
+
+# Columnas añadidas después de la primera versión del esquema (archivos existentes)
+COLUMNAS_AGREGADAS = {
+    "conversaciones": {"prompt_template": "TEXT", "prompt_version": "INTEGER"},
+}
+
+# Como en PostgreSQL, el timestamp de un mensaje no cambia una vez insertado
+UPSERT_MENSAJE_SQL = """
+    INSERT INTO mensajes (
+        id, conversacion_id, role, content, timestamp,
+        sentiment_score, processing_time_ms, ai_processing_time_ms,
+        sentiment, sentiment_confidence, intent, intent_confidence,
+        token_count, response_tone, metadata
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        content = excluded.content,
+        sentiment_score = excluded.sentiment_score,
+        processing_time_ms = excluded.processing_time_ms,
+        ai_processing_time_ms = excluded.ai_processing_time_ms,
+        sentiment = excluded.sentiment,
+        sentiment_confidence = excluded.sentiment_confidence,
+        intent = excluded.intent,
+        intent_confidence = excluded.intent_confidence,
+        token_count = excluded.token_count,
+        response_tone = excluded.response_tone,
+        metadata = excluded.metadata
+"""
+
+CONVERSACION_SELECT_SQL = """
+    SELECT
+        c.id, c.usuario_id, c.fecha_inicio, c.fecha_fin, c.cantidad_mensajes, c.metadata,
+        c.prompt_template, c.prompt_version, u.datos AS usuario_datos
+    FROM conversaciones c
+    LEFT JOIN usuarios u ON u.id = c.usuario_id
+"""
+
+MENSAJE_SELECT_COLUMNS = """
+    id, conversacion_id, role, content, timestamp, metadata,
+    sentiment, sentiment_score, sentiment_confidence,
+    intent, intent_confidence, token_count,
+    processing_time_ms, ai_processing_time_ms, response_tone
+"""
+
+# LIMIT -1 equivale a sin límite en SQLite
+MENSAJES_RECIENTES_SQL = """
+    SELECT """ + MENSAJE_SELECT_COLUMNS + """
+    FROM mensajes
+    WHERE conversacion_id = ?
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+MENSAJES_ANTERIORES_SQL = """
+    SELECT """ + MENSAJE_SELECT_COLUMNS + """
+    FROM mensajes
+    WHERE conversacion_id = ?
+        AND (? IS NULL OR timestamp < ?)
+    ORDER BY timestamp DESC
+    LIMIT ?
+"""
+
+MENSAJES_LOTE_SQL = """
+    SELECT """ + MENSAJE_SELECT_COLUMNS + """
+    FROM (
+        SELECT
+            """ + MENSAJE_SELECT_COLUMNS + """,
+            row_number() OVER (PARTITION BY conversacion_id ORDER BY timestamp DESC) AS posicion
+        FROM mensajes
+        WHERE conversacion_id IN (SELECT value FROM json_each(?))
+    )
+    WHERE ? IS NULL OR posicion <= ?
+    ORDER BY conversacion_id, timestamp ASC
+"""
+
+
+def _fecha_texto(valor: Optional[datetime]) -> Optional[str]:
+    """Texto ISO con microsegundos: el orden lexicográfico coincide con el cronológico."""
+    return valor.isoformat(timespec="microseconds") if valor else None
+
+
+def _usuario_params(usuario: Usuario) -> Tuple[Any, ...]:
+    return (usuario.id, json.dumps(usuario.datos or {}), _fecha_texto(datetime.now()))
+
+
+def _conversacion_params(conversacion: Conversacion) -> Tuple[Any, ...]:
+    return (
+        conversacion.id,
+        conversacion.usuario.id,
+        _fecha_texto(conversacion.fecha_inicio),
+        _fecha_texto(conversacion.fecha_fin),
+        json.dumps(conversacion.metadata or {}, default=str),
+        conversacion.prompt_template,
+        conversacion.prompt_version
+    )
+
+
+def _mensaje_params(conversacion_id: str, mensaje: Mensaje) -> Tuple[Any, ...]:
+    metadata = getattr(mensaje, 'metadata', None) or {}
+    return (
+        mensaje.id,
+        conversacion_id,
+        mensaje.role,
+        mensaje.content,
+        _fecha_texto(getattr(mensaje, 'timestamp', None) or datetime.now()),
+        getattr(mensaje, 'sentiment_score', None),
+        getattr(mensaje, 'processing_time_ms', None),
+        getattr(mensaje, 'ai_processing_time_ms', None) or metadata.get('ai_processing_time_ms'),
+        getattr(mensaje, 'sentiment', None),
+        getattr(mensaje, 'sentiment_confidence', None),
+        getattr(mensaje, 'intent', None),
+        getattr(mensaje, 'intent_confidence', None),
+        getattr(mensaje, 'token_count', None),
+        getattr(mensaje, 'response_tone', None) or metadata.get('response_tone'),
+        json.dumps(metadata, default=str) if metadata else None
+    )
+
+
+def _conversacion_desde_fila(fila: Dict[str, Any]) -> Conversacion:
+    usuario = Usuario(id=fila['usuario_id'], datos=cargar_json(fila.get('usuario_datos'), {}))
+    conversacion = Conversacion(
+        id=fila['id'],
+        usuario=usuario,
+        fecha_inicio=cargar_fecha(fila['fecha_inicio']),
+        fecha_fin=cargar_fecha(fila['fecha_fin']),
+        metadata=cargar_json(fila.get('metadata'), {}),
+        prompt_template=fila.get('prompt_template'),
+        prompt_version=fila.get('prompt_version')
+    )
+    conversacion.total_mensajes = fila.get('cantidad_mensajes') or 0
+    return conversacion
+
 
 class SQLiteRepository(IRepository):
-    """Implementación de repositorio utilizando SQLite."""
-    
-    def __init__(self, db_path="./chatbot_data.db"):
-        """Inicializa el repositorio con la ruta a la base de datos."""
+    """
+    Repositorio persistente embebido en SQLite, para despliegues de un solo nodo,
+    edge y pruebas.
+
+    Usa WAL para que las lecturas no bloqueen la escritura: un único escritor
+    (una conexión protegida por un lock) y un pool acotado de conexiones de solo
+    lectura (`max_readers`) que cada lectura toma y devuelve.
+    Las consultas son constantes del módulo, por lo que la caché de sentencias de
+    cada conexión (`cached_statements`) las reutiliza ya preparadas.
+    """
+
+    def __init__(self, db_path: str = "./chatbot_data.db", config: Optional[Dict[str, Any]] = None):
+        """
+        Inicializa el repositorio con la ruta a la base de datos.
+
+        Args:
+            db_path: Ruta del archivo SQLite (":memory:" para una base volátil)
+            config: Configuración de pragmas (por defecto OptimizedConfig.SQLITE_CONFIG)
+        """
         self.db_path = db_path
+        self.config = {**DEFAULT_SQLITE_CONFIG, **(config or self._load_config())}
+        self._in_memory = db_path == ":memory:"
+        self._write_lock = threading.RLock()
+        self._readers: List[sqlite3.Connection] = []
+        self._idle_readers: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._readers_lock = threading.Lock()
+
+        self._writer = self._connect()
         self._crear_tablas()
-    
-    def _crear_tablas(self):
-        """Crea las tablas necesarias si no existen."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Tabla de usuarios
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS usuarios (
-            id TEXT PRIMARY KEY,
-            datos TEXT,
-            fecha_creacion TEXT
+        logger.info(
+            f"SQLite Repository inicializado en {db_path} "
+            f"(journal_mode={self._pragma(self._writer, 'journal_mode')})"
         )
-        ''')
-        
-        # Tabla de conversaciones
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS conversaciones (
-            id TEXT PRIMARY KEY,
-            usuario_id TEXT,
-            fecha_inicio TEXT,
-            fecha_fin TEXT,
-            activa INTEGER,
-            FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            return dict(OptimizedConfig.SQLITE_CONFIG)
+        except Exception:
+            return {}
+
+    def _connect(self, readonly: bool = False) -> sqlite3.Connection:
+        """
+        Abre una conexión con los pragmas configurados. isolation_level=None deja
+        la conexión en autocommit; las transacciones se abren de forma explícita.
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.config["busy_timeout_ms"] / 1000,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=self.config["cached_statements"]
         )
-        ''')
-        
-        # Tabla de mensajes
-        cursor.execute('''
-        CREATE TABLE IF NOT EXISTS mensajes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            conversacion_id TEXT,
-            role TEXT,
-            content TEXT,
-            timestamp TEXT,
-            FOREIGN KEY (conversacion_id) REFERENCES conversaciones (id)
+        conn.row_factory = sqlite3.Row
+        if not self._in_memory:
+            conn.execute(f"PRAGMA journal_mode={self.config['journal_mode']}")
+        conn.execute(f"PRAGMA synchronous={self.config['synchronous']}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.config['busy_timeout_ms'])}")
+        conn.execute(f"PRAGMA cache_size=-{int(self.config['cache_size_kb'])}")
+        conn.execute(f"PRAGMA mmap_size={int(self.config['mmap_size'])}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only=ON")
+        return conn
+
+    @staticmethod
+    def _pragma(conn: sqlite3.Connection, name: str) -> Any:
+        row = conn.execute(f"PRAGMA {name}").fetchone()
+        return row[0] if row else None
+
+    def _crear_tablas(self):
+        """Crea las tablas, índices y triggers necesarios si no existen."""
+        with self._write_lock:
+            self._writer.executescript(SCHEMA_SQL)
+            for tabla, columnas in COLUMNAS_AGREGADAS.items():
+                existentes = {fila[1] for fila in self._writer.execute(f"PRAGMA table_info({tabla})")}
+                for columna, tipo in columnas.items():
+                    if columna not in existentes:
+                        self._writer.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        Transacción de escritura con el único escritor. BEGIN IMMEDIATE toma el
+        lock de escritura al inicio para no fallar a mitad de la transacción.
+        """
+        with self._write_lock:
+            self._writer.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._writer
+            except Exception:
+                self._writer.execute("ROLLBACK")
+                raise
+            else:
+                self._writer.execute("COMMIT")
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """
+        Conexión de lectura del pool durante una consulta. En WAL los lectores ven
+        la última transacción confirmada sin esperar al escritor. Una base
+        ":memory:" no se comparte entre conexiones, así que se lee con el escritor.
+        """
+        if self._in_memory:
+            with self._write_lock:
+                yield self._writer
+            return
+
+        conn = self._tomar_lector()
+        try:
+            yield conn
+        finally:
+            self._idle_readers.put(conn)
+
+    def _tomar_lector(self) -> sqlite3.Connection:
+        """
+        Toma una conexión de lectura libre; abre una nueva mientras haya menos de
+        `max_readers` y, si no, espera a que se libere una (hasta busy_timeout_ms).
+        """
+        try:
+            return self._idle_readers.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._readers_lock:
+            if len(self._readers) < self.config["max_readers"]:
+                conn = self._connect(readonly=True)
+                self._readers.append(conn)
+                return conn
+
+        try:
+            return self._idle_readers.get(timeout=self.config["busy_timeout_ms"] / 1000)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f"Sin conexiones de lectura libres tras {self.config['busy_timeout_ms']} ms"
+            ) from None
+
+    def _fetch_one(self, query: str, params: Sequence[Any]) -> Optional[Dict[str, Any]]:
+        with self._reader() as conn:
+            row = conn.execute(query, params).fetchone()
+        return dict(row) if row else None
+
+    def _fetch_all(self, query: str, params: Sequence[Any]) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
+            rows = conn.execute(query, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def cerrar(self) -> None:
+        """
+        Cierra el escritor y todas las conexiones de lectura.
+        """
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers.clear()
+            self._idle_readers = queue.LifoQueue()
+        with self._write_lock:
+            self._writer.close()
+        logger.info(f"SQLite Repository cerrado: {self.db_path}")
+
+    def guardar_usuario(self, usuario: Usuario) -> None:
+        """
+        Guarda un usuario en SQLite.
+
+        Args:
+            usuario: Usuario a guardar
+        """
+        try:
+            with self._transaction() as conn:
+                conn.execute(UPSERT_USUARIO_SQL, _usuario_params(usuario))
+            logger.debug(f"Usuario guardado en SQLite: {usuario.id}")
+        except Exception as e:
+            logger.error(f"Error guardando usuario {usuario.id}: {e}", exc_info=True)
+            raise
+
+    def obtener_usuario(self, usuario_id: str) -> Optional[Usuario]:
+        """
+        Obtiene un usuario de SQLite.
+
+        Args:
+            usuario_id: ID del usuario
+
+        Returns:
+            Usuario o None si no existe
+        """
+        try:
+            fila = self._fetch_one("SELECT id, datos FROM usuarios WHERE id = ?", (usuario_id,))
+            if not fila:
+                return None
+            return Usuario(id=fila['id'], datos=cargar_json(fila['datos'], {}))
+        except Exception as e:
+            logger.error(f"Error obteniendo usuario {usuario_id}: {e}")
+            return None
+
+    def guardar_conversacion(self, conversacion: Conversacion) -> None:
+        """
+        Guarda la conversación y los mensajes de su ventana en una sola transacción.
+        El mensaje de sistema no se copia: basta la referencia a su plantilla.
+
+        Args:
+            conversacion: Conversación a guardar
+        """
+        try:
+            with self._transaction() as conn:
+                conn.execute(UPSERT_USUARIO_SQL, _usuario_params(conversacion.usuario))
+                conn.execute(UPSERT_CONVERSACION_SQL, _conversacion_params(conversacion))
+                mensajes = [mensaje for mensaje in conversacion.mensajes if mensaje.role != "system"]
+                for mensaje in mensajes:
+                    if not mensaje.id:
+                        mensaje.id = new_id()
+                conn.executemany(
+                    UPSERT_MENSAJE_SQL,
+                    [_mensaje_params(conversacion.id, mensaje) for mensaje in mensajes]
+                )
+            self._asignar_cargador(conversacion)
+            logger.debug(f"Conversación guardada en SQLite: {conversacion.id}")
+        except Exception as e:
+            logger.error(f"Error guardando conversación {conversacion.id}: {e}", exc_info=True)
+            raise
+
+    def _guardar_mensaje(self, conversacion_id: str, mensaje: Mensaje) -> None:
+        """
+        Guarda un mensaje; el trigger incrementa el contador solo si es nuevo.
+
+        Args:
+            conversacion_id: ID de la conversación
+            mensaje: Mensaje a guardar
+        """
+        if not mensaje.id:
+            mensaje.id = new_id()
+        try:
+            with self._transaction() as conn:
+                conn.execute(UPSERT_MENSAJE_SQL, _mensaje_params(conversacion_id, mensaje))
+        except Exception as e:
+            logger.error(f"Error guardando mensaje {mensaje.id}: {e}", exc_info=True)
+            raise
+
+    def aplicar_unidad_de_trabajo(self, unidad: UnitOfWork) -> None:
+        """
+        Persiste un turno completo (usuarios, conversaciones y mensajes) en una
+        sola transacción.
+
+        Args:
+            unidad: Unidad de trabajo con los cambios registrados
+        """
+        try:
+            with self._transaction() as conn:
+                if unidad.usuarios:
+                    conn.executemany(UPSERT_USUARIO_SQL, [_usuario_params(u) for u in unidad.usuarios.values()])
+                if unidad.conversaciones:
+                    conn.executemany(
+                        UPSERT_CONVERSACION_SQL,
+                        [_conversacion_params(c) for c in unidad.conversaciones.values()]
+                    )
+                if unidad.mensajes:
+                    conn.executemany(
+                        UPSERT_MENSAJE_SQL,
+                        [_mensaje_params(conversacion_id, m) for conversacion_id, m in unidad.mensajes.values()]
+                    )
+            for conversacion in unidad.conversaciones.values():
+                self._asignar_cargador(conversacion)
+        except Exception as e:
+            logger.error(f"Error persistiendo unidad de trabajo en SQLite: {e}", exc_info=True)
+            raise
+
+    def _asignar_cargador(self, conversacion: Conversacion) -> None:
+        if conversacion.cargador_mensajes is None:
+            conversacion.cargador_mensajes = (
+                lambda antes_de, limite, conversacion_id=conversacion.id:
+                    self.obtener_mensajes_anteriores(conversacion_id, antes_de, limite)
+            )
+
+    def _hidratar_conversacion(self, where: str, valor: str, max_mensajes: Optional[int]) -> Optional[Conversacion]:
+        """
+        Carga la cabecera y la ventana de mensajes recientes de una conversación.
+        """
+        fila = self._fetch_one(
+            CONVERSACION_SELECT_SQL + f" WHERE {where} ORDER BY c.fecha_inicio DESC LIMIT 1",
+            (valor,)
         )
-        ''')
-        
-        conn.commit()
-        conn.close()
-    
-    # Implementa los métodos de la interfaz IRepository...
\ No newline at end of file
+        if not fila:
+            return None
+
+        conversacion = _conversacion_desde_fila(fila)
+        filas = self._fetch_all(MENSAJES_RECIENTES_SQL, (conversacion.id, max_mensajes or max_mensajes_historial()))
+        conversacion.mensajes = [mensaje_desde_fila(mensaje) for mensaje in reversed(filas)]
+        conversacion.total_mensajes = max(conversacion.total_mensajes, len(conversacion.mensajes))
+        self._asignar_cargador(conversacion)
+        return conversacion
+
+    def obtener_conversacion(
+        self,
+        conversacion_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> Optional[Conversacion]:
+        """
+        Obtiene una conversación con su ventana de mensajes recientes.
+
+        Args:
+            conversacion_id: ID de la conversación
+            max_mensajes: Mensajes recientes a cargar (por defecto
+                CONVERSATION_CONFIG['max_messages_in_history'])
+
+        Returns:
+            Conversación o None si no existe
+        """
+        try:
+            return self._hidratar_conversacion("c.id = ?", conversacion_id, max_mensajes)
+        except Exception as e:
+            logger.error(f"Error obteniendo conversación {conversacion_id}: {e}")
+            return None
+
+    def obtener_conversacion_activa(
+        self,
+        usuario_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> Optional[Conversacion]:
+        """
+        Obtiene la conversación activa de un usuario con su ventana de mensajes recientes.
+
+        Args:
+            usuario_id: ID del usuario
+            max_mensajes: Mensajes recientes a cargar
+
+        Returns:
+            Conversación activa o None si no existe
+        """
+        try:
+            return self._hidratar_conversacion("c.usuario_id = ? AND c.fecha_fin IS NULL", usuario_id, max_mensajes)
+        except Exception as e:
+            logger.error(f"Error obteniendo conversación activa para {usuario_id}: {e}")
+            return None
+
+    def obtener_mensajes_anteriores(
+        self,
+        conversacion_id: str,
+        antes_de: Optional[datetime] = None,
+        limite: int = 20
+    ) -> List[Mensaje]:
+        """
+        Obtiene una página de mensajes anteriores a `antes_de`.
+
+        Args:
+            conversacion_id: ID de la conversación
+            antes_de: Cursor; solo mensajes anteriores a esta fecha (None = los más recientes)
+            limite: Número máximo de mensajes
+
+        Returns:
+            Mensajes en orden cronológico
+        """
+        try:
+            cursor = _fecha_texto(antes_de)
+            filas = self._fetch_all(MENSAJES_ANTERIORES_SQL, (conversacion_id, cursor, cursor, limite))
+            return [mensaje_desde_fila(fila) for fila in reversed(filas)]
+        except Exception as e:
+            logger.error(f"Error obteniendo mensajes anteriores de {conversacion_id}: {e}")
+            return []
+
+    def _cargar_conversaciones(self, where: str, valor: Any, max_mensajes: Optional[int]) -> List[Conversacion]:
+        filas = self._fetch_all(CONVERSACION_SELECT_SQL + f" WHERE {where} ORDER BY c.fecha_inicio DESC", (valor,))
+        conversaciones = [_conversacion_desde_fila(fila) for fila in filas]
+        if not conversaciones:
+            return []
+
+        por_id = {conversacion.id: conversacion for conversacion in conversaciones}
+        mensajes_data = self._fetch_all(MENSAJES_LOTE_SQL, (json.dumps(list(por_id)), max_mensajes, max_mensajes))
+        for mensaje_data in mensajes_data:
+            por_id[mensaje_data['conversacion_id']].mensajes.append(mensaje_desde_fila(mensaje_data))
+
+        for conversacion in conversaciones:
+            conversacion.total_mensajes = max(conversacion.total_mensajes, len(conversacion.mensajes))
+            self._asignar_cargador(conversacion)
+        return conversaciones
+
+    def obtener_conversaciones(
+        self,
+        conversacion_ids: List[str],
+        max_mensajes: Optional[int] = None
+    ) -> List[Conversacion]:
+        """
+        Obtiene varias conversaciones con dos consultas (cabeceras y mensajes).
+
+        Args:
+            conversacion_ids: IDs de las conversaciones
+            max_mensajes: Mensajes más recientes a cargar por conversación (None = todos)
+
+        Returns:
+            Conversaciones encontradas, de la más reciente a la más antigua
+        """
+        if not conversacion_ids:
+            return []
+        try:
+            return self._cargar_conversaciones(
+                "c.id IN (SELECT value FROM json_each(?))", json.dumps(list(conversacion_ids)), max_mensajes
+            )
+        except Exception as e:
+            logger.error(f"Error obteniendo conversaciones por lote: {e}")
+            return []
+
+    def obtener_conversaciones_usuario(
+        self,
+        usuario_id: str,
+        max_mensajes: Optional[int] = None
+    ) -> List[Conversacion]:
+        """
+        Obtiene todas las conversaciones de un usuario.
+
+        Args:
+            usuario_id: ID del usuario
+            max_mensajes: Mensajes más recientes a cargar por conversación (None = todos)
+
+        Returns:
+            Lista de conversaciones
+        """
+        try:
+            return self._cargar_conversaciones("c.usuario_id = ?", usuario_id, max_mensajes)
+        except Exception as e:
+            logger.error(f"Error obteniendo conversaciones para {usuario_id}: {e}")
+            return []
+
+    def exportar_conversaciones_usuario(self, usuario_id: str) -> List[Conversacion]:
+        """
+        Obtiene todas las conversaciones de un usuario con todos sus mensajes,
+        propagando los errores (rebalanceo de shards).
+
+        Args:
+            usuario_id: ID del usuario
+
+        Returns:
+            Lista de conversaciones completas
+        """
+        return self._cargar_conversaciones("c.usuario_id = ?", usuario_id, None)
+
+    def listar_ids_usuarios(self) -> List[str]:
+        """
+        IDs de los usuarios con datos en esta base (rebalanceo de shards).
+
+        Returns:
+            Lista de IDs de usuario
+        """
+        filas = self._fetch_all("SELECT id FROM usuarios UNION SELECT usuario_id FROM conversaciones", ())
+        return [fila['id'] for fila in filas]
+
+    def eliminar_conversaciones_usuario(self, usuario_id: str, conversacion_ids: List[str]) -> None:
+        """
+        Elimina las conversaciones indicadas con sus mensajes, y el usuario si ya no
+        le quedan conversaciones, en una transacción.
+
+        Args:
+            usuario_id: ID del usuario
+            conversacion_ids: Conversaciones a eliminar
+        """
+        ids = json.dumps(list(conversacion_ids))
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM mensajes WHERE conversacion_id IN (SELECT value FROM json_each(?))", (ids,))
+            conn.execute(
+                "DELETE FROM conversaciones WHERE usuario_id = ? AND id IN (SELECT value FROM json_each(?))",
+                (usuario_id, ids)
+            )
+            conn.execute(
+                "DELETE FROM usuarios WHERE id = ? AND NOT EXISTS "
+                "(SELECT 1 FROM conversaciones WHERE usuario_id = ?)",
+                (usuario_id, usuario_id)
+            )
+        logger.info(f"Eliminadas {len(conversacion_ids)} conversaciones de {usuario_id}")
+
+    def finalizar_conversacion(self, conversacion_id: str) -> None:
+        """
+        Finaliza una conversación.
+
+        Args:
+            conversacion_id: ID de la conversación
+        """
+        try:
+            with self._transaction() as conn:
+                conn.execute(
+                    "UPDATE conversaciones SET fecha_fin = ? WHERE id = ? AND fecha_fin IS NULL",
+                    (_fecha_texto(datetime.now()), conversacion_id)
+                )
+            logger.info(f"Conversación {conversacion_id} finalizada")
+        except Exception as e:
+            logger.error(f"Error al finalizar conversación {conversacion_id}: {e}", exc_info=True)
+            raise
@@ -0,0 +1,329 @@
+# bot_siacasa/infrastructure/shared_state.py
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, Iterator, List, MutableMapping, Optional, Sequence, TypeVar
+
+from bot_siacasa.infrastructure.cooperative import run_blocking
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_SHARED_STATE_CONFIG = {
+    "key_prefix": "siacasa:",
+    "socket_timeout": 0.5,         # Segundos por operación: el estado compartido es un acelerador
+    "retry_after_seconds": 5.0     # Pausa antes de reintentar tras un fallo de conexión
+}
+
+
+class SharedStateError(Exception):
+    """Error al hablar con el almacén de estado compartido."""
+
+
+class SharedStateStore(ABC):
+    """
+    Almacén clave-valor (texto) para el estado que deben ver todos los procesos
+    del bot: instantáneas de conversación, cachés de respuestas y la relación
+    ticket -> usuario.
+
+    `get`/`set`/`delete` lanzan SharedStateError si el almacén no responde. Los
+    métodos `*_json` y `discard` son de mejor esfuerzo: registran el fallo y se
+    comportan como un fallo de caché, porque ningún dato de aquí es la fuente de
+    verdad (lo es el repositorio).
+    """
+
+    # True si otros procesos ven lo que se escribe aquí
+    shared = False
+
+    @abstractmethod
+    def get_many(self, keys: Sequence[str]) -> List[Optional[str]]:
+        pass
+
+    @abstractmethod
+    def set_many(self, items: Dict[str, str], ttl: Optional[float] = None) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, *keys: str) -> int:
+        pass
+
+    def get(self, key: str) -> Optional[str]:
+        return self.get_many([key])[0]
+
+    def set(self, key: str, value: str, ttl: Optional[float] = None) -> None:
+        self.set_many({key: value}, ttl)
+
+    def get_json(self, key: str) -> Any:
+        """
+        Valor JSON de una clave, o None si no existe o el almacén falla.
+        """
+        try:
+            raw = self.get(key)
+            return json.loads(raw) if raw is not None else None
+        except (SharedStateError, ValueError) as e:
+            logger.warning(f"Estado compartido no disponible al leer {key}: {e}")
+            return None
+
+    def set_json(self, key: str, value: Any, ttl: Optional[float] = None) -> bool:
+        """
+        Guarda un valor JSON. Retorna False si el almacén falla.
+        """
+        return self.set_many_json({key: value}, ttl)
+
+    def set_many_json(self, items: Dict[str, Any], ttl: Optional[float] = None) -> bool:
+        try:
+            self.set_many({key: json.dumps(value, default=str) for key, value in items.items()}, ttl)
+            return True
+        except SharedStateError as e:
+            logger.warning(f"Estado compartido no disponible al escribir {', '.join(items)}: {e}")
+            return False
+
+    def discard(self, *keys: str) -> int:
+        """
+        Borra claves sin propagar errores del almacén.
+        """
+        try:
+            return self.delete(*keys)
+        except SharedStateError as e:
+            logger.warning(f"Estado compartido no disponible al borrar {', '.join(keys)}: {e}")
+            return 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "shared": self.shared}
+
+    def close(self) -> None:
+        pass
+
+
+class InProcessStateStore(SharedStateStore):
+    """
+    Almacén en memoria del proceso (por defecto, un solo worker). Respeta los TTL
+    igual que el almacén en red para que el comportamiento no cambie entre ambos.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._datos: Dict[str, tuple] = {}  # key -> (valor, expira_en | None)
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[str]]:
+        ahora = self._clock()
+        resultado = []
+        with self._lock:
+            for key in keys:
+                item = self._datos.get(key)
+                if item is not None and item[1] is not None and item[1] <= ahora:
+                    del self._datos[key]
+                    item = None
+                resultado.append(item[0] if item is not None else None)
+        return resultado
+
+    def set_many(self, items: Dict[str, str], ttl: Optional[float] = None) -> None:
+        expira = self._clock() + ttl if ttl else None
+        with self._lock:
+            for key, value in items.items():
+                self._datos[key] = (value, expira)
+
+    def delete(self, *keys: str) -> int:
+        with self._lock:
+            return sum(1 for key in keys if self._datos.pop(key, None) is not None)
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**super().get_stats(), "keys": len(self._datos)}
+
+
+class RedisStateStore(SharedStateStore):
+    """
+    Almacén en un servidor compatible con Redis (Redis, Valkey, KeyDB, Dragonfly)
+    a través de redis-py, que gestiona el pool de conexiones, AUTH, SELECT y TLS
+    (rediss://). Solo usa MGET/SET PX/DEL; cada lote es una sola ida y vuelta.
+
+    Las llamadas pasan por `cooperative.run_blocking` para no bloquear el hub de
+    eventlet. Si el servidor no responde, las operaciones fallan rápido durante
+    `retry_after_seconds` en lugar de esperar el timeout en cada petición.
+    """
+
+    shared = True
+
+    def __init__(
+        self,
+        url: str,
+        socket_timeout: Optional[float] = None,
+        key_prefix: Optional[str] = None,
+        retry_after_seconds: Optional[float] = None,
+        client: Any = None
+    ):
+        """
+        Args:
+            url: redis://[usuario:clave@]host[:puerto][/db] o rediss://... (TLS)
+            socket_timeout: Segundos máximos por operación
+            key_prefix: Prefijo de todas las claves (separa despliegues que comparten servidor)
+            retry_after_seconds: Pausa tras un fallo de conexión
+            client: Cliente redis-py ya construido (por defecto se crea desde la URL)
+
+        Los valores no indicados se toman de OptimizedConfig.SHARED_STATE_CONFIG.
+        """
+        import redis
+
+        config = {**DEFAULT_SHARED_STATE_CONFIG, **self._load_config()}
+        self.socket_timeout = socket_timeout or config["socket_timeout"]
+        self.key_prefix = config["key_prefix"] if key_prefix is None else key_prefix
+        self.retry_after_seconds = config["retry_after_seconds"] if retry_after_seconds is None else retry_after_seconds
+        self._redis_error = redis.RedisError
+        self._client = client or redis.Redis.from_url(
+            url,
+            socket_timeout=self.socket_timeout,
+            socket_connect_timeout=self.socket_timeout,
+            decode_responses=True
+        )
+        self._caido_hasta = 0.0
+        self.errors = 0
+
+        kwargs = self._client.connection_pool.connection_kwargs
+        self.address = f"{kwargs.get('host', 'localhost')}:{kwargs.get('port', 6379)}/{kwargs.get('db', 0)}"
+        logger.info(f"Estado compartido en {self.address} (prefijo '{self.key_prefix}')")
+
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            return dict(getattr(OptimizedConfig, "SHARED_STATE_CONFIG", {}))
+        except Exception:
+            return {}
+
+    # --- Operaciones ---
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[str]]:
+        if not keys:
+            return []
+        return self._ejecutar(self._client.mget, [self.key_prefix + key for key in keys])
+
+    def set_many(self, items: Dict[str, str], ttl: Optional[float] = None) -> None:
+        if not items:
+            return
+        px = max(int(ttl * 1000), 1) if ttl else None
+
+        def escribir():
+            pipeline = self._client.pipeline(transaction=False)
+            for key, value in items.items():
+                pipeline.set(self.key_prefix + key, value, px=px)
+            pipeline.execute()
+
+        self._ejecutar(escribir)
+
+    def delete(self, *keys: str) -> int:
+        if not keys:
+            return 0
+        return self._ejecutar(self._client.delete, *(self.key_prefix + key for key in keys))
+
+    def ping(self) -> bool:
+        return bool(self._ejecutar(self._client.ping))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **super().get_stats(),
+            "address": self.address,
+            "errors": self.errors,
+            "available": time.monotonic() >= self._caido_hasta
+        }
+
+    def close(self) -> None:
+        self._client.close()
+
+    def _ejecutar(self, operacion: Callable[..., T], *args: Any) -> T:
+        if time.monotonic() < self._caido_hasta:
+            raise SharedStateError("almacén marcado como no disponible")
+        try:
+            return run_blocking(operacion, *args)
+        except self._redis_error as e:
+            self.errors += 1
+            self._caido_hasta = time.monotonic() + self.retry_after_seconds
+            raise SharedStateError(f"{self.address}: {e}") from e
+
+
+class SharedMapping(MutableMapping):
+    """
+    Diccionario respaldado por el almacén de estado compartido, para estructuras
+    pequeñas que todos los workers deben ver (p. ej. ticket -> usuario). Guarda
+    una copia local como respaldo si el almacén no responde.
+    """
+
+    def __init__(self, store: SharedStateStore, namespace: str, ttl: Optional[float] = None):
+        self.store = store
+        self.namespace = namespace
+        self.ttl = ttl
+        self._local: Dict[str, Any] = {}
+
+    def _key(self, key: Any) -> str:
+        return f"{self.namespace}:{key}"
+
+    def __getitem__(self, key: Any) -> Any:
+        try:
+            raw = self.store.get(self._key(key))
+        except SharedStateError as e:
+            logger.warning(f"Estado compartido no disponible, se usa la copia local de {self.namespace}: {e}")
+            return self._local[key]
+        if raw is None:
+            raise KeyError(key)
+        value = json.loads(raw)
+        self._local[key] = value
+        return value
+
+    def __setitem__(self, key: Any, value: Any) -> None:
+        self._local[key] = value
+        self.store.set_json(self._key(key), value, self.ttl)
+
+    def __delitem__(self, key: Any) -> None:
+        existia = self._local.pop(key, None) is not None
+        if not self.store.discard(self._key(key)) and not existia:
+            raise KeyError(key)
+
+    def update_many(self, items: Dict[Any, Any]) -> None:
+        """Carga masiva en una sola ida y vuelta."""
+        self._local.update(items)
+        self.store.set_many_json({self._key(key): value for key, value in items.items()}, self.ttl)
+
+    # Iterar o contar el almacén completo no es barato: se usa la copia local
+    def __iter__(self) -> Iterator[Any]:
+        return iter(dict(self._local))
+
+    def __len__(self) -> int:
+        return len(self._local)
+
+
+# Instancia global (singleton pattern)
+_shared_state: Optional[SharedStateStore] = None
+_shared_state_lock = threading.Lock()
+
+
+def get_shared_state() -> SharedStateStore:
+    """
+    Retorna el almacén de estado compartido del proceso: RedisStateStore si
+    REDIS_URL está configurada, o InProcessStateStore en caso contrario.
+    """
+    global _shared_state
+    with _shared_state_lock:
+        if _shared_state is None:
+            _shared_state = _crear_shared_state()
+        return _shared_state
+
+
+def _crear_shared_state() -> SharedStateStore:
+    try:
+        from bot_siacasa.config.config import EnvironmentConfig
+        url = EnvironmentConfig.REDIS_URL
+    except Exception:
+        url = None
+
+    if url:
+        try:
+            return RedisStateStore(url)
+        except ImportError:
+            logger.error("REDIS_URL configurada pero redis-py no está instalado; se usa estado en proceso")
+        except ValueError as e:
+            logger.error(f"REDIS_URL inválida, se usa estado en proceso: {e}", exc_info=True)
+    return InProcessStateStore()
@@ -10,6 +10,10 @@ from flask import Flask, request
 from flask_socketio import SocketIO, emit, join_room, leave_room
 import socket  # Añadida esta importación para obtener el hostname
 
+from bot_siacasa.domain.services.conversation_cache import invalidar_conversacion_usuario
+from bot_siacasa.infrastructure.cooperative import enable_cooperative_mode
+from bot_siacasa.infrastructure.shared_state import SharedMapping, get_shared_state
+
 logger = logging.getLogger(__name__)
 
 class ChatSocketIOServer:
@@ -17,19 +21,22 @@ class ChatSocketIOServer:
     Servidor SocketIO para chat en tiempo real entre usuarios y agentes de soporte.
     """
     
-    def __init__(self, app=None, support_repository=None):
+    def __init__(self, app=None, support_repository=None, worker_affinity=None):
         """
         Inicializa el servidor SocketIO.
         
         Args:
             app: Aplicación Flask (opcional)
             support_repository: Repositorio para persistencia de mensajes
+            worker_affinity: WorkerAffinity para detectar conexiones fuera del worker dueño (opcional)
         """
         self.socketio = None
         self.support_repository = support_repository
+        self.worker_affinity = worker_affinity
         self.user_connections = {}  # user_id -> session_id
         self.agent_connections = {}  # agent_id -> session_id
-        self.ticket_users = {}  # ticket_id -> user_id
+        # ticket_id -> user_id, visible para todos los workers
+        self.ticket_users = SharedMapping(get_shared_state(), "ticket_usuario")
         
         # Log when server is initialized
         logger.info("SocketIO server initialized")
@@ -61,11 +68,14 @@ class ChatSocketIOServer:
             query = """
             SELECT id, user_id FROM support_tickets
             """
-            results = self.support_repository.db.fetch_all(query)
-            
-            for row in results:
-                self.ticket_users[row['id']] = row['user_id']
-                logger.info(f"Relación cargada: ticket {row['id']} -> usuario {row['user_id']}")
+            relaciones = {}
+            for row in self.support_repository.db.fetch_iter(query):
+                relaciones[row['id']] = row['user_id']
+                if len(relaciones) >= 1000:
+                    self.ticket_users.update_many(relaciones)
+                    relaciones = {}
+            self.ticket_users.update_many(relaciones)
+            logger.info(f"Relaciones ticket-usuario cargadas: {len(self.ticket_users)}")
         except Exception as e:
             logger.error(f"Error al cargar relaciones ticket-usuario: {e}", exc_info=True)
         
@@ -81,6 +91,15 @@ class ChatSocketIOServer:
             logger.info(f"URL de conexión: {request.url}")
             logger.info(f"Argumentos de conexión: {request.args}")
             
+            # Las salas del usuario viven en el worker que atiende sus mensajes
+            usuario_id = request.args.get('usuario_id')
+            if self.worker_affinity is not None and usuario_id and not self.worker_affinity.is_local(usuario_id):
+                self.worker_affinity.registrar_conexion_fuera_de_afinidad()
+                emit('worker_redirect', {
+                    'worker': self.worker_affinity.owner(usuario_id),
+                    'port': self.worker_affinity.port_for(usuario_id)
+                })
+            
             # Enviar mensaje de bienvenida con detalles del servidor
             emit('welcome', {
                 'status': 'success',
@@ -276,6 +295,7 @@ class ChatSocketIOServer:
                                 
                                 # Guardar cambios
                                 self.support_repository.guardar_ticket(ticket)
+                                invalidar_conversacion_usuario(ticket.conversacion.usuario.id, "mensaje en ticket")
                                 logger.info(f"Mensaje de usuario agregado a la conversación del ticket {ticket_id}")
                             else:
                                 logger.warning(f"Ticket no encontrado: {ticket_id}")
@@ -456,13 +476,14 @@ class ChatSocketIOServer:
 # Instancia global del servidor
 socketio_server = None
 
-def init_socketio_server(app=None, support_repository=None):
+def init_socketio_server(app=None, support_repository=None, worker_affinity=None):
     """
     Inicializa y devuelve la instancia global del servidor Socket.IO.
     
     Args:
         app: Aplicación Flask (opcional)
         support_repository: Repositorio para persistencia de mensajes
+        worker_affinity: WorkerAffinity del proceso (opcional)
         
     Returns:
         Instancia del servidor Socket.IO
@@ -470,6 +491,10 @@ def init_socketio_server(app=None, support_repository=None):
     global socketio_server
     
     if socketio_server is None:
+        # Con eventlet, la E/S de base de datos y OpenAI debe ceder el hub para no
+        # congelar el resto de websockets y requests mientras está en curso
+        enable_cooperative_mode()
+        
         # Primero crear la instancia de SocketIO con configuración mejorada
         socketio = SocketIO(
             app, 
@@ -483,7 +508,10 @@ def init_socketio_server(app=None, support_repository=None):
         )
         
         # Luego crear el servidor con la clase wrapper
-        socketio_server = ChatSocketIOServer(support_repository=support_repository)
+        socketio_server = ChatSocketIOServer(
+            support_repository=support_repository,
+            worker_affinity=worker_affinity
+        )
         
         # Inicializar el servidor con la instancia de SocketIO
         socketio_server.init_app(socketio)
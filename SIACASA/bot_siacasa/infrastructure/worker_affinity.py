@@ -0,0 +1,292 @@
+# bot_siacasa/infrastructure/worker_affinity.py
+import http.client
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from bot_siacasa.infrastructure.hash_ring import ConsistentHashRing, parse_node_targets
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKER_AFFINITY_CONFIG = {
+    "virtual_nodes": 128,
+    "connect_timeout": 2.0,        # Segundos máximos para conectar con el worker dueño
+    "forward_timeout": 60.0,       # Segundos esperando su respuesta: más que el peor turno con IA
+    "retry_after_seconds": 10.0    # Tiempo fuera del anillo de un worker que no respondió
+}
+
+# Cabecera que marca una petición ya reenviada (evita bucles) y el worker que respondió
+WORKER_HEADER = "X-Siacasa-Worker"
+
+# Cabeceras que no se reenvían entre workers (RFC 7230, sección 6.1)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "host", "content-length"
+}
+
+
+class WorkerUnavailableError(ConnectionError):
+    """
+    No se pudo conectar con el worker dueño: la petición no llegó a enviarse y
+    puede atenderse en otro worker.
+    """
+
+
+class WorkerTimeoutError(TimeoutError):
+    """
+    El worker dueño recibió la petición pero no respondió a tiempo. Puede seguir
+    procesándola, así que no debe repetirse en otro worker.
+    """
+
+
+class WorkerAffinity:
+    """
+    Afinidad usuario -> worker por hash consistente.
+
+    Cada `usuario_id` tiene un worker dueño, así que todas sus peticiones (y su
+    conexión Socket.IO) llegan al mismo proceso y las cachés en memoria del
+    ChatbotService se mantienen calientes al escalar. Al agregar o quitar un
+    worker solo cambian de dueño ~1/N de los usuarios.
+
+    Un worker que no responde sale del anillo durante `retry_after_seconds`: sus
+    usuarios pasan temporalmente a los workers siguientes del anillo.
+    """
+
+    def __init__(
+        self,
+        workers: Dict[str, str],
+        local_worker: str,
+        virtual_nodes: Optional[int] = None,
+        connect_timeout: Optional[float] = None,
+        forward_timeout: Optional[float] = None,
+        retry_after_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            workers: URL base por nombre de worker. El nombre (no el orden)
+                determina el reparto: debe mantenerse estable entre despliegues.
+            local_worker: Nombre del worker de este proceso
+            virtual_nodes: Posiciones en el anillo por worker
+            connect_timeout: Segundos máximos para conectar con el worker
+            forward_timeout: Segundos máximos esperando la respuesta del worker
+            retry_after_seconds: Tiempo fuera del anillo tras un fallo
+            clock: Reloj monotónico (inyectable en pruebas)
+
+        Los valores no indicados se toman de OptimizedConfig.WORKER_AFFINITY_CONFIG.
+        """
+        if local_worker not in workers:
+            raise ValueError(f"El worker local {local_worker} no está en la lista de workers")
+
+        config = {**DEFAULT_WORKER_AFFINITY_CONFIG, **self._load_config()}
+        self.workers: Dict[str, str] = {nombre: url.rstrip("/") for nombre, url in workers.items()}
+        self.local_worker = local_worker
+        self.ring = ConsistentHashRing(self.workers, virtual_nodes or config["virtual_nodes"])
+        self.connect_timeout = connect_timeout or config["connect_timeout"]
+        self.forward_timeout = forward_timeout or config["forward_timeout"]
+        self.retry_after_seconds = (
+            config["retry_after_seconds"] if retry_after_seconds is None else retry_after_seconds
+        )
+        self._clock = clock
+
+        self._lock = threading.Lock()
+        self._caidos: Dict[str, float] = {}  # worker -> instante en que vuelve al anillo
+        self.local_requests = 0
+        self.forwarded_requests = 0
+        self.forward_errors = 0
+        self.forward_timeouts = 0
+        self.misrouted_connections = 0
+
+        logger.info(
+            f"Afinidad de workers: {local_worker} entre {len(self.workers)} workers ({', '.join(self.workers)})"
+        )
+
+    @staticmethod
+    def _load_config() -> Dict[str, Any]:
+        try:
+            from bot_siacasa.config.config import OptimizedConfig
+            return dict(getattr(OptimizedConfig, "WORKER_AFFINITY_CONFIG", {}))
+        except Exception:
+            return {}
+
+    # --- Enrutamiento ---
+
+    def owner(self, usuario_id: str) -> str:
+        """
+        Worker dueño de un usuario entre los workers disponibles.
+        """
+        self._restaurar_vencidos()
+        return self.ring.get_node(usuario_id) or self.local_worker
+
+    def is_local(self, usuario_id: str) -> bool:
+        return self.owner(usuario_id) == self.local_worker
+
+    def url_for(self, usuario_id: str) -> str:
+        return self.workers[self.owner(usuario_id)]
+
+    def port_for(self, usuario_id: str) -> Optional[int]:
+        return urlparse(self.url_for(usuario_id)).port
+
+    def add_worker(self, nombre: str, url: str) -> None:
+        """
+        Agrega un worker (escalado): recibe ~1/N de los usuarios.
+        """
+        with self._lock:
+            self.workers[nombre] = url.rstrip("/")
+            self._caidos.pop(nombre, None)
+        self.ring.add_node(nombre)
+
+    def remove_worker(self, nombre: str) -> None:
+        """
+        Quita un worker: solo sus usuarios cambian de dueño.
+        """
+        if nombre == self.local_worker:
+            raise ValueError("No se puede quitar el worker local")
+        with self._lock:
+            self.workers.pop(nombre, None)
+            self._caidos.pop(nombre, None)
+        self.ring.remove_node(nombre)
+
+    def marcar_caido(self, nombre: str) -> None:
+        """
+        Saca temporalmente del anillo a un worker que no respondió.
+        """
+        if nombre == self.local_worker:
+            return
+        with self._lock:
+            self._caidos[nombre] = self._clock() + self.retry_after_seconds
+        self.ring.remove_node(nombre)
+        logger.warning(f"Worker {nombre} sin respuesta: fuera del anillo por {self.retry_after_seconds}s")
+
+    def _restaurar_vencidos(self) -> None:
+        if not self._caidos:
+            return
+        ahora = self._clock()
+        with self._lock:
+            vencidos = [nombre for nombre, hasta in self._caidos.items() if hasta <= ahora]
+            for nombre in vencidos:
+                del self._caidos[nombre]
+        for nombre in vencidos:
+            if nombre in self.workers:
+                self.ring.add_node(nombre)
+                logger.info(f"Worker {nombre} vuelve al anillo")
+
+    # --- Reenvío ---
+
+    def forward(
+        self,
+        worker: str,
+        method: str,
+        path: str,
+        headers: Dict[str, str],
+        body: bytes = b""
+    ) -> Tuple[int, List[Tuple[str, str]], bytes]:
+        """
+        Reenvía una petición HTTP al worker indicado.
+
+        Args:
+            worker: Nombre del worker destino
+            method: Método HTTP
+            path: Ruta con query string
+            headers: Cabeceras de la petición original
+            body: Cuerpo de la petición original
+
+        Returns:
+            (status, cabeceras, cuerpo) de la respuesta del worker
+
+        Raises:
+            WorkerUnavailableError: Si no se pudo conectar (nada se envió); el
+                worker queda fuera del anillo por un tiempo
+            WorkerTimeoutError: Si el worker no respondió dentro de forward_timeout
+            OSError: Si la conexión se cortó después de enviar la petición
+        """
+        cabeceras = {
+            nombre: valor for nombre, valor in headers.items()
+            if nombre.lower() not in HOP_BY_HOP_HEADERS and nombre.lower() != WORKER_HEADER.lower()
+        }
+        cabeceras[WORKER_HEADER] = self.local_worker
+        url = urlparse(self.workers[worker])
+        tipo = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+        conexion = tipo(url.hostname, url.port, timeout=self.connect_timeout)
+        try:
+            # Solo un fallo al conectar permite atender la petición en otro worker:
+            # después de enviarla, el dueño puede estar procesándola
+            try:
+                conexion.connect()
+            except OSError as e:
+                with self._lock:
+                    self.forward_errors += 1
+                self.marcar_caido(worker)
+                raise WorkerUnavailableError(f"No se pudo conectar con {worker}: {e}") from e
+
+            conexion.sock.settimeout(self.forward_timeout)
+            try:
+                conexion.request(method, url.path + path, body=body or None, headers=cabeceras)
+                respuesta = conexion.getresponse()
+                resultado = (respuesta.status, respuesta.getheaders(), respuesta.read())
+            except TimeoutError as e:
+                with self._lock:
+                    self.forward_timeouts += 1
+                raise WorkerTimeoutError(
+                    f"{worker} no respondió en {self.forward_timeout}s a {method} {path}"
+                ) from e
+            except OSError:
+                with self._lock:
+                    self.forward_errors += 1
+                raise
+        finally:
+            conexion.close()
+
+        with self._lock:
+            self.forwarded_requests += 1
+        return resultado
+
+    def registrar_local(self) -> None:
+        with self._lock:
+            self.local_requests += 1
+
+    def registrar_conexion_fuera_de_afinidad(self) -> None:
+        with self._lock:
+            self.misrouted_connections += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        self._restaurar_vencidos()
+        with self._lock:
+            return {
+                "local_worker": self.local_worker,
+                "workers": list(self.workers),
+                "workers_en_anillo": self.ring.nodes,
+                "workers_caidos": list(self._caidos),
+                "local_requests": self.local_requests,
+                "forwarded_requests": self.forwarded_requests,
+                "forward_errors": self.forward_errors,
+                "forward_timeouts": self.forward_timeouts,
+                "misrouted_connections": self.misrouted_connections
+            }
+
+
+def worker_affinity_from_env() -> Optional[WorkerAffinity]:
+    """
+    Construye la afinidad a partir de WORKER_NODES ("worker0=http://host:3200,...")
+    y WORKER_NAME (por defecto "worker<NODE_APP_INSTANCE>", la instancia de pm2).
+
+    Returns:
+        WorkerAffinity, o None si hay menos de dos workers o falta la configuración
+    """
+    from bot_siacasa.config.config import EnvironmentConfig
+
+    try:
+        workers = parse_node_targets(EnvironmentConfig.WORKER_NODES, prefijo="worker")
+    except ValueError as e:
+        logger.error(f"WORKER_NODES inválida, afinidad deshabilitada: {e}", exc_info=True)
+        return None
+    if len(workers) < 2:
+        return None
+
+    local_worker = EnvironmentConfig.WORKER_NAME
+    if local_worker not in workers:
+        logger.error(f"WORKER_NAME={local_worker!r} no está en WORKER_NODES, afinidad deshabilitada")
+        return None
+    return WorkerAffinity(workers, local_worker)
@@ -885,10 +885,30 @@
 
     // ======== SOCKET.IO ========
 
+    /**
+     * Obtiene el puerto del worker que atiende al usuario (afinidad por hash
+     * consistente), para que Socket.IO conecte al mismo proceso que sus mensajes
+     * @returns {Promise<number>} - Puerto del worker, o el puerto por defecto
+     */
+    async function resolveWorkerPort() {
+        try {
+            const url = `${config.apiEndpoint.replace("/mensaje", "/worker")}?usuario_id=${encodeURIComponent(sessionId)}`;
+            const response = await fetch(url);
+            if (response.ok) {
+                const data = await response.json();
+                if (data.port) return data.port;
+            }
+        } catch (error) {
+            console.warn("No se pudo obtener el worker del usuario:", error);
+        }
+        return serverPort;
+    }
+
     /**
      * Inicializa la conexión Socket.IO
+     * @param {number} port - Puerto del worker (opcional; por defecto se consulta)
      */
-    function initSocketConnection() {
+    async function initSocketConnection(port) {
         try {
             // Verificar si io está definido
             if (typeof io === "undefined") {
@@ -897,11 +917,13 @@
             }
 
             // Construir la URL del servidor Socket.IO
-            const socketUrl = `http://4.201.137.254:${serverPort}`;
+            const workerPort = port || (await resolveWorkerPort());
+            const socketUrl = `http://4.201.137.254:${workerPort}`;
             console.log(`Conectando a Socket.IO: ${socketUrl}`);
 
             // Inicializar Socket.IO
             socket = io(socketUrl, {
+                query: { usuario_id: sessionId },
                 transports: ["websocket", "polling"],
                 reconnection: true,
                 reconnectionAttempts: 5,
@@ -923,6 +945,14 @@
         console.log('Configurando eventos Socket.IO');
         if (!socket) return;
 
+        // El worker indica que el usuario pertenece a otro: reconectar allí
+        socket.on("worker_redirect", (data) => {
+            if (!data || !data.port) return;
+            console.log(`Reconectando Socket.IO al worker ${data.worker}`);
+            socket.disconnect();
+            initSocketConnection(data.port);
+        });
+
         socket.on("connect", () => {
             console.log("Conectado a Socket.IO con ID:", socket.id);
 
@@ -4,12 +4,22 @@ import os
 import uuid
 import logging
 from typing import Dict, Any
-from flask import Flask, render_template, request, jsonify, session
+from flask import Flask, Response, render_template, request, jsonify, session, g
 from flask_cors import CORS  # Necesitarás instalar flask-cors
 from dotenv import load_dotenv  # ← AGREGAR ESTA LÍNEA
 
 from bot_siacasa.domain.banks_config import BANK_CONFIGS
 from bot_siacasa.application.use_cases.procesar_mensaje_use_case import ProcesarMensajeUseCase
+from bot_siacasa.config.config import OptimizedConfig
+from bot_siacasa.domain.services.conversation_cache import invalidar_conversacion_usuario
+from bot_siacasa.infrastructure.cooperative import run_blocking
+from bot_siacasa.infrastructure.db.query_budget import start_tracking, stop_tracking
+from bot_siacasa.infrastructure.worker_affinity import (
+    HOP_BY_HOP_HEADERS,
+    WORKER_HEADER,
+    WorkerTimeoutError,
+    WorkerUnavailableError,
+)
 from bot_siacasa.infrastructure.websocket.socketio_server import get_websocket_server as get_socketio_server
 import json
 
@@ -22,23 +32,35 @@ class WebApp:
     Clase que encapsula la aplicación web Flask.
     """
     
-    def __init__(self, procesar_mensaje_use_case, chatbot_service):
+    # Rutas cuyas peticiones se atienden en el worker dueño del usuario
+    RUTAS_CON_AFINIDAD = ('/api/mensaje', '/api/mensajes', '/api/finalizar-sesion', '/api/reiniciar', '/api/debug/')
+    
+    def __init__(self, procesar_mensaje_use_case, chatbot_service, worker_affinity=None):
         """
         Inicializa la aplicación web.
         
         Args:
             procesar_mensaje_use_case: Caso de uso para procesar mensajes
             chatbot_service: Servicio de chatbot
+            worker_affinity: WorkerAffinity para atender a cada usuario en su worker (opcional)
         """
         self.app = Flask(__name__)
         self.procesar_mensaje_use_case = procesar_mensaje_use_case
         self.chatbot_service = chatbot_service
+        self.worker_affinity = worker_affinity
         self.app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24))
 
         
         # Configurar CORS para permitir solicitudes desde cualquier origen
         CORS(self.app, resources={r"/api/*": {"origins": "*"}})
         
+        # Reenviar al worker dueño las peticiones de usuarios de otros workers
+        if worker_affinity is not None:
+            self._register_worker_affinity()
+        
+        # Contar consultas a la base de datos por request
+        self._register_query_tracking()
+        
         # Registrar rutas principales
         self._register_routes()
         
@@ -50,6 +72,111 @@ class WebApp:
         except ImportError as e:
             logger.warning(f"No se pudieron cargar las rutas de métricas: {e}")
 
+    def _register_query_tracking(self) -> None:
+        """
+        Cuenta los viajes a la base de datos y las filas obtenidas en cada request.
+        El resultado se registra en logs y, en modo debug, se devuelve en las
+        cabeceras X-DB-Queries y X-DB-Rows.
+        """
+        warning_threshold = OptimizedConfig.DATABASE_CONFIG.get("request_query_warning", 15)
+        
+        @self.app.before_request
+        def start_query_tracking():
+            g.db_query_counter, g.db_query_token = start_tracking(f"{request.method} {request.path}")
+        
+        @self.app.after_request
+        def report_query_tracking(response):
+            counter = g.get('db_query_counter')
+            if counter is None or not counter.queries:
+                return response
+            
+            if self.app.debug:
+                response.headers['X-DB-Queries'] = str(counter.queries)
+                response.headers['X-DB-Rows'] = str(counter.rows)
+            
+            repeated = counter.repeated()
+            if counter.queries > warning_threshold:
+                logger.warning(
+                    f"{counter.name}: {counter.queries} consultas, {counter.rows} filas "
+                    f"(umbral {warning_threshold}); repetidas: {repeated}"
+                )
+            else:
+                logger.debug(f"{counter.name}: {counter.queries} consultas, {counter.rows} filas")
+            return response
+        
+        @self.app.teardown_request
+        def stop_query_tracking(_error):
+            token = g.pop('db_query_token', None)
+            if token is not None:
+                try:
+                    stop_tracking(token)
+                except ValueError:
+                    # El token se creó en otro contexto (p. ej. un green thread distinto)
+                    pass
+
+    def _register_worker_affinity(self) -> None:
+        """
+        Atiende cada petición de usuario en su worker dueño (hash consistente de
+        usuario_id): si el dueño es otro worker, la reenvía y devuelve su respuesta.
+        Las peticiones ya reenviadas se atienden siempre localmente, y si el dueño no
+        responde también: el repositorio sigue siendo la fuente de verdad.
+        """
+        affinity = self.worker_affinity
+        
+        @self.app.before_request
+        def route_to_owner_worker():
+            if not request.path.startswith(self.RUTAS_CON_AFINIDAD) or request.headers.get(WORKER_HEADER):
+                return None
+            usuario_id = self._usuario_de_request()
+            if not usuario_id:
+                return None
+            
+            owner = affinity.owner(usuario_id)
+            if owner == affinity.local_worker:
+                affinity.registrar_local()
+                return None
+            
+            path = request.path + (f"?{request.query_string.decode()}" if request.query_string else "")
+            try:
+                # Con eventlet, la espera al otro worker no debe bloquear el hub
+                status, headers, body = run_blocking(
+                    affinity.forward, owner, request.method, path, dict(request.headers), request.get_data()
+                )
+            except WorkerUnavailableError as e:
+                # La petición no llegó al dueño: se puede atender aquí sin duplicarla
+                logger.warning(f"Worker {owner} no disponible para {usuario_id}, se atiende localmente: {e}")
+                affinity.registrar_local()
+                return None
+            except WorkerTimeoutError as e:
+                # El dueño puede seguir procesándola: repetirla aquí duplicaría el turno
+                logger.error(f"Sin respuesta de {owner} para {usuario_id}: {e}")
+                return jsonify({'status': 'error', 'mensaje': 'El servidor tardó demasiado en responder'}), 504
+            except OSError as e:
+                logger.error(f"Conexión con {owner} interrumpida para {usuario_id}: {e}")
+                return jsonify({'status': 'error', 'mensaje': 'Error al contactar al servidor'}), 502
+            
+            headers = [(nombre, valor) for nombre, valor in headers if nombre.lower() not in HOP_BY_HOP_HEADERS]
+            return Response(body, status=status, headers=headers)
+        
+        @self.app.after_request
+        def tag_worker(response):
+            response.headers.setdefault(WORKER_HEADER, affinity.local_worker)
+            return response
+
+    def _usuario_de_request(self):
+        """
+        usuario_id de la petición: ruta, query string, cuerpo JSON (también el de
+        sendBeacon, que llega como texto) o formulario, y por último la sesión.
+        """
+        usuario_id = (request.view_args or {}).get('usuario_id') or request.args.get('usuario_id')
+        if not usuario_id and request.method == 'POST':
+            datos = request.get_json(silent=True, force=True)
+            if isinstance(datos, dict):
+                usuario_id = datos.get('usuario_id')
+            if not usuario_id:
+                usuario_id = request.form.get('usuario_id')
+        return usuario_id or session.get('usuario_id')
+
     def _register_routes(self) -> None:
         """
         Registra las rutas de la aplicación.
@@ -97,17 +224,13 @@ class WebApp:
                 
                 logger.info(f"Finalizando sesión para usuario: {usuario_id}")
                 
-                # Finalizar la sesión activa del usuario
-                query = """
-                UPDATE chatbot_sessions 
-                SET end_time = %s
-                WHERE user_id = %s AND end_time IS NULL
-                """
-                
-                from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
-                db = NeonDBConnector()
-                
-                db.execute(query, (datetime.now(), usuario_id))
+                # Finalizar la conversación activa (y sus sesiones) en el repositorio
+                # antes de invalidar la caché: si no, el siguiente turno la reabre
+                repository = self.chatbot_service.repository
+                conversacion = repository.obtener_conversacion_activa(usuario_id)
+                if conversacion:
+                    repository.finalizar_conversacion(conversacion.id)
+                invalidar_conversacion_usuario(usuario_id, "sesión finalizada")
                 logger.info(f"Conversación finalizada para usuario {usuario_id}")
                 
                 return jsonify({
@@ -141,7 +264,8 @@ class WebApp:
                     return jsonify({
                         'usuario_id': usuario_id,
                         'conversacion_id': conversacion.id,
-                        'total_mensajes': len(conversacion.mensajes),
+                        'total_mensajes': conversacion.total_mensajes,
+                        'mensajes_en_memoria': len(conversacion.mensajes),
                         'mensajes': mensajes,
                         'cache_status': usuario_id in self.chatbot_service._conversation_cache
                     })
@@ -150,6 +274,20 @@ class WebApp:
             except Exception as e:
                 return jsonify({'error': str(e)})
         
+        # Worker que atiende a un usuario (el widget conecta Socket.IO a ese worker)
+        @self.app.route('/api/worker', methods=['GET'])
+        def worker_de_usuario():
+            usuario_id = request.args.get('usuario_id')
+            if self.worker_affinity is None or not usuario_id:
+                return jsonify({'worker': None, 'url': None, 'port': None, 'local': True})
+            owner = self.worker_affinity.owner(usuario_id)
+            return jsonify({
+                'worker': owner,
+                'url': self.worker_affinity.workers[owner],
+                'port': self.worker_affinity.port_for(usuario_id),
+                'local': owner == self.worker_affinity.local_worker
+            })
+        
         # API para procesar mensajes
         @self.app.route('/api/mensaje', methods=['POST'])
         def procesar_mensaje():
@@ -187,23 +325,23 @@ class WebApp:
                 # NUEVO: Asegurarse de que la conversación tenga el bank_code en sus metadatos
                 if not getattr(conversacion, 'metadata', None):
                     conversacion.metadata = {}
-                conversacion.metadata['bank_code'] = bank_code
-
-                # Guardar la conversación con los metadatos actualizados
-                self.chatbot_service.repository.guardar_conversacion(conversacion)
                 
-                # NUEVO: Verificar si hay una sesión activa para este usuario o crear una nueva
-                session_id = self._get_or_create_chat_session(usuario_id, bank_code)
+                # Solo se guarda antes de procesar si cambió el banco; el resto del turno
+                # se persiste junto al final del procesamiento
+                if conversacion.metadata.get('bank_code') != bank_code:
+                    conversacion.metadata['bank_code'] = bank_code
+                    self.chatbot_service.repository.guardar_conversacion(conversacion)
                 
-                # Procesar mensaje con el chatbot
+                # Procesar mensaje con el chatbot; la sesión (chatbot_sessions y métricas)
+                # se actualiza en el mismo lote que persiste el turno
                 respuesta = self.procesar_mensaje_use_case.execute(
                     mensaje_usuario=mensaje,
                     usuario_id=usuario_id,
                     info_usuario=info_usuario
                 )
                 
-                # NUEVO: Actualizar contador de mensajes en la sesión
-                self._update_chat_session_message_count(session_id)
+                # La sesión es la propia conversación
+                session_id = conversacion.id
                 
                 # Devolver respuesta como JSON, incluyendo el ID de usuario
                 return jsonify({
@@ -296,84 +434,6 @@ class WebApp:
                 }), 500
         
         
-    # NUEVO: Añadir métodos de gestión de sesiones
-    def _get_or_create_chat_session(self, usuario_id, bank_code):
-        """
-        Obtiene una sesión de chat activa o crea una nueva.
-        
-        Args:
-            usuario_id: ID del usuario
-            bank_code: Código del banco
-            
-        Returns:
-            ID de la sesión
-        """
-        try:
-            # Conectar a la base de datos
-            from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
-            db = NeonDBConnector()
-            
-            # Verificar si hay una sesión activa para este usuario (sin end_time)
-            query = """
-            SELECT id FROM chatbot_sessions 
-            WHERE user_id = %s AND bank_code = %s AND end_time IS NULL 
-            ORDER BY start_time DESC LIMIT 1
-            """
-            
-            result = db.fetch_one(query, (usuario_id, bank_code))
-            
-            if result:
-                logger.info(f"Sesión activa encontrada: {result['id']} para usuario {usuario_id}")
-                return result['id']
-            
-            # Si no hay sesión activa, crear una nueva
-            session_id = str(uuid.uuid4())
-            
-            query = """
-            INSERT INTO chatbot_sessions (id, user_id, bank_code, start_time, message_count, metadata)
-            VALUES (%s, %s, %s, %s, 0, %s)
-            """
-            
-            # Usar el bank_code pasado como parámetro en lugar de obtenerlo de la solicitud
-            # datos = request.json
-            # bank_code = datos.get('bank_code', 'default')  <-- Esta línea debe ser eliminada
-            
-            # Metadatos como JSON
-            metadata_json = json.dumps({"source": "web"})
-            db.execute(query, (session_id, usuario_id, bank_code, datetime.now(), metadata_json))
-            logger.info(f"Nueva conversación iniciada: {session_id} para usuario {usuario_id} del banco {bank_code}")
-            
-            return session_id
-            
-        except Exception as e:
-            logger.error(f"Error al obtener/crear sesión de chat: {e}", exc_info=True)
-            # En caso de error, generar un ID de sesión temporal
-            return str(uuid.uuid4())
-        
-    def _update_chat_session_message_count(self, session_id):
-        """
-        Actualiza el contador de mensajes en una sesión.
-        
-        Args:
-            session_id: ID de la sesión
-        """
-        try:
-            query = """
-            UPDATE chatbot_sessions 
-            SET message_count = message_count + 1
-            WHERE id = %s
-            """
-            
-            from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
-            db = NeonDBConnector()
-            
-            db.execute(query, (session_id,))
-            
-        except Exception as e:
-            logger.error(f"Error al actualizar contador de mensajes: {e}", exc_info=True)
-
-    
-    
     def run(self, host: str = '0.0.0.0', port: int = 4040, debug: bool = False, **kwargs) -> None:
         """
         Ejecuta la aplicación web.
@@ -16,6 +16,7 @@ load_dotenv()
 # Clases principales de la aplicación
 from bot_siacasa.config.config import OptimizedConfig, EnvironmentConfig, get_optimized_config
 from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.domain.services.conversation_cache import ConversationCache
 from bot_siacasa.domain.services.response_cache_service import get_cache_service
 from bot_siacasa.infrastructure.ai.openai_provider import OpenAIProvider
 from bot_siacasa.infrastructure.ai.knowledge_base_service import KnowledgeBaseService
@@ -27,7 +28,15 @@ from bot_siacasa.application.use_cases.analizar_sentimiento_use_case import Anal
 from flask import Flask, jsonify, request, render_template_string
 from bot_siacasa.infrastructure.websocket.socketio_server import init_socketio_server
 from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+from bot_siacasa.infrastructure.db.connection_pool import get_all_pool_stats
+from bot_siacasa.infrastructure.db.replica import get_all_replica_stats
+from bot_siacasa.infrastructure.db.migrations import ensure_schema
+from bot_siacasa.infrastructure.db.partitions import PartitionManager
+from bot_siacasa.infrastructure.db.prepared_statements import prepared_statement_stats
+from bot_siacasa.infrastructure.db.query_stats import get_query_stats
 from bot_siacasa.infrastructure.db.support_repository import SupportRepository
+from bot_siacasa.infrastructure.shared_state import get_shared_state
+from bot_siacasa.infrastructure.worker_affinity import worker_affinity_from_env
 from bot_siacasa.interfaces.web.web_app import WebApp
 
 # Configurar logging optimizado
@@ -60,6 +69,11 @@ class OptimizedChatbotApp:
         """Inicializa la aplicación con configuración optimizada."""
         self.config = get_optimized_config()
         self.cache_service = get_cache_service()
+        # Estado compartido entre workers solo si hay un almacén en red (REDIS_URL)
+        shared_state = get_shared_state()
+        self.shared_store = shared_state if shared_state.shared else None
+        # Afinidad usuario -> worker cuando hay varios workers (WORKER_NODES)
+        self.worker_affinity = worker_affinity_from_env()
         
         # Componentes principales
         self.repository = None
@@ -84,10 +98,46 @@ class OptimizedChatbotApp:
         
         try:
             # 1. Inicializar conector de base de datos y repositorio PERSISTENTE
-            neon_disabled = EnvironmentConfig.DISABLE_NEONDB or EnvironmentConfig.USE_MEMORY_REPOSITORY
+            neon_disabled = (
+                EnvironmentConfig.DISABLE_NEONDB
+                or EnvironmentConfig.USE_MEMORY_REPOSITORY
+                or EnvironmentConfig.REPOSITORY_BACKEND == "memory"
+            )
             repo_issue = None
 
-            if neon_disabled:
+            if EnvironmentConfig.REPOSITORY_BACKEND == "sqlite":
+                try:
+                    from bot_siacasa.infrastructure.repositories.sqlite_repository import SQLiteRepository
+
+                    self.repository = SQLiteRepository(EnvironmentConfig.SQLITE_DB_PATH)
+                    self.repository_backend = "sqlite"
+                    self.persistence_enabled = True
+                    self.repository_error = None
+                    logger.info(f"✅ SQLite Repository inicializado en {EnvironmentConfig.SQLITE_DB_PATH}")
+                except Exception as db_error:
+                    repo_issue = f"{db_error.__class__.__name__}: {db_error}"
+                    self.repository_error = repo_issue
+                    logger.warning(
+                        "No se pudo abrir la base SQLite. Se usará repositorio en memoria. Detalle: %s",
+                        db_error,
+                        exc_info=True
+                    )
+            elif EnvironmentConfig.REPOSITORY_BACKEND == "sharded":
+                try:
+                    self.repository = self._build_sharded_repository()
+                    self.repository_backend = "sharded"
+                    self.persistence_enabled = True
+                    self.repository_error = None
+                    logger.info(f"✅ Repositorio particionado inicializado ({len(self.repository.shards)} shards)")
+                except Exception as db_error:
+                    repo_issue = f"{db_error.__class__.__name__}: {db_error}"
+                    self.repository_error = repo_issue
+                    logger.warning(
+                        "No se pudieron abrir los shards. Se usará repositorio en memoria. Detalle: %s",
+                        db_error,
+                        exc_info=True
+                    )
+            elif neon_disabled:
                 repo_issue = "NeonDB deshabilitado por configuración"
                 logger.warning("NeonDB deshabilitado vía variable de entorno. Se utilizará el repositorio en memoria.")
             else:
@@ -95,6 +145,9 @@ class OptimizedChatbotApp:
                     db_connector = NeonDBConnector(
                         connect_timeout=EnvironmentConfig.NEONDB_CONNECT_TIMEOUT
                     )
+                    # Primera conexión: aplica las migraciones pendientes del esquema
+                    ensure_schema(db_connector)
+                    self._maintain_partitions(db_connector)
                     self.repository = PostgreSQLRepository(db_connector)
                     self.repository_backend = "postgresql"
                     self.persistence_enabled = True
@@ -128,7 +181,8 @@ class OptimizedChatbotApp:
             
             self.ai_provider = OpenAIProvider(
                 api_key=EnvironmentConfig.OPENAI_API_KEY,
-                model=self.config["openai"]["model"]
+                model=self.config["openai"]["model"],
+                shared_store=self.shared_store
             )
             # Aplicar configuración optimizada
             self.ai_provider.update_config(**self.config["openai"])
@@ -182,7 +236,8 @@ class OptimizedChatbotApp:
                 sentimiento_analyzer=sentiment_analyzer,
                 ai_provider=self.ai_provider,
                 bank_config=bank_config,
-                knowledge_service=self.knowledge_service
+                knowledge_service=self.knowledge_service,
+                conversation_cache=ConversationCache(shared_store=self.shared_store)
             )
             logger.info("✅ ChatbotService inicializado")
             
@@ -254,13 +309,57 @@ class OptimizedChatbotApp:
             "avg_response_time_ms": round(avg_response_time, 2),
             "requests_per_second": round(self.total_requests / max(uptime, 1), 2),
             "cache_stats": self.cache_service.get_stats(),
+            "conversation_cache_stats": (
+                self.chatbot_service._conversation_cache.get_stats() if self.chatbot_service else {}
+            ),
+            "shared_state_stats": get_shared_state().get_stats(),
+            "worker_affinity_stats": self.worker_affinity.get_stats() if self.worker_affinity else {},
             "ai_provider_stats": self.ai_provider.get_cache_stats() if hasattr(self.ai_provider, 'get_cache_stats') else {},
             "repository_backend": self.repository_backend,
             "persistence_enabled": self.persistence_enabled,
             "knowledge_base_enabled": self.knowledge_service is not None,
-            "repository_issue": self.repository_error
+            "repository_issue": self.repository_error,
+            "repository_stats": self.repository.get_stats() if hasattr(self.repository, "get_stats") else {},
+            "db_pool_stats": get_all_pool_stats(),
+            "db_prepared_statements": prepared_statement_stats.as_dict(),
+            "db_query_stats": get_query_stats(top=10),
+            "db_replica_stats": get_all_replica_stats()
         }
 
+    def _build_sharded_repository(self):
+        """
+        Abre un repositorio por shard de SHARD_TARGETS: los destinos terminados en
+        .db/.sqlite son archivos SQLite y el resto, hosts de PostgreSQL (con la misma
+        base, usuario y contraseña que NEONDB_*).
+        """
+        from bot_siacasa.infrastructure.repositories.sharded_repository import ShardedRepository, parse_shard_targets
+        from bot_siacasa.infrastructure.repositories.sqlite_repository import SQLiteRepository
+
+        targets = parse_shard_targets(EnvironmentConfig.SHARD_TARGETS)
+        if not targets:
+            raise ValueError("SHARD_TARGETS no configurado")
+
+        shards = {}
+        for nombre, destino in targets.items():
+            if destino.endswith((".db", ".sqlite")):
+                shards[nombre] = SQLiteRepository(destino)
+            else:
+                db_connector = NeonDBConnector(host=destino, connect_timeout=EnvironmentConfig.NEONDB_CONNECT_TIMEOUT)
+                ensure_schema(db_connector)
+                self._maintain_partitions(db_connector)
+                shards[nombre] = PostgreSQLRepository(db_connector)
+        anteriores = [nombre.strip() for nombre in EnvironmentConfig.SHARD_PREVIOUS.split(",") if nombre.strip()]
+        return ShardedRepository(shards, shards_anteriores=anteriores or None)
+
+    def _maintain_partitions(self, db_connector: NeonDBConnector) -> None:
+        """Crea las particiones mensuales futuras; un fallo no impide arrancar."""
+        if not OptimizedConfig.PARTITION_CONFIG.get("maintain_on_startup", True):
+            return
+        try:
+            PartitionManager(db_connector).ensure_future_partitions()
+        except Exception as e:
+            logger.warning(f"No se pudieron verificar las particiones mensuales: {e}", exc_info=True)
+
     def _update_metrics(self, response_time_ms: float) -> None:
         """Actualiza métricas internas."""
         self.total_response_time += response_time_ms
@@ -297,7 +396,7 @@ def main():
             print("⚠️ NeonDB no disponible o deshabilitado. Usando repositorio en memoria (los datos no se persistirán).")
         
         # Crear la aplicación web Flask
-        web_app_instance = WebApp(app.procesar_mensaje_use_case, app.chatbot_service)
+        web_app_instance = WebApp(app.procesar_mensaje_use_case, app.chatbot_service, app.worker_affinity)
         
         # Inicializar el repositorio de soporte para Socket.IO
         support_repository = None
@@ -315,7 +414,7 @@ def main():
             logger.warning("Repositorio de soporte deshabilitado porque no hay base de datos persistente disponible.")
         
         # Inicializar el servidor Socket.IO
-        socketio_server = init_socketio_server(web_app_instance.app, support_repository)
+        socketio_server = init_socketio_server(web_app_instance.app, support_repository, app.worker_affinity)
         if support_repository is None:
             logger.warning("Socket.IO se ejecutará sin soporte para tickets persistentes.")
         
@@ -6,56 +6,69 @@ from sqlalchemy.orm import Session
 from .database import get_database_session, DBSession, DBMessage, DBDailyMetrics
 from .models import SentimentType, ResolutionStatus, IntentType, DailyMetrics
 
+# Filas por lote al recorrer resultados grandes con cursores de servidor
+STREAM_BATCH_SIZE = 1000
+
 class SIACASAMetricsAnalyzer:
     """Analizador de métricas específico para SIACASA"""
     
     def __init__(self):
         pass
     
-    def _get_db(self):
-        return next(get_database_session())
+    def _get_db(self, readonly: bool = False):
+        # Los reportes históricos toleran retraso y pueden leerse de la réplica
+        return next(get_database_session(readonly=readonly))
     
     def generate_daily_report(self, date: datetime) -> Dict[str, Any]:
         """Generar reporte diario específico para cajas rurales"""
         
-        db = self._get_db()
+        db = self._get_db(readonly=True)
         
         try:
             start_date = date.replace(hour=0, minute=0, second=0, microsecond=0)
             end_date = start_date + timedelta(days=1)
             
-            # Consultar sesiones del día
-            sessions = db.query(DBSession).filter(
+            # Consultar sesiones del día en streaming (cursor de servidor) acumulando en una pasada
+            sessions = db.query(
+                DBSession.total_messages,
+                DBSession.resolution_status,
+                DBSession.escalation_required,
+                DBSession.emotion_improvement
+            ).filter(
                 and_(
                     DBSession.start_time >= start_date,
                     DBSession.start_time < end_date
                 )
-            ).all()
+            ).execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+            
+            total_sessions = 0
+            total_messages = 0
+            successful_resolutions = 0
+            escalated_sessions = 0
+            emotional_improvements = 0
+            
+            for s in sessions:
+                # Métricas básicas
+                total_sessions += 1
+                total_messages += s.total_messages or 0
+                
+                # Métricas de efectividad bancaria
+                if s.resolution_status == "exitosa":  # Cambiar de enum a string
+                    successful_resolutions += 1
+                if s.escalation_required:
+                    escalated_sessions += 1
+                
+                # Mejora emocional (clave para SIACASA)
+                if s.emotion_improvement:
+                    emotional_improvements += 1
             
-            if not sessions:
+            if not total_sessions:
                 return {
                     "date": date.isoformat(),
                     "error": "No data found for SIACASA",
                     "total_sessions": 0
                 }
             
-            # Métricas básicas
-            total_sessions = len(sessions)
-            total_messages = sum(s.total_messages for s in sessions)
-            
-            # Métricas de efectividad bancaria
-            successful_resolutions = sum(
-                1 for s in sessions 
-                if s.resolution_status == "exitosa"  # Cambiar de enum a string
-            )
-            escalated_sessions = sum(1 for s in sessions if s.escalation_required)
-            
-            # Mejora emocional (clave para SIACASA)
-            emotional_improvements = sum(
-                1 for s in sessions 
-                if s.emotion_improvement
-            )
-            
             # Distribución de intents bancarios - CORREGIDO: Sin JOIN
             intent_counts = db.query(
                 DBMessage.intent,
@@ -86,7 +99,7 @@ class SIACASAMetricsAnalyzer:
     def get_user_journey(self, user_id: str, days: int = 30) -> Dict[str, Any]:
         """Obtener journey de un cliente específico"""
         
-        db = self._get_db()
+        db = self._get_db(readonly=True)
         
         try:
             since_date = datetime.utcnow() - timedelta(days=days)
@@ -135,17 +148,16 @@ class SIACASAMetricsAnalyzer:
             if satisfaction_trend:
                 avg_satisfaction = sum(t["score"] for t in satisfaction_trend) / len(satisfaction_trend)
             
-            # Intent más común
-            all_messages = []
-            for session in sessions:
-                messages = db.query(DBMessage).filter(
-                    DBMessage.session_id == session.id
-                ).all()
-                all_messages.extend(messages)
+            # Intent más común (una sola consulta en streaming sobre los mensajes de todas las sesiones)
+            # (la cota por timestamp limita la lectura a las particiones del periodo)
+            intents = db.query(DBMessage.intent).filter(
+                DBMessage.session_id.in_([session.id for session in sessions]),
+                DBMessage.timestamp >= sessions[-1].start_time
+            ).execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
             
             intent_counts = {}
-            for msg in all_messages:
-                intent_counts[msg.intent] = intent_counts.get(msg.intent, 0) + 1
+            for (intent,) in intents:
+                intent_counts[intent] = intent_counts.get(intent, 0) + 1
             
             most_common_intent = max(intent_counts, key=intent_counts.get) if intent_counts else None
             
@@ -3,6 +3,7 @@ import time
 import json
 from datetime import datetime
 from typing import Dict, Optional, Any
+from bot_siacasa.domain.identifiers import new_id
 from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
 
 logger = logging.getLogger(__name__)
@@ -32,8 +33,7 @@ class MetricsCollector:
                 return str(existing_session['id'])
             
             # Crear nueva sesión
-            import uuid
-            session_id = str(uuid.uuid4())
+            session_id = new_id()
             
             self.db_connector.execute("""
                 INSERT INTO chat_sessions (
@@ -50,7 +50,7 @@ class MetricsCollector:
             
         except Exception as e:
             logger.error(f"Error obteniendo/creando sesión: {e}")
-            return str(uuid.uuid4())  # Fallback
+            return new_id()  # Fallback
     
     def record_message_sync(self, **kwargs):
         """
@@ -86,6 +86,7 @@ class MetricsCollector:
                     FROM mensajes m
                     JOIN conversaciones c ON m.conversacion_id = c.id
                     WHERE c.usuario_id = %s
+                        AND m.timestamp >= c.fecha_inicio
                     ORDER BY m.timestamp DESC
                     LIMIT 1
                 """, (user_id,))
@@ -111,7 +112,7 @@ class MetricsCollector:
                         is_escalation_request = %s,
                         response_tone = %s,
                         metadata = COALESCE(metadata, '{}'::jsonb) || %s::jsonb
-                    WHERE id = %s
+                    WHERE id = %s AND timestamp = %s
                 """, (
                     processing_time_ms,
                     ai_processing_time_ms,
@@ -126,7 +127,8 @@ class MetricsCollector:
                         'detected_entities': kwargs.get('detected_entities', {}),
                         'timing_breakdown': kwargs.get('timing_breakdown', {})
                     }),
-                    last_message['id']
+                    last_message['id'],
+                    last_message['timestamp']
                 ))
                 
                 logger.info(f"✅ Métricas guardadas: {processing_time_ms:.1f}ms (mensaje {last_message['id'][:8]}..., filas: {rows_updated})")
@@ -157,7 +159,6 @@ class MetricsCollector:
             
             if table_exists and table_exists['count'] > 0:
                 # Guardar en tabla message_metrics
-                import uuid
                 self.db_connector.execute("""
                     INSERT INTO message_metrics (
                         id, session_id, user_message, bot_response,
@@ -165,7 +166,7 @@ class MetricsCollector:
                         timestamp
                     ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
                 """, (
-                    str(uuid.uuid4()),
+                    new_id(),
                     session_id,
                     kwargs.get('user_message', ''),
                     kwargs.get('bot_response', ''),
@@ -200,7 +201,7 @@ class MetricsCollector:
             if conversacion_id:
                 # Buscar último mensaje de esta conversación
                 last_message = self.db_connector.fetch_one("""
-                    SELECT id FROM mensajes 
+                    SELECT id, timestamp FROM mensajes 
                     WHERE conversacion_id = %s 
                     ORDER BY timestamp DESC 
                     LIMIT 1
@@ -211,11 +212,12 @@ class MetricsCollector:
                         UPDATE mensajes SET
                             processing_time_ms = %s,
                             sentiment = %s
-                        WHERE id = %s
+                        WHERE id = %s AND timestamp = %s
                     """, (
                         processing_time_ms,
                         kwargs.get('sentiment', 'neutral'),
-                        last_message['id']
+                        last_message['id'],
+                        last_message['timestamp']
                     ))
                     
                     logger.info(f"✅ Métricas alternativas guardadas: {processing_time_ms:.1f}ms")
@@ -283,8 +285,7 @@ def test_metrics_funcionan():
         db = NeonDBConnector()
         
         # Crear conversación si no existe
-        import uuid
-        conv_id = str(uuid.uuid4())
+        conv_id = new_id()
         
         db.execute("""
             INSERT INTO conversaciones (id, usuario_id, fecha_inicio)
@@ -293,7 +294,7 @@ def test_metrics_funcionan():
         """, (conv_id, test_user_id, datetime.now()))
         
         # Crear mensaje de prueba
-        mensaje_id = str(uuid.uuid4())
+        mensaje_id = new_id()
         db.execute("""
             INSERT INTO mensajes (id, conversacion_id, role, content, timestamp)
             VALUES (%s, %s, %s, %s, %s)
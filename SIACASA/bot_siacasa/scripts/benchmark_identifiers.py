@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark de inserción según el tipo de identificador: antes (uuid4 aleatorio en
+VARCHAR) y después (UUIDv7 ordenado por tiempo en UUID nativo), más las
+combinaciones intermedias. Mide filas por segundo y el tamaño final del índice
+de la clave primaria. Usa tablas "bench_ids_*" que se eliminan al terminar.
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+# Añadir el directorio raíz del proyecto al sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot_siacasa.domain.identifiers import new_id
+
+GENERATORS = {
+    "uuid4": lambda: str(uuid.uuid4()),
+    "uuid7": new_id,
+}
+
+# (nombre, tipo de columna, generador); el primero es el esquema anterior
+SCENARIOS = [
+    ("varchar_uuid4", "VARCHAR(100)", "uuid4"),
+    ("varchar_uuid7", "VARCHAR(100)", "uuid7"),
+    ("uuid_uuid4", "UUID", "uuid4"),
+    ("uuid_uuid7", "UUID", "uuid7"),
+]
+
+
+def run_scenario(db, name: str, column_type: str, generator: str, rows: int, batch: int):
+    """
+    Inserta `rows` filas en lotes y retorna (filas/s, tamaño del índice en bytes).
+    """
+    table = f"bench_ids_{name}"
+    db.execute(f"DROP TABLE IF EXISTS {table}")
+    db.execute(f"CREATE TABLE {table} (id {column_type} PRIMARY KEY, conversacion_id VARCHAR(100), content TEXT)")
+    generate = GENERATORS[generator]
+    try:
+        start = time.perf_counter()
+        for offset in range(0, rows, batch):
+            values = [(generate(), "bench", f"mensaje {i}") for i in range(offset, min(rows, offset + batch))]
+            db.execute_values(f"INSERT INTO {table} (id, conversacion_id, content) VALUES %s", values)
+        elapsed = time.perf_counter() - start
+        size = db.fetch_one("SELECT pg_relation_size(%s) AS size_bytes", (f"{table}_pkey",))
+        return rows / elapsed, size["size_bytes"] if size else 0
+    finally:
+        db.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Compara la inserción con uuid4/VARCHAR frente a UUIDv7/UUID")
+    parser.add_argument("--rows", type=int, default=200000, help="Filas a insertar por escenario")
+    parser.add_argument("--batch", type=int, default=1000, help="Filas por INSERT")
+    args = parser.parse_args()
+
+    from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+
+    db = NeonDBConnector()
+    results = []
+    for name, column_type, generator in SCENARIOS:
+        rows_per_second, index_bytes = run_scenario(db, name, column_type, generator, args.rows, args.batch)
+        results.append((name, rows_per_second, index_bytes))
+
+    baseline = results[0][1]
+    print(f"{'escenario':>14} | {'filas/s':>10} | {'vs antes':>8} | {'índice PK':>10}")
+    for name, rows_per_second, index_bytes in results:
+        print(
+            f"{name:>14} | {rows_per_second:>10.0f} | {rows_per_second / baseline:>7.2f}x | "
+            f"{index_bytes / 1024 / 1024:>7.2f} MB"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
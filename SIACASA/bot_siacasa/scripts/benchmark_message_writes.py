@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark del costo de guardar un mensaje a medida que crece la conversación.
+Compara el recuento con COUNT(*) por inserción con el contador incremental actual.
+Crea datos temporales (usuario "bench-user") y los elimina al terminar.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Añadir el directorio raíz del proyecto al sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.identifiers import new_id
+from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+from bot_siacasa.infrastructure.repositories.postgresql_repository import (
+    PostgreSQLRepository,
+    _mensaje_params,
+    MENSAJE_COLUMNS,
+    MENSAJE_CONFLICT_SQL,
+    MENSAJE_PLACEHOLDERS,
+)
+
+# Estrategia anterior: upsert y luego recuento completo de la conversación
+RECOUNT_SQL = """
+    UPDATE conversaciones 
+    SET cantidad_mensajes = (SELECT COUNT(*) FROM mensajes WHERE conversacion_id = %s)
+    WHERE id = %s
+"""
+
+
+def _seed(db, conversacion_id: str, total: int):
+    """Crea una conversación con `total` mensajes previos."""
+    db.execute(
+        "INSERT INTO conversaciones (id, usuario_id, cantidad_mensajes) VALUES (%s, %s, %s)",
+        (conversacion_id, "bench-user", total)
+    )
+    rows = [
+        _mensaje_params(conversacion_id, Mensaje(role="user", content=f"mensaje {i}", id=new_id()))
+        for i in range(total)
+    ]
+    if rows:
+        db.execute_values(f"INSERT INTO mensajes ({MENSAJE_COLUMNS}) VALUES %s", rows)
+
+
+def _measure(write, samples: int) -> float:
+    timings = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        write()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Mide el costo de escritura de mensajes según el tamaño de la conversación")
+    parser.add_argument("--sizes", default="0,1000,10000,50000", help="Tamaños de conversación a probar")
+    parser.add_argument("--samples", type=int, default=50, help="Escrituras medidas por tamaño")
+    args = parser.parse_args()
+
+    db = NeonDBConnector()
+    repository = PostgreSQLRepository(db)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    created = []
+
+    print(f"{'mensajes':>10} | {'COUNT(*) ms':>12} | {'incremental ms':>15}")
+    try:
+        for size in sizes:
+            conversacion_id = new_id()
+            created.append(conversacion_id)
+            _seed(db, conversacion_id, size)
+
+            def recount_write():
+                mensaje = Mensaje(role="user", content="hola", id=new_id())
+                db.execute(
+                    f"INSERT INTO mensajes ({MENSAJE_COLUMNS}) VALUES {MENSAJE_PLACEHOLDERS} {MENSAJE_CONFLICT_SQL}",
+                    _mensaje_params(conversacion_id, mensaje)
+                )
+                db.execute(RECOUNT_SQL, (conversacion_id, conversacion_id))
+
+            def incremental_write():
+                mensaje = Mensaje(role="user", content="hola", id=new_id())
+                repository._guardar_mensaje(conversacion_id, mensaje)
+
+            recount_ms = _measure(recount_write, args.samples)
+            incremental_ms = _measure(incremental_write, args.samples)
+            print(f"{size:>10} | {recount_ms:>12.2f} | {incremental_ms:>15.2f}")
+    finally:
+        for conversacion_id in created:
+            db.execute("DELETE FROM mensajes WHERE conversacion_id = %s", (conversacion_id,))
+            db.execute("DELETE FROM conversaciones WHERE id = %s", (conversacion_id,))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Benchmark de repositorios con la misma carga: turnos de chat (mensaje del
+usuario + respuesta en una unidad de trabajo) y lecturas de la conversación
+activa. Compara SQLiteRepository con PostgreSQLRepository (NeonDB).
+Los usuarios de PostgreSQL usan el prefijo "bench-" y sus datos se eliminan al terminar.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+# Añadir el directorio raíz del proyecto al sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.domain.identifiers import new_id
+from bot_siacasa.infrastructure.repositories.sqlite_repository import SQLiteRepository
+
+
+def _percentile(timings, pct: float) -> float:
+    ordered = sorted(timings)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def run_workload(repository, users: int, turns: int):
+    """
+    Ejecuta la carga y retorna los tiempos (ms) de escritura y lectura.
+    """
+    writes, reads = [], []
+    for u in range(users):
+        usuario = Usuario(id=f"bench-{uuid.uuid4()}")
+        conversacion = Conversacion(id=new_id(), usuario=usuario)
+        with repository.unit_of_work() as unidad:
+            unidad.registrar_usuario(usuario)
+            unidad.registrar_conversacion(conversacion)
+
+        for t in range(turns):
+            pregunta = Mensaje(role="user", content=f"Consulta {t} del usuario {u}")
+            respuesta = Mensaje(role="assistant", content=f"Respuesta {t} para el usuario {u}")
+            conversacion.agregar_mensaje(pregunta)
+            conversacion.agregar_mensaje(respuesta)
+
+            start = time.perf_counter()
+            with repository.unit_of_work() as unidad:
+                unidad.registrar_mensaje(conversacion.id, pregunta)
+                unidad.registrar_mensaje(conversacion.id, respuesta)
+                unidad.registrar_conversacion(conversacion)
+            writes.append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            repository.obtener_conversacion_activa(usuario.id)
+            reads.append((time.perf_counter() - start) * 1000)
+    return writes, reads
+
+
+def _cleanup_postgres(repository):
+    db = repository.db
+    db.execute(
+        "DELETE FROM mensajes WHERE conversacion_id IN (SELECT id FROM conversaciones WHERE usuario_id LIKE 'bench-%%')"
+    )
+    db.execute("DELETE FROM conversaciones WHERE usuario_id LIKE 'bench-%%'")
+    db.execute("DELETE FROM usuarios WHERE id LIKE 'bench-%%'")
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Compara SQLiteRepository y PostgreSQLRepository con la misma carga")
+    parser.add_argument("--users", type=int, default=20, help="Usuarios (conversaciones) simulados")
+    parser.add_argument("--turns", type=int, default=10, help="Turnos por conversación")
+    parser.add_argument("--sqlite-path", default=None, help="Archivo SQLite (por defecto, uno temporal)")
+    parser.add_argument("--skip-postgres", action="store_true", help="Mide solo SQLite")
+    args = parser.parse_args()
+
+    results = []
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        sqlite_repository = SQLiteRepository(args.sqlite_path or os.path.join(tmpdir, "benchmark.db"))
+        try:
+            results.append(("sqlite", *run_workload(sqlite_repository, args.users, args.turns)))
+        finally:
+            sqlite_repository.cerrar()
+
+    if not args.skip_postgres:
+        try:
+            from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+            from bot_siacasa.infrastructure.repositories.postgresql_repository import PostgreSQLRepository
+
+            postgres_repository = PostgreSQLRepository(NeonDBConnector())
+        except Exception as e:
+            print(f"PostgreSQL no disponible ({e}); se omite")
+        else:
+            try:
+                results.append(("postgresql", *run_workload(postgres_repository, args.users, args.turns)))
+            finally:
+                _cleanup_postgres(postgres_repository)
+
+    print(f"{'backend':>10} | {'escritura p50':>13} | {'escritura p95':>13} | {'lectura p50':>11} | {'lectura p95':>11}")
+    for backend, writes, reads in results:
+        print(
+            f"{backend:>10} | {statistics.median(writes):>10.3f} ms | {_percentile(writes, 0.95):>10.3f} ms | "
+            f"{statistics.median(reads):>8.3f} ms | {_percentile(reads, 0.95):>8.3f} ms"
+        )
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Script de mantenimiento de las particiones mensuales de mensajes de SIACASA:
+crea las particiones de los próximos meses y separa las que superan la retención.
+Pensado para ejecutarse periódicamente (cron) o en bucle con --interval.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Añadir el directorio raíz del proyecto al sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+from bot_siacasa.infrastructure.db.partitions import PARTITIONED_TABLES, PartitionManager, convert_to_partitioned
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Crea particiones futuras y separa las antiguas de las tablas de mensajes")
+    parser.add_argument("--months-ahead", type=int, default=None, help="Meses futuros a crear (por defecto PARTITION_CONFIG)")
+    parser.add_argument("--retention-months", type=int, default=None, help="Meses que permanecen adjuntos (0 = no separar)")
+    parser.add_argument("--convert", action="store_true", help="Particiona las tablas que aún no lo están (bloquea la tabla durante la copia)")
+    parser.add_argument("--list", action="store_true", help="Muestra las particiones y su tamaño")
+    parser.add_argument("--interval", type=int, default=0, help="Segundos entre ejecuciones (0 = una sola vez)")
+    args = parser.parse_args()
+
+    db = NeonDBConnector()
+    manager = PartitionManager(db, months_ahead=args.months_ahead, retention_months=args.retention_months)
+
+    if args.convert:
+        for table in PARTITIONED_TABLES:
+            with db.transaction() as cursor:
+                if convert_to_partitioned(cursor, table, manager.months_ahead):
+                    print(f"✅ {table.name} particionada")
+
+    while True:
+        try:
+            result = manager.run_maintenance()
+            print(f"✅ Particiones verificadas: {len(result['ensured'])}, separadas: {len(result['detached'])}")
+            for name in result["detached"]:
+                print(f"   - {name}")
+            if args.list:
+                for table in manager.tables:
+                    for partition in manager.list_partitions(table.name):
+                        print(f"   {partition['name']:<32} {partition['size_bytes'] / 1024 / 1024:>8.2f} MB  {partition['bounds']}")
+        except Exception as e:
+            logger.error(f"Error en el mantenimiento de particiones: {e}", exc_info=True)
+            print(f"❌ Error: {e}")
+            if not args.interval:
+                return 1
+
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Script para aplicar las migraciones de esquema de SIACASA en NeonDB
+"""
+import argparse
+import os
+import sys
+
+# Añadir el directorio raíz del proyecto al sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+from bot_siacasa.infrastructure.db.migrations import MIGRATIONS, get_current_version, run_migrations
+from bot_siacasa.infrastructure.db.indexes import check_indexes
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Aplica las migraciones de esquema pendientes")
+    parser.add_argument("--target", type=int, default=None, help="Versión máxima a aplicar")
+    parser.add_argument("--status", action="store_true", help="Solo muestra la versión actual")
+    parser.add_argument("--check-indexes", action="store_true", help="Reporta índices faltantes o sin uso")
+    args = parser.parse_args()
+
+    try:
+        db = NeonDBConnector()
+        current = get_current_version(db)
+        latest = max(migration.version for migration in MIGRATIONS)
+        print(f"📋 Versión de esquema actual: {current} (última disponible: {latest})")
+
+        if args.status:
+            for migration in MIGRATIONS:
+                mark = "✅" if migration.version <= current else "⏳"
+                print(f"   {mark} {migration.version}: {migration.description}")
+            return 0
+
+        if args.check_indexes:
+            report = check_indexes(db)
+            print(f"📋 Índices gestionados faltantes: {len(report['missing'])}")
+            for index in report["missing"]:
+                print(f"   ⏳ {index['name']} ON {index['table']} ({index['columns']}) - {index['purpose']}")
+            for index in report["invalid"]:
+                print(f"   ❌ {index['name']} ON {index['table']} es inválido; vuelva a aplicar las migraciones")
+            print(f"📋 Índices sin uso desde el último reinicio de estadísticas: {len(report['unused'])}")
+            for index in report["unused"]:
+                print(f"   ⚠️  {index['name']} ON {index['table']} ({index['size_bytes'] / 1024:.0f} KB)")
+            return 1 if report["missing"] or report["invalid"] else 0
+
+        applied = run_migrations(db, target=args.target)
+        if applied:
+            print(f"✅ Migraciones aplicadas: {applied}")
+        else:
+            print("✅ El esquema ya está al día")
+
+    except Exception as e:
+        logger.error(f"Error aplicando migraciones: {e}", exc_info=True)
+        print(f"❌ Error: {e}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
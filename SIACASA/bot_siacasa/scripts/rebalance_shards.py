@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Script para mover los datos de los usuarios que cambiaron de shard al agregar
+uno nuevo a SHARD_TARGETS: copia usuario, conversaciones y mensajes a su shard
+actual y los borra del anterior. Se puede repetir si se interrumpe; al terminar,
+quitar SHARD_PREVIOUS de la configuración de los workers.
+"""
+import os
+import sys
+
+# Añadir el directorio raíz del proyecto al sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot_siacasa.main import OptimizedChatbotApp
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Función principal"""
+    try:
+        repository = OptimizedChatbotApp()._build_sharded_repository()
+    except Exception as e:
+        logger.error(f"No se pudieron abrir los shards: {e}", exc_info=True)
+        print(f"❌ Error: {e}")
+        return 1
+
+    try:
+        movidos = repository.rebalancear()
+        print(f"✅ Usuarios movidos a su shard: {movidos}")
+        print("   Ya se puede quitar SHARD_PREVIOUS de la configuración")
+        return 0
+    except Exception as e:
+        logger.error(f"Error rebalanceando shards: {e}", exc_info=True)
+        print(f"❌ Error: {e}")
+        return 1
+    finally:
+        repository.cerrar()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
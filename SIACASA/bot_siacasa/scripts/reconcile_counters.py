@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Script para reparar la deriva de los contadores de mensajes de SIACASA.
+Pensado para ejecutarse periódicamente (cron) o en bucle con --interval.
+"""
+import argparse
+import os
+import sys
+import time
+
+# Añadir el directorio raíz del proyecto al sys.path
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, project_root)
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+from bot_siacasa.infrastructure.db.counters import reconcile_message_counts
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    """Función principal"""
+    parser = argparse.ArgumentParser(description="Reconcilia conversaciones.cantidad_mensajes con los mensajes reales")
+    parser.add_argument("--days", type=int, default=7, help="Ventana de conversaciones a revisar (0 = todas)")
+    parser.add_argument("--interval", type=int, default=0, help="Segundos entre ejecuciones (0 = una sola vez)")
+    args = parser.parse_args()
+
+    db = NeonDBConnector()
+    days = args.days or None
+
+    while True:
+        try:
+            repaired = reconcile_message_counts(db, days=days)
+            print(f"✅ Conversaciones corregidas: {repaired}")
+        except Exception as e:
+            logger.error(f"Error reconciliando contadores: {e}", exc_info=True)
+            print(f"❌ Error: {e}")
+            if not args.interval:
+                return 1
+
+        if not args.interval:
+            return 0
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
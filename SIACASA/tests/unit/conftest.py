@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from typing import Any, List, Optional
+
+import pytest
+
+from bot_siacasa.infrastructure.db.connection_pool import ConnectionPool
+from bot_siacasa.infrastructure.db.neondb_connector import NeonDBConnector
+
+
+class FakeCursor:
+    """Cursor psycopg2 simulado que registra las sentencias ejecutadas."""
+
+    def __init__(self, connection: "FakeConnection", name: Optional[str] = None, dict_rows: bool = False):
+        self.connection = connection
+        self.name = name
+        self.dict_rows = dict_rows
+        self.rowcount = 0
+        self.itersize = 2000
+        self._rows: List[Any] = []
+
+    def mogrify(self, template: Any, args: tuple) -> bytes:
+        if isinstance(template, bytes):
+            template = template.decode()
+        return (template % tuple(repr(arg) for arg in args)).encode()
+
+    def execute(self, query: Any, params: Any = None) -> None:
+        if isinstance(query, bytes):
+            query = query.decode()
+        self.connection.round_trips += 1
+        self.connection.statements.append((query, params))
+        default_row = {"result": 1} if self.dict_rows else (1,)
+        self._rows = list(self.connection.results.pop(0)) if self.connection.results else [default_row]
+        self.rowcount = len(self._rows)
+
+    def copy_expert(self, statement: Any, buffer: Any) -> None:
+        self.connection.round_trips += 1
+        self.connection.copied.append(buffer.getvalue())
+        self.rowcount = buffer.getvalue().count("\n")
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def fetchmany(self, size: int):
+        batch, self._rows = self._rows[:size], self._rows[size:]
+        return batch
+
+    def __iter__(self):
+        while self._rows:
+            yield self._rows.pop(0)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeConnection:
+    """Conexión psycopg2 simulada."""
+
+    encoding = "UTF8"
+
+    def __init__(self):
+        self.closed = 0
+        self.statements: List[tuple] = []
+        self.copied: List[str] = []
+        self.results: List[List[Any]] = []
+        self.commits = 0
+        self.rollbacks = 0
+        self.round_trips = 0
+
+    def cursor(self, name: Optional[str] = None, cursor_factory: Any = None) -> FakeCursor:
+        return FakeCursor(self, name=name, dict_rows=cursor_factory is not None)
+
+    def get_transaction_status(self) -> int:
+        return 0
+
+    def commit(self) -> None:
+        self.commits += 1
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+@pytest.fixture
+def fake_connection_factory():
+    """Crea conexiones simuladas nuevas (p. ej. como creador de un ConnectionPool)."""
+    return FakeConnection
+
+
+@pytest.fixture
+def build_connector():
+    """Fábrica de NeonDBConnector sobre una única conexión simulada; retorna (conector, conexión)."""
+
+    def build() -> tuple:
+        connection = FakeConnection()
+        pool = ConnectionPool(lambda: connection, pool_size=1, max_overflow=0, pre_ping=False)
+        connector = NeonDBConnector(
+            host="localhost", database="siacasa", user="test", password="test", pool=pool
+        )
+        connection.statements.clear()
+        connection.commits = 0
+        connection.round_trips = 0
+        return connector, connection
+
+    return build
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, List
+
+import pytest
+
+from bot_siacasa.infrastructure.db.connection_pool import ConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+    """Cursor mínimo compatible con la interfaz usada por el pool."""
+
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+
+    def execute(self, query: str, params: Any = None) -> None:
+        if self.connection.broken:
+            raise RuntimeError("conexión rota")
+        self.connection.statements.append(query)
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self) -> None:
+        pass
+
+
+class FakeConnection:
+    """Conexión psycopg2 simulada."""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.statements: List[str] = []
+        self.rollbacks = 0
+
+    def cursor(self, *_args, **_kwargs) -> FakeCursor:
+        return FakeCursor(self)
+
+    def get_transaction_status(self) -> int:
+        return 0
+
+    def rollback(self) -> None:
+        self.rollbacks += 1
+
+    def close(self) -> None:
+        self.closed = 1
+
+
+def _build_pool(**settings) -> tuple:
+    created: List[FakeConnection] = []
+
+    def creator() -> FakeConnection:
+        connection = FakeConnection()
+        created.append(connection)
+        return connection
+
+    return ConnectionPool(creator, **settings), created
+
+
+def test_pool_reuses_idle_connections():
+    pool, created = _build_pool(pool_size=2, max_overflow=0)
+
+    for _ in range(5):
+        with pool.connection():
+            pass
+
+    stats = pool.get_stats()
+    assert len(created) == 1
+    assert stats["checkouts"] == 5
+    assert stats["idle"] == 1
+    assert stats["in_use"] == 0
+
+
+def test_pool_closes_overflow_connections_on_release():
+    pool, created = _build_pool(pool_size=1, max_overflow=2)
+
+    leased = [pool.acquire() for _ in range(3)]
+    assert pool.get_stats()["in_use"] == 3
+
+    for pooled in leased:
+        pool.release(pooled)
+
+    stats = pool.get_stats()
+    assert stats["idle"] == 1
+    assert stats["total"] == 1
+    assert sum(1 for connection in created if connection.closed) == 2
+
+
+def test_pool_times_out_when_exhausted():
+    pool, _ = _build_pool(pool_size=1, max_overflow=0, timeout=0.05)
+    pool.acquire()
+
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+
+    assert pool.get_stats()["timeouts"] == 1
+
+
+def test_waiting_thread_receives_released_connection():
+    pool, created = _build_pool(pool_size=1, max_overflow=0, timeout=2.0)
+    pooled = pool.acquire()
+    results = []
+
+    def worker():
+        with pool.connection() as other:
+            results.append(other)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    time.sleep(0.05)
+    pool.release(pooled)
+    thread.join(timeout=2)
+
+    assert results and results[0] is pooled
+    assert len(created) == 1
+    stats = pool.get_stats()
+    assert stats["waits"] == 1
+    assert stats["max_wait_time_ms"] > 0
+
+
+def test_pre_ping_replaces_broken_connection():
+    pool, created = _build_pool(pool_size=1, max_overflow=0)
+    with pool.connection():
+        pass
+
+    created[0].broken = True
+    with pool.connection() as pooled:
+        assert pooled.connection is created[1]
+
+    assert created[0].closed
+    assert pool.get_stats()["ping_failures"] == 1
+
+
+def test_recycle_age_reopens_old_connection():
+    pool, created = _build_pool(pool_size=1, max_overflow=0, recycle=0)
+    with pool.connection():
+        pass
+    time.sleep(0.01)
+    with pool.connection():
+        pass
+
+    assert len(created) == 2
+    assert pool.get_stats()["connections_recycled"] == 1
@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import threading
+
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.domain.services.conversation_cache import (
+    ConversationCache,
+    estimar_bytes_conversacion,
+    invalidar_conversacion_usuario,
+)
+from bot_siacasa.infrastructure.repositories.memory_repository import MemoryRepository
+from tests.unit.test_unit_of_work import FakeAIProvider
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def conversacion_de(usuario_id: str, kb: int = 10) -> Conversacion:
+    conversacion = Conversacion(id=f"conv-{usuario_id}", usuario=Usuario(id=usuario_id))
+    conversacion.agregar_mensaje(Mensaje(role="user", content="x" * (kb * 1024)))
+    return conversacion
+
+
+def test_evicts_least_recently_used_when_memory_bound_is_exceeded():
+    # ~12 KB por conversación: caben 4 en 50 KB
+    cache = ConversationCache(max_memory_mb=50 / 1024, idle_ttl_seconds=60)
+    for usuario_id in ("a", "b", "c", "d"):
+        cache.put(usuario_id, conversacion_de(usuario_id))
+    assert cache.get("a") is not None  # "b" pasa a ser la menos usada
+
+    cache.put("e", conversacion_de("e"))
+
+    assert "b" not in cache
+    assert all(usuario_id in cache for usuario_id in ("a", "c", "d", "e"))
+    stats = cache.get_stats()
+    assert stats["evictions"] == 1
+    assert stats["memoria_estimada_mb"] <= stats["max_memoria_mb"]
+
+
+def test_idle_entries_expire():
+    clock = FakeClock()
+    cache = ConversationCache(max_memory_mb=1, idle_ttl_seconds=30, clock=clock)
+    cache.put("a", conversacion_de("a"))
+    cache.put("b", conversacion_de("b"))
+
+    clock.now += 20
+    assert cache.get("a") is not None
+    clock.now += 20
+    # "b" lleva 40 s sin uso; "a" solo 20
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+    clock.now += 31
+    cache.put("c", conversacion_de("c"))
+    assert len(cache) == 1
+    assert cache.get_stats()["expirations"] == 2
+
+
+def test_invalidation_hooks_reach_every_cache():
+    primera, segunda = ConversationCache(), ConversationCache()
+    primera.put("a", conversacion_de("a"))
+    segunda.put("a", conversacion_de("a"))
+    segunda.put("b", conversacion_de("b"))
+
+    assert invalidar_conversacion_usuario("a", "ticket creado") == 2
+    assert segunda.invalidate_conversation("conv-b")
+    assert "a" not in primera and len(segunda) == 0
+    assert segunda.get_stats()["invalidations"] == 2
+
+
+def test_service_writes_through_and_reports_hits():
+    repository = MemoryRepository()
+    cache = ConversationCache()
+    service = ChatbotService(
+        repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider(), conversation_cache=cache
+    )
+
+    service.procesar_mensaje("user-1", "¿Cuál es mi saldo de ahorros?")
+    conversacion = cache.get("user-1")
+    assert conversacion is repository.obtener_conversacion_activa("user-1")
+    assert [m.role for m in conversacion.mensajes] == ["system", "user", "assistant"]
+
+    service.procesar_mensaje("user-1", "¿Y el de mi cuenta corriente?")
+    assert cache.get_stats()["hits"] >= 2
+    assert cache.get_stats()["misses"] == 1
+
+    # Tras invalidar, el siguiente turno recarga la conversación del repositorio
+    invalidar_conversacion_usuario("user-1", "sesión finalizada")
+    service.procesar_mensaje("user-1", "Gracias")
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_memory_accounting_stays_consistent_under_concurrency():
+    cache = ConversationCache(max_memory_mb=200 / 1024, idle_ttl_seconds=60)
+    errors = []
+
+    def worker(n: int):
+        try:
+            for i in range(300):
+                usuario_id = f"user-{(n * 7 + i) % 40}"
+                if cache.get(usuario_id) is None:
+                    cache.put(usuario_id, conversacion_de(usuario_id, kb=1 + i % 5))
+                if i % 50 == 0:
+                    cache.invalidate(usuario_id)
+        except Exception as e:  # pragma: no cover - se reporta abajo
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert cache._total_bytes == sum(estimar_bytes_conversacion(e.conversacion) for e in cache._entradas.values())
+    assert cache._total_bytes <= cache.max_bytes
@@ -0,0 +1,210 @@
+from __future__ import annotations
+
+import json
+from datetime import datetime
+
+from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.infrastructure.db.query_budget import assert_query_budget
+from bot_siacasa.infrastructure.repositories.memory_repository import MemoryRepository
+from bot_siacasa.infrastructure.repositories.postgresql_repository import PostgreSQLRepository
+from tests.unit.test_unit_of_work import FakeAIProvider
+
+
+def hydration_row() -> dict:
+    # json_agg serializa las fechas como texto ISO
+    mensajes = [
+        {
+            "id": "m1", "role": "user", "content": "Hola",
+            "timestamp": "2026-10-01T10:00:00.123456", "metadata": None,
+            "sentiment": "neutral", "sentiment_score": 0.1, "sentiment_confidence": 0.9,
+            "intent": "saludo", "intent_confidence": 0.8, "token_count": 3,
+            "processing_time_ms": None, "ai_processing_time_ms": None, "response_tone": None,
+        },
+        {
+            "id": "m2", "role": "assistant", "content": "¿En qué te ayudo?",
+            "timestamp": "2026-10-01T10:00:02", "metadata": {"bank_code": "bn"},
+            "sentiment": None, "sentiment_score": None, "sentiment_confidence": None,
+            "intent": None, "intent_confidence": None, "token_count": 6,
+            "processing_time_ms": 250, "ai_processing_time_ms": 200, "response_tone": "formal",
+        },
+    ]
+    return {
+        "id": "conv-1",
+        "usuario_id": "user-1",
+        "fecha_inicio": datetime(2026, 10, 1, 9, 59),
+        "fecha_fin": None,
+        "cantidad_mensajes": 40,
+        "metadata": json.dumps({"bank_code": "bn"}),
+        "usuario_datos": {"nombre": "Ana"},
+        "mensajes": mensajes,
+    }
+
+
+def test_active_conversation_is_hydrated_in_one_round_trip(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = False
+    connection.results.append([hydration_row()])
+    repository = PostgreSQLRepository(connector)
+
+    with assert_query_budget("obtener_conversacion_activa", max_queries=1):
+        conversacion = repository.obtener_conversacion_activa("user-1", max_mensajes=2)
+
+    assert connection.statements[0][1] == (2, "user-1")
+    assert conversacion.usuario.datos == {"nombre": "Ana"}
+    assert conversacion.metadata == {"bank_code": "bn"}
+    assert [m.id for m in conversacion.mensajes] == ["m1", "m2"]
+    assert conversacion.mensajes[0].timestamp == datetime(2026, 10, 1, 10, 0, 0, 123456)
+    assert conversacion.mensajes[0].metadata == {}
+    assert conversacion.mensajes[1].metadata == {"bank_code": "bn"}
+    assert conversacion.mensajes[1].processing_time_ms == 250
+
+
+def test_conversation_by_id_loads_recent_window_and_handles_missing_rows(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = False
+    row = hydration_row()
+    row["mensajes"] = []
+    connection.results.extend([[row], []])
+    repository = PostgreSQLRepository(connector)
+
+    conversacion = repository.obtener_conversacion("conv-1")
+    missing = repository.obtener_conversacion("conv-2")
+
+    assert connection.statements[0][1] == (15, "conv-1")
+    assert conversacion.mensajes == []
+    assert conversacion.total_mensajes == 40
+    assert conversacion.tiene_mensajes_anteriores()
+    assert missing is None
+
+
+def test_chatbot_cache_miss_resumes_conversation_with_one_query(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = False
+    connection.results.append([hydration_row()])
+    repository = PostgreSQLRepository(connector)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+
+    with assert_query_budget("ChatbotService.obtener_o_crear_conversacion", max_queries=1):
+        conversacion = service.obtener_o_crear_conversacion("user-1")
+
+    assert conversacion.id == "conv-1"
+    # La ventana no incluía el mensaje de sistema: se repone al inicio
+    assert [m.role for m in conversacion.mensajes] == ["system", "user", "assistant"]
+    assert service._conversation_cache.get("user-1") is conversacion
+
+
+def test_older_messages_are_paged_by_timestamp_on_demand(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = False
+    connection.results.append([hydration_row()])
+    repository = PostgreSQLRepository(connector)
+    conversacion = repository.obtener_conversacion_activa("user-1", max_mensajes=2)
+    connection.results.append([
+        {"id": "m0", "role": "assistant", "content": "Bienvenido", "timestamp": datetime(2026, 10, 1, 9, 59, 30)},
+        {"id": "m-1", "role": "system", "content": "Eres un asistente", "timestamp": datetime(2026, 10, 1, 9, 59)},
+    ])
+
+    with assert_query_budget("Conversacion.obtener_mensajes_anteriores", max_queries=1):
+        anteriores = conversacion.obtener_mensajes_anteriores(limite=2)
+
+    query, params = connection.statements[-1]
+    assert "timestamp < %s" in query
+    assert params == ("conv-1", "conv-1", datetime(2026, 10, 1, 10, 0, 0, 123456), datetime(2026, 10, 1, 10, 0, 0, 123456), 2)
+    assert [m.id for m in anteriores] == ["m-1", "m0"]
+    # Las páginas no se agregan a la ventana en memoria
+    assert [m.id for m in conversacion.mensajes] == ["m1", "m2"]
+
+
+def test_memory_stays_bounded_while_history_remains_pageable():
+    repository = MemoryRepository()
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    service._max_mensajes_historial = 5
+
+    for i in range(10):
+        service.procesar_mensaje("user-1", f"Consulta número {i} sobre mi cuenta de ahorros")
+
+    conversacion = service.obtener_o_crear_conversacion("user-1")
+    assert len(conversacion.mensajes) == 5
+    assert conversacion.mensajes[0].role == "system"
+    assert conversacion.total_mensajes == 20
+    assert conversacion.tiene_mensajes_anteriores()
+
+    anteriores = conversacion.obtener_mensajes_anteriores(limite=4)
+    assert len(anteriores) == 4
+    assert max(m.timestamp for m in anteriores) < min(m.timestamp for m in conversacion.mensajes[1:])
+
+
+def test_user_conversations_are_loaded_in_two_queries(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = False
+    headers = []
+    for i in range(50):
+        row = hydration_row()
+        del row["mensajes"]
+        row["id"] = f"conv-{i}"
+        headers.append(row)
+    connection.results.append(headers)
+    connection.results.append([
+        {"conversacion_id": "conv-0", "id": "a", "role": "user", "content": "Hola", "timestamp": datetime(2026, 10, 1, 10)},
+        {"conversacion_id": "conv-0", "id": "b", "role": "assistant", "content": "Hola", "timestamp": datetime(2026, 10, 1, 10, 1)},
+        {"conversacion_id": "conv-7", "id": "c", "role": "user", "content": "Saldo", "timestamp": datetime(2026, 10, 2, 8)},
+    ])
+    repository = PostgreSQLRepository(connector)
+
+    with assert_query_budget("PostgreSQLRepository.obtener_conversaciones_usuario", max_queries=2):
+        conversaciones = repository.obtener_conversaciones_usuario("user-1", max_mensajes=5)
+
+    assert len(conversaciones) == 50
+    por_id = {conversacion.id: conversacion for conversacion in conversaciones}
+    assert [m.id for m in por_id["conv-0"].mensajes] == ["a", "b"]
+    assert [m.id for m in por_id["conv-7"].mensajes] == ["c"]
+    assert por_id["conv-3"].mensajes == []
+    ids, ids_cota, limite, _ = connection.statements[1][1]
+    assert len(ids) == 50 and ids_cota == ids and limite == 5
+    assert "row_number()" in connection.statements[1][0]
+
+
+def test_batch_lookup_by_ids_skips_queries_for_empty_input(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+
+    assert repository.obtener_conversaciones([]) == []
+    assert connection.round_trips == 0
+
+
+def test_uuid_array_lookups_are_not_sent_as_prepared_text_arrays(build_connector):
+    # PREPARE tipa ANY($1::uuid[]) como uuid[] y EXECUTE recibiría un text[]
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = True
+    header = hydration_row()
+    del header["mensajes"]
+    connection.results.append([header])
+    connection.results.append([])
+    repository = PostgreSQLRepository(connector)
+
+    conversaciones = repository.obtener_conversaciones(["conv-1", "conv-2"], max_mensajes=5)
+
+    assert [conversacion.id for conversacion in conversaciones] == ["conv-1"]
+    assert not any(query.startswith(("PREPARE", "EXECUTE")) for query, _ in connection.statements)
+    assert [params for _, params in connection.statements] == [
+        (["conv-1", "conv-2"],),
+        (["conv-1"], ["conv-1"], 5, 5),
+    ]
+    assert all("::uuid[]" in query for query, _ in connection.statements)
+
+
+def test_user_lookup_prepares_header_query_but_not_message_batch(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = True
+    header = hydration_row()
+    del header["mensajes"]
+    connection.results.append([])  # PREPARE
+    connection.results.append([header])
+    connection.results.append([])
+    repository = PostgreSQLRepository(connector)
+
+    repository.obtener_conversaciones_usuario("user-1", max_mensajes=5)
+
+    executes = [params for query, params in connection.statements if query.startswith("EXECUTE")]
+    assert executes == [("user-1",)]
+    assert (["conv-1"], ["conv-1"], 5, 5) in [params for _, params in connection.statements]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import socket
+import time
+
+import eventlet
+import pytest
+from psycopg2 import extensions
+
+from bot_siacasa.infrastructure import cooperative
+from bot_siacasa.infrastructure.db.connection_pool import ConnectionPool
+
+
+@pytest.fixture
+def cooperative_mode():
+    assert cooperative.enable_cooperative_mode()
+    try:
+        yield
+    finally:
+        cooperative.disable_cooperative_mode()
+
+
+def test_blocking_call_in_tpool_lets_other_green_threads_progress(cooperative_mode):
+    ticks = []
+
+    def heartbeat():
+        while True:
+            ticks.append(time.monotonic())
+            eventlet.sleep(0.01)
+
+    beat = eventlet.spawn(heartbeat)
+    # time.sleep sin monkey patching bloquearía el hub completo
+    call = eventlet.spawn(cooperative.run_blocking, time.sleep, 0.3)
+    call.wait()
+    beat.kill()
+
+    assert len(ticks) >= 10
+
+
+def test_exhausted_pool_waits_without_blocking_the_hub(cooperative_mode, fake_connection_factory):
+    pool = ConnectionPool(fake_connection_factory, pool_size=1, max_overflow=0, timeout=1.0, pre_ping=False)
+    order = []
+
+    def holder():
+        with pool.connection():
+            order.append("holder")
+            eventlet.sleep(0.05)
+
+    def waiter():
+        with pool.connection():
+            order.append("waiter")
+
+    first = eventlet.spawn(holder)
+    eventlet.sleep(0)
+    second = eventlet.spawn(waiter)
+    first.wait()
+    second.wait()
+
+    assert order == ["holder", "waiter"]
+    assert pool.get_stats()["timeouts"] == 0
+
+
+def test_wait_callback_yields_until_socket_is_ready():
+    left, right = socket.socketpair()
+
+    class PollingConnection:
+        def __init__(self):
+            self.states = [extensions.POLL_READ, extensions.POLL_OK]
+
+        def poll(self):
+            return self.states.pop(0)
+
+        def fileno(self):
+            return left.fileno()
+
+    eventlet.spawn_after(0.02, right.send, b"x")
+    connection = PollingConnection()
+    cooperative.eventlet_wait_callback(connection)
+
+    assert connection.states == []
+    left.close()
+    right.close()
+
+
+def test_copy_rows_falls_back_to_insert_with_wait_callback(cooperative_mode, build_connector):
+    connector, connection = build_connector()
+
+    copied = connector.copy_rows("text_embeddings", ["id", "embedding"], [("1", [0.1, 0.2])])
+
+    assert copied == 1
+    assert connection.copied == []
+    assert connection.statements[0][0].startswith('INSERT INTO "text_embeddings" ("id", "embedding") VALUES')
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.identifiers import new_id, uuid7, uuid7_datetime
+from bot_siacasa.infrastructure.db import migrations
+
+
+def test_uuid7_has_version_variant_and_embedded_time():
+    before = datetime.now(timezone.utc).replace(microsecond=0)
+    value = uuid7()
+
+    assert value.version == 7
+    assert value.variant == uuid.RFC_4122
+    assert before <= uuid7_datetime(value) <= datetime.now(timezone.utc)
+    assert uuid7_datetime(str(uuid.uuid4())) is None
+    assert uuid7_datetime("conv-1") is None
+
+
+def test_ids_are_strictly_increasing_even_within_the_same_millisecond():
+    ids = [new_id() for _ in range(10000)]
+
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_ids_are_unique_across_threads():
+    results = []
+
+    def generate():
+        results.extend(new_id() for _ in range(2000))
+
+    threads = [threading.Thread(target=generate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(results)) == 8000
+
+
+def test_messages_get_time_ordered_ids_by_default():
+    primero = Mensaje(role="user", content="hola")
+    time.sleep(0.002)
+    segundo = Mensaje(role="assistant", content="¿En qué te ayudo?")
+
+    assert uuid.UUID(primero.id).version == 7
+    assert primero.id < segundo.id
+
+
+def test_uuid_migration_keeps_existing_uuid4_values():
+    migration = next(m for m in migrations.MIGRATIONS if m.version == 7)
+
+    assert migration.transactional
+    assert len(migration.statements) == 3
+    for statement in migration.statements:
+        assert "TYPE UUID USING" in statement
+        assert "::uuid ELSE md5(" in statement
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.infrastructure.repositories.memory_repository import MemoryRepository
+
+
+def build_conversation(conversacion_id: str, usuario_id: str, mensajes: int = 2, texto: str = "hola") -> Conversacion:
+    conversacion = Conversacion(id=conversacion_id, usuario=Usuario(id=usuario_id))
+    for i in range(mensajes):
+        conversacion.agregar_mensaje(Mensaje(role="user", content=f"{texto} {i}"))
+    return conversacion
+
+
+def test_finished_conversations_are_evicted_before_active_ones():
+    repository = MemoryRepository(max_conversations=3)
+    finalizada = build_conversation("conv-0", "user-0")
+    finalizada.finalizar()
+    repository.guardar_conversacion(finalizada)
+    for i in range(1, 4):
+        repository.guardar_conversacion(build_conversation(f"conv-{i}", f"user-{i}"))
+
+    assert list(repository.conversaciones) == ["conv-1", "conv-2", "conv-3"]
+    assert repository.obtener_conversacion("conv-0") is None
+
+    # Acceder a conv-1 la vuelve la más reciente: la siguiente víctima es conv-2
+    repository.obtener_conversacion_activa("user-1")
+    repository.guardar_conversacion(build_conversation("conv-4", "user-4"))
+
+    assert list(repository.conversaciones) == ["conv-3", "conv-1", "conv-4"]
+    assert repository.obtener_conversacion_activa("user-2") is None
+    assert "user-2" not in repository.conversaciones_por_usuario
+    assert repository.get_stats()["desalojos"] == 2
+
+
+def test_memory_ceiling_bounds_resident_messages():
+    repository = MemoryRepository(max_conversations=1000, max_memory_mb=0.05)
+    for i in range(20):
+        repository.guardar_conversacion(build_conversation(f"conv-{i}", f"user-{i}", mensajes=5, texto="x" * 500))
+
+    stats = repository.get_stats()
+    assert stats["memoria_estimada_mb"] <= 0.05
+    assert 0 < stats["conversaciones_residentes"] < 20
+    assert len(repository.mensajes) == stats["conversaciones_residentes"]
+
+
+def test_evicted_conversations_spill_to_disk_and_are_restored(tmp_path):
+    repository = MemoryRepository(max_conversations=2, spill_path=str(tmp_path / "spill"))
+    original = build_conversation("conv-0", "user-0", mensajes=3)
+    original.usuario.datos = {"nombre": "Ana"}
+    repository.guardar_usuario(original.usuario)
+    repository.guardar_conversacion(original)
+    for i in range(1, 3):
+        repository.guardar_conversacion(build_conversation(f"conv-{i}", f"user-{i}"))
+
+    assert "conv-0" not in repository.conversaciones
+    assert repository.get_stats()["conversaciones_en_disco"] == 1
+    # El usuario sin conversaciones residentes también sale de memoria
+    assert "user-0" not in repository.usuarios
+    assert repository.obtener_usuario("user-0").datos == {"nombre": "Ana"}
+
+    restaurada = repository.obtener_conversacion_activa("user-0")
+
+    assert [m.content for m in restaurada.mensajes] == ["hola 0", "hola 1", "hola 2"]
+    assert restaurada.usuario.datos == {"nombre": "Ana"}
+    assert len(restaurada.obtener_mensajes_anteriores(limite=10)) == 0
+    assert repository.get_stats()["recuperaciones"] == 1
+    # Al recuperarla se desaloja la menos usada para respetar el límite
+    assert list(repository.conversaciones) == ["conv-2", "conv-0"]
+    repository.cerrar()
+
+
+def test_conversations_by_user_use_the_index():
+    repository = MemoryRepository()
+    repository.guardar_conversacion(build_conversation("conv-a", "user-1"))
+    anterior = build_conversation("conv-b", "user-1")
+    anterior.finalizar()
+    repository.guardar_conversacion(anterior)
+    repository.guardar_conversacion(build_conversation("conv-c", "user-2"))
+
+    assert {c.id for c in repository.obtener_conversaciones_usuario("user-1")} == {"conv-a", "conv-b"}
+    assert repository.obtener_conversacion_activa("user-1").id == "conv-a"
+
+    repository.finalizar_conversacion("conv-a")
+    assert repository.obtener_conversacion_activa("user-1") is None
+
+
+def test_spilled_users_can_be_listed_exported_and_deleted(tmp_path):
+    repository = MemoryRepository(max_conversations=1, spill_path=str(tmp_path / "spill"))
+    repository.guardar_conversacion(build_conversation("conv-1", "user-1", mensajes=3))
+    repository.guardar_conversacion(build_conversation("conv-2", "user-2"))
+    assert "conv-1" in repository._spilled
+
+    assert sorted(repository.listar_ids_usuarios()) == ["user-1", "user-2"]
+    exportadas = repository.exportar_conversaciones_usuario("user-1")
+    assert [len(conversacion.mensajes) for conversacion in exportadas] == [3]
+
+    repository.eliminar_conversaciones_usuario("user-1", ["conv-1"])
+
+    assert repository.listar_ids_usuarios() == ["user-2"]
+    assert repository.obtener_conversacion("conv-1") is None
+    assert repository.obtener_usuario("user-1") is None
+    assert "c:conv-1" not in repository._spill and "u:user-1" not in repository._spill
+    repository.cerrar()
@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.infrastructure.db.counters import reconcile_message_counts
+from bot_siacasa.infrastructure.repositories.postgresql_repository import (
+    UPSERT_CONVERSACION_SQL,
+    PostgreSQLRepository,
+    upsert_mensajes_sql,
+)
+
+
+def test_message_upsert_increments_counter_only_for_inserted_rows():
+    statement = " ".join(upsert_mensajes_sql(2).split())
+
+    assert "COUNT(*) FROM mensajes" not in statement
+    assert "RETURNING conversacion_id, (xmax = 0) AS insertado" in statement
+    assert "cantidad_mensajes = c.cantidad_mensajes + nuevos.cantidad" in statement
+    assert statement.count("(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)") == 2
+
+
+def test_conversation_upsert_does_not_overwrite_counter():
+    on_conflict = UPSERT_CONVERSACION_SQL.split("ON CONFLICT")[1]
+
+    assert "cantidad_mensajes" not in on_conflict
+
+
+def test_guardar_mensaje_is_a_single_statement(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = False
+    repository = PostgreSQLRepository(connector)
+
+    repository._guardar_mensaje("conv-1", Mensaje(role="user", content="hola"))
+
+    assert connection.round_trips == 1
+    assert connection.statements[0][0].lstrip().startswith("WITH upsert AS")
+
+
+def test_reconcile_filters_by_window_and_reports_repairs():
+    class RecordingDB:
+        def __init__(self):
+            self.calls = []
+
+        def execute(self, query, params=None):
+            self.calls.append(params)
+            return 3
+
+    db = RecordingDB()
+
+    assert reconcile_message_counts(db, days=7) == 3
+    assert reconcile_message_counts(db, days=None) == 3
+    assert db.calls[0]["desde"] is not None
+    assert db.calls[1]["desde"] is None
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Any, List, Set
+
+from bot_siacasa.infrastructure.db import migrations
+from bot_siacasa.infrastructure.db.indexes import check_indexes
+from bot_siacasa.infrastructure.db.migrations import Migration, ensure_schema, run_migrations
+
+
+class FakeMigrationCursor:
+    """Cursor simulado que interpreta las consultas sobre schema_version."""
+
+    def __init__(self, db: "FakeMigrationDB"):
+        self.db = db
+        self._rows: List[Any] = []
+
+    def execute(self, query: str, params: Any = None) -> None:
+        self.db.statements.append(query.strip())
+        normalized = " ".join(query.split())
+        if normalized == "SELECT version FROM schema_version":
+            self._rows = [{"version": version} for version in sorted(self.db.applied)]
+        elif normalized.startswith("SELECT 1 FROM schema_version"):
+            self._rows = [{"?column?": 1}] if params[0] in self.db.applied else []
+        elif normalized.startswith("INSERT INTO schema_version"):
+            self.db.pending.add(params[0])
+            self._rows = []
+        else:
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+
+class FakeMigrationDB:
+    """Conector simulado con transacciones que solo confirman si no hay errores."""
+
+    host = "localhost"
+    database = "fake"
+
+    def __init__(self):
+        self.applied: Set[int] = set()
+        self.pending: Set[int] = set()
+        self.statements: List[str] = []
+        self.autocommit_calls = 0
+
+    @contextmanager
+    def transaction(self):
+        self.pending = set()
+        try:
+            yield FakeMigrationCursor(self)
+        except Exception:
+            self.pending = set()
+            raise
+        self.applied |= self.pending
+
+    @contextmanager
+    def autocommit(self):
+        self.autocommit_calls += 1
+        self.pending = set()
+        yield FakeMigrationCursor(self)
+        self.applied |= self.pending
+
+
+def test_run_migrations_applies_pending_versions_in_order():
+    db = FakeMigrationDB()
+    steps = [
+        Migration(2, "segunda", ["CREATE TABLE b (id INT)"]),
+        Migration(1, "primera", ["CREATE TABLE a (id INT)"]),
+    ]
+
+    assert run_migrations(db, steps) == [1, 2]
+    assert db.applied == {1, 2}
+    creates = [
+        statement for statement in db.statements
+        if statement.startswith("CREATE TABLE ") and "schema_version" not in statement
+    ]
+    assert creates == ["CREATE TABLE a (id INT)", "CREATE TABLE b (id INT)"]
+
+    db.statements.clear()
+    assert run_migrations(db, steps) == []
+    assert not any(statement.startswith("CREATE TABLE ") and "schema_version" not in statement
+                   for statement in db.statements)
+
+
+def test_failed_migration_is_not_recorded():
+    db = FakeMigrationDB()
+
+    def failing_step(_cursor):
+        raise RuntimeError("boom")
+
+    steps = [Migration(1, "ok", ["SELECT 1"]), Migration(2, "falla", [failing_step])]
+
+    try:
+        run_migrations(db, steps)
+    except RuntimeError:
+        pass
+
+    assert db.applied == {1}
+
+
+def test_non_transactional_migration_runs_in_autocommit_with_session_lock():
+    db = FakeMigrationDB()
+    steps = [Migration(1, "indices", ["CREATE INDEX CONCURRENTLY x ON t (a)"], transactional=False)]
+
+    run_migrations(db, steps)
+
+    assert db.autocommit_calls == 1
+    assert any("pg_advisory_lock" in statement for statement in db.statements)
+    assert any("pg_advisory_unlock" in statement for statement in db.statements)
+
+
+def test_ensure_schema_runs_once_per_target(monkeypatch):
+    db = FakeMigrationDB()
+    calls = []
+    monkeypatch.setattr(migrations, "_verified_targets", set())
+    monkeypatch.setattr(migrations, "run_migrations", lambda target_db: calls.append(target_db))
+
+    ensure_schema(db)
+    ensure_schema(db)
+
+    assert calls == [db]
+
+
+def test_declared_migrations_have_unique_increasing_versions():
+    versions = [migration.version for migration in migrations.MIGRATIONS]
+
+    assert versions == sorted(set(versions))
+
+
+class IndexCursor:
+    """Cursor simulado con un catálogo mínimo de tablas e índices."""
+
+    def __init__(self, tables: Set[str], invalid: Set[str]):
+        self.tables = tables
+        self.invalid = invalid
+        self.statements: List[str] = []
+        self._rows: List[Any] = []
+
+    def execute(self, query: str, params: Any = None) -> None:
+        normalized = " ".join(query.split())
+        self.statements.append(normalized)
+        if normalized.startswith("SELECT to_regclass"):
+            self._rows = [{"present": params[0] in self.tables}]
+        elif "FROM pg_index" in normalized:
+            self._rows = [{"valid": False}] if params[0] in self.invalid else []
+        else:
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+def test_index_migration_builds_concurrently_and_skips_missing_tables():
+    migration = next(m for m in migrations.MIGRATIONS if m.version == 5)
+    cursor = IndexCursor(
+        tables={"conversaciones", "mensajes", "support_tickets"},
+        invalid={"idx_mensajes_conversacion_timestamp"},
+    )
+
+    for step in migration.statements:
+        step(cursor)
+
+    assert not migration.transactional
+    creates = [statement for statement in cursor.statements if statement.startswith("CREATE INDEX")]
+    assert all(statement.startswith("CREATE INDEX CONCURRENTLY IF NOT EXISTS") for statement in creates)
+    assert {statement.split()[6] for statement in creates} == {
+        "idx_conversaciones_usuario_activa",
+        "idx_mensajes_conversacion_timestamp",
+        "idx_tickets_status_bank_priority",
+        "idx_tickets_agent_status",
+    }
+    assert "DROP INDEX CONCURRENTLY IF EXISTS idx_mensajes_conversacion_timestamp" in cursor.statements
+
+
+def test_indexes_skipped_on_a_fresh_database_are_built_after_their_tables_exist():
+    por_version = {m.version: m for m in migrations.MIGRATIONS}
+    tablas = {"conversaciones", "mensajes", "chatbot_sessions", "support_tickets", "agent_messages"}
+
+    cursor = IndexCursor(tables=tablas, invalid=set())
+    for step in por_version[5].statements:
+        step(cursor)
+    assert not any("idx_chat_sessions_user_end" in statement for statement in cursor.statements)
+
+    # chat_sessions se crea en la migración 8; la 10 crea su índice
+    pendiente = por_version[10]
+    cursor = IndexCursor(tables=tablas | {"chat_sessions"}, invalid=set())
+    for step in pendiente.statements:
+        step(cursor)
+
+    assert not pendiente.transactional
+    assert "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_chat_sessions_user_end ON chat_sessions (user_id, end_time)" \
+        in cursor.statements
+
+
+def test_check_indexes_reports_missing_invalid_and_unused():
+    class CatalogDB:
+        def fetch_all(self, query, params=None):
+            if "pg_stat_user_indexes" in query:
+                return [{"table": "mensajes", "name": "idx_viejo", "scans": 0, "size_bytes": 8192}]
+            return [
+                {"name": "idx_conversaciones_usuario_activa", "valid": True},
+                {"name": "idx_tickets_agent_status", "valid": False},
+            ]
+
+    report = check_indexes(CatalogDB())
+
+    missing = {index["name"] for index in report["missing"]}
+    assert "idx_conversaciones_usuario_activa" not in missing
+    assert "idx_agent_messages_ticket_timestamp" in missing
+    assert [index["name"] for index in report["invalid"]] == ["idx_tickets_agent_status"]
+    assert report["unused"][0]["name"] == "idx_viejo"
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import pytest
+
+from bot_siacasa.infrastructure.db.connection_pool import ConnectionPool
+from bot_siacasa.infrastructure.db.neondb_connector import _rows_to_copy_buffer
+from bot_siacasa.infrastructure.db.prepared_statements import (
+    PreparedStatementCache,
+    prepared_statement_stats,
+    to_server_placeholders,
+)
+from bot_siacasa.infrastructure.db.replica import ReplicaRouter
+
+
+def test_execute_values_sends_rows_in_one_statement_and_commit(build_connector):
+    connector, connection = build_connector()
+    rows = [("session-1", f"file-{i}", "pending") for i in range(500)]
+
+    connector.execute_values(
+        "INSERT INTO training_session_files (session_id, file_id, status) VALUES %s", rows
+    )
+
+    assert connection.round_trips == 1
+    assert connection.commits == 1
+    statement = connection.statements[0][0]
+    assert statement.count("'session-1'") == 500
+
+
+def test_execute_values_paginates_large_batches(build_connector):
+    connector, connection = build_connector()
+    rows = [(i,) for i in range(2500)]
+
+    connector.execute_values("INSERT INTO t (n) VALUES %s", rows, page_size=1000)
+
+    assert connection.round_trips == 3
+    assert connection.commits == 1
+
+
+def test_copy_rows_serializes_nulls_quotes_and_json():
+    buffer = _rows_to_copy_buffer([
+        ("a", None, 'dice "hola"', {"k": 1}),
+        ("", 2, "x,y", None),
+    ])
+
+    lines = buffer.getvalue().splitlines()
+    assert lines[0] == '"a",,"dice ""hola""","{""k"": 1}"'
+    assert lines[1] == '"","2","x,y",'
+
+
+def test_copy_rows_uses_single_round_trip(build_connector):
+    connector, connection = build_connector()
+
+    copied = connector.copy_rows(
+        "text_embeddings", ["id", "text"], [(str(i), "chunk") for i in range(1000)]
+    )
+
+    assert copied == 1000
+    assert connection.round_trips == 1
+    assert connection.commits == 1
+
+
+def test_placeholders_are_translated_for_prepare():
+    translated = to_server_placeholders("SELECT * FROM t WHERE a = %s AND b LIKE 'x%%' AND c = %s")
+
+    assert translated == ("SELECT * FROM t WHERE a = $1 AND b LIKE 'x%' AND c = $2", 2)
+    assert to_server_placeholders("SELECT %(a)s") is None
+
+
+def test_prepared_queries_are_prepared_once_per_connection(build_connector):
+    connector, connection = build_connector()
+    connector.prepared_statements_enabled = True
+    before = prepared_statement_stats.as_dict()
+    query = "SELECT id FROM conversaciones WHERE usuario_id = %s LIMIT 1"
+
+    connector.fetch_one(query, ("user-1",), prepared=True)
+    connector.fetch_one(query, ("user-2",), prepared=True)
+
+    statements = [statement for statement, _ in connection.statements]
+    assert sum(1 for statement in statements if statement.startswith("PREPARE")) == 1
+    assert sum(1 for statement in statements if statement.startswith("EXECUTE")) == 2
+    after = prepared_statement_stats.as_dict()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+def test_prepared_statement_cache_evicts_least_recently_used(fake_connection_factory):
+    connection = fake_connection_factory()
+    cache = PreparedStatementCache(max_size=2)
+    cursor = connection.cursor()
+
+    for query in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+        cache.execute(cursor, query, ())
+
+    assert "SELECT 1" in cache and "SELECT 3" in cache
+    assert "SELECT 2" not in cache
+    assert any(statement.startswith("DEALLOCATE") for statement, _ in connection.statements)
+
+
+def test_fetch_iter_streams_rows_with_named_cursor_and_releases_connection(build_connector):
+    connector, connection = build_connector()
+    connection.results.append([{"id": i} for i in range(25)])
+
+    rows = connector.fetch_iter("SELECT id FROM support_tickets", batch_size=10)
+    first = next(rows)
+
+    assert first == {"id": 0}
+    assert connector.get_pool_stats()["in_use"] == 1
+    assert [row["id"] for row in rows] == list(range(1, 25))
+    assert connector.get_pool_stats()["in_use"] == 0
+
+
+def test_fetch_iter_releases_connection_when_closed_early(build_replica_connector, build_connector, fake_connection_factory):
+    connector, connection = build_connector()
+    connection.results.append([{"id": i} for i in range(25)])
+
+    rows = connector.fetch_iter("SELECT id FROM support_tickets", batch_size=10)
+    next(rows)
+    rows.close()
+
+    assert connector.get_pool_stats()["in_use"] == 0
+    assert connection.rollbacks >= 1
+
+
+@pytest.fixture
+def build_replica_connector(build_connector, fake_connection_factory):
+    def build(router: ReplicaRouter) -> tuple:
+        connector, primary = build_connector()
+        replica = fake_connection_factory()
+        connector.replica_pool = ConnectionPool(lambda: replica, pool_size=1, max_overflow=0, pre_ping=False)
+        connector.replica_router = router
+        return connector, primary, replica
+
+    return build
+
+
+def test_readonly_reads_go_to_replica_and_writes_stay_on_primary(build_replica_connector):
+    router = ReplicaRouter(max_lag_seconds=30, lag_check_interval=60, failure_cooldown=30)
+    connector, primary, replica = build_replica_connector(router)
+    replica.results.extend([[(0,)], [{"count": 7}]])
+
+    assert connector.fetch_one("SELECT COUNT(*) AS count FROM support_tickets", readonly=True) == {"count": 7}
+    connector.execute("UPDATE support_tickets SET status = %s", ("closed",))
+
+    assert [statement for statement, _ in primary.statements] == ["UPDATE support_tickets SET status = %s"]
+    assert router.get_stats()["replica_reads"] == 1
+
+
+def test_stale_replica_falls_back_to_primary(build_replica_connector):
+    router = ReplicaRouter(max_lag_seconds=5, lag_check_interval=60, failure_cooldown=30)
+    connector, primary, replica = build_replica_connector(router)
+    replica.results.append([(120.0,)])
+    primary.results.append([{"count": 3}])
+
+    assert connector.fetch_all_replica("SELECT COUNT(*) AS count FROM chatbot_sessions") == [{"count": 3}]
+    assert len(replica.statements) == 1
+    assert router.get_stats()["stale_skips"] == 1
+
+
+def test_replica_error_retries_on_primary_and_cools_down(build_replica_connector):
+    router = ReplicaRouter(max_lag_seconds=30, lag_check_interval=60, failure_cooldown=30)
+    connector, primary, replica = build_replica_connector(router)
+    replica.results.append([(0,)])
+
+    def broken_cursor(name=None, cursor_factory=None):
+        raise RuntimeError("replica down")
+
+    connector.fetch_one("SELECT 1", readonly=True)
+    replica.cursor = broken_cursor
+    primary.results.append([{"ok": 1}])
+
+    assert connector.fetch_one("SELECT 1 AS ok", readonly=True) == {"ok": 1}
+    assert connector.fetch_one("SELECT 1 AS ok", readonly=True) == {"result": 1}
+    stats = router.get_stats()
+    assert stats["replica_errors"] == 1
+    assert stats["available"] is False
+
+
+def test_fetch_iter_falls_back_to_primary_when_replica_fails_before_first_row(build_replica_connector):
+    router = ReplicaRouter(max_lag_seconds=30, lag_check_interval=60, failure_cooldown=30)
+    connector, primary, replica = build_replica_connector(router)
+    replica.results.append([(0,)])
+    connector.fetch_one("SELECT 1", readonly=True)
+
+    def broken_cursor(name=None, cursor_factory=None):
+        raise RuntimeError("replica down")
+
+    replica.cursor = broken_cursor
+    primary.results.append([{"id": i} for i in range(5)])
+
+    rows = list(connector.fetch_iter("SELECT id FROM support_tickets", batch_size=2, readonly=True))
+
+    assert [row["id"] for row in rows] == list(range(5))
+    assert router.get_stats()["replica_errors"] == 1
+    assert connector.get_pool_stats()["in_use"] == 0
@@ -0,0 +1,189 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Set
+
+from bot_siacasa.infrastructure.db import migrations
+from bot_siacasa.infrastructure.db.indexes import ManagedIndex, create_managed_index
+from bot_siacasa.infrastructure.db.partitions import (
+    PARTITIONED_TABLES,
+    PartitionManager,
+    add_months,
+    convert_to_partitioned,
+)
+from bot_siacasa.infrastructure.repositories.postgresql_repository import (
+    HIDRATAR_CONVERSACION_SQL,
+    MENSAJE_CONFLICT_SQL,
+    MENSAJES_ANTERIORES_SQL,
+    MENSAJES_LOTE_SQL,
+)
+
+
+class PartitionCursor:
+    """Cursor simulado con un catálogo de tablas (None, "table" o "partitioned")."""
+
+    def __init__(
+        self,
+        tables: Dict[str, str],
+        oldest: Optional[datetime] = None,
+        default_months: Optional[Set[str]] = None
+    ):
+        self.tables = tables
+        self.oldest = oldest
+        # Meses ("2026-11-01") con filas en la partición DEFAULT
+        self.default_months = default_months or set()
+        self.statements: List[str] = []
+        self.rowcount = 0
+        self._rows: List[Any] = []
+
+    def execute(self, query: str, params: Any = None) -> None:
+        normalized = " ".join(query.split())
+        self.statements.append(normalized)
+        self.rowcount = 0
+        if "AS has_default" in normalized:
+            self._rows = [{"present": params[0] in self.tables, "has_default": params[1] in self.tables}]
+        elif normalized.startswith("SELECT EXISTS"):
+            self._rows = [{"pending": any(f">= '{month}'" in normalized for month in self.default_months)}]
+        elif normalized.startswith("INSERT INTO") and "_default WHERE" in normalized:
+            self.rowcount = 3
+        elif normalized.startswith("SELECT to_regclass"):
+            kind = self.tables.get(params[0])
+            self._rows = [{"present": kind is not None, "partitioned": kind == "partitioned"}]
+        elif normalized.startswith("SELECT MIN("):
+            self._rows = [{"oldest": self.oldest}]
+        else:
+            self._rows = []
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+
+def test_convert_creates_monthly_partitions_covering_existing_rows():
+    mensajes = PARTITIONED_TABLES[0]
+    cursor = PartitionCursor({"mensajes": "table"}, oldest=datetime(2026, 7, 20, 10, 30))
+
+    assert convert_to_partitioned(cursor, mensajes, months_ahead=2, today=date(2026, 10, 17))
+
+    partitions = [s.split()[5] for s in cursor.statements if s.startswith("CREATE TABLE IF NOT EXISTS")]
+    assert partitions == [
+        "mensajes_p202607", "mensajes_p202608", "mensajes_p202609",
+        "mensajes_p202610", "mensajes_p202611", "mensajes_p202612", "mensajes_default",
+    ]
+    assert "PARTITION BY RANGE (timestamp)" in cursor.statements[2]
+    assert (
+        "CREATE TABLE IF NOT EXISTS mensajes_p202612 PARTITION OF mensajes "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')"
+    ) in cursor.statements
+    # Se copian las filas antes de crear la clave (id, timestamp) y los índices
+    copy = cursor.statements.index("INSERT INTO mensajes SELECT * FROM mensajes_sin_particionar")
+    key = cursor.statements.index("ALTER TABLE mensajes ADD PRIMARY KEY (id, timestamp)")
+    assert copy < key
+    assert cursor.statements[-1].startswith("CREATE INDEX IF NOT EXISTS idx_mensajes_conversacion_timestamp")
+
+
+def test_convert_is_idempotent_and_skips_missing_tables():
+    agent_messages = PARTITIONED_TABLES[1]
+
+    assert not convert_to_partitioned(PartitionCursor({"agent_messages": "partitioned"}), agent_messages)
+    assert not convert_to_partitioned(PartitionCursor({}), agent_messages)
+
+
+def test_partition_migration_runs_in_a_transaction():
+    migration = next(m for m in migrations.MIGRATIONS if m.version == 6)
+    cursor = PartitionCursor({"mensajes": "table", "agent_messages": "partitioned"})
+
+    for step in migration.statements:
+        step(cursor)
+
+    assert migration.transactional
+    assert "ALTER TABLE mensajes RENAME TO mensajes_sin_particionar" in cursor.statements
+    assert not any("agent_messages_sin_particionar" in s for s in cursor.statements)
+    assert "ALTER TABLE agent_messages ADD FOREIGN KEY (ticket_id) REFERENCES support_tickets(id)" not in cursor.statements
+
+
+def test_managed_index_on_partitioned_table_is_not_concurrent():
+    cursor = PartitionCursor({"mensajes": "partitioned"})
+
+    create_managed_index(cursor, ManagedIndex("idx_m", "mensajes", "conversacion_id, timestamp"))
+
+    assert cursor.statements[-1] == "CREATE INDEX IF NOT EXISTS idx_m ON mensajes (conversacion_id, timestamp)"
+
+
+def test_manager_ensures_future_months_and_detaches_expired_ones():
+    class FakeDB:
+        def __init__(self):
+            self.cursor = PartitionCursor({"mensajes": "partitioned", "agent_messages": "table"})
+            self.executed: List[str] = []
+
+        @contextmanager
+        def transaction(self):
+            yield self.cursor
+
+        def fetch_all(self, query, params=None):
+            if params[0] != "mensajes":
+                return []
+            return [
+                {"name": "mensajes_default", "bounds": "DEFAULT", "size_bytes": 0},
+                {"name": "mensajes_p202509", "bounds": "", "size_bytes": 0},
+                {"name": "mensajes_p202510", "bounds": "", "size_bytes": 0},
+                {"name": "mensajes_p202611", "bounds": "", "size_bytes": 0},
+            ]
+
+        def execute(self, query, params=None):
+            self.executed.append(query)
+
+    db = FakeDB()
+    manager = PartitionManager(db, months_ahead=2, retention_months=12)
+
+    result = manager.run_maintenance(today=date(2026, 10, 17))
+
+    assert result["ensured"] == ["mensajes_p202610", "mensajes_p202611", "mensajes_p202612"]
+    assert result["detached"] == ["mensajes_p202509"]
+    assert db.executed == ["ALTER TABLE mensajes DETACH PARTITION mensajes_p202509"]
+    assert add_months(date(2026, 11, 1), 14) == date(2028, 1, 1)
+
+
+def test_new_month_partition_takes_its_rows_out_of_the_default_partition():
+    class FakeDB:
+        def __init__(self):
+            self.cursor = PartitionCursor(
+                {"mensajes": "partitioned", "mensajes_default": "table", "mensajes_p202610": "table"},
+                default_months={"2026-11-01"}
+            )
+            self.transactions = 0
+
+        @contextmanager
+        def transaction(self):
+            self.transactions += 1
+            yield self.cursor
+
+    db = FakeDB()
+    manager = PartitionManager(db, tables=PARTITIONED_TABLES[:1], months_ahead=2)
+
+    assert manager.ensure_future_partitions(today=date(2026, 10, 17)) == [
+        "mensajes_p202610", "mensajes_p202611", "mensajes_p202612"
+    ]
+
+    assert db.transactions == 1
+    statements = [s for s in db.cursor.statements if not s.startswith("SELECT")]
+    rango = "timestamp >= '2026-11-01' AND timestamp < '2026-12-01'"
+    assert statements == [
+        "ALTER TABLE mensajes DETACH PARTITION mensajes_default",
+        "CREATE TABLE IF NOT EXISTS mensajes_p202611 PARTITION OF mensajes "
+        "FOR VALUES FROM ('2026-11-01') TO ('2026-12-01')",
+        f"INSERT INTO mensajes SELECT * FROM mensajes_default WHERE {rango}",
+        f"DELETE FROM mensajes_default WHERE {rango}",
+        "ALTER TABLE mensajes ATTACH PARTITION mensajes_default DEFAULT",
+        # Diciembre no tiene filas en DEFAULT: se crea directamente
+        "CREATE TABLE IF NOT EXISTS mensajes_p202612 PARTITION OF mensajes "
+        "FOR VALUES FROM ('2026-12-01') TO ('2027-01-01')",
+    ]
+
+
+def test_hot_queries_bound_message_timestamps_for_pruning():
+    assert "ON CONFLICT (id, timestamp)" in MENSAJE_CONFLICT_SQL
+    assert "timestamp = EXCLUDED.timestamp" not in MENSAJE_CONFLICT_SQL
+    assert "timestamp >= c.fecha_inicio" in HIDRATAR_CONVERSACION_SQL
+    assert "SELECT MIN(fecha_inicio) FROM conversaciones" in MENSAJES_LOTE_SQL
+    assert "SELECT fecha_inicio FROM conversaciones" in MENSAJES_ANTERIORES_SQL
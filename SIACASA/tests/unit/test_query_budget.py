@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import pytest
+
+from bot_siacasa.domain.entities.ticket import TicketStatus
+from bot_siacasa.infrastructure.db.query_budget import (
+    QueryBudgetExceeded,
+    assert_query_budget,
+    track_queries,
+)
+from bot_siacasa.infrastructure.db.support_repository import SupportRepository
+from bot_siacasa.interfaces.web.web_app import WebApp
+
+
+def test_nested_trackers_count_round_trips_and_rows(build_connector):
+    connector, connection = build_connector()
+    connection.results.extend([[{"id": 1}, {"id": 2}], [{"id": 3}]])
+
+    with track_queries("externo") as outer:
+        connector.fetch_all("SELECT id FROM conversaciones WHERE usuario_id = %s", ("u1",))
+        with track_queries("interno") as inner:
+            connector.fetch_all("SELECT id FROM conversaciones WHERE usuario_id = %s", ("u2",))
+
+    assert (outer.queries, outer.rows) == (2, 3)
+    assert (inner.queries, inner.rows) == (1, 1)
+    assert outer.repeated() == {"SELECT id FROM conversaciones WHERE usuario_id = ?": 2}
+
+
+def test_budget_passes_within_limits(build_connector):
+    connector, _ = build_connector()
+
+    with assert_query_budget("lectura simple", max_queries=1) as counter:
+        connector.fetch_one("SELECT 1")
+
+    assert counter.queries == 1
+
+
+def test_budget_detects_n_plus_one_in_tickets_by_status(build_connector):
+    connector, connection = build_connector()
+    connection.results.append([{"id": f"ticket-{i}"} for i in range(5)])
+    repository = SupportRepository(connector)
+
+    with pytest.raises(QueryBudgetExceeded) as excinfo:
+        with assert_query_budget(
+            "SupportRepository.obtener_tickets_por_estado", max_queries=3, max_repeats=1
+        ):
+            repository.obtener_tickets_por_estado(TicketStatus.PENDING)
+
+    message = str(excinfo.value)
+    assert "6 consultas" in message
+    assert "5x" in message
+
+
+def test_fetch_iter_counts_each_batch_as_round_trip(build_connector):
+    connector, connection = build_connector()
+    connection.results.append([{"id": i} for i in range(25)])
+
+    with track_queries() as counter:
+        list(connector.fetch_iter("SELECT id FROM support_tickets", batch_size=10))
+
+    # DECLARE + 3 lotes con filas + lote vacío final
+    assert counter.queries == 5
+    assert counter.rows == 25
+
+
+def test_web_app_exposes_query_headers_in_debug_mode(build_connector):
+    connector, _ = build_connector()
+    web_app = WebApp(procesar_mensaje_use_case=None, chatbot_service=None)
+    web_app.app.debug = True
+
+    @web_app.app.route('/api/_prueba_consultas')
+    def prueba_consultas():
+        connector.fetch_one("SELECT 1")
+        connector.fetch_one("SELECT 2")
+        return "ok"
+
+    response = web_app.app.test_client().get('/api/_prueba_consultas')
+
+    assert response.headers['X-DB-Queries'] == "2"
+    assert response.headers['X-DB-Rows'] == "2"
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import logging
+
+from bot_siacasa.infrastructure.db.query_stats import QueryStatsRegistry, fingerprint
+
+
+def test_fingerprint_groups_equivalent_queries():
+    first = fingerprint("SELECT * FROM mensajes\n WHERE conversacion_id = %s  -- hidratar\n LIMIT 10")
+    second = fingerprint("select * FROM mensajes WHERE conversacion_id = 'abc' LIMIT 25")
+
+    assert first == "SELECT * FROM mensajes WHERE conversacion_id = ? LIMIT ?"
+    assert second.lower() == first.lower()
+    assert fingerprint("INSERT INTO t (a, b) VALUES (1, 'x'), (2, 'y'), (3, 'z')") == \
+        "INSERT INTO t (a, b) VALUES (?)"
+    assert fingerprint("SELECT 1 FROM t WHERE id IN (%s, %s, %s)") == "SELECT ? FROM t WHERE id IN (?)"
+
+
+def test_registry_tracks_calls_histogram_and_slow_queries(caplog):
+    registry = QueryStatsRegistry(slow_query_threshold_ms=100)
+
+    with caplog.at_level(logging.WARNING, logger="bot_siacasa.db.slow_queries"):
+        registry.record("SELECT * FROM t WHERE id = %s", 3.0, rows=1)
+        registry.record("SELECT * FROM t WHERE id = %s", 40.0, rows=1)
+        registry.record("SELECT * FROM t WHERE id = %s", 150.0, rows=0, error=True)
+
+    stats = registry.get_stats()
+    entry = stats["queries"][0]
+    assert entry["calls"] == 3
+    assert entry["errors"] == 1
+    assert entry["slow_calls"] == 1
+    assert entry["max_ms"] == 150.0
+    assert entry["histogram"] == {"<=5ms": 1, "<=50ms": 1, "<=250ms": 1}
+    assert len(caplog.records) == 1
+    assert '"duration_ms": 150.0' in caplog.records[0].getMessage()
+
+
+def test_registry_bounds_number_of_fingerprints():
+    registry = QueryStatsRegistry(slow_query_threshold_ms=1000, max_fingerprints=2)
+
+    for table in ("a", "b", "c"):
+        registry.record(f"SELECT * FROM {table}", 1.0)
+
+    stats = registry.get_stats()
+    assert stats["fingerprints"] == 2
+    assert stats["dropped_fingerprints"] == 1
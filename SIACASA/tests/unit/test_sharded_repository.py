@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.infrastructure.hash_ring import ConsistentHashRing
+from bot_siacasa.infrastructure.repositories.sharded_repository import ShardedRepository, parse_shard_targets
+from bot_siacasa.infrastructure.repositories.sqlite_repository import SQLiteRepository
+from tests.unit.test_unit_of_work import FakeAIProvider
+
+SHARDS = ("shard-a", "shard-b", "shard-c")
+
+
+def build_repository(tmp_path) -> ShardedRepository:
+    return ShardedRepository({nombre: SQLiteRepository(str(tmp_path / f"{nombre}.db")) for nombre in SHARDS})
+
+
+def contar(repository: SQLiteRepository, tabla: str) -> int:
+    with repository._reader() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+
+
+def test_ring_is_stable_and_moves_about_one_nth_of_keys():
+    keys = [f"user-{i}" for i in range(5000)]
+    ring = ConsistentHashRing(["a", "b", "c"])
+    antes = {key: ring.get_node(key) for key in keys}
+
+    assert antes == {key: ConsistentHashRing(["c", "a", "b"]).get_node(key) for key in keys}
+    assert all(900 < list(antes.values()).count(nodo) < 2400 for nodo in "abc")
+
+    ring.add_node("d")
+    movidas = [key for key in keys if ring.get_node(key) != antes[key]]
+    # Solo se mueven claves hacia el nodo nuevo, ~1/4 del total
+    assert all(ring.get_node(key) == "d" for key in movidas)
+    assert 0.15 < len(movidas) / len(keys) < 0.35
+
+    ring.remove_node("d")
+    assert {key: ring.get_node(key) for key in keys} == antes
+
+
+def test_each_user_lives_in_a_single_shard(tmp_path):
+    repository = build_repository(tmp_path)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+
+    usuarios = [f"user-{i}" for i in range(12)]
+    for usuario_id in usuarios:
+        service.procesar_mensaje(usuario_id, "¿Cuál es mi saldo de ahorros?")
+
+    for usuario_id in usuarios:
+        propio = repository.shard_para_usuario(usuario_id)
+        for nombre, shard in repository.shards.items():
+            tiene = shard.obtener_conversacion_activa(usuario_id) is not None
+            assert tiene == (nombre == propio)
+
+    por_shard = {nombre: contar(shard, "mensajes") for nombre, shard in repository.shards.items()}
+    assert sum(por_shard.values()) == 24
+    assert len([total for total in por_shard.values() if total]) > 1
+    repository.cerrar()
+
+
+def test_conversation_lookups_fall_back_to_fan_out_once(tmp_path):
+    repository = build_repository(tmp_path)
+    conversacion = Conversacion(id="conv-1", usuario=Usuario(id="user-7"))
+    conversacion.agregar_mensaje(Mensaje(role="user", content="hola"))
+    repository.guardar_conversacion(conversacion)
+    repository.cerrar()
+
+    # Un proceso nuevo no conoce el shard de la conversación
+    reabierto = build_repository(tmp_path)
+    cargada = reabierto.obtener_conversacion("conv-1")
+    assert [m.content for m in cargada.mensajes] == ["hola"]
+    assert reabierto.fan_outs == 1
+
+    reabierto.obtener_conversacion("conv-1")
+    reabierto.finalizar_conversacion("conv-1")
+    assert reabierto.fan_outs == 1
+    assert reabierto.obtener_conversacion_activa("user-7") is None
+    assert reabierto.obtener_conversacion("desconocida") is None
+    reabierto.cerrar()
+
+
+def test_admin_batch_reads_merge_all_shards(tmp_path):
+    repository = build_repository(tmp_path)
+    ids = []
+    for i in range(9):
+        conversacion = Conversacion(id=f"conv-{i}", usuario=Usuario(id=f"user-{i}"))
+        conversacion.agregar_mensaje(Mensaje(role="user", content=f"mensaje {i}"))
+        repository.guardar_conversacion(conversacion)
+        ids.append(conversacion.id)
+
+    otro_proceso = build_repository(tmp_path)
+    cargadas = otro_proceso.obtener_conversaciones(ids + ["desconocida"])
+    totales = repository.fan_out(lambda shard: contar(shard, "conversaciones"))
+
+    assert sorted(c.id for c in cargadas) == sorted(ids)
+    assert sum(totales.values()) == 9
+    otro_proceso.cerrar()
+    repository.cerrar()
+
+
+def test_shard_targets_keep_explicit_names():
+    assert parse_shard_targets("a=db-a.internal, b=/data/b.db") == {"a": "db-a.internal", "b": "/data/b.db"}
+    assert parse_shard_targets("host-1,host-2,") == {"shard0": "host-1", "shard1": "host-2"}
+
+
+def test_adding_a_shard_keeps_users_readable_until_rebalance_moves_them(tmp_path):
+    repository = build_repository(tmp_path)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    usuarios = [f"user-{i}" for i in range(40)]
+    for usuario_id in usuarios:
+        service.procesar_mensaje(usuario_id, "¿Cuál es mi saldo de ahorros?")
+    activas = {usuario_id: repository.obtener_conversacion_activa(usuario_id).id for usuario_id in usuarios}
+
+    nuevo = SQLiteRepository(str(tmp_path / "shard-d.db"))
+    repository.agregar_shard("shard-d", nuevo)
+    movidos = [usuario_id for usuario_id in usuarios if repository.shard_para_usuario(usuario_id) == "shard-d"]
+    assert movidos and contar(nuevo, "conversaciones") == 0
+
+    # Antes del rebalanceo se leen desde el shard anterior
+    for usuario_id in usuarios:
+        assert repository.obtener_conversacion_activa(usuario_id).id == activas[usuario_id]
+        assert repository.obtener_usuario(usuario_id) is not None
+    assert repository.get_stats()["rebalanceo_pendiente"]
+
+    # Un worker arrancado con el reparto nuevo y SHARD_PREVIOUS también los encuentra
+    reiniciado = ShardedRepository(
+        {nombre: SQLiteRepository(str(tmp_path / f"{nombre}.db")) for nombre in (*SHARDS, "shard-d")},
+        shards_anteriores=SHARDS
+    )
+    assert reiniciado.obtener_conversacion_activa(movidos[0]).id == activas[movidos[0]]
+    reiniciado.cerrar()
+
+    assert repository.rebalancear() == len(movidos)
+
+    assert contar(nuevo, "conversaciones") == len(movidos)
+    assert contar(nuevo, "mensajes") == 2 * len(movidos)
+    assert sum(contar(shard, "mensajes") for shard in repository.shards.values()) == 2 * len(usuarios)
+    for usuario_id in movidos:
+        assert all(
+            repo.obtener_conversacion_activa(usuario_id) is None
+            for nombre, repo in repository.shards.items() if nombre != "shard-d"
+        )
+        conversacion = repository.obtener_conversacion_activa(usuario_id)
+        assert conversacion.id == activas[usuario_id]
+        assert [m.role for m in conversacion.mensajes] == ["user", "assistant"]
+    assert repository.get_stats()["rebalanceo_pendiente"] is False
+    assert repository.rebalancear() == 0
+
+    repository.cerrar()
+
+
+def test_failed_move_keeps_source_data_and_previous_ring(tmp_path):
+    repository = build_repository(tmp_path)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    usuarios = [f"user-{i}" for i in range(40)]
+    for usuario_id in usuarios:
+        service.procesar_mensaje(usuario_id, "¿Cuál es mi saldo de ahorros?")
+
+    nuevo = SQLiteRepository(str(tmp_path / "shard-d.db"))
+    repository.agregar_shard("shard-d", nuevo)
+    movidos = [usuario_id for usuario_id in usuarios if repository.shard_para_usuario(usuario_id) == "shard-d"]
+    origen = repository.shards[repository._shard_anterior(movidos[0])]
+
+    def exportar_con_error(usuario_id):
+        raise RuntimeError("lectura fallida")
+
+    original = origen.exportar_conversaciones_usuario
+    origen.exportar_conversaciones_usuario = exportar_con_error
+    assert repository.rebalancear() < len(movidos)
+
+    # Nada se borró del origen y las lecturas siguen consultando el anillo anterior
+    assert repository.get_stats()["rebalanceo_pendiente"]
+    assert origen.obtener_conversacion_activa(movidos[0]) is not None
+    assert repository.obtener_conversacion_activa(movidos[0]) is not None
+
+    origen.exportar_conversaciones_usuario = original
+    repository.rebalancear()
+    assert repository.get_stats()["rebalanceo_pendiente"] is False
+    assert contar(nuevo, "conversaciones") == len(movidos)
+    repository.cerrar()
+
+
+def test_user_conversations_forward_the_message_window(tmp_path):
+    repository = build_repository(tmp_path)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    for texto in ("Hola", "¿Cuál es mi saldo?", "Gracias"):
+        service.procesar_mensaje("user-1", texto)
+
+    completas = repository.obtener_conversaciones_usuario("user-1")
+    recientes = repository.obtener_conversaciones_usuario("user-1", max_mensajes=2)
+
+    assert [len(conversacion.mensajes) for conversacion in completas] == [6]
+    assert [m.content for m in recientes[0].mensajes] == [m.content for m in completas[0].mensajes[-2:]]
+    repository.cerrar()
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.infrastructure.repositories.sqlite_repository import SQLiteRepository
+from tests.unit.test_unit_of_work import FakeAIProvider
+
+
+def build_repository(tmp_path) -> SQLiteRepository:
+    return SQLiteRepository(str(tmp_path / "chatbot.db"))
+
+
+def test_uses_wal_and_round_trips_conversations(tmp_path):
+    repository = build_repository(tmp_path)
+    inicio = datetime(2026, 10, 1, 9, 0)
+    conversacion = Conversacion(
+        id="conv-1", usuario=Usuario(id="user-1", datos={"nombre": "Ana"}), metadata={"bank_code": "bn"}
+    )
+    for i in range(3):
+        mensaje = Mensaje(role="user", content=f"mensaje {i}", timestamp=inicio + timedelta(seconds=i))
+        mensaje.intent = "consulta_saldo"
+        conversacion.agregar_mensaje(mensaje)
+
+    repository.guardar_conversacion(conversacion)
+    repository.guardar_conversacion(conversacion)
+    cargada = repository.obtener_conversacion_activa("user-1")
+
+    assert repository._pragma(repository._writer, "journal_mode") == "wal"
+    assert cargada.usuario.datos == {"nombre": "Ana"}
+    assert cargada.metadata == {"bank_code": "bn"}
+    assert [m.content for m in cargada.mensajes] == ["mensaje 0", "mensaje 1", "mensaje 2"]
+    assert cargada.mensajes[0].intent == "consulta_saldo"
+    # Guardar de nuevo no duplica mensajes ni infla el contador
+    assert cargada.total_mensajes == 3
+    repository.cerrar()
+
+
+def test_window_paging_and_batch_loading(tmp_path):
+    repository = build_repository(tmp_path)
+    inicio = datetime(2026, 10, 1, 9, 0)
+    for c in range(3):
+        conversacion = Conversacion(id=f"conv-{c}", usuario=Usuario(id="user-1"), fecha_inicio=inicio + timedelta(days=c))
+        for i in range(10):
+            conversacion.agregar_mensaje(Mensaje(role="user", content=f"{c}-{i}", timestamp=inicio + timedelta(days=c, seconds=i)))
+        if c < 2:
+            conversacion.finalizar()
+        repository.guardar_conversacion(conversacion)
+
+    activa = repository.obtener_conversacion_activa("user-1", max_mensajes=4)
+    anteriores = activa.obtener_mensajes_anteriores(limite=3)
+    conversaciones = repository.obtener_conversaciones_usuario("user-1", max_mensajes=2)
+
+    assert activa.id == "conv-2"
+    assert [m.content for m in activa.mensajes] == ["2-6", "2-7", "2-8", "2-9"]
+    assert activa.total_mensajes == 10
+    assert [m.content for m in anteriores] == ["2-3", "2-4", "2-5"]
+    assert [c.id for c in conversaciones] == ["conv-2", "conv-1", "conv-0"]
+    assert [m.content for m in conversaciones[2].mensajes] == ["0-8", "0-9"]
+    assert repository.obtener_conversaciones(["conv-0", "missing"], max_mensajes=1)[0].mensajes[0].content == "0-9"
+    repository.cerrar()
+
+
+def test_turns_are_persisted_through_unit_of_work(tmp_path):
+    repository = build_repository(tmp_path)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+
+    service.procesar_mensaje("user-1", "¿Cuál es mi saldo de ahorros?")
+    service.procesar_mensaje("user-1", "¿Y el de mi cuenta corriente?")
+
+    reabierta = SQLiteRepository(repository.db_path)
+    conversacion = reabierta.obtener_conversacion_activa("user-1")
+    # El prompt de sistema se guarda como referencia, no como mensaje
+    assert [m.role for m in conversacion.mensajes] == ["user", "assistant", "user", "assistant"]
+    assert conversacion.total_mensajes == 4
+    assert (conversacion.prompt_template, conversacion.prompt_version) == ("default", 1)
+    reabierta.cerrar()
+    repository.cerrar()
+
+
+def test_concurrent_readers_while_single_writer_writes(tmp_path):
+    repository = build_repository(tmp_path)
+    conversacion = Conversacion(id="conv-1", usuario=Usuario(id="user-1"))
+    repository.guardar_conversacion(conversacion)
+    errors = []
+
+    def writer():
+        try:
+            for i in range(50):
+                with repository.unit_of_work() as unidad:
+                    unidad.registrar_mensaje("conv-1", Mensaje(role="user", content=f"m{i}"))
+        except Exception as e:  # pragma: no cover - se reporta abajo
+            errors.append(e)
+
+    def reader():
+        try:
+            for _ in range(50):
+                repository.obtener_conversacion("conv-1")
+        except Exception as e:  # pragma: no cover - se reporta abajo
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert repository.obtener_conversacion("conv-1").total_mensajes == 50
+    assert len(repository._readers) <= repository.config["max_readers"]
+    repository.cerrar()
+
+
+def test_reader_pool_is_bounded_and_reused_across_threads(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "chatbot.db"), config={"max_readers": 2})
+    repository.guardar_conversacion(Conversacion(id="conv-1", usuario=Usuario(id="user-1")))
+    encontradas = []
+
+    def reader():
+        for _ in range(20):
+            encontradas.append(repository.obtener_conversacion("conv-1") is not None)
+
+    # Hilos de corta vida (como los de un servidor con un hilo por petición)
+    for _ in range(3):
+        threads = [threading.Thread(target=reader) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert len(encontradas) == 3 * 8 * 20 and all(encontradas)
+    # Las conexiones no quedan atadas a hilos terminados: vuelven todas al pool
+    assert 1 <= len(repository._readers) <= 2
+    assert repository._idle_readers.qsize() == len(repository._readers)
+    repository.cerrar()
+
+
+def test_in_memory_database_is_supported():
+    repository = SQLiteRepository(":memory:")
+    repository.guardar_usuario(Usuario(id="user-1", datos={"plan": "basico"}))
+    repository.guardar_usuario(Usuario(id="user-1", datos={"plan": "premium"}))
+
+    assert repository.obtener_usuario("user-1").datos == {"plan": "premium"}
+    assert repository.obtener_usuario("user-2") is None
+    repository.cerrar()
+
+
+def test_finalizar_conversacion_propagates_write_errors(tmp_path):
+    repository = build_repository(tmp_path)
+    repository.guardar_conversacion(Conversacion(id="conv-1", usuario=Usuario(id="user-1")))
+    repository.cerrar()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        repository.finalizar_conversacion("conv-1")
+
+
+def test_saving_a_message_again_keeps_its_original_timestamp(tmp_path):
+    repository = build_repository(tmp_path)
+    conversacion = Conversacion(id="conv-1", usuario=Usuario(id="user-1"))
+    mensaje = Mensaje(role="user", content="Hola", timestamp=datetime(2026, 10, 1, 9, 0))
+    conversacion.agregar_mensaje(mensaje)
+    repository.guardar_conversacion(conversacion)
+
+    mensaje.timestamp = datetime(2026, 10, 5, 12, 0)
+    mensaje.content = "Hola de nuevo"
+    repository.guardar_conversacion(conversacion)
+
+    cargado = repository.obtener_conversacion("conv-1").mensajes[0]
+    assert cargado.content == "Hola de nuevo"
+    assert cargado.timestamp == datetime(2026, 10, 1, 9, 0)
+    repository.cerrar()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.domain.system_prompts import PROMPT_TEMPLATE_V1, PromptReference, SystemPromptCatalog
+from bot_siacasa.infrastructure.db import migrations
+from bot_siacasa.infrastructure.repositories.sqlite_repository import SQLiteRepository
+from tests.unit.test_unit_of_work import FakeAIProvider
+
+
+def test_catalog_renders_bank_prompt_once_per_reference():
+    catalog = SystemPromptCatalog(templates={"default": {1: PROMPT_TEMPLATE_V1}})
+    catalog.registrar_banco("bcp", {"identity_statement": "Atiendes a clientes del BCP."})
+    referencia = catalog.referencia_actual("bcp")
+
+    mensaje = catalog.mensaje(referencia)
+
+    assert referencia == PromptReference("bcp", 1)
+    assert mensaje.role == "system"
+    assert mensaje.content.startswith("Eres el asistente virtual oficial del Banco de Crédito del Perú.")
+    assert "Mantén un tono casual" in mensaje.content
+    # Todas las conversaciones del banco comparten el mismo mensaje
+    assert catalog.mensaje(PromptReference("bcp", 1)) is mensaje
+
+
+def test_unknown_version_falls_back_to_current_template():
+    catalog = SystemPromptCatalog(templates={"default": {1: "v1 {bank_name}", 2: "v2 {bank_name}"}})
+
+    assert catalog.renderizar(PromptReference("bn", 1)) == "v1 Banco de la Nación"
+    assert catalog.renderizar(PromptReference("bn", 7)) == "v2 Banco de la Nación"
+    assert catalog.referencia_actual(None) == PromptReference("default", 2)
+
+
+def test_conversations_store_reference_instead_of_prompt_copy(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "chatbot.db"))
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+
+    service.procesar_mensaje("user-1", "¿Cuál es mi saldo de ahorros?")
+
+    with repository._reader() as conn:
+        roles = [fila["role"] for fila in conn.execute("SELECT role FROM mensajes")]
+        fila = conn.execute("SELECT prompt_template, prompt_version, cantidad_mensajes FROM conversaciones").fetchone()
+    assert roles == ["user", "assistant"]
+    assert tuple(fila) == ("default", 1, 2)
+
+    # Otro proceso reconstruye el mismo prompt a partir de la referencia
+    reabierta = SQLiteRepository(repository.db_path)
+    otro_servicio = ChatbotService(reabierta, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    conversacion = otro_servicio.obtener_o_crear_conversacion("user-1")
+    assert conversacion.mensajes[0].content == service.mensaje_sistema.content
+    assert [m.role for m in conversacion.mensajes] == ["system", "user", "assistant"]
+    reabierta.cerrar()
+    repository.cerrar()
+
+
+def test_existing_conversations_keep_their_prompt_version(tmp_path):
+    repository = SQLiteRepository(str(tmp_path / "chatbot.db"))
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    service.procesar_mensaje("user-1", "¿Cuál es mi saldo de ahorros?")
+
+    # Se publica una versión nueva del prompt
+    service.prompt_catalog.templates = {"default": {1: PROMPT_TEMPLATE_V1, 2: "Versión 2 para {bank_name}."}}
+    service._conversation_cache.clear()
+
+    anterior = service.obtener_o_crear_conversacion("user-1")
+    repository.finalizar_conversacion(anterior.id)
+    service._conversation_cache.clear()
+    nueva = service.obtener_o_crear_conversacion("user-1")
+
+    assert anterior.prompt_version == 1
+    assert anterior.mensajes[0].content.startswith("Eres el asistente virtual oficial")
+    assert nueva.prompt_version == 2
+    assert nueva.mensajes[0].content == "Versión 2 para Banco SIACASA."
+    repository.cerrar()
+
+
+def test_migration_removes_persisted_system_prompts():
+    migration = next(m for m in migrations.MIGRATIONS if m.version == 9)
+
+    assert migration.transactional
+    assert "prompt_template" in migration.statements[0]
+    assert "prompt_version" in migration.statements[1]
+    assert "DELETE FROM mensajes WHERE role = 'system'" in migration.statements[2]
+    assert "GREATEST(c.cantidad_mensajes - p.cantidad, 0)" in migration.statements[2]
@@ -0,0 +1,237 @@
+from __future__ import annotations
+
+from bot_siacasa.domain.entities.conversacion import Conversacion
+from bot_siacasa.domain.entities.mensaje import Mensaje
+from bot_siacasa.domain.entities.usuario import Usuario
+from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.infrastructure.db.query_budget import assert_query_budget
+from bot_siacasa.infrastructure.repositories.memory_repository import MemoryRepository
+from bot_siacasa.infrastructure.repositories.postgresql_repository import PostgreSQLRepository
+
+
+class FakeAIProvider:
+    """Proveedor de IA simulado sin llamadas de red."""
+
+    def analizar_sentimiento(self, texto):
+        return {"sentimiento": "neutral", "confianza": 0.9, "intent": "consulta_saldo"}
+
+    def generar_respuesta(self, mensajes, instrucciones_adicionales=None):
+        return "Tu saldo está disponible en la banca móvil."
+
+
+def build_conversation() -> Conversacion:
+    conversacion = Conversacion(id="conv-1", usuario=Usuario(id="user-1"))
+    conversacion.agregar_mensaje(Mensaje(role="system", content="Eres un asistente bancario."))
+    return conversacion
+
+
+def test_unit_of_work_flushes_turn_in_one_round_trip_and_deduplicates_messages(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+    conversacion = build_conversation()
+    pregunta = Mensaje(role="user", content="¿Cuál es mi saldo?")
+    respuesta = Mensaje(role="assistant", content="Puedes verlo en la app.")
+
+    with repository.unit_of_work() as unidad:
+        unidad.registrar_mensaje(conversacion.id, pregunta)
+        unidad.registrar_mensaje(conversacion.id, respuesta)
+        pregunta.processing_time_ms = 120
+        unidad.registrar_mensaje(conversacion.id, pregunta)
+        unidad.registrar_conversacion(conversacion)
+
+    assert connection.round_trips == 1
+    batch = connection.statements[0][0]
+    assert batch.count("INSERT INTO mensajes") == 1
+    assert batch.count(repr(pregunta.id)) == 1
+    assert "120" in batch
+    assert batch.count("INSERT INTO conversaciones") == 1
+
+
+def test_unit_of_work_is_discarded_when_block_fails(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+
+    try:
+        with repository.unit_of_work() as unidad:
+            unidad.registrar_conversacion(build_conversation())
+            raise RuntimeError("fallo del turno")
+    except RuntimeError:
+        pass
+
+    assert connection.round_trips == 0
+
+
+def test_procesar_mensaje_persists_turn_within_query_budget(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    service._conversation_cache.put("user-1", build_conversation())
+
+    with assert_query_budget("ChatbotService.procesar_mensaje", max_queries=1):
+        respuesta = service.procesar_mensaje("user-1", "¿Cuál es mi saldo de ahorros?")
+
+    assert respuesta == "Tu saldo está disponible en la banca móvil."
+    assert connection.statements[0][0].count("INSERT INTO mensajes") == 1
+
+
+def test_default_unit_of_work_applies_changes_with_repository_methods():
+    repository = MemoryRepository()
+    conversacion = build_conversation()
+
+    with repository.unit_of_work() as unidad:
+        unidad.registrar_usuario(conversacion.usuario)
+        unidad.registrar_conversacion(conversacion)
+
+    assert repository.obtener_usuario("user-1") is conversacion.usuario
+    assert repository.obtener_conversacion("conv-1") is conversacion
+
+
+def test_guardar_usuario_is_a_single_upsert(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+
+    repository.guardar_usuario(Usuario(id="user-1", datos={"plan": "premium"}))
+
+    assert connection.round_trips == 1
+    query, params = connection.statements[0]
+    assert "ON CONFLICT (id) DO UPDATE" in query
+    assert params == ("user-1", '{"plan": "premium"}')
+
+
+def test_turn_flush_feeds_admin_and_metrics_sessions_in_the_same_batch(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+    conversacion = build_conversation()
+    conversacion.metadata = {"bank_code": "bn"}
+    pregunta = Mensaje(role="user", content="¿Cuál es mi saldo?")
+    pregunta.sentiment = "negativo"
+    respuesta = Mensaje(role="assistant", content="Puedes verlo en la app.")
+    respuesta.processing_time_ms = 250
+
+    with repository.unit_of_work() as unidad:
+        unidad.registrar_mensaje(conversacion.id, pregunta)
+        unidad.registrar_mensaje(conversacion.id, respuesta)
+        unidad.registrar_conversacion(conversacion)
+
+    assert connection.round_trips == 1
+    batch = connection.statements[0][0]
+    # Las sesiones se escriben después de los mensajes para leer el contador actualizado
+    assert batch.index("INSERT INTO mensajes") < batch.index("INSERT INTO chatbot_sessions")
+    assert batch.count("INSERT INTO chatbot_sessions") == 1
+    assert "(SELECT code FROM banks WHERE code = 'bn')" in batch
+    assert batch.count("INSERT INTO chat_sessions") == 1
+    assert batch.count("INSERT INTO chat_messages") == 1
+    assert repr(respuesta.id) in batch.split("INSERT INTO chat_messages")[1]
+    assert "'negativo'" in batch.split("INSERT INTO chat_sessions")[1]
+
+
+def test_metrics_session_counters_only_grow_with_inserted_turns(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+    conversacion = build_conversation()
+    pregunta = Mensaje(role="user", content="¿Cuál es mi saldo?")
+    respuesta = Mensaje(role="assistant", content="Puedes verlo en la app.")
+
+    with repository.unit_of_work() as unidad:
+        unidad.registrar_mensaje(conversacion.id, pregunta)
+        unidad.registrar_mensaje(conversacion.id, respuesta)
+        unidad.registrar_conversacion(conversacion)
+
+    batch = connection.statements[0][0]
+    sesion, turnos = batch.split("INSERT INTO chat_sessions")[1].split("INSERT INTO chat_messages")
+    # Reenviar un turno ya guardado (ON CONFLICT DO NOTHING) no debe recontarlo
+    assert "total_messages =" not in sesion and "avg_response_time_ms =" not in sesion
+    assert "RETURNING session_id, processing_time_ms" in turnos
+    assert "total_messages = COALESCE(s.total_messages, 0) + nuevos.cantidad" in turnos
+
+
+def test_web_message_endpoint_only_persists_the_turn_batch(build_connector):
+    from bot_siacasa.application.use_cases.procesar_mensaje_use_case import ProcesarMensajeUseCase
+    from bot_siacasa.interfaces.web.web_app import WebApp
+
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    service.esta_escalada = lambda usuario_id: False
+    service.check_for_escalation = lambda mensaje, usuario_id: False
+    conversacion = build_conversation()
+    conversacion.metadata = {"bank_code": "default"}
+    service._conversation_cache.put("user-1", conversacion)
+    web_app = WebApp(procesar_mensaje_use_case=ProcesarMensajeUseCase(service), chatbot_service=service)
+    web_app.app.debug = True
+
+    response = web_app.app.test_client().post(
+        '/api/mensaje', json={"mensaje": "¿Cuál es mi saldo de ahorros?", "usuario_id": "user-1"}
+    )
+
+    assert response.get_json()["session_id"] == "conv-1"
+    assert response.headers['X-DB-Queries'] == "1"
+    assert "INSERT INTO chatbot_sessions" in connection.statements[0][0]
+
+
+def test_finished_session_stays_closed_after_one_more_turn(tmp_path):
+    from bot_siacasa.application.use_cases.procesar_mensaje_use_case import ProcesarMensajeUseCase
+    from bot_siacasa.infrastructure.repositories.sqlite_repository import SQLiteRepository
+    from bot_siacasa.interfaces.web.web_app import WebApp
+
+    repository = SQLiteRepository(str(tmp_path / "chatbot.db"))
+    service = ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+    service.esta_escalada = lambda usuario_id: False
+    service.check_for_escalation = lambda mensaje, usuario_id: False
+    client = WebApp(ProcesarMensajeUseCase(service), service).app.test_client()
+
+    def turno(texto):
+        return client.post('/api/mensaje', json={"mensaje": texto, "usuario_id": "user-1"}).get_json()
+
+    session_id = turno("Hola")["session_id"]
+    copia_vieja = service._conversation_cache.get("user-1")
+
+    assert client.post('/api/finalizar-sesion', json={"usuario_id": "user-1"}).status_code == 200
+    assert "user-1" not in service._conversation_cache
+    assert repository.obtener_conversacion(session_id).fecha_fin is not None
+
+    # Otro worker aún tiene la copia sin fecha de fin y persiste un turno más con ella
+    service._conversation_cache.put("user-1", copia_vieja)
+    service.procesar_mensaje("user-1", "¿Cuál es mi saldo?")
+    assert repository.obtener_conversacion(session_id).fecha_fin is not None
+    assert repository.obtener_conversacion_activa("user-1") is None
+
+    service._conversation_cache.invalidate("user-1")
+    assert turno("Hola de nuevo")["session_id"] != session_id
+
+
+def test_finalizar_conversacion_closes_admin_and_metrics_sessions_in_one_round_trip(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+    repository.finalizar_conversacion("conv-1")
+
+    assert connection.round_trips == 1
+    sql = connection.statements[0][0]
+    assert "UPDATE conversaciones SET fecha_fin" in sql
+    assert "UPDATE chatbot_sessions SET end_time = COALESCE(end_time" in sql
+    assert "UPDATE chat_sessions SET end_time = COALESCE(end_time" in sql
+
+    # Un turno posterior con una copia sin fecha de fin no reabre las sesiones
+    with repository.unit_of_work() as unidad:
+        unidad.registrar_conversacion(build_conversation())
+    lote = connection.statements[-1][0]
+    assert "fecha_fin = COALESCE(conversaciones.fecha_fin, EXCLUDED.fecha_fin)" in lote
+    assert "end_time = COALESCE(chatbot_sessions.end_time, EXCLUDED.end_time)" in lote
+    assert "end_time = COALESCE(chat_sessions.end_time, EXCLUDED.end_time)" in lote
+
+
+def test_copied_data_does_not_derive_admin_and_metrics_sessions(build_connector):
+    connector, connection = build_connector()
+    repository = PostgreSQLRepository(connector)
+    conversacion = build_conversation()
+
+    unidad = repository.unit_of_work()
+    unidad.derivar_sesiones = False
+    with unidad:
+        unidad.registrar_conversacion(conversacion)
+        unidad.registrar_mensaje(conversacion.id, Mensaje(role="user", content="Hola"))
+        unidad.registrar_mensaje(conversacion.id, Mensaje(role="assistant", content="¿En qué te ayudo?"))
+
+    lote = connection.statements[0][0]
+    assert "INSERT INTO conversaciones" in lote and "INSERT INTO mensajes" in lote
+    assert "chatbot_sessions" not in lote and "chat_sessions" not in lote and "chat_messages" not in lote
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import random
+import threading
+
+import pytest
+from werkzeug.serving import make_server
+
+from bot_siacasa.application.use_cases.procesar_mensaje_use_case import ProcesarMensajeUseCase
+from bot_siacasa.domain.services.chatbot_service import ChatbotService
+from bot_siacasa.domain.services.conversation_cache import ConversationCache
+from bot_siacasa.infrastructure.repositories.memory_repository import MemoryRepository
+from bot_siacasa.infrastructure.worker_affinity import (
+    WORKER_HEADER,
+    WorkerAffinity,
+    WorkerTimeoutError,
+    WorkerUnavailableError,
+)
+from bot_siacasa.interfaces.web.web_app import WebApp
+from tests.unit.test_conversation_cache import FakeClock
+from tests.unit.test_shared_state import puerto_cerrado
+from tests.unit.test_unit_of_work import FakeAIProvider
+
+USUARIOS = [f"user-{i}" for i in range(4000)]
+
+
+def usuario_de(affinity: WorkerAffinity, worker: str) -> str:
+    return next(usuario_id for usuario_id in USUARIOS if affinity.owner(usuario_id) == worker)
+
+
+def build_service(repository) -> ChatbotService:
+    return ChatbotService(repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider())
+
+
+def test_joining_or_leaving_workers_moves_about_one_nth_of_users():
+    workers = {f"worker{i}": f"http://127.0.0.1:{3200 + i}" for i in range(3)}
+    affinity = WorkerAffinity(workers, "worker0")
+    antes = {usuario_id: affinity.owner(usuario_id) for usuario_id in USUARIOS}
+
+    affinity.add_worker("worker3", "http://127.0.0.1:3203")
+    movidos = [usuario_id for usuario_id in USUARIOS if affinity.owner(usuario_id) != antes[usuario_id]]
+    assert all(affinity.owner(usuario_id) == "worker3" for usuario_id in movidos)
+    assert 0.15 < len(movidos) / len(USUARIOS) < 0.35
+
+    affinity.remove_worker("worker3")
+    affinity.remove_worker("worker2")
+    despues = {usuario_id: affinity.owner(usuario_id) for usuario_id in USUARIOS}
+    # Solo cambian de worker los usuarios de worker2
+    assert all(despues[u] == antes[u] for u in USUARIOS if antes[u] != "worker2")
+    with pytest.raises(ValueError):
+        affinity.remove_worker("worker0")
+
+
+def test_unreachable_owner_leaves_the_ring_until_retry():
+    clock = FakeClock()
+    affinity = WorkerAffinity(
+        {"worker0": "http://127.0.0.1:3200", "worker1": f"http://127.0.0.1:{puerto_cerrado()}"},
+        "worker0", forward_timeout=1, retry_after_seconds=30, clock=clock
+    )
+    usuario_id = usuario_de(affinity, "worker1")
+
+    with pytest.raises(WorkerUnavailableError):
+        affinity.forward("worker1", "GET", "/api/mensajes", {})
+
+    assert affinity.owner(usuario_id) == "worker0"
+    assert affinity.get_stats()["workers_caidos"] == ["worker1"]
+    clock.now += 31
+    assert affinity.owner(usuario_id) == "worker1"
+
+
+def test_web_app_serves_each_user_on_its_owner_worker():
+    repository = MemoryRepository()
+    servicios = {nombre: build_service(repository) for nombre in ("worker0", "worker1")}
+    apps = {}
+    servidor = make_server("127.0.0.1", 0, lambda environ, start: apps["worker1"](environ, start), threaded=True)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    workers = {"worker0": "http://127.0.0.1:3200", "worker1": f"http://127.0.0.1:{servidor.server_port}"}
+    remoto = WebApp(
+        ProcesarMensajeUseCase(servicios["worker1"]), servicios["worker1"], WorkerAffinity(workers, "worker1")
+    )
+    apps["worker1"] = remoto.app
+    local = WebApp(
+        ProcesarMensajeUseCase(servicios["worker0"]), servicios["worker0"], WorkerAffinity(workers, "worker0")
+    )
+    client = local.app.test_client()
+    try:
+        for worker in ("worker0", "worker1"):
+            usuario_id = usuario_de(local.worker_affinity, worker)
+            respuesta = client.post("/api/mensaje", json={"mensaje": "¿Cuál es mi saldo?", "usuario_id": usuario_id})
+
+            assert respuesta.status_code == 200
+            assert respuesta.get_json()["usuario_id"] == usuario_id
+            assert respuesta.headers[WORKER_HEADER] == worker
+            # Solo el worker dueño tiene la conversación en su caché
+            assert {n for n, s in servicios.items() if usuario_id in s._conversation_cache} == {worker}
+            assert client.get(f"/api/worker?usuario_id={usuario_id}").get_json()["worker"] == worker
+
+        stats = local.worker_affinity.get_stats()
+        assert stats["forwarded_requests"] == 1 and stats["local_requests"] == 1
+        # El worker dueño no vuelve a reenviar una petición ya reenviada
+        assert remoto.worker_affinity.get_stats()["forwarded_requests"] == 0
+    finally:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def test_slow_owner_answers_504_without_leaving_the_ring_or_running_the_turn_twice():
+    liberar = threading.Event()
+    recibidas = []
+
+    def worker_lento(environ, start_response):
+        recibidas.append(environ["PATH_INFO"])
+        liberar.wait(5)
+        start_response("200 OK", [("Content-Type", "application/json")])
+        return [b"{}"]
+
+    servidor = make_server("127.0.0.1", 0, worker_lento, threaded=True)
+    threading.Thread(target=servidor.serve_forever, args=(0.05,), daemon=True).start()
+    servicio = build_service(MemoryRepository())
+    affinity = WorkerAffinity(
+        {"worker0": "http://127.0.0.1:3200", "worker1": f"http://127.0.0.1:{servidor.server_port}"},
+        "worker0", forward_timeout=0.2
+    )
+    local = WebApp(ProcesarMensajeUseCase(servicio), servicio, affinity)
+    usuario_id = usuario_de(affinity, "worker1")
+    try:
+        with pytest.raises(WorkerTimeoutError):
+            affinity.forward("worker1", "GET", "/api/mensajes", {})
+
+        respuesta = local.app.test_client().post(
+            "/api/mensaje", json={"mensaje": "¿Cuál es mi saldo?", "usuario_id": usuario_id}
+        )
+
+        assert respuesta.status_code == 504
+        assert recibidas == ["/api/mensajes", "/api/mensaje"]
+        # El dueño sigue en el anillo y el turno no se procesó en este worker
+        assert affinity.owner(usuario_id) == "worker1"
+        assert usuario_id not in servicio._conversation_cache
+        stats = affinity.get_stats()
+        assert stats["forward_timeouts"] == 2 and stats["workers_caidos"] == []
+    finally:
+        liberar.set()
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def simular_carga(workers: int, afinidad: bool, usuarios: int = 40, turnos: int = 6) -> float:
+    """
+    Reparte los turnos de `usuarios` usuarios entre `workers` procesos (cada uno
+    con su propia caché de conversaciones) por hash consistente o en round-robin,
+    y retorna la tasa de aciertos de caché del conjunto.
+    """
+    repository = MemoryRepository()
+    nombres = [f"worker{i}" for i in range(workers)]
+    servicios = {
+        nombre: ChatbotService(
+            repository, sentimiento_analyzer=None, ai_provider=FakeAIProvider(),
+            conversation_cache=ConversationCache()
+        )
+        for nombre in nombres
+    }
+    affinity = WorkerAffinity({nombre: "http://127.0.0.1" for nombre in nombres}, nombres[0])
+
+    peticiones = [f"load-user-{u}" for u in range(usuarios) for _ in range(turnos)]
+    random.Random(7).shuffle(peticiones)
+    for numero, usuario_id in enumerate(peticiones):
+        worker = affinity.owner(usuario_id) if afinidad else nombres[numero % workers]
+        servicios[worker].obtener_o_crear_conversacion(usuario_id)
+
+    stats = [servicio._conversation_cache.get_stats() for servicio in servicios.values()]
+    hits = sum(s["hits"] for s in stats)
+    return hits / (hits + sum(s["misses"] for s in stats))
+
+
+@pytest.mark.parametrize("workers", [1, 2, 4])
+def test_load_hit_rate_with_affinity_matches_a_single_worker(workers):
+    con_afinidad = simular_carga(workers, afinidad=True)
+    sin_afinidad = simular_carga(workers, afinidad=False)
+
+    # Con afinidad cada usuario falla solo en su primer turno: 5/6 aciertos con cualquier número de workers
+    assert con_afinidad == pytest.approx(5 / 6)
+    if workers == 1:
+        assert sin_afinidad == con_afinidad
+    else:
+        # En round-robin cada worker vuelve a cargar la conversación
+        assert sin_afinidad < con_afinidad - 0.1 * (workers - 1)
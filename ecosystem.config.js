@@ -5,6 +5,12 @@ module.exports = {
       script: '/home/siacasa/projects/siacasa/venv/bin/python3',
       args: '-m bot_siacasa.main',
       cwd: '/home/siacasa/projects/siacasa/SIACASA',
+      // Un solo worker: las salas de Socket.IO y las conexiones de agentes viven en
+      // el proceso, así que el chat agente <-> usuario no cruza workers. Para escalar
+      // hace falta una cola de mensajes para Socket.IO; entonces subir instances y
+      // configurar REDIS_URL y WORKER_NODES (worker0=http://127.0.0.1:3200,...)
+      instances: 1,
+      exec_mode: 'fork',
       env: {
         NODE_ENV: 'production',
         PYTHONPATH: '/home/siacasa/projects/siacasa',